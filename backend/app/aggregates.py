@@ -0,0 +1,153 @@
+"""
+Agregados del dashboard mantenidos de forma incremental
+
+El TelemetryStore notifica cada alta, cambio o baja de recorrido y cada cambio de
+estado de un montacarga; /api/dashboard/stats responde en O(1) (o en O(días)
+cuando se filtra por rango de fechas) sin recorrer los recorridos.
+"""
+
+import math
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, Optional, Tuple
+
+TOLERANCIA_KM = 1e-6
+
+
+def minutos_recorrido(recorrido: dict) -> int:
+    """Minutos entre hora_inicio y hora_fin (HH:MM), como calculaba el dashboard"""
+    inicio = recorrido["hora_inicio"].split(":")
+    fin = recorrido["hora_fin"].split(":")
+    return (int(fin[0]) * 60 + int(fin[1])) - (int(inicio[0]) * 60 + int(inicio[1]))
+
+
+def _aporte(recorrido: dict) -> Tuple[float, int]:
+    return recorrido["distancia_km"], minutos_recorrido(recorrido)
+
+
+def _nuevo_bucket() -> dict:
+    return {"recorridos": 0, "distancia_km": 0.0, "minutos": 0}
+
+
+class DashboardAggregates:
+    """Contadores globales y por día de recorridos, distancia, tiempo y estados"""
+
+    def __init__(self):
+        self.total_recorridos = 0
+        self.distancia_total = 0.0
+        self.tiempo_total = 0
+        self.estados: Counter = Counter()
+        self.por_dia: Dict[str, dict] = defaultdict(_nuevo_bucket)
+        # Último aporte de cada recorrido en memoria a los totales: id -> (distancia, minutos)
+        self._aportes: Dict[int, Tuple[float, int]] = {}
+
+    # ---------- Notificaciones del store ----------
+
+    def recorrido_changed(self, recorrido: dict) -> None:
+        """Aplica la diferencia entre el aporte anterior del recorrido y el actual"""
+        self._aportes[recorrido["id"]] = self._aplicar(recorrido, self._aportes.get(recorrido["id"]))
+
+    def archived_changed(self, recorrido: dict, anterior: Optional[dict]) -> None:
+        """
+        Como recorrido_changed para un recorrido archivado, cuyo aporte no se
+        guarda: `anterior` son sus metadatos antes del cambio (None si es nuevo)
+        """
+        self._aplicar(recorrido, None if anterior is None else _aporte(anterior))
+
+    def forget(self, recorrido_id: int) -> None:
+        """El recorrido pasó al archivo: su aporte se calcula desde sus metadatos (archived_*)"""
+        self._aportes.pop(recorrido_id, None)
+
+    def _aplicar(self, recorrido: dict, anterior: Optional[Tuple[float, int]]) -> Tuple[float, int]:
+        distancia, minutos = _aporte(recorrido)
+        bucket = self.por_dia[recorrido["fecha"]]
+        if anterior is None:
+            self.total_recorridos += 1
+            bucket["recorridos"] += 1
+            anterior = (0.0, 0)
+
+        delta_distancia, delta_minutos = distancia - anterior[0], minutos - anterior[1]
+        self.distancia_total += delta_distancia
+        self.tiempo_total += delta_minutos
+        bucket["distancia_km"] += delta_distancia
+        bucket["minutos"] += delta_minutos
+        return distancia, minutos
+
+    def recorrido_removed(self, recorrido: dict) -> None:
+        """Descuenta el último aporte de un recorrido eliminado"""
+        anterior = self._aportes.pop(recorrido["id"], None)
+        if anterior is not None:
+            self._descontar(recorrido, anterior)
+
+    def archived_removed(self, recorrido: dict) -> None:
+        """Descuenta un recorrido archivado eliminado (su aporte sale de sus metadatos)"""
+        self._descontar(recorrido, _aporte(recorrido))
+
+    def _descontar(self, recorrido: dict, anterior: Tuple[float, int]) -> None:
+        bucket = self.por_dia[recorrido["fecha"]]
+        self.total_recorridos -= 1
+        self.distancia_total -= anterior[0]
+        self.tiempo_total -= anterior[1]
+        bucket["recorridos"] -= 1
+        bucket["distancia_km"] -= anterior[0]
+        bucket["minutos"] -= anterior[1]
+        if bucket["recorridos"] == 0:
+            del self.por_dia[recorrido["fecha"]]
+
+    def estado_changed(self, anterior: Optional[str], nuevo: str) -> None:
+        if anterior is not None:
+            self.estados[anterior] -= 1
+        self.estados[nuevo] += 1
+
+    # ---------- Consultas ----------
+
+    def stats(self, desde: Optional[str] = None, hasta: Optional[str] = None) -> dict:
+        """Estadísticas globales o del rango de fechas [desde, hasta] (YYYY-MM-DD)"""
+        if desde is None and hasta is None:
+            total_recorridos, distancia_total, tiempo_total = (
+                self.total_recorridos, self.distancia_total, self.tiempo_total
+            )
+        else:
+            total_recorridos, distancia_total, tiempo_total = 0, 0.0, 0
+            for fecha, bucket in self.por_dia.items():
+                if (desde is None or fecha >= desde) and (hasta is None or fecha <= hasta):
+                    total_recorridos += bucket["recorridos"]
+                    distancia_total += bucket["distancia_km"]
+                    tiempo_total += bucket["minutos"]
+
+        velocidad_promedio = (distancia_total / (tiempo_total / 60)) if tiempo_total > 0 else 0
+
+        return {
+            "total_recorridos": total_recorridos,
+            "distancia_total": round(distancia_total, 2),
+            "tiempo_total": tiempo_total,
+            "velocidad_promedio": round(velocidad_promedio, 2),
+            "montacargas_activos": self.estados["Activo"],
+            "montacargas_mantenimiento": self.estados["Mantenimiento"]
+        }
+
+    def check(self, recorridos: Iterable[dict], montacargas: Iterable[dict]) -> dict:
+        """
+        Compara los contadores con un recálculo completo.
+        Devuelve las diferencias encontradas (vacío si son consistentes).
+        """
+        recorridos = list(recorridos)
+        esperado = {
+            "total_recorridos": len(recorridos),
+            "distancia_total": sum(r["distancia_km"] for r in recorridos),
+            "tiempo_total": sum(minutos_recorrido(r) for r in recorridos),
+        }
+        estados = Counter(m["estado"] for m in montacargas)
+        actual = {
+            "total_recorridos": self.total_recorridos,
+            "distancia_total": self.distancia_total,
+            "tiempo_total": self.tiempo_total,
+        }
+
+        diferencias = {}
+        for clave, valor in esperado.items():
+            if not math.isclose(actual[clave], valor, rel_tol=1e-9, abs_tol=TOLERANCIA_KM):
+                diferencias[clave] = {"incremental": actual[clave], "recalculado": valor}
+        for estado in set(estados) | {e for e, n in self.estados.items() if n}:
+            if estados[estado] != self.estados[estado]:
+                diferencias[f"estado:{estado}"] = {"incremental": self.estados[estado], "recalculado": estados[estado]}
+        return diferencias
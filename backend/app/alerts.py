@@ -0,0 +1,300 @@
+"""
+Motor de reglas de alerta evaluado sobre el flujo de ingesta
+
+Reglas declarativas (dicts, p. ej. desde un JSON):
+- {"id", "tipo": "velocidad", "max_kmh", "zona_id"?}: velocidad mayor que max_kmh
+  (dentro de la zona, si se indica)
+- {"id", "tipo": "bateria", "min"}: batería menor que min (%)
+- {"id", "tipo": "estado", "estados": [...]}: status reportado en la lista (p. ej. "error")
+- {"id", "tipo": "sin_datos", "segundos"}: sin recibir puntos durante ese tiempo
+Todas aceptan "mc_ids" (solo esos montacargas) y "severidad".
+
+Las reglas se compilan una vez: cada regla es un bit y, por tipo, se ordenan
+los umbrales con máscaras acumuladas, de modo que evaluar un punto cuesta una
+búsqueda binaria por grupo (no un recorrido de todas las reglas). El estado de
+cada montacarga es la máscara de reglas activas: solo se emiten eventos
+cuando cambia un bit ("activa" al cumplirse, "resuelta" al dejar de cumplirse).
+
+La regla sin_datos usa un heap de vencimientos con reprogramación perezosa:
+cada montacarga tiene a lo sumo una entrada por regla y tick() solo revisa
+las vencidas, sin recorrer todos los montacargas.
+
+El estado (reglas activas y alertas por montacarga) se exporta con
+`export_state` y se restaura con `load_state` (snapshot del log de
+telemetría), identificando las reglas por su id.
+"""
+
+import heapq
+import json
+import time
+from bisect import bisect_left, bisect_right
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+TIPOS_REGLA = {"velocidad": "max_kmh", "bateria": "min", "estado": "estados", "sin_datos": "segundos"}
+
+
+class _Umbrales:
+    """Reglas de un grupo ordenadas por umbral, con la máscara de reglas de cada corte"""
+
+    __slots__ = ("umbrales", "mascaras")
+
+    def __init__(self, reglas: List[Tuple[float, int]], sufijos: bool):
+        reglas = sorted(reglas)
+        self.umbrales = [umbral for umbral, _ in reglas]
+        bits = [1 << indice for _, indice in reglas]
+        # Prefijos: mascaras[k] = reglas [0, k). Sufijos: mascaras[k] = reglas [k, n)
+        self.mascaras = [0] * (len(bits) + 1)
+        if sufijos:
+            for k in range(len(bits) - 1, -1, -1):
+                self.mascaras[k] = self.mascaras[k + 1] | bits[k]
+        else:
+            for k, bit in enumerate(bits):
+                self.mascaras[k + 1] = self.mascaras[k] | bit
+
+
+def _bits(mascara: int):
+    """Índices de los bits encendidos de la máscara"""
+    while mascara:
+        bit = mascara & -mascara
+        yield bit.bit_length() - 1
+        mascara ^= bit
+
+
+def validate_rule(regla: dict) -> dict:
+    tipo = regla.get("tipo")
+    if tipo not in TIPOS_REGLA:
+        raise ValueError(f"Regla {regla.get('id')}: tipo desconocido {tipo!r}")
+    if "id" not in regla or TIPOS_REGLA[tipo] not in regla:
+        raise ValueError(f"Regla {regla.get('id')}: faltan 'id' o '{TIPOS_REGLA[tipo]}'")
+    return regla
+
+
+class AlertEngine:
+    """Reglas compiladas, estado por montacarga, alertas activas e historial de eventos"""
+
+    def __init__(self, reglas: Iterable[dict], zonas=None, max_eventos: int = 1000, reloj=time.monotonic):
+        self.reglas: List[dict] = [validate_rule(regla) for regla in reglas]
+        # GeofenceIndex para las reglas de velocidad por zona
+        self.zonas = zonas
+        self.reloj = reloj
+        self.eventos: deque = deque(maxlen=max_eventos)
+        self.evaluados = 0
+        # mc_id -> máscara de reglas activas
+        self._activas: Dict[int, int] = {}
+        # (índice de regla, mc_id) -> alerta activa
+        self._alertas: Dict[Tuple[int, int], dict] = {}
+        self._mascaras_mc: Dict[int, int] = {}
+        # sin_datos: último punto recibido (reloj del servidor) y heap (vence, índice de regla, mc_id)
+        self._ultimo_dato: Dict[int, float] = {}
+        self._vencimientos: List[Tuple[float, int, int]] = []
+        self._compilar()
+
+    # ---------- Compilación ----------
+
+    def _compilar(self) -> None:
+        velocidad: Dict[Optional[int], List[Tuple[float, int]]] = {}
+        bateria: List[Tuple[float, int]] = []
+        self._estados: Dict[str, int] = {}
+        self._sin_datos: List[Tuple[int, float]] = []
+        self._con_filtro = 0
+        for indice, regla in enumerate(self.reglas):
+            tipo = regla["tipo"]
+            if regla.get("mc_ids") is not None:
+                self._con_filtro |= 1 << indice
+            if tipo == "velocidad":
+                velocidad.setdefault(regla.get("zona_id"), []).append((float(regla["max_kmh"]), indice))
+            elif tipo == "bateria":
+                bateria.append((float(regla["min"]), indice))
+            elif tipo == "estado":
+                for estado in regla["estados"]:
+                    self._estados[estado] = self._estados.get(estado, 0) | 1 << indice
+            else:
+                self._sin_datos.append((indice, float(regla["segundos"])))
+        # velocidad > max_kmh: umbrales menores que la velocidad (prefijo);
+        # batería < min: umbrales mayores que la batería (sufijo)
+        self._velocidad = _Umbrales(velocidad.pop(None, []), sufijos=False)
+        self._velocidad_zona = {zona: _Umbrales(r, sufijos=False) for zona, r in velocidad.items()}
+        self._bateria = _Umbrales(bateria, sufijos=True)
+        self._clasificar = bool(self._velocidad_zona) and self.zonas is not None and len(self.zonas) > 0
+
+    def _mascara_mc(self, mc_id: int) -> int:
+        """Reglas que aplican al montacarga: las que no filtran más las que lo incluyen"""
+        mascara = self._mascaras_mc.get(mc_id)
+        if mascara is None:
+            mascara = ~self._con_filtro
+            for indice in _bits(self._con_filtro):
+                if mc_id in self.reglas[indice]["mc_ids"]:
+                    mascara |= 1 << indice
+            self._mascaras_mc[mc_id] = mascara
+        return mascara
+
+    # ---------- Evaluación de puntos ----------
+
+    def _violadas(self, speed: float, battery: float, status: str, zona: Optional[int]) -> int:
+        mascara = self._velocidad.mascaras[bisect_left(self._velocidad.umbrales, speed)]
+        if zona is not None:
+            grupo = self._velocidad_zona.get(zona)
+            if grupo is not None:
+                mascara |= grupo.mascaras[bisect_left(grupo.umbrales, speed)]
+        mascara |= self._bateria.mascaras[bisect_right(self._bateria.umbrales, battery)]
+        return mascara | self._estados.get(status, 0)
+
+    def _aplicar(self, mc_id: int, ts: int, speed: float, battery: float, status: str,
+                 zona: Optional[int], eventos: List[dict]) -> None:
+        nueva = self._violadas(speed, battery, status, zona) & self._mascara_mc(mc_id)
+        anterior = self._activas.get(mc_id, 0)
+        if nueva == anterior:
+            return
+        self._activas[mc_id] = nueva
+        valores = {"velocidad": speed, "bateria": battery, "estado": status}
+        for indice in _bits(nueva ^ anterior):
+            activa = bool(nueva >> indice & 1)
+            eventos.append(self._cambio(indice, mc_id, ts, activa, valores[self.reglas[indice]["tipo"]]))
+
+    def evaluate(self, mc_id: int, ts: int, lat: float, lng: float, speed: float,
+                 battery: float, status: str) -> List[dict]:
+        """Evalúa un punto; devuelve los eventos de alertas que se activan o se resuelven"""
+        eventos = self._dato_recibido(mc_id, ts)
+        zona = self.zonas.classify(lat, lng) if self._clasificar else None
+        self._aplicar(mc_id, ts, speed, battery, status, zona, eventos)
+        self.evaluados += 1
+        return eventos
+
+    def evaluate_many(self, mc_id: int, ts: np.ndarray, lat: np.ndarray, lng: np.ndarray,
+                      speed: np.ndarray, battery: np.ndarray, status: Sequence[str]) -> List[dict]:
+        """Igual que evaluate para un lote de un montacarga, en orden de ts"""
+        if len(ts) == 0:
+            return []
+        orden = np.argsort(ts, kind="stable").tolist()
+        ts = np.asarray(ts)
+        eventos = self._dato_recibido(mc_id, int(ts[orden[-1]]))
+        zonas = self.zonas.classify_many(np.asarray(lat), np.asarray(lng)).tolist() if self._clasificar else None
+        ts_l, speed_l, battery_l = ts.tolist(), np.asarray(speed).tolist(), np.asarray(battery).tolist()
+        for i in orden:
+            zona = None if zonas is None or zonas[i] == -1 else zonas[i]
+            self._aplicar(mc_id, ts_l[i], speed_l[i], battery_l[i], status[i], zona, eventos)
+        self.evaluados += len(orden)
+        return eventos
+
+    # ---------- Sin datos (heap de vencimientos) ----------
+
+    def _dato_recibido(self, mc_id: int, ts: int) -> List[dict]:
+        """Registra la llegada de datos: resuelve las alertas sin_datos y programa los vencimientos"""
+        eventos = []
+        if not self._sin_datos:
+            return eventos
+        ahora = self.reloj()
+        primera_vez = mc_id not in self._ultimo_dato
+        self._ultimo_dato[mc_id] = ahora
+        aplicables = self._mascara_mc(mc_id)
+        for indice, segundos in self._sin_datos:
+            if not aplicables >> indice & 1:
+                continue
+            if (indice, mc_id) in self._alertas:
+                eventos.append(self._cambio(indice, mc_id, ts, False, None))
+                heapq.heappush(self._vencimientos, (ahora + segundos, indice, mc_id))
+            elif primera_vez:
+                heapq.heappush(self._vencimientos, (ahora + segundos, indice, mc_id))
+        return eventos
+
+    def tick(self) -> List[dict]:
+        """
+        Activa las alertas sin_datos vencidas. Una entrada cuyo montacarga recibió
+        datos después de programarla se reprograma al vencimiento real (perezoso).
+        """
+        eventos = []
+        ahora = self.reloj()
+        while self._vencimientos and self._vencimientos[0][0] <= ahora:
+            _, indice, mc_id = heapq.heappop(self._vencimientos)
+            vence = self._ultimo_dato[mc_id] + self._segundos(indice)
+            if vence > ahora:
+                heapq.heappush(self._vencimientos, (vence, indice, mc_id))
+            else:
+                # Queda fuera del heap hasta que vuelvan a llegar datos
+                eventos.append(self._cambio(indice, mc_id, None, True, round(ahora - self._ultimo_dato[mc_id], 1)))
+        return eventos
+
+    def _segundos(self, indice: int) -> float:
+        return float(self.reglas[indice]["segundos"])
+
+    # ---------- Alertas ----------
+
+    def _cambio(self, indice: int, mc_id: int, ts: Optional[int], activa: bool, valor) -> dict:
+        regla = self.reglas[indice]
+        evento = {
+            "alerta": "activa" if activa else "resuelta",
+            "regla_id": regla["id"],
+            "tipo": regla["tipo"],
+            "severidad": regla.get("severidad", "media"),
+            "mc_id": mc_id,
+            "ts": ts,
+            "valor": valor,
+        }
+        if activa:
+            self._alertas[(indice, mc_id)] = evento
+        else:
+            self._alertas.pop((indice, mc_id), None)
+        self.eventos.append(evento)
+        return evento
+
+    # ---------- Estado ----------
+
+    def export_state(self) -> dict:
+        """Reglas activas y alertas por montacarga, serializables en JSON (reglas por id)"""
+        return {
+            "activas": {str(mc_id): [self.reglas[i]["id"] for i in _bits(mascara)]
+                        for mc_id, mascara in self._activas.items() if mascara},
+            "alertas": list(self._alertas.values()),
+            "con_datos": list(self._ultimo_dato),
+        }
+
+    def load_state(self, estado: dict) -> None:
+        """
+        Reemplaza el estado por el exportado con export_state; las reglas que ya
+        no existen se ignoran. El reloj de sin_datos no sobrevive al reinicio:
+        los montacargas con datos vuelven a contar desde ahora.
+        """
+        indices = {regla["id"]: indice for indice, regla in enumerate(self.reglas)}
+        self._activas = {}
+        for mc_id, ids in estado.get("activas", {}).items():
+            mascara = 0
+            for regla_id in ids:
+                if regla_id in indices:
+                    mascara |= 1 << indices[regla_id]
+            self._activas[int(mc_id)] = mascara
+        self._alertas = {
+            (indices[alerta["regla_id"]], alerta["mc_id"]): alerta
+            for alerta in estado.get("alertas", []) if alerta["regla_id"] in indices
+        }
+        self._ultimo_dato = {}
+        self._vencimientos = []
+        ahora = self.reloj()
+        for mc_id in estado.get("con_datos", []):
+            self._ultimo_dato[mc_id] = ahora
+            aplicables = self._mascara_mc(mc_id)
+            for indice, segundos in self._sin_datos:
+                if aplicables >> indice & 1 and (indice, mc_id) not in self._alertas:
+                    self._vencimientos.append((ahora + segundos, indice, mc_id))
+        heapq.heapify(self._vencimientos)
+
+    def active(self, mc_id: Optional[int] = None) -> List[dict]:
+        """Alertas activas (opcionalmente de un montacarga)"""
+        return [a for (_, mc), a in self._alertas.items() if mc_id is None or mc == mc_id]
+
+    def stats(self) -> dict:
+        return {
+            "reglas": len(self.reglas),
+            "puntos_evaluados": self.evaluados,
+            "alertas_activas": len(self._alertas),
+            "montacargas": len(self._activas.keys() | self._ultimo_dato.keys()),
+            "vencimientos_programados": len(self._vencimientos),
+        }
+
+
+def load_rules(path: str) -> List[dict]:
+    """Reglas desde un archivo JSON: [{"id", "tipo", ...}, ...]"""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,313 @@
+"""
+Archivo comprimido de recorridos antiguos (retención por niveles)
+
+- Los recorridos de días fuera de la ventana caliente se mueven a un archivo
+  append-only en disco: un chunk zlib por montacarga y día con las columnas de
+  todos sus recorridos. Cada columna va con sus bytes transpuestos (byte
+  shuffle) y ts en deltas, lo que agrupa los bytes repetidos y comprime mejor.
+- El índice (montacarga, fecha) -> (offset, tamaño, metadatos de los
+  recorridos) vive en memoria y se persiste como JSON por líneas, también
+  append-only: la última línea de una clave reemplaza a las anteriores.
+- Las lecturas decodifican el chunk completo y lo guardan en una caché LRU
+  de chunks decodificados de tamaño acotado.
+- Reescribir un chunk (recorrido tardío o borrado) deja el anterior como
+  bytes muertos. `compact` copia los chunks vigentes a un archivo de datos
+  nuevo y reescribe el índice; la primera línea del índice nombra su archivo
+  de datos, así el cambio se confirma con un solo rename.
+- Los métodos se pueden llamar desde hilos (la API los ejecuta fuera del
+  event loop): un lock serializa el acceso al archivo de datos, al índice y
+  a la caché. `stats` y `entries` no lo toman.
+- Los metadatos de cada recorrido del índice son los mismos dicts que
+  indexa el TelemetryStore (una sola copia por recorrido archivado).
+"""
+
+import glob
+import json
+import logging
+import os
+import sys
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .columns import COLUMNAS, PointColumns
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FILE = "archive.dat"
+INDEX_FILE = "archive-index.jsonl"
+NIVEL_ZLIB = 6
+
+
+def _shuffle(valores: np.ndarray) -> bytes:
+    """Bytes de la columna agrupados por posición dentro del valor"""
+    return valores.view(np.uint8).reshape(len(valores), valores.itemsize).T.tobytes()
+
+
+def codificar_columnas(columnas: Dict[str, np.ndarray]) -> bytes:
+    partes = []
+    for nombre, dtype in COLUMNAS.items():
+        valores = np.ascontiguousarray(columnas[nombre], dtype=dtype)
+        if nombre == "ts":
+            valores = np.diff(valores, prepend=np.int64(0))
+        partes.append(_shuffle(valores))
+    return zlib.compress(b"".join(partes), NIVEL_ZLIB)
+
+
+def decodificar_columnas(datos: bytes, n: int) -> Dict[str, np.ndarray]:
+    crudo = zlib.decompress(datos)
+    columnas = {}
+    inicio = 0
+    for nombre, dtype in COLUMNAS.items():
+        ancho = np.dtype(dtype).itemsize
+        fin = inicio + n * ancho
+        bytes_columna = np.frombuffer(crudo, dtype=np.uint8, count=n * ancho, offset=inicio)
+        valores = np.ascontiguousarray(bytes_columna.reshape(ancho, n).T).view(dtype).ravel()
+        columnas[nombre] = np.cumsum(valores) if nombre == "ts" else valores
+        inicio = fin
+    return columnas
+
+
+class TripArchive:
+    """Chunks comprimidos por (montacarga, fecha) con índice en memoria y caché LRU"""
+
+    def __init__(self, directorio: str, cache_chunks: int = 64):
+        os.makedirs(directorio, exist_ok=True)
+        self.directorio = directorio
+        self.cache_chunks = cache_chunks
+        self.aciertos = 0
+        self.fallos = 0
+        self._indice: Dict[Tuple[int, str], dict] = {}
+        self._cache: "OrderedDict[Tuple[int, str], Dict[int, PointColumns]]" = OrderedDict()
+        self._lock = threading.RLock()
+
+        self._path_indice = os.path.join(directorio, INDEX_FILE)
+        self.archivo_datos = ARCHIVE_FILE
+        if os.path.exists(self._path_indice):
+            self._cargar_indice()
+        # Restos de una compactación interrumpida o ya confirmada
+        for path in glob.glob(os.path.join(directorio, "*.tmp")) + glob.glob(os.path.join(directorio, "*.dat")):
+            if os.path.basename(path) != self.archivo_datos:
+                os.remove(path)
+        self._datos = open(os.path.join(directorio, self.archivo_datos), "a+b")
+        self._tamano_datos = os.fstat(self._datos.fileno()).st_size
+        self._indice_file = open(self._path_indice, "a", encoding="utf-8")
+
+    def _cargar_indice(self) -> None:
+        with open(self._path_indice, encoding="utf-8") as f:
+            for linea in f:
+                try:
+                    entrada = json.loads(linea)
+                except ValueError:
+                    # Línea final incompleta (escritura interrumpida): el chunk no quedó indexado
+                    logger.warning("Entrada incompleta al final de %s; se descarta", self._path_indice)
+                    break
+                if "archivo" in entrada:
+                    # Cabecera de un índice compactado
+                    self.archivo_datos = entrada["archivo"]
+                elif entrada["recorridos"]:
+                    # Fechas y horas se repiten entre recorridos: una sola copia de cada texto
+                    for meta in entrada["recorridos"]:
+                        for campo in ("fecha", "hora_inicio", "hora_fin"):
+                            if isinstance(meta.get(campo), str):
+                                meta[campo] = sys.intern(meta[campo])
+                    self._indice[(entrada["mc_id"], entrada["fecha"])] = entrada
+                else:
+                    self._indice.pop((entrada["mc_id"], entrada["fecha"]), None)
+
+    # ---------- Escritura ----------
+
+    def write(self, mc_id: int, fecha: str, recorridos: List[dict]) -> dict:
+        """
+        Archiva los recorridos (con puntos) de un montacarga en un día. Si el día
+        ya estaba archivado (recorrido tardío), el chunk nuevo incluye los anteriores.
+        """
+        clave = (mc_id, fecha)
+        with self._lock:
+            por_id = {}
+            if clave in self._indice:
+                anteriores = self.chunk(mc_id, fecha)
+                for meta in self._indice[clave]["recorridos"]:
+                    por_id[meta["id"]] = (meta, anteriores[meta["id"]])
+            for recorrido in recorridos:
+                meta = {k: v for k, v in recorrido.items() if k != "puntos_recorrido"}
+                por_id[recorrido["id"]] = (meta, recorrido["puntos_recorrido"])
+            return self._escribir(mc_id, fecha, por_id)
+
+    def remove(self, mc_id: int, fecha: str, recorrido_id: int) -> None:
+        """Reescribe el chunk del día sin ese recorrido (una entrada vacía borra la clave)"""
+        clave = (mc_id, fecha)
+        with self._lock:
+            anteriores = self.chunk(mc_id, fecha)
+            por_id = {
+                meta["id"]: (meta, anteriores[meta["id"]])
+                for meta in self._indice[clave]["recorridos"] if meta["id"] != recorrido_id
+            }
+            self._escribir(mc_id, fecha, por_id)
+
+    def _escribir(self, mc_id: int, fecha: str, por_id: Dict[int, Tuple[dict, PointColumns]]) -> dict:
+        clave = (mc_id, fecha)
+        metas, columnas = [], {nombre: [] for nombre in COLUMNAS}
+        for recorrido_id in sorted(por_id):
+            meta, puntos = por_id[recorrido_id]
+            # Los metadatos ya indexados se conservan (los comparte el store)
+            if meta.get("n_puntos") != len(puntos):
+                meta = {**meta, "n_puntos": len(puntos)}
+            metas.append(meta)
+            for nombre in COLUMNAS:
+                columnas[nombre].append(getattr(puntos, nombre))
+        datos = codificar_columnas({
+            nombre: np.concatenate(partes or [np.empty(0, COLUMNAS[nombre])]) for nombre, partes in columnas.items()
+        })
+
+        # Primero el chunk (con fsync) y después la línea del índice que lo referencia
+        offset = self._tamano_datos
+        self._datos.write(datos)
+        self._datos.flush()
+        os.fsync(self._datos.fileno())
+        self._tamano_datos += len(datos)
+        entrada = {"mc_id": mc_id, "fecha": fecha, "offset": offset, "size": len(datos),
+                   "n_puntos": sum(m["n_puntos"] for m in metas), "recorridos": metas}
+        self._indice_file.write(json.dumps(entrada, default=float) + "\n")
+        self._indice_file.flush()
+        os.fsync(self._indice_file.fileno())
+
+        if metas:
+            self._indice[clave] = entrada
+        else:
+            self._indice.pop(clave, None)
+        self._cache.pop(clave, None)
+        return entrada
+
+    # ---------- Lectura ----------
+
+    def _leer(self, entrada: dict) -> Dict[int, PointColumns]:
+        datos = os.pread(self._datos.fileno(), entrada["size"], entrada["offset"])
+        columnas = decodificar_columnas(datos, entrada["n_puntos"])
+        recorridos = {}
+        inicio = 0
+        for meta in entrada["recorridos"]:
+            fin = inicio + meta["n_puntos"]
+            puntos = PointColumns(max(fin - inicio, 1))
+            puntos.extend(*(columnas[nombre][inicio:fin] for nombre in COLUMNAS))
+            recorridos[meta["id"]] = puntos
+            inicio = fin
+        return recorridos
+
+    def chunk(self, mc_id: int, fecha: str) -> Dict[int, PointColumns]:
+        """Puntos de los recorridos archivados de un montacarga en un día: {id: columnas}"""
+        clave = (mc_id, fecha)
+        with self._lock:
+            recorridos = self._cache.get(clave)
+            if recorridos is not None:
+                self._cache.move_to_end(clave)
+                self.aciertos += 1
+                return recorridos
+            self.fallos += 1
+            recorridos = self._leer(self._indice[clave])
+            self._cache[clave] = recorridos
+            if len(self._cache) > self.cache_chunks:
+                self._cache.popitem(last=False)
+            return recorridos
+
+    def chunks(self, claves: Iterable[Tuple[int, str]]) -> Dict[Tuple[int, str], Dict[int, PointColumns]]:
+        """Varios chunks de una vez (p. ej. desde un hilo, para una página de recorridos)"""
+        return {clave: self.chunk(*clave) for clave in set(claves)}
+
+    def entries(self) -> List[dict]:
+        return list(self._indice.values())
+
+    def iter_chunks(self, claves: Optional[Iterable[Tuple[int, str]]] = None
+                    ) -> Iterator[Tuple[dict, Dict[int, PointColumns]]]:
+        """
+        Recorre los chunks (todos o los de `claves` que sigan archivados) sin
+        pasar por la caché, para reconstrucciones
+        """
+        with self._lock:
+            entradas = self._indice.values() if claves is None else filter(None, map(self._indice.get, claves))
+            entradas = list(entradas)
+        for entrada in entradas:
+            with self._lock:
+                # Una compactación pudo mover el chunk entre lecturas
+                actual = self._indice.get((entrada["mc_id"], entrada["fecha"]))
+                if actual is None:
+                    continue
+                recorridos = self._leer(actual)
+            yield actual, recorridos
+
+    # ---------- Compactación ----------
+
+    def dead_bytes(self) -> int:
+        """Bytes del archivo de datos que ya no referencia ningún chunk vigente"""
+        return self._tamano_datos - sum(e["size"] for e in self.entries())
+
+    def compact(self) -> int:
+        """
+        Copia los chunks vigentes (sin descomprimirlos) a un archivo de datos
+        nuevo y reescribe el índice con una entrada por clave. Devuelve los
+        bytes liberados.
+        """
+        with self._lock:
+            return self._compactar()
+
+    def _compactar(self) -> int:
+        antes = self._tamano_datos
+        numero = int(self.archivo_datos[len("archive-"):-len(".dat")]) + 1 if "-" in self.archivo_datos else 1
+        nuevo = f"archive-{numero}.dat"
+
+        entradas = []
+        with open(os.path.join(self.directorio, nuevo + ".tmp"), "wb") as datos:
+            offset = 0
+            for entrada in self._indice.values():
+                datos.write(os.pread(self._datos.fileno(), entrada["size"], entrada["offset"]))
+                entradas.append({**entrada, "offset": offset})
+                offset += entrada["size"]
+            datos.flush()
+            os.fsync(datos.fileno())
+        os.replace(os.path.join(self.directorio, nuevo + ".tmp"), os.path.join(self.directorio, nuevo))
+
+        tmp_indice = self._path_indice + ".tmp"
+        with open(tmp_indice, "w", encoding="utf-8") as indice:
+            indice.write(json.dumps({"archivo": nuevo}) + "\n")
+            for entrada in entradas:
+                indice.write(json.dumps(entrada, default=float) + "\n")
+            indice.flush()
+            os.fsync(indice.fileno())
+        # El rename del índice confirma el cambio; el archivo de datos anterior ya no se referencia
+        os.replace(tmp_indice, self._path_indice)
+        fd = os.open(self.directorio, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+        self._datos.close()
+        self._indice_file.close()
+        os.remove(os.path.join(self.directorio, self.archivo_datos))
+        self.archivo_datos = nuevo
+        self._datos = open(os.path.join(self.directorio, nuevo), "a+b")
+        self._tamano_datos = offset
+        self._indice_file = open(self._path_indice, "a", encoding="utf-8")
+        self._indice = {(e["mc_id"], e["fecha"]): e for e in entradas}
+        return antes - offset
+
+    def stats(self) -> dict:
+        entradas = self.entries()
+        return {
+            "chunks": len(entradas),
+            "recorridos": sum(len(e["recorridos"]) for e in entradas),
+            "puntos": sum(e["n_puntos"] for e in entradas),
+            "bytes_comprimidos": sum(e["size"] for e in entradas),
+            "bytes_muertos": self.dead_bytes(),
+            "cache_chunks": len(self._cache),
+            "cache_aciertos": self.aciertos,
+            "cache_fallos": self.fallos,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._datos.close()
+            self._indice_file.close()
@@ -0,0 +1,111 @@
+"""
+Formato binario compacto de subida para microcontroladores
+
+Un envío es una cabecera fija seguida de registros de 14 bytes (little-endian):
+
+    cabecera (24 bytes): magic "RB", versión u8, reservado u8, mc_id u32,
+                         epoch base i64 (s), lat base i32, lng base i32 (1e-7 grados)
+    registro (14 bytes): dlat i32, dlng i32 (1e-7 grados), dt u16 (s),
+                         speed u16 (0.01 km/h), battery u8, status u8
+
+Cada registro guarda la diferencia respecto al anterior (el primero respecto a
+la cabecera). El servidor lee los registros con np.frombuffer, sin copiar ni
+parsear punto por punto, y reconstruye las columnas con sumas acumuladas.
+"""
+
+import struct
+from typing import Sequence, Tuple
+
+import numpy as np
+
+from .ingest import STATUS_CODES
+
+MAGIC = b"RB"
+VERSION = 1
+
+HEADER = struct.Struct("<2sBxIqii")
+
+RECORD_DTYPE = np.dtype([
+    ("dlat", "<i4"),
+    ("dlng", "<i4"),
+    ("dt", "<u2"),
+    ("speed", "<u2"),
+    ("battery", "u1"),
+    ("status", "u1"),
+])
+
+# 1e-7 grados por unidad de lat/lng (~1 cm)
+ESCALA_COORDENADAS = 10_000_000
+# 0.01 km/h por unidad de velocidad
+ESCALA_VELOCIDAD = 100
+# Rango de ts aceptado: el mismo que interpreta parse_timestamp (hasta 9999-12-31T23:59:59)
+TS_MAXIMO = 253402300799
+
+
+class BinaryFormatError(ValueError):
+    """Envío binario mal formado (cabecera, versión o largo)"""
+
+
+def decode_upload(cuerpo: bytes) -> Tuple[int, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Decodifica un envío binario.
+
+    Devuelve (mc_id, ts, lat, lng, speed, battery, status) con ts en epoch
+    (int64), lat/lng en grados (float64), speed en km/h (float32), battery
+    (uint8) y status como códigos de app.ingest.STATUS_NAMES (uint8). Los
+    valores fuera de rango (ver TS_MAXIMO) los valida quien llama, por punto.
+    """
+    if len(cuerpo) < HEADER.size:
+        raise BinaryFormatError("Envío más corto que la cabecera")
+    magic, version, mc_id, epoch, lat_base, lng_base = HEADER.unpack_from(cuerpo)
+    if magic != MAGIC:
+        raise BinaryFormatError("Magic inválido")
+    if version != VERSION:
+        raise BinaryFormatError(f"Versión no soportada: {version}")
+    if (len(cuerpo) - HEADER.size) % RECORD_DTYPE.itemsize:
+        raise BinaryFormatError(f"El largo de los registros no es múltiplo de {RECORD_DTYPE.itemsize} bytes")
+
+    registros = np.frombuffer(cuerpo, dtype=RECORD_DTYPE, offset=HEADER.size)
+    if not 0 <= epoch <= TS_MAXIMO:
+        raise BinaryFormatError(f"Epoch base fuera de rango: {epoch}")
+    ts = epoch + np.cumsum(registros["dt"], dtype=np.int64)
+    lat = (lat_base + np.cumsum(registros["dlat"], dtype=np.int64)) / ESCALA_COORDENADAS
+    lng = (lng_base + np.cumsum(registros["dlng"], dtype=np.int64)) / ESCALA_COORDENADAS
+    speed = registros["speed"].astype(np.float32) / ESCALA_VELOCIDAD
+    return mc_id, ts, lat, lng, speed, registros["battery"], registros["status"]
+
+
+def _validar_rango(campo: str, valores: np.ndarray) -> np.ndarray:
+    """Valores que caben en el campo `campo` de RECORD_DTYPE (sin truncar ni dar la vuelta)"""
+    limites = np.iinfo(RECORD_DTYPE[campo])
+    fuera = ~np.isfinite(valores) | (valores < limites.min) | (valores > limites.max)
+    if fuera.any():
+        i = int(np.argmax(fuera))
+        raise ValueError(f"{campo} del punto {i} fuera del rango del formato "
+                         f"[{limites.min}, {limites.max}]: {valores[i]}")
+    return valores
+
+
+def encode_upload(mc_id: int, ts: np.ndarray, lat: np.ndarray, lng: np.ndarray,
+                  speed: np.ndarray, battery: np.ndarray, status: Sequence[str]) -> bytes:
+    """
+    Codifica puntos en el formato binario (referencia para clientes y benchmarks).
+    ValueError si un valor no entra en su campo: ts decrecientes o separados por
+    más de 65535 s (dt u16), speed negativa o de más de 655.35 km/h (u16),
+    saltos de lng de más de ~214 grados (i32) o battery fuera de 0-255.
+    """
+    ts = np.asarray(ts, dtype=np.int64)
+    lat_e7 = np.round(np.asarray(lat) * ESCALA_COORDENADAS).astype(np.int64)
+    lng_e7 = np.round(np.asarray(lng) * ESCALA_COORDENADAS).astype(np.int64)
+    epoch = int(ts[0]) if len(ts) else 0
+    lat_base = int(lat_e7[0]) if len(ts) else 0
+    lng_base = int(lng_e7[0]) if len(ts) else 0
+
+    registros = np.empty(len(ts), dtype=RECORD_DTYPE)
+    registros["dlat"] = _validar_rango("dlat", np.diff(lat_e7, prepend=lat_base))
+    registros["dlng"] = _validar_rango("dlng", np.diff(lng_e7, prepend=lng_base))
+    registros["dt"] = _validar_rango("dt", np.diff(ts, prepend=epoch))
+    registros["speed"] = _validar_rango("speed", np.round(np.asarray(speed, dtype=np.float64) * ESCALA_VELOCIDAD))
+    registros["battery"] = _validar_rango("battery", np.asarray(battery))
+    registros["status"] = [STATUS_CODES.get(st, 0) for st in status]
+    return HEADER.pack(MAGIC, VERSION, mc_id, epoch, lat_base, lng_base) + registros.tobytes()
@@ -0,0 +1,238 @@
+"""
+Almacenamiento columnar de puntos GPS de un recorrido
+
+Cada columna es un arreglo NumPy tipado que crece por duplicación de capacidad
+(append amortizado O(1)). Los puntos solo se convierten a dicts JSON en el
+borde de la API.
+"""
+
+import calendar
+import re
+import warnings
+from datetime import datetime
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+CAPACIDAD_INICIAL = 16
+
+# Forma completa YYYY-MM-DDTHH:MM[:SS][Z]: la única que el camino vectorizado
+# interpreta igual que parse_timestamp (sin desplazamiento horario ni fechas parciales)
+_ISO_COMPLETO = re.compile(r"[0-9]{4}-[0-9]{2}-[0-9]{2}T[0-9]{2}:[0-9]{2}(:[0-9]{2})?Z?")
+
+COLUMNAS = {
+    "lat": np.float64,
+    "lng": np.float64,
+    "ts": np.int64,       # segundos epoch (hora local del dispositivo, sin zona)
+    "speed": np.float32,  # km/h
+    "battery": np.uint8,  # 0-100 %
+}
+
+
+def parse_timestamp(timestamp: str, fecha: Optional[str] = None) -> int:
+    """
+    Convierte un timestamp ISO (YYYY-MM-DDTHH:MM[:SS]) a segundos epoch.
+    Si solo viene la hora (HH:MM), se combina con `fecha`.
+    """
+    if "T" not in timestamp and fecha is not None:
+        timestamp = f"{fecha}T{timestamp}"
+    dt = datetime.fromisoformat(timestamp)
+    return calendar.timegm(dt.timetuple())
+
+
+def parse_timestamps(timestamps: Sequence[str]) -> Tuple[np.ndarray, List[int]]:
+    """
+    Convierte una lista de timestamps ISO a segundos epoch en una sola operación.
+    Devuelve el arreglo y los índices que no se pudieron interpretar (con valor -1).
+    Si algún timestamp no tiene la forma completa, el lote se interpreta punto a
+    punto con parse_timestamp (mismo resultado que el endpoint individual).
+    """
+    if all(map(_ISO_COMPLETO.fullmatch, timestamps)):
+        try:
+            with warnings.catch_warnings():
+                # Un sufijo "Z" se ignora igual que en parse_timestamp
+                warnings.simplefilter("ignore", UserWarning)
+                return np.array(timestamps, dtype=str).astype("datetime64[s]").astype(np.int64), []
+        except ValueError:
+            pass
+
+    ts = np.empty(len(timestamps), dtype=np.int64)
+    invalidos = []
+    for i, timestamp in enumerate(timestamps):
+        try:
+            ts[i] = parse_timestamp(timestamp)
+        except ValueError:
+            ts[i] = -1
+            invalidos.append(i)
+    return ts, invalidos
+
+
+def format_timestamps(ts: np.ndarray) -> List[str]:
+    """Formatea un arreglo de segundos epoch como strings ISO (vectorizado)"""
+    return np.asarray(ts, dtype="datetime64[s]").astype(str).tolist()
+
+
+class PointColumns:
+    """Columnas lat/lng/ts/speed/battery de un recorrido"""
+
+    __slots__ = ("_size", "_data", "_compartidas")
+
+    def __init__(self, capacidad: int = CAPACIDAD_INICIAL):
+        self._size = 0
+        self._data = {nombre: np.empty(capacidad, dtype=dtype) for nombre, dtype in COLUMNAS.items()}
+        # Con vistas de view() vivas, merge escribe sobre copias de los buffers
+        self._compartidas = False
+
+    @classmethod
+    def from_dicts(cls, puntos: Iterable[dict], fecha: Optional[str] = None) -> "PointColumns":
+        """Construye columnas desde el formato de dicts {"lat", "lng", "timestamp"}"""
+        puntos = list(puntos)
+        columnas = cls(max(len(puntos), CAPACIDAD_INICIAL))
+        if puntos:
+            columnas.extend(
+                lat=[p["lat"] for p in puntos],
+                lng=[p["lng"] for p in puntos],
+                ts=[parse_timestamp(p["timestamp"], fecha) for p in puntos],
+                speed=[p.get("speed", 0.0) for p in puntos],
+                battery=[p.get("battery", 100) for p in puntos],
+            )
+        return columnas
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _reservar(self, requerido: int) -> None:
+        capacidad = len(self._data["lat"])
+        if requerido <= capacidad:
+            return
+        nueva = max(requerido, capacidad * 2, CAPACIDAD_INICIAL)
+        for nombre, columna in self._data.items():
+            ampliada = np.empty(nueva, dtype=columna.dtype)
+            ampliada[:self._size] = columna[:self._size]
+            self._data[nombre] = ampliada
+        self._compartidas = False
+
+    def append(self, lat: float, lng: float, ts: int, speed: float = 0.0, battery: int = 100) -> None:
+        self._reservar(self._size + 1)
+        i = self._size
+        self._data["lat"][i] = lat
+        self._data["lng"][i] = lng
+        self._data["ts"][i] = ts
+        self._data["speed"][i] = speed
+        self._data["battery"][i] = battery
+        self._size += 1
+
+    def extend(self, lat, lng, ts, speed=None, battery=None) -> None:
+        """Agrega varios puntos en una sola operación"""
+        n = len(lat)
+        if n == 0:
+            return
+        self._reservar(self._size + n)
+        inicio, fin = self._size, self._size + n
+        self._data["lat"][inicio:fin] = lat
+        self._data["lng"][inicio:fin] = lng
+        self._data["ts"][inicio:fin] = ts
+        self._data["speed"][inicio:fin] = 0.0 if speed is None else speed
+        self._data["battery"][inicio:fin] = 100 if battery is None else battery
+        self._size = fin
+
+    def copy(self) -> "PointColumns":
+        """Copia de los puntos actuales (no cambia si se agregan o insertan puntos al original)"""
+        copia = PointColumns(max(self._size, 1))
+        copia.extend(self.lat, self.lng, self.ts, self.speed, self.battery)
+        return copia
+
+    def view(self) -> "PointColumns":
+        """
+        Vista de solo lectura de los puntos actuales en O(1) (copy-on-write): comparte los buffers,
+        que append y extend solo escriben más allá de los puntos existentes; un
+        merge en medio copia antes los buffers del que escribe.
+        """
+        vista = PointColumns.__new__(PointColumns)
+        vista._size = self._size
+        vista._data = dict(self._data)
+        vista._compartidas = self._compartidas = True
+        return vista
+
+    def bisect(self, ts: int) -> int:
+        """Posición de un punto con ese ts en columnas ordenadas (después de los de igual ts)"""
+        return int(np.searchsorted(self.ts, ts, side="right"))
+
+    def merge(self, lat, lng, ts, speed=None, battery=None) -> int:
+        """
+        Inserta puntos en su posición por timestamp (columnas ordenadas por ts).
+        Solo se desplazan los puntos posteriores al primer punto insertado; al
+        final del recorrido equivale a extend. Devuelve la posición del primero.
+        """
+        ts = np.asarray(ts, dtype=np.int64)
+        n = len(ts)
+        valores = {
+            "lat": lat, "lng": lng, "ts": ts,
+            "speed": np.full(n, 0.0) if speed is None else speed,
+            "battery": np.full(n, 100) if battery is None else battery,
+        }
+        if n > 1 and np.any(ts[1:] < ts[:-1]):
+            orden = np.argsort(ts, kind="stable")
+            valores = {nombre: np.asarray(v)[orden] for nombre, v in valores.items()}
+            ts = valores["ts"]
+        desde = self.bisect(ts[0]) if n else self._size
+        if desde == self._size:
+            self.extend(**valores)
+            return desde
+
+        # Posiciones de los puntos nuevos dentro de la cola mezclada [desde, size + n)
+        posiciones = np.searchsorted(self.ts[desde:], ts, side="right") + np.arange(n)
+        cola = np.ones(self._size - desde + n, dtype=bool)
+        cola[posiciones] = False
+        if self._compartidas:
+            self._data = {nombre: columna.copy() for nombre, columna in self._data.items()}
+            self._compartidas = False
+        self._reservar(self._size + n)
+        for nombre, columna in self._data.items():
+            destino = columna[desde:self._size + n]
+            destino[cola] = columna[desde:self._size].copy()
+            destino[posiciones] = valores[nombre]
+        self._size += n
+        return desde
+
+    # Vistas (sin copia) sobre la parte ocupada de cada columna
+    @property
+    def lat(self) -> np.ndarray:
+        return self._data["lat"][:self._size]
+
+    @property
+    def lng(self) -> np.ndarray:
+        return self._data["lng"][:self._size]
+
+    @property
+    def ts(self) -> np.ndarray:
+        return self._data["ts"][:self._size]
+
+    @property
+    def speed(self) -> np.ndarray:
+        return self._data["speed"][:self._size]
+
+    @property
+    def battery(self) -> np.ndarray:
+        return self._data["battery"][:self._size]
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes reservados por todas las columnas"""
+        return sum(columna.nbytes for columna in self._data.values())
+
+    def to_dicts(self, inicio: int = 0, fin: Optional[int] = None,
+                 indices: Optional[np.ndarray] = None) -> List[dict]:
+        """
+        Convierte al formato JSON actual: [{"lat", "lng", "timestamp"}, ...]
+        `indices` selecciona puntos sueltos (en lugar del rango [inicio, fin)).
+        """
+        fin = self._size if fin is None else min(fin, self._size)
+        seleccion = slice(inicio, fin) if indices is None else indices
+        lats = self._data["lat"][seleccion].tolist()
+        lngs = self._data["lng"][seleccion].tolist()
+        timestamps = format_timestamps(self._data["ts"][seleccion])
+        return [
+            {"lat": lat, "lng": lng, "timestamp": timestamp}
+            for lat, lng, timestamp in zip(lats, lngs, timestamps)
+        ]
@@ -0,0 +1,201 @@
+"""
+Deduplicación por montacarga de puntos reenviados (reintentos de envíos)
+
+La clave de un punto es (mc_id, ts). Por montacarga se guarda la marca de agua
+(el ts más alto recibido) y un bitmap circular de `ventana_s` bits, un bit por
+segundo: el bit ts % ventana_s indica si ya llegó un punto con ese ts. Es
+exacto (sin falsos positivos) y ocupa ventana_s / 8 bytes por montacarga.
+
+- Un punto con ts dentro de la ventana (marca - ventana_s, marca] se acepta
+  solo si su bit está apagado; si es anterior a la marca, es un punto atrasado.
+- Un punto anterior a la ventana no se puede distinguir de uno ya recibido y
+  se descarta (fuera_de_ventana).
+- Al avanzar la marca se apagan los bits de los segundos que salen de la ventana.
+- Con `max_adelanto_s`, un punto posterior a la hora del servidor más ese
+  margen se descarta (futuros) sin mover la marca: un reloj desajustado no
+  deja fuera de la ventana a los puntos reales que siguen.
+
+Los lotes se evalúan como si sus puntos llegaran en orden de ts; dentro de
+un lote, de varios puntos con el mismo ts se conserva el primero. Si los
+puntos aceptados no llegan a almacenarse, `restore` devuelve la ventana del
+montacarga al estado tomado con `checkpoint` y un reenvío vuelve a aceptarse.
+
+El estado de todos los montacargas se exporta con `export_state` y se
+restaura con `load_state` (snapshot del log de telemetría): los puntos
+aceptados que el filtro GPS descartó no están en el store, así que sembrar la
+ventana desde los puntos almacenados no la reconstruye igual.
+"""
+
+import base64
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+VENTANA_S = 3600
+
+
+class _Ventana:
+    __slots__ = ("marca", "bits")
+
+    def __init__(self, marca: int, bytes_bitmap: int):
+        self.marca = marca
+        self.bits = bytearray(bytes_bitmap)
+
+
+def _apagar(bits: bytearray, inicio: int, fin: int) -> None:
+    """Apaga los bits [inicio, fin) del bitmap (sin dar la vuelta)"""
+    while inicio < fin and inicio & 7:
+        bits[inicio >> 3] &= ~(1 << (inicio & 7)) & 0xFF
+        inicio += 1
+    while fin > inicio and fin & 7:
+        fin -= 1
+        bits[fin >> 3] &= ~(1 << (fin & 7)) & 0xFF
+    if fin > inicio:
+        bits[inicio >> 3:fin >> 3] = bytes((fin - inicio) >> 3)
+
+
+class DedupWindow:
+    """Ventana deslizante de timestamps recibidos, con un bitmap por montacarga"""
+
+    def __init__(self, ventana_s: int = VENTANA_S, max_adelanto_s: Optional[int] = None,
+                 reloj: Callable[[], float] = time.time):
+        # Múltiplo de 8: el bitmap ocupa bytes completos
+        self.ventana_s = max(8, -(-ventana_s // 8) * 8)
+        self.max_adelanto_s = max_adelanto_s
+        self.reloj = reloj
+        self._ventanas: Dict[int, _Ventana] = {}
+        self.recibidos = 0
+        self.duplicados = 0
+        self.atrasados = 0
+        self.fuera_de_ventana = 0
+        self.futuros = 0
+
+    def _limite(self) -> Optional[int]:
+        return None if self.max_adelanto_s is None else int(self.reloj()) + self.max_adelanto_s
+
+    def _avanzar(self, ventana: _Ventana, marca: int) -> None:
+        """Mueve la marca de agua: los segundos (marca anterior, marca] reutilizan sus bits"""
+        cantidad = marca - ventana.marca
+        if cantidad <= 0:
+            return
+        if cantidad >= self.ventana_s:
+            ventana.bits[:] = bytes(len(ventana.bits))
+        else:
+            inicio = (ventana.marca + 1) % self.ventana_s
+            fin = inicio + cantidad
+            _apagar(ventana.bits, inicio, min(fin, self.ventana_s))
+            if fin > self.ventana_s:
+                _apagar(ventana.bits, 0, fin - self.ventana_s)
+        ventana.marca = marca
+
+    def accept(self, mc_id: int, ts: int) -> bool:
+        """True si el punto es nuevo (y lo registra); False si es duplicado o demasiado antiguo"""
+        self.recibidos += 1
+        limite = self._limite()
+        if limite is not None and ts > limite:
+            self.futuros += 1
+            return False
+        ventana = self._ventanas.get(mc_id)
+        if ventana is None:
+            ventana = self._ventanas[mc_id] = _Ventana(ts, self.ventana_s >> 3)
+        elif ts <= ventana.marca - self.ventana_s:
+            self.fuera_de_ventana += 1
+            return False
+        posicion = ts % self.ventana_s
+        if ts <= ventana.marca and ventana.bits[posicion >> 3] >> (posicion & 7) & 1:
+            self.duplicados += 1
+            return False
+        if ts < ventana.marca:
+            self.atrasados += 1
+        self._avanzar(ventana, ts)
+        ventana.bits[posicion >> 3] |= 1 << (posicion & 7)
+        return True
+
+    def accept_many(self, mc_id: int, ts: np.ndarray, contar: bool = True) -> np.ndarray:
+        """Máscara de los puntos nuevos del lote (los registra); O(n log n) en el tamaño del lote"""
+        ts = np.asarray(ts, dtype=np.int64)
+        nuevos = np.zeros(len(ts), dtype=bool)
+        if len(ts) == 0:
+            return nuevos
+        limite = self._limite()
+        futuros = np.zeros(len(ts), dtype=bool) if limite is None else ts > limite
+        if futuros.all():
+            if contar:
+                self.recibidos += len(ts)
+                self.futuros += len(ts)
+            return nuevos
+        ventana = self._ventanas.get(mc_id)
+        if ventana is None:
+            ventana = self._ventanas[mc_id] = _Ventana(int(ts[~futuros].min()) - 1, self.ventana_s >> 3)
+        marca = ventana.marca
+        bits = np.frombuffer(ventana.bits, dtype=np.uint8)
+
+        # Primera aparición de cada ts en el lote, dentro de la ventana y no posterior al límite
+        nuevos[np.unique(ts, return_index=True)[1]] = True
+        nuevos &= (ts > marca - self.ventana_s) & ~futuros
+        # Los anteriores a la marca pueden haberse recibido ya
+        previos = np.flatnonzero(nuevos & (ts <= marca))
+        posiciones = ts[previos] % self.ventana_s
+        nuevos[previos] = (bits[posiciones >> 3] >> (posiciones & 7) & 1) == 0
+
+        self._avanzar(ventana, max(marca, int(ts[~futuros].max())))
+        # Los atrasados que quedaron fuera de la ventana nueva no se marcan (su bit ya es de otro segundo)
+        posiciones = ts[nuevos & (ts > ventana.marca - self.ventana_s)] % self.ventana_s
+        np.bitwise_or.at(bits, posiciones >> 3, (1 << (posiciones & 7)).astype(np.uint8))
+
+        if contar:
+            fuera = int(np.count_nonzero(ts <= marca - self.ventana_s))
+            n_futuros = int(np.count_nonzero(futuros))
+            aceptados = int(np.count_nonzero(nuevos))
+            self.recibidos += len(ts)
+            self.fuera_de_ventana += fuera
+            self.futuros += n_futuros
+            self.duplicados += len(ts) - aceptados - fuera - n_futuros
+            self.atrasados += int(np.count_nonzero(nuevos & (ts < marca)))
+        return nuevos
+
+    def checkpoint(self, mc_id: int) -> Optional[Tuple[int, bytes]]:
+        """Marca y bitmap actuales de un montacarga (None si aún no tiene ventana)"""
+        ventana = self._ventanas.get(mc_id)
+        return None if ventana is None else (ventana.marca, bytes(ventana.bits))
+
+    def restore(self, mc_id: int, estado: Optional[Tuple[int, bytes]]) -> None:
+        """Deshace lo registrado desde `checkpoint` (los contadores no cambian)"""
+        if estado is None:
+            self._ventanas.pop(mc_id, None)
+            return
+        ventana = self._ventanas[mc_id]
+        ventana.marca = estado[0]
+        ventana.bits[:] = estado[1]
+
+    def export_state(self) -> dict:
+        """Marca y bitmap (base64) por montacarga, serializables en JSON (claves mc_id como texto)"""
+        return {
+            "ventana_s": self.ventana_s,
+            "ventanas": {str(mc_id): [v.marca, base64.b64encode(v.bits).decode()] for mc_id, v in self._ventanas.items()},
+        }
+
+    def load_state(self, estado: dict) -> None:
+        """Reemplaza las ventanas por las exportadas con export_state (con el mismo ventana_s)"""
+        if estado["ventana_s"] != self.ventana_s:
+            raise ValueError(f"Ventana de deduplicación de {estado['ventana_s']} s, se esperaban {self.ventana_s} s")
+        self._ventanas = {}
+        for mc_id, (marca, bits) in estado["ventanas"].items():
+            ventana = self._ventanas[int(mc_id)] = _Ventana(marca, 0)
+            ventana.bits = bytearray(base64.b64decode(bits))
+
+    def seed(self, mc_id: int, ts: np.ndarray) -> None:
+        """Registra puntos ya almacenados (p. ej. al recuperar un snapshot) sin contarlos"""
+        self.accept_many(mc_id, ts, contar=False)
+
+    def stats(self) -> dict:
+        return {
+            "ventana_s": self.ventana_s,
+            "montacargas": len(self._ventanas),
+            "recibidos": self.recibidos,
+            "duplicados": self.duplicados,
+            "atrasados": self.atrasados,
+            "fuera_de_ventana": self.fuera_de_ventana,
+            "futuros": self.futuros,
+        }
@@ -0,0 +1,126 @@
+"""
+Geocoding con caché, deduplicación de consultas en vuelo y cliente HTTP reutilizable
+
+- Las llamadas a la API de geocoding (bloqueantes, con requests) se ejecutan
+  en un pool de hilos propio y acotado: el event loop, y con él la ingesta,
+  no se detiene mientras se espera la respuesta.
+- Una requests.Session con pool de conexiones keep-alive evita abrir una
+  conexión TLS nueva por consulta.
+- Caché LRU con TTL por dirección normalizada (mayúsculas, acentos
+  compuestos y espacios no cuentan). Solo se guardan respuestas definitivas
+  (OK / ZERO_RESULTS), no errores de cuota o de clave.
+- Consultas concurrentes de la misma dirección comparten una única llamada
+  a la API (la primera la lanza, las demás esperan su resultado).
+"""
+
+import asyncio
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+GOOGLE_GEOCODING_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+# Estados de Google que son respuesta definitiva para la dirección
+ESTADOS_CACHEABLES = ("OK", "ZERO_RESULTS")
+
+
+def normalizar_direccion(direccion: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", direccion).casefold().split())
+
+
+class Geocoder:
+    """Cliente de geocoding con caché LRU/TTL y coalescencia de consultas idénticas"""
+
+    def __init__(self, url: str = GOOGLE_GEOCODING_URL, timeout_s: float = 5.0,
+                 conexiones: int = 8, max_entradas: int = 10_000, ttl_s: float = 86_400):
+        self.url = url
+        self.timeout_s = timeout_s
+        self.max_entradas = max_entradas
+        self.ttl_s = ttl_s
+        self._session = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=conexiones)
+        self._session.mount("http://", adaptador)
+        self._session.mount("https://", adaptador)
+        # Tantos hilos como conexiones del pool: el exceso espera en la cola del ejecutor
+        self._ejecutor = ThreadPoolExecutor(max_workers=conexiones, thread_name_prefix="geocoding")
+        self._cache: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self._en_vuelo: Dict[str, asyncio.Future] = {}
+        self.aciertos = 0
+        self.fallos = 0
+        self.coalescidas = 0
+        self.llamadas = 0
+
+    def _consultar(self, direccion: str, api_key: str) -> dict:
+        """Llamada bloqueante a la API (se ejecuta en el pool de hilos)"""
+        respuesta = self._session.get(self.url, params={"address": direccion, "key": api_key},
+                                      timeout=self.timeout_s)
+        respuesta.raise_for_status()
+        return respuesta.json()
+
+    def _cacheado(self, clave: str) -> Optional[dict]:
+        entrada = self._cache.get(clave)
+        if entrada is None:
+            return None
+        if entrada[0] < time.monotonic():
+            del self._cache[clave]
+            return None
+        self._cache.move_to_end(clave)
+        return entrada[1]
+
+    def _guardar(self, clave: str, resultado: dict) -> None:
+        if resultado.get("status") not in ESTADOS_CACHEABLES:
+            return
+        self._cache[clave] = (time.monotonic() + self.ttl_s, resultado)
+        self._cache.move_to_end(clave)
+        while len(self._cache) > self.max_entradas:
+            self._cache.popitem(last=False)
+
+    async def _resolver(self, clave: str, direccion: str, api_key: str) -> dict:
+        try:
+            self.llamadas += 1
+            loop = asyncio.get_running_loop()
+            resultado = await loop.run_in_executor(self._ejecutor, self._consultar, direccion, api_key)
+            self._guardar(clave, resultado)
+            return resultado
+        finally:
+            del self._en_vuelo[clave]
+
+    async def geocode(self, direccion: str, api_key: str) -> dict:
+        """
+        Respuesta JSON de la API para la dirección. Propaga requests.RequestException;
+        un error se entrega a todas las consultas que esperaban esa llamada y no se cachea.
+        """
+        clave = normalizar_direccion(direccion)
+        resultado = self._cacheado(clave)
+        if resultado is not None:
+            self.aciertos += 1
+            return resultado
+
+        tarea = self._en_vuelo.get(clave)
+        if tarea is None:
+            self.fallos += 1
+            tarea = self._en_vuelo[clave] = asyncio.ensure_future(self._resolver(clave, direccion, api_key))
+            # Marca la excepción como recuperada aunque todos los que esperaban se hayan ido
+            tarea.add_done_callback(lambda t: t.cancelled() or t.exception())
+        else:
+            self.coalescidas += 1
+        # shield: si el cliente que lanzó la llamada se desconecta, las demás la siguen esperando
+        return await asyncio.shield(tarea)
+
+    def stats(self) -> dict:
+        return {
+            "entradas": len(self._cache),
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "coalescidas": self.coalescidas,
+            "llamadas_api": self.llamadas,
+            "en_vuelo": len(self._en_vuelo),
+        }
+
+    def close(self) -> None:
+        self._ejecutor.shutdown(wait=False, cancel_futures=True)
+        self._session.close()
@@ -0,0 +1,204 @@
+"""
+Geocercas: zonas del campus, clasificación de puntos y ocupación por zona
+
+- GeofenceIndex indexa los polígonos en una grilla uniforme: cada celda guarda
+  las zonas cuyo rectángulo envolvente la toca, de modo que clasificar un punto
+  solo prueba punto-en-polígono contra unas pocas zonas candidatas.
+- GeofenceTracker mantiene la zona actual de cada montacarga, emite eventos de
+  entrada/salida y acumula el tiempo de permanencia (dwell) por zona.
+
+Las zonas son dicts {"id", "nombre", "poligono": [[lat, lng], ...]}. Si un punto
+cae en zonas superpuestas, gana la de menor área (la más específica).
+"""
+
+import json
+from collections import Counter, defaultdict, deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+
+class _Poligono:
+    """Aristas precalculadas para el test de cruce de rayos"""
+
+    __slots__ = ("zona_id", "lat1", "lat2", "lng1", "pendiente", "caja", "area")
+
+    def __init__(self, zona_id: int, vertices: np.ndarray):
+        self.zona_id = zona_id
+        lat, lng = vertices[:, 0], vertices[:, 1]
+        self.lat1, self.lat2 = lat, np.roll(lat, -1)
+        self.lng1, lng2 = lng, np.roll(lng, -1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # Aristas horizontales nunca cruzan el rayo (quedan enmascaradas)
+            self.pendiente = (lng2 - lng) / (self.lat2 - lat)
+        self.caja = (lat.min(), lat.max(), lng.min(), lng.max())
+        self.area = abs(float(np.dot(lat, np.roll(lng, -1)) - np.dot(lng, np.roll(lat, -1)))) / 2
+
+    def contiene(self, lat: np.ndarray, lng: np.ndarray) -> np.ndarray:
+        """Punto-en-polígono vectorizado: arreglos de puntos contra todas las aristas"""
+        lat = lat[:, None]
+        lng = lng[:, None]
+        cruza = (self.lat1 > lat) != (self.lat2 > lat)
+        with np.errstate(invalid="ignore"):
+            cruce_lng = self.lng1 + (lat - self.lat1) * self.pendiente
+        return (np.count_nonzero(cruza & (lng < cruce_lng), axis=1) % 2) == 1
+
+
+class GeofenceIndex:
+    """Índice de zonas sobre una grilla uniforme en grados"""
+
+    def __init__(self, zonas: Iterable[dict] = (), celda_grados: Optional[float] = None):
+        self.zonas: Dict[int, dict] = {}
+        self._poligonos: List[_Poligono] = []
+        self._celdas: Dict[Tuple[int, int], List[_Poligono]] = defaultdict(list)
+        self.celda = celda_grados
+        self._cargar(list(zonas))
+
+    def __len__(self) -> int:
+        return len(self.zonas)
+
+    def _cargar(self, zonas: List[dict]) -> None:
+        for zona in zonas:
+            self.zonas[zona["id"]] = zona
+            self._poligonos.append(_Poligono(zona["id"], np.asarray(zona["poligono"], dtype=np.float64)))
+        if not self._poligonos:
+            return
+        if self.celda is None:
+            # Celdas del tamaño mediano de una zona: cada zona toca pocas celdas
+            lados = [max(p.caja[1] - p.caja[0], p.caja[3] - p.caja[2]) for p in self._poligonos]
+            self.celda = max(float(np.median(lados)), 1e-6)
+        # Zonas más pequeñas primero: la primera coincidencia es la más específica
+        for poligono in sorted(self._poligonos, key=lambda p: p.area):
+            lat_min, lat_max, lng_min, lng_max = poligono.caja
+            for i in range(self._celda(lat_min), self._celda(lat_max) + 1):
+                for j in range(self._celda(lng_min), self._celda(lng_max) + 1):
+                    self._celdas[(i, j)].append(poligono)
+
+    def _celda(self, grados: float) -> int:
+        return int(np.floor(grados / self.celda))
+
+    def classify(self, lat: float, lng: float) -> Optional[int]:
+        """Id de la zona que contiene el punto, o None"""
+        if not self._poligonos:
+            return None
+        candidatos = self._celdas.get((self._celda(lat), self._celda(lng)))
+        if not candidatos:
+            return None
+        punto_lat, punto_lng = np.array([lat]), np.array([lng])
+        for poligono in candidatos:
+            lat_min, lat_max, lng_min, lng_max = poligono.caja
+            if lat_min <= lat <= lat_max and lng_min <= lng <= lng_max and poligono.contiene(punto_lat, punto_lng)[0]:
+                return poligono.zona_id
+        return None
+
+    def classify_many(self, lat: np.ndarray, lng: np.ndarray) -> np.ndarray:
+        """Zona de cada punto (-1 fuera de toda zona), agrupando los puntos por celda"""
+        resultado = np.full(len(lat), -1, dtype=np.int64)
+        if not self._poligonos or len(lat) == 0:
+            return resultado
+        fila = np.floor(lat / self.celda).astype(np.int64)
+        columna = np.floor(lng / self.celda).astype(np.int64)
+        celdas, grupo = np.unique(np.stack((fila, columna), axis=1), axis=0, return_inverse=True)
+        grupo = grupo.ravel()
+        orden = np.argsort(grupo, kind="stable")
+        cortes = np.searchsorted(grupo[orden], np.arange(len(celdas) + 1))
+        for k, (i, j) in enumerate(celdas.tolist()):
+            candidatos = self._celdas.get((i, j))
+            if not candidatos:
+                continue
+            indices = orden[cortes[k]:cortes[k + 1]]
+            for poligono in candidatos:
+                pendientes = indices[resultado[indices] == -1]
+                if len(pendientes) == 0:
+                    break
+                dentro = poligono.contiene(lat[pendientes], lng[pendientes])
+                resultado[pendientes[dentro]] = poligono.zona_id
+        return resultado
+
+
+class GeofenceTracker:
+    """Zona actual, eventos de entrada/salida y permanencia por montacarga"""
+
+    def __init__(self, index: GeofenceIndex, max_eventos: int = 1000):
+        self.index = index
+        # mc_id -> (zona_id, ts de entrada, ts del último punto)
+        self._actual: Dict[int, Tuple[int, int, int]] = {}
+        self._ocupantes: Dict[int, Set[int]] = defaultdict(set)
+        self.permanencia_s: Counter = Counter()
+        self.eventos: deque = deque(maxlen=max_eventos)
+
+    def zona_actual(self, mc_id: int) -> Optional[int]:
+        """Zona en la que está el montacarga, o None (fuera de toda zona o sin datos)"""
+        actual = self._actual.get(mc_id)
+        return actual[0] if actual and actual[0] != -1 else None
+
+    def update(self, mc_id: int, ts: int, lat: float, lng: float) -> List[dict]:
+        """Clasifica un punto y devuelve los eventos de salida/entrada que produce"""
+        zona = self.index.classify(lat, lng)
+        return self._transicion(mc_id, int(ts), -1 if zona is None else zona)
+
+    def update_many(self, mc_id: int, ts: np.ndarray, lat: np.ndarray, lng: np.ndarray) -> List[dict]:
+        """Igual que update para un lote: solo se procesan los puntos donde cambia la zona"""
+        if len(ts) == 0:
+            return []
+        orden = np.argsort(ts, kind="stable")
+        ts = np.asarray(ts)[orden]
+        zonas = self.index.classify_many(np.asarray(lat)[orden], np.asarray(lng)[orden])
+        cambios = np.concatenate(([0], np.flatnonzero(np.diff(zonas)) + 1))
+        eventos = []
+        for k in cambios.tolist():
+            eventos += self._transicion(mc_id, int(ts[k]), int(zonas[k]))
+        self._transicion(mc_id, int(ts[-1]), int(zonas[-1]))
+        return eventos
+
+    def _transicion(self, mc_id: int, ts: int, zona: int) -> List[dict]:
+        actual = self._actual.get(mc_id)
+        if actual is not None and ts < actual[2]:
+            # Punto atrasado: no altera la secuencia de entradas/salidas
+            return []
+        if actual is not None and actual[0] == zona:
+            self._actual[mc_id] = (zona, actual[1], ts)
+            return []
+
+        eventos = []
+        if actual is not None and actual[0] != -1:
+            zona_anterior, entrada, _ = actual
+            permanencia = ts - entrada
+            self.permanencia_s[zona_anterior] += permanencia
+            self._ocupantes[zona_anterior].discard(mc_id)
+            eventos.append(self._evento("salida", mc_id, zona_anterior, ts, permanencia))
+        if zona != -1:
+            self._ocupantes[zona].add(mc_id)
+            eventos.append(self._evento("entrada", mc_id, zona, ts))
+        self._actual[mc_id] = (zona, ts, ts)
+        return eventos
+
+    def _evento(self, tipo: str, mc_id: int, zona_id: int, ts: int, permanencia_s: Optional[int] = None) -> dict:
+        evento = {"evento": tipo, "mc_id": mc_id, "zona_id": zona_id, "ts": ts}
+        if permanencia_s is not None:
+            evento["permanencia_s"] = permanencia_s
+        self.eventos.append(evento)
+        return evento
+
+    def ocupacion(self) -> List[dict]:
+        """Montacargas en cada zona y permanencia acumulada (incluye las estadías en curso)"""
+        en_curso: Counter = Counter()
+        for zona, entrada, ultimo in self._actual.values():
+            if zona != -1:
+                en_curso[zona] += ultimo - entrada
+        return [
+            {
+                "zona_id": zona_id,
+                "nombre": zona["nombre"],
+                "montacargas": sorted(self._ocupantes.get(zona_id, ())),
+                "ocupacion": len(self._ocupantes.get(zona_id, ())),
+                "permanencia_s": self.permanencia_s[zona_id] + en_curso[zona_id],
+            }
+            for zona_id, zona in self.index.zonas.items()
+        ]
+
+
+def load_zones(path: str) -> List[dict]:
+    """Zonas desde un archivo JSON: [{"id", "nombre", "poligono": [[lat, lng], ...]}, ...]"""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,208 @@
+"""
+Filtro GPS en streaming por montacarga (estado O(1) por dispositivo)
+
+Cada punto crudo pasa por tres etapas antes de llegar al recorrido:
+
+1. Outliers: se descarta un punto que implica una velocidad imposible para un
+   montacarga respecto a la última posición filtrada.
+2. Kalman: filtro de posición por eje (modelo de paseo aleatorio, como los
+   filtros lat/lng habituales para GPS de móviles); la varianza crece con el
+   tiempo transcurrido y la velocidad reportada, y se reduce con cada medición.
+3. Paradas: con velocidad reportada baja dentro de un radio del punto de
+   anclaje, los puntos no se almacenan; la parada queda registrada con su
+   primer punto y, al reanudar la marcha, con un punto final en el anclaje (la
+   duración se conserva y el jitter no suma distancia). Salir del radio a más
+   de la velocidad de parada (dispositivos que no reportan velocidad) cuenta
+   como marcha.
+
+Un hueco sin movimiento (sin datos o parado) mayor que `gap_inactivo_s`
+corta el recorrido: el siguiente punto en movimiento abre uno nuevo.
+
+Un punto atrasado (anterior al último procesado) no altera el estado: se
+descarta si la distancia a la última posición filtrada no se puede recorrer
+en la diferencia de tiempo, se suprime si cae en la parada en curso y, si no,
+se almacena tal cual (la ingesta lo inserta en orden).
+
+El estado de todos los montacargas se exporta con `export_state` y se
+restaura con `load_state` (snapshot del log de telemetría), de modo que la
+recuperación filtra la cola del log igual que la ingesta en vivo.
+"""
+
+import math
+from typing import Dict, List, NamedTuple, Optional
+
+from .trip_metrics import RADIO_TIERRA_KM
+
+VELOCIDAD_MAX_KMH = 50.0
+RUIDO_GPS_M = 5.0
+RUIDO_PROCESO_M_S = 1.5
+VELOCIDAD_PARADA_KMH = 1.0
+RADIO_PARADA_M = 8.0
+GAP_INACTIVO_S = 1800
+
+_METROS_POR_GRADO = math.radians(1) * RADIO_TIERRA_KM * 1000
+
+
+class PuntoFiltrado(NamedTuple):
+    ts: int
+    lat: float
+    lng: float
+    speed: float
+    battery: int
+    # True si el punto abre un recorrido nuevo (hueco de inactividad)
+    corte: bool = False
+
+
+def _distancia_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Distancia equirectangular en metros (exacta a escala de metros)"""
+    x = (lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2))
+    return math.hypot(lat2 - lat1, x) * _METROS_POR_GRADO
+
+
+class _Estado:
+    __slots__ = ("ts", "lat", "lng", "varianza", "ancla", "inicio_parada", "pendiente")
+
+    def __init__(self, ts: int, lat: float, lng: float, varianza: float):
+        self.ts = ts
+        self.lat = lat
+        self.lng = lng
+        self.varianza = varianza
+        # Parada en curso: (lat, lng) de anclaje y ts de inicio
+        self.ancla: Optional[tuple] = None
+        self.inicio_parada = 0
+        # Último punto de la parada en curso, aún sin almacenar
+        self.pendiente: Optional[PuntoFiltrado] = None
+
+
+class GpsFilter:
+    """Etapa de filtrado con un estado por montacarga"""
+
+    def __init__(self, velocidad_max_kmh: float = VELOCIDAD_MAX_KMH, ruido_gps_m: float = RUIDO_GPS_M,
+                 ruido_proceso_m_s: float = RUIDO_PROCESO_M_S, velocidad_parada_kmh: float = VELOCIDAD_PARADA_KMH,
+                 radio_parada_m: float = RADIO_PARADA_M, gap_inactivo_s: int = GAP_INACTIVO_S):
+        self.velocidad_max_kmh = velocidad_max_kmh
+        self.ruido_gps_m = ruido_gps_m
+        self.ruido_proceso_m_s = ruido_proceso_m_s
+        self.velocidad_parada_kmh = velocidad_parada_kmh
+        self.radio_parada_m = radio_parada_m
+        self.gap_inactivo_s = gap_inactivo_s
+        self._estados: Dict[int, _Estado] = {}
+        self.recibidos = 0
+        self.descartados = 0
+        self.suprimidos = 0
+
+    def reset(self, mc_id: int) -> None:
+        self._estados.pop(mc_id, None)
+
+    def procesar(self, mc_id: int, ts: int, lat: float, lng: float,
+                 speed: float = 0.0, battery: int = 100) -> List[PuntoFiltrado]:
+        """Procesa un punto crudo y devuelve los puntos a almacenar (0, 1 o 2)"""
+        self.recibidos += 1
+        estado = self._estados.get(mc_id)
+        if estado is None:
+            self._estados[mc_id] = _Estado(ts, lat, lng, self.ruido_gps_m ** 2)
+            return [PuntoFiltrado(ts, lat, lng, speed, battery)]
+
+        dt = ts - estado.ts
+        if dt < 0:
+            return self._atrasado(estado, ts, lat, lng, speed, battery)
+
+        salida: List[PuntoFiltrado] = []
+        if dt > self.gap_inactivo_s:
+            # Hueco sin datos: cerrar la parada pendiente y abrir un recorrido nuevo
+            if estado.pendiente is not None:
+                salida.append(estado.pendiente)
+            self._estados[mc_id] = _Estado(ts, lat, lng, self.ruido_gps_m ** 2)
+            salida.append(PuntoFiltrado(ts, lat, lng, speed, battery, corte=True))
+            return salida
+
+        distancia = _distancia_m(estado.lat, estado.lng, lat, lng)
+        if distancia / max(dt, 1) * 3.6 > self.velocidad_max_kmh:
+            self.descartados += 1
+            return []
+
+        # Kalman por eje con la misma varianza para lat y lng; en marcha, el ruido
+        # de proceso es la velocidad reportada (menos retraso respecto al GPS)
+        estado.varianza += dt * max(self.ruido_proceso_m_s, speed / 3.6) ** 2
+        ganancia = estado.varianza / (estado.varianza + self.ruido_gps_m ** 2)
+        estado.lat += ganancia * (lat - estado.lat)
+        estado.lng += ganancia * (lng - estado.lng)
+        estado.varianza *= 1 - ganancia
+        estado.ts = ts
+
+        if speed < self.velocidad_parada_kmh:
+            if estado.ancla is None:
+                estado.ancla = (estado.lat, estado.lng)
+                estado.inicio_parada = ts
+                return [PuntoFiltrado(ts, estado.lat, estado.lng, 0.0, battery)]
+            deriva = _distancia_m(estado.ancla[0], estado.ancla[1], estado.lat, estado.lng)
+            if (deriva <= self.radio_parada_m
+                    or deriva / max(ts - estado.inicio_parada, 1) * 3.6 < self.velocidad_parada_kmh):
+                # Jitter o deriva lenta fuera del radio: la parada sigue en el anclaje
+                estado.pendiente = PuntoFiltrado(ts, estado.ancla[0], estado.ancla[1], 0.0, battery)
+                self.suprimidos += 1
+                return []
+
+        # Reanuda la marcha: el último punto de la parada cierra la parada (y el
+        # recorrido, si la parada superó el hueco de inactividad)
+        corte = estado.ancla is not None and ts - estado.inicio_parada > self.gap_inactivo_s
+        if estado.pendiente is not None:
+            salida.append(estado.pendiente)
+            self.suprimidos -= 1
+        estado.ancla = None
+        estado.pendiente = None
+        salida.append(PuntoFiltrado(ts, estado.lat, estado.lng, speed, battery, corte=corte))
+        return salida
+
+    def _atrasado(self, estado: _Estado, ts: int, lat: float, lng: float,
+                  speed: float, battery: int) -> List[PuntoFiltrado]:
+        """Punto anterior al estado: mismas reglas de outlier y parada, sin suavizar ni mover el estado"""
+        # La posición real en ts está a lo sumo a velocidad_max * |dt| de la
+        # posición filtrada actual (la misma cota que para un punto posterior)
+        if _distancia_m(estado.lat, estado.lng, lat, lng) / (estado.ts - ts) * 3.6 > self.velocidad_max_kmh:
+            self.descartados += 1
+            return []
+        if (estado.ancla is not None and ts >= estado.inicio_parada and speed < self.velocidad_parada_kmh
+                and _distancia_m(estado.ancla[0], estado.ancla[1], lat, lng) <= self.radio_parada_m):
+            # Jitter de la parada en curso que llegó tarde: la parada ya tiene su punto inicial
+            self.suprimidos += 1
+            return []
+        return [PuntoFiltrado(ts, lat, lng, speed, battery)]
+
+    def checkpoint(self, mc_id: int) -> Optional[list]:
+        """Estado actual de un montacarga (None si aún no tiene), para deshacer con restore"""
+        estado = self._estados.get(mc_id)
+        return None if estado is None else [getattr(estado, campo) for campo in _Estado.__slots__]
+
+    def restore(self, mc_id: int, estado: Optional[list]) -> None:
+        """Deshace lo procesado desde `checkpoint` (los contadores no cambian)"""
+        if estado is None:
+            self._estados.pop(mc_id, None)
+            return
+        restaurado = self._estados[mc_id] = _Estado(*estado[:4])
+        restaurado.ancla, restaurado.inicio_parada, restaurado.pendiente = estado[4:]
+
+    def export_state(self) -> dict:
+        """Estado por montacarga serializable en JSON (claves mc_id como texto)"""
+        return {
+            str(mc_id): [e.ts, e.lat, e.lng, e.varianza, e.ancla, e.inicio_parada, e.pendiente]
+            for mc_id, e in self._estados.items()
+        }
+
+    def load_state(self, estados: dict) -> None:
+        """Reemplaza el estado por el exportado con export_state"""
+        self._estados = {}
+        for mc_id, (ts, lat, lng, varianza, ancla, inicio_parada, pendiente) in estados.items():
+            estado = _Estado(ts, lat, lng, varianza)
+            estado.ancla = tuple(ancla) if ancla is not None else None
+            estado.inicio_parada = inicio_parada
+            estado.pendiente = PuntoFiltrado(*pendiente) if pendiente is not None else None
+            self._estados[int(mc_id)] = estado
+
+    def stats(self) -> dict:
+        return {
+            "montacargas": len(self._estados),
+            "recibidos": self.recibidos,
+            "descartados": self.descartados,
+            "suprimidos": self.suprimidos,
+        }
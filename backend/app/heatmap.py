@@ -0,0 +1,308 @@
+"""
+Mapa de calor: visitas, permanencia y velocidad media por celda
+
+Los puntos ingeridos se agregan de forma incremental en grillas de varias
+resoluciones (celdas en grados, cada nivel 4 veces más fino) y en buckets de
+una hora. Las consultas por rectángulo y ventana de tiempo suman celdas ya
+agregadas, sin recorrer los puntos crudos.
+
+- Las celdas se agrupan en tiles de TILE x TILE celdas: una consulta solo
+  visita los tiles que cubre su rectángulo, no toda la grilla.
+- Las horas más antiguas que `rollup_horas` se acumulan en buckets de un día
+  (la ventana de una consulta sobre ese tramo se resuelve a días completos).
+- Los buckets más antiguos que `retencion_horas` se descartan.
+Los dos horizontes se miden desde la hora del servidor (no desde los datos:
+un punto con el reloj adelantado no adelanta el descarte). Los puntos
+posteriores a la hora del servidor más `max_adelanto_s` se descartan.
+"""
+
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Lado de la celda (grados) por resolución: ~710 m, ~180 m, ~45 m, ~11 m
+TAMANOS_CELDA = (0.0064, 0.0016, 0.0004, 0.0001)
+
+SEGUNDOS_POR_BUCKET = 3600
+HORAS_POR_DIA = 24
+
+# Celdas por lado de un tile
+TILE = 32
+
+# Horizontes por defecto: buckets horarios durante 7 días, diarios hasta 90 días
+ROLLUP_HORAS = 7 * HORAS_POR_DIA
+RETENCION_HORAS = 90 * HORAS_POR_DIA
+
+# Un hueco mayor entre puntos no cuenta como permanencia (dispositivo apagado o sin señal)
+MAX_PERMANENCIA_S = 300
+
+# Adelanto aceptado del reloj de un dispositivo sobre el del servidor
+MAX_ADELANTO_S = 300
+
+# Máximo de celdas al elegir la resolución automáticamente
+MAX_CELDAS = 2500
+
+# Empaquetado de (bucket, fila, columna) en 63 bits: filas y columnas de la
+# resolución más fina caben con signo en 21 y 22 bits, y 20 bits de buckets
+# horarios alcanzan hasta ~2089
+_BITS_FILA = 21
+_BITS_COLUMNA = 22
+_BITS_BUCKET = 63 - _BITS_FILA - _BITS_COLUMNA
+_DESPLAZAMIENTO_FILA = 1 << (_BITS_FILA - 1)
+_DESPLAZAMIENTO_COLUMNA = 1 << (_BITS_COLUMNA - 1)
+
+# Acumuladores por celda: [visitas, permanencia_s, suma de velocidades]
+Celda = List[float]
+# Un tile: bucket (hora de inicio) -> (fila, columna) -> acumuladores
+Tile = Dict[int, Dict[Tuple[int, int], Celda]]
+
+
+def _sumar(destino: Dict[Tuple[int, int], Celda], celdas: Dict[Tuple[int, int], Celda]) -> None:
+    for clave, (v, p, s) in celdas.items():
+        total = destino.get(clave)
+        if total is None:
+            destino[clave] = [v, p, s]
+        else:
+            total[0] += v
+            total[1] += p
+            total[2] += s
+
+
+class HeatmapGrid:
+    """Grillas multirresolución actualizadas en la ingesta, por tile y bucket de tiempo"""
+
+    def __init__(self, tamanos: Tuple[float, ...] = TAMANOS_CELDA,
+                 max_permanencia_s: int = MAX_PERMANENCIA_S,
+                 rollup_horas: int = ROLLUP_HORAS, retencion_horas: int = RETENCION_HORAS,
+                 max_adelanto_s: int = MAX_ADELANTO_S, reloj: Callable[[], float] = time.time):
+        self.tamanos = tamanos
+        self.max_permanencia_s = max_permanencia_s
+        self.max_adelanto_s = max_adelanto_s
+        self.reloj = reloj
+        self.rollup_horas = rollup_horas
+        self.retencion_horas = max(retencion_horas, rollup_horas)
+        # nivel -> (fila, columna) del tile -> tile
+        self._niveles: List[Dict[Tuple[int, int], Tile]] = [defaultdict(lambda: defaultdict(dict)) for _ in tamanos]
+        # mc_id -> (ts, lat, lng) del último punto, aún sin permanencia asignada
+        self._ultimo: Dict[int, Tuple[int, float, float]] = {}
+        self.puntos = 0
+        self.descartados = 0
+        # Hora del servidor en el último avance; los buckets anteriores a `_frontera`
+        # (inicio de un día) son diarios y se identifican por su primera hora
+        self._hora_max: Optional[int] = None
+        self._frontera = 0
+        self._retencion = 0
+
+    def ingest(self, mc_id: int, ts, lat, lng, speed) -> None:
+        """Agrega un punto o un lote (escalares o arreglos) de un montacarga"""
+        ts = np.atleast_1d(np.asarray(ts, dtype=np.int64))
+        if len(ts) == 0:
+            return
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        lng = np.atleast_1d(np.asarray(lng, dtype=np.float64))
+        speed = np.atleast_1d(np.asarray(speed, dtype=np.float64))
+        orden = np.argsort(ts, kind="stable")
+        ts, lat, lng, speed = ts[orden], lat[orden], lng[orden], speed[orden]
+        limite = self._avanzar()
+        if ts[-1] > limite:
+            # Reloj adelantado: esos puntos no se agregan ni encadenan la permanencia
+            vigentes = ts <= limite
+            self.descartados += len(ts) - int(vigentes.sum())
+            ts, lat, lng, speed = ts[vigentes], lat[vigentes], lng[vigentes], speed[vigentes]
+            if len(ts) == 0:
+                return
+
+        visitas = np.ones(len(ts))
+        ultimo = self._ultimo.get(mc_id)
+        if ultimo is not None and ts[0] < ultimo[0]:
+            # Lote atrasado: cuenta visitas y velocidad, sin permanencia
+            self.puntos += self._acumular(ts, lat, lng, visitas, np.zeros(len(ts)), speed)
+            return
+
+        # La permanencia de un punto es el tiempo hasta el siguiente (acotada)
+        permanencia = np.zeros(len(ts))
+        permanencia[:-1] = np.minimum(np.diff(ts), self.max_permanencia_s)
+        if ultimo is not None:
+            # El último punto del envío anterior recibe su permanencia ahora
+            ts = np.concatenate(([ultimo[0]], ts))
+            lat = np.concatenate(([ultimo[1]], lat))
+            lng = np.concatenate(([ultimo[2]], lng))
+            permanencia = np.concatenate(([min(ts[1] - ts[0], self.max_permanencia_s)], permanencia))
+            visitas = np.concatenate(([0.0], visitas))
+            speed = np.concatenate(([0.0], speed))
+        self.puntos += self._acumular(ts, lat, lng, visitas, permanencia, speed)
+        self._ultimo[mc_id] = (int(ts[-1]), float(lat[-1]), float(lng[-1]))
+
+    def backfill(self, mc_id: int, ts, lat, lng, speed) -> None:
+        """
+        Agrega un recorrido antiguo completo (del archivo o de la base sqlite) con su
+        permanencia entre puntos, sin encadenarlo con el último punto en vivo
+        """
+        ts = np.asarray(ts, dtype=np.int64)
+        if len(ts) == 0:
+            return
+        orden = np.argsort(ts, kind="stable")
+        ts = ts[orden]
+        self._avanzar()
+        permanencia = np.zeros(len(ts))
+        permanencia[:-1] = np.minimum(np.diff(ts), self.max_permanencia_s)
+        self.puntos += self._acumular(ts, np.asarray(lat, dtype=np.float64)[orden],
+                                      np.asarray(lng, dtype=np.float64)[orden], np.ones(len(ts)), permanencia,
+                                      np.asarray(speed, dtype=np.float64)[orden])
+
+    def retention_start(self) -> int:
+        """Timestamp desde el que se conservan datos (lo anterior se descartaría al ingerirlo)"""
+        self._avanzar()
+        return self._retencion * SEGUNDOS_POR_BUCKET
+
+    def _avanzar(self) -> int:
+        """
+        Mueve los horizontes al empezar un día nuevo en el reloj del servidor:
+        agrega a días y descarta lo vencido. Devuelve el último ts aceptado.
+        """
+        ahora = int(self.reloj())
+        hora = ahora // SEGUNDOS_POR_BUCKET
+        if self._hora_max is not None and hora // HORAS_POR_DIA <= self._hora_max // HORAS_POR_DIA:
+            self._hora_max = max(self._hora_max, hora)
+            return ahora + self.max_adelanto_s
+        self._hora_max = hora
+        frontera = (hora - self.rollup_horas) // HORAS_POR_DIA * HORAS_POR_DIA
+        retencion = (hora - self.retencion_horas) // HORAS_POR_DIA * HORAS_POR_DIA
+        if frontera <= self._frontera and retencion <= self._retencion:
+            return ahora + self.max_adelanto_s
+        self._frontera, self._retencion = max(frontera, self._frontera), max(retencion, self._retencion)
+        for tiles in self._niveles:
+            for clave_tile in list(tiles):
+                tile = tiles[clave_tile]
+                for bucket in [b for b in tile if b < self._frontera]:
+                    celdas = tile[bucket]
+                    dia = bucket - bucket % HORAS_POR_DIA
+                    if dia < self._retencion:
+                        del tile[bucket]
+                    elif dia != bucket:
+                        del tile[bucket]
+                        _sumar(tile[dia], celdas)
+                if not tile:
+                    del tiles[clave_tile]
+        return ahora + self.max_adelanto_s
+
+    def _acumular(self, ts, lat, lng, visitas, permanencia, speed) -> int:
+        """Suma los puntos a las celdas de cada nivel; devuelve las visitas contadas"""
+        bucket = ts // SEGUNDOS_POR_BUCKET
+        # Fuera de la retención, o fuera del rango que cabe en la clave empaquetada
+        vigentes = (bucket >= self._retencion) & (bucket >= 0) & (bucket < 1 << _BITS_BUCKET)
+        if not vigentes.all():
+            # Anteriores al horizonte de retención: se descartan
+            self.descartados += int(visitas[~vigentes].sum())
+            bucket, lat, lng = bucket[vigentes], lat[vigentes], lng[vigentes]
+            visitas, permanencia, speed = visitas[vigentes], permanencia[vigentes], speed[vigentes]
+        bucket = np.where(bucket < self._frontera, bucket - bucket % HORAS_POR_DIA, bucket)
+        for nivel, tamano in enumerate(self.tamanos):
+            fila = np.floor(lat / tamano).astype(np.int64) + _DESPLAZAMIENTO_FILA
+            columna = np.floor(lng / tamano).astype(np.int64) + _DESPLAZAMIENTO_COLUMNA
+            # (bucket, fila, columna) empaquetados en un int64: np.unique 1-D es mucho más rápido
+            claves, inversa = np.unique(
+                (bucket << _BITS_FILA + _BITS_COLUMNA) | (fila << _BITS_COLUMNA) | columna, return_inverse=True
+            )
+            sumas = np.stack((
+                np.bincount(inversa, visitas, len(claves)),
+                np.bincount(inversa, permanencia, len(claves)),
+                np.bincount(inversa, speed, len(claves)),
+            ), axis=1).tolist()
+            filas = ((claves >> _BITS_COLUMNA) & ((1 << _BITS_FILA) - 1)) - _DESPLAZAMIENTO_FILA
+            columnas = (claves & ((1 << _BITS_COLUMNA) - 1)) - _DESPLAZAMIENTO_COLUMNA
+            tiles = self._niveles[nivel]
+            clave_anterior, celdas = None, None
+            for b, f, c, tf, tc, (v, p, s) in zip((claves >> _BITS_FILA + _BITS_COLUMNA).tolist(),
+                                                  filas.tolist(), columnas.tolist(),
+                                                  (filas // TILE).tolist(), (columnas // TILE).tolist(), sumas):
+                # Las claves vienen ordenadas por bucket y fila: celdas vecinas comparten tile
+                if clave_anterior != (tf, tc, b):
+                    clave_anterior = (tf, tc, b)
+                    celdas = tiles[(tf, tc)][b]
+                celda = celdas.get((f, c))
+                if celda is None:
+                    celdas[(f, c)] = [v, p, s]
+                else:
+                    celda[0] += v
+                    celda[1] += p
+                    celda[2] += s
+        return int(visitas.sum())
+
+    def resolucion_para(self, lat_min: float, lat_max: float, lng_min: float, lng_max: float) -> int:
+        """Resolución más fina cuyo número de celdas en el rectángulo no supera MAX_CELDAS"""
+        for nivel in range(len(self.tamanos) - 1, 0, -1):
+            tamano = self.tamanos[nivel]
+            if ((lat_max - lat_min) / tamano + 1) * ((lng_max - lng_min) / tamano + 1) <= MAX_CELDAS:
+                return nivel
+        return 0
+
+    def query(self, lat_min: float, lat_max: float, lng_min: float, lng_max: float,
+              desde_ts: Optional[int] = None, hasta_ts: Optional[int] = None,
+              resolucion: Optional[int] = None) -> dict:
+        """
+        Celdas del rectángulo con sus totales en la ventana [desde_ts, hasta_ts].
+        La ventana se resuelve a buckets completos: horas, o días en el tramo agregado.
+        """
+        self._avanzar()
+        if resolucion is None:
+            resolucion = self.resolucion_para(lat_min, lat_max, lng_min, lng_max)
+        tamano = self.tamanos[resolucion]
+        fila_min, fila_max = int(np.floor(lat_min / tamano)), int(np.floor(lat_max / tamano))
+        col_min, col_max = int(np.floor(lng_min / tamano)), int(np.floor(lng_max / tamano))
+        bucket_min = None if desde_ts is None else desde_ts // SEGUNDOS_POR_BUCKET
+        bucket_max = None if hasta_ts is None else hasta_ts // SEGUNDOS_POR_BUCKET
+
+        tiles = self._niveles[resolucion]
+        totales: Dict[Tuple[int, int], Celda] = {}
+        for tile_fila in range(fila_min // TILE, fila_max // TILE + 1):
+            for tile_columna in range(col_min // TILE, col_max // TILE + 1):
+                tile = tiles.get((tile_fila, tile_columna))
+                if tile is None:
+                    continue
+                # Un tile cubierto por completo no necesita filtrar celdas
+                completo = (fila_min <= tile_fila * TILE and (tile_fila + 1) * TILE - 1 <= fila_max
+                            and col_min <= tile_columna * TILE and (tile_columna + 1) * TILE - 1 <= col_max)
+                for bucket, celdas in tile.items():
+                    ultima_hora = bucket + (HORAS_POR_DIA - 1 if bucket < self._frontera else 0)
+                    if (bucket_min is not None and ultima_hora < bucket_min) or \
+                            (bucket_max is not None and bucket > bucket_max):
+                        continue
+                    if completo:
+                        _sumar(totales, celdas)
+                        continue
+                    for (fila, columna), (v, p, s) in celdas.items():
+                        if fila_min <= fila <= fila_max and col_min <= columna <= col_max:
+                            total = totales.get((fila, columna))
+                            if total is None:
+                                totales[(fila, columna)] = [v, p, s]
+                            else:
+                                total[0] += v
+                                total[1] += p
+                                total[2] += s
+
+        return {
+            "resolucion": resolucion,
+            "tamano_celda": tamano,
+            "celdas": [
+                {
+                    "lat": round((fila + 0.5) * tamano, 7),
+                    "lng": round((columna + 0.5) * tamano, 7),
+                    "visitas": int(v),
+                    "permanencia_s": int(p),
+                    "velocidad_media": round(s / v, 2) if v else 0.0,
+                }
+                for (fila, columna), (v, p, s) in sorted(totales.items())
+            ],
+        }
+
+    def stats(self) -> dict:
+        return {
+            "puntos": self.puntos,
+            "descartados": self.descartados,
+            "tiles": [len(tiles) for tiles in self._niveles],
+            "buckets": [sum(len(tile) for tile in tiles.values()) for tiles in self._niveles],
+            "celdas": [sum(len(c) for tile in tiles.values() for c in tile.values()) for tiles in self._niveles],
+        }
@@ -0,0 +1,235 @@
+"""
+Ingesta de puntos GPS hacia el TelemetryStore
+
+append_point procesa un punto (endpoint individual) y append_points agrega
+un lote completo ya validado, agrupado por fecha, en una operación por recorrido.
+Con un GpsFilter, los puntos pasan antes por el filtro del montacarga y los
+recorridos se cortan en los huecos de inactividad. Los puntos atrasados se
+insertan en orden de timestamp y solo se recalculan los segmentos afectados.
+"""
+
+import time
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from .columns import PointColumns, format_timestamps
+from .dedup import DedupWindow
+from .gps_filter import GpsFilter, PuntoFiltrado
+from .metrics import etapa
+from .store import TelemetryStore
+from .trip_metrics import merge_trip_metrics, segment_metrics, update_trip_metrics
+
+SEGUNDOS_POR_DIA = 86400
+
+# Códigos de status para formatos binarios (log, uploads compactos)
+STATUS_NAMES = ["active", "idle", "maintenance", "charging", "error"]
+STATUS_CODES = {nombre: codigo for codigo, nombre in enumerate(STATUS_NAMES)}
+
+
+def status_code(status: str) -> int:
+    """Código binario del status (los valores desconocidos se guardan como active)"""
+    return STATUS_CODES.get(status, 0)
+
+
+def status_name(codigo: int) -> str:
+    return STATUS_NAMES[codigo] if codigo < len(STATUS_NAMES) else "active"
+
+
+def estado_montacarga(status: str) -> str:
+    """Traduce el status del microcontrolador al estado del montacarga"""
+    return "Mantenimiento" if status == "maintenance" else "Activo"
+
+
+def _nuevo_recorrido(store: TelemetryStore, mc_id: int, fecha: str, hora: str,
+                     speed: float, battery: int, status: str) -> dict:
+    return store.create_recorrido(
+        montacarga_id=mc_id,
+        fecha=fecha,
+        hora_inicio=hora,
+        hora_fin=hora,
+        distancia_km=0.0,
+        puntos_recorrido=PointColumns(),
+        tiempo_minutos=0,
+        velocidad_actual=speed,
+        bateria=battery,
+        estado=status
+    )
+
+
+def _hora(ts: int) -> str:
+    return time.strftime("%H:%M", time.gmtime(ts))
+
+
+def drop_duplicates(dedup: DedupWindow, args: tuple) -> Optional[tuple]:
+    """
+    Quita de los argumentos de append_points los puntos ya recibidos según la
+    ventana de deduplicación. None si no queda ninguno.
+    """
+    mc_id, ts, lat, lng, speed, battery, status = args
+    nuevos = dedup.accept_many(mc_id, ts)
+    if nuevos.all():
+        return args
+    if not nuevos.any():
+        return None
+    return (mc_id, ts[nuevos], lat[nuevos], lng[nuevos], speed[nuevos], battery[nuevos],
+            [s for s, nuevo in zip(status, nuevos.tolist()) if nuevo])
+
+
+def _buscar_recorrido(store: TelemetryStore, mc_id: int, fecha: str, ts: int) -> Optional[dict]:
+    """
+    Recorrido del día al que pertenece un punto: el activo o, si el punto es
+    anterior a su inicio (atrasado tras un corte), el último que empezó antes.
+
+    Los recorridos archivados no se modifican: un punto de un día archivado va
+    a un recorrido en memoria de ese día (uno nuevo si no queda ninguno), que la
+    retención agrega después al chunk del día.
+    """
+    recorrido = store.get_recorrido_activo(mc_id, fecha)
+    if recorrido is None or not len(recorrido["puntos_recorrido"]) or ts >= recorrido["puntos_recorrido"].ts[0]:
+        return recorrido
+    return store.get_recorrido_anterior(mc_id, fecha, ts) or recorrido
+
+
+def _insertar(store: TelemetryStore, recorrido: dict, lat, lng, ts, speed, battery,
+              agregados: Optional[list] = None) -> None:
+    """
+    Agrega puntos al recorrido. Al final es un append; si hay puntos atrasados
+    se insertan en orden (búsqueda binaria + desplazamiento de los posteriores)
+    y las métricas se corrigen solo en los segmentos vecinos a los insertados.
+    Con `agregados`, anota (recorrido, ts, lat, lng) de los puntos almacenados.
+    """
+    if agregados is not None:
+        agregados.append((recorrido, ts, lat, lng))
+    columnas = recorrido["puntos_recorrido"]
+    previos = len(columnas)
+    if len(ts) == 1 and previos > 0 and ts[0] >= columnas.ts[-1]:
+        columnas.append(lat[0], lng[0], ts[0], speed[0], battery[0])
+        recorrido["hora_fin"] = _hora(int(ts[0]))
+        with etapa("metricas_recorrido"):
+            update_trip_metrics(recorrido)
+        store.refresh_recorrido(recorrido)
+        return
+
+    # Segmentos afectados: del punto anterior al primero insertado al siguiente al último
+    desde = max(columnas.bisect(min(ts)) - 1, 0)
+    fin = columnas.bisect(max(ts)) + 1
+    with etapa("metricas_recorrido"):
+        anteriores = segment_metrics(columnas, desde, fin)
+        posicion = columnas.merge(lat, lng, ts, speed, battery)
+        merge_trip_metrics(recorrido, desde, fin + len(ts), anteriores)
+    recorrido["hora_inicio"], recorrido["hora_fin"] = _hora(int(columnas.ts[0])), _hora(int(columnas.ts[-1]))
+    store.refresh_recorrido(recorrido, desde=posicion if posicion < previos else None)
+
+
+def _agregar_filtrados(store: TelemetryStore, mc_id: int, puntos: List[PuntoFiltrado],
+                       status: str, agregados: Optional[list] = None) -> List[dict]:
+    """
+    Agrega los puntos que entrega el filtro: los tramos consecutivos del mismo día
+    van al recorrido activo en una operación; un punto con corte abre un recorrido nuevo.
+    """
+    if not puntos:
+        return []
+    timestamps = format_timestamps(np.array([p.ts for p in puntos], dtype=np.int64))
+    fechas = [t.split('T')[0] for t in timestamps]
+
+    recorridos: List[dict] = []
+    inicio = 0
+    while inicio < len(puntos):
+        fin = inicio + 1
+        while fin < len(puntos) and not puntos[fin].corte and fechas[fin] == fechas[inicio]:
+            fin += 1
+        tramo = puntos[inicio:fin]
+        primero = tramo[0]
+
+        with etapa("busqueda_recorrido"):
+            recorrido = None if primero.corte else _buscar_recorrido(store, mc_id, fechas[inicio], primero.ts)
+        if recorrido is None:
+            # Al crearlo queda como el recorrido activo del día (el más reciente)
+            recorrido = _nuevo_recorrido(store, mc_id, fechas[inicio], timestamps[inicio].split('T')[1][:5],
+                                         primero.speed, primero.battery, status)
+        lat, lng, ts, speed, battery = zip(*((p.lat, p.lng, p.ts, p.speed, p.battery) for p in tramo))
+        _insertar(store, recorrido, lat, lng, ts, speed, battery, agregados)
+        if not recorridos or recorridos[-1] is not recorrido:
+            recorridos.append(recorrido)
+        inicio = fin
+    return recorridos
+
+
+def append_point(store: TelemetryStore, mc_id: int, ts: int, lat: float, lng: float,
+                 speed: float = 0.0, battery: int = 100, status: str = "active",
+                 filtro: Optional[GpsFilter] = None, agregados: Optional[list] = None) -> Optional[dict]:
+    """
+    Agrega un punto (ts en segundos epoch, ver parse_timestamp) al recorrido
+    activo del día (creándolo si no existe). Con filtro, devuelve el último
+    recorrido modificado o None si el punto se descartó o quedó retenido en una parada.
+    En `agregados` se anotan los puntos tal como quedaron almacenados (ver _insertar).
+    """
+    if filtro is not None:
+        with etapa("filtro_gps"):
+            puntos = filtro.procesar(mc_id, ts, lat, lng, speed, battery)
+        recorridos = _agregar_filtrados(store, mc_id, puntos, status, agregados)
+        store.set_estado(mc_id, estado_montacarga(status))
+        return recorridos[-1] if recorridos else None
+
+    fecha, hora = time.strftime("%Y-%m-%d", time.gmtime(ts)), _hora(ts)
+    with etapa("busqueda_recorrido"):
+        recorrido = _buscar_recorrido(store, mc_id, fecha, ts)
+    if recorrido is None:
+        recorrido = _nuevo_recorrido(store, mc_id, fecha, hora, speed, battery, status)
+
+    # Al final del recorrido, distancia (haversine), duración y velocidades en O(1);
+    # un punto atrasado se inserta en orden
+    _insertar(store, recorrido, (lat,), (lng,), (ts,), (speed,), (battery,), agregados)
+
+    store.set_estado(mc_id, estado_montacarga(status))
+    return recorrido
+
+
+def append_points(store: TelemetryStore, mc_id: int, ts: np.ndarray, lat: np.ndarray, lng: np.ndarray,
+                  speed: np.ndarray, battery: np.ndarray, status: Sequence[str],
+                  filtro: Optional[GpsFilter] = None, agregados: Optional[list] = None) -> List[dict]:
+    """
+    Agrega un lote de puntos: los ordena por timestamp, los agrupa por fecha y
+    extiende cada recorrido en una sola operación (insertando en orden los
+    atrasados), recalculando las métricas de los segmentos nuevos en bloque.
+    Con filtro, cada punto pasa por el filtro del montacarga en orden de timestamp.
+    En `agregados` se anotan los puntos tal como quedaron almacenados (ver _insertar).
+    """
+    if len(ts) == 0:
+        return []
+
+    orden = np.argsort(ts, kind="stable")
+    ts, lat, lng, speed, battery = ts[orden], lat[orden], lng[orden], speed[orden], battery[orden]
+    ultimo_status = status[orden[-1]]
+
+    if filtro is not None:
+        puntos = []
+        with etapa("filtro_gps"):
+            for punto in zip(ts.tolist(), lat.tolist(), lng.tolist(), speed.tolist(), battery.tolist()):
+                puntos += filtro.procesar(mc_id, *punto)
+        recorridos = _agregar_filtrados(store, mc_id, puntos, status[orden[0]], agregados)
+        store.set_estado(mc_id, estado_montacarga(ultimo_status))
+        return recorridos
+
+    dias = ts // SEGUNDOS_POR_DIA
+    cortes = np.flatnonzero(np.diff(dias)) + 1
+    inicios = np.concatenate(([0], cortes))
+    fines = np.concatenate((cortes, [len(ts)]))
+
+    recorridos = []
+    for inicio, fin in zip(inicios.tolist(), fines.tolist()):
+        primero = format_timestamps(ts[[inicio]])[0]
+        fecha = primero.split('T')[0]
+        with etapa("busqueda_recorrido"):
+            recorrido = _buscar_recorrido(store, mc_id, fecha, int(ts[inicio]))
+        if recorrido is None:
+            recorrido = _nuevo_recorrido(store, mc_id, fecha, primero.split('T')[1][:5],
+                                         float(speed[inicio]), int(battery[inicio]), status[orden[inicio]])
+
+        _insertar(store, recorrido, lat[inicio:fin], lng[inicio:fin], ts[inicio:fin],
+                  speed[inicio:fin], battery[inicio:fin], agregados)
+        recorridos.append(recorrido)
+
+    store.set_estado(mc_id, estado_montacarga(ultimo_status))
+    return recorridos
@@ -0,0 +1,161 @@
+"""
+Cola asíncrona de ingesta (write-behind)
+
+Los endpoints del microcontrolador validan y encolan los puntos, y responden
+de inmediato. Una tarea consumidora en segundo plano los aplica al store en
+micro-lotes, cada uno dentro de `contexto_lote` (por ejemplo, una transacción
+del backend SQLite). Cuando la cola se llena, se pide a los dispositivos que
+espacien sus envíos (next_upload_in más alto).
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import nullcontext
+from typing import Any, Callable, ContextManager, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class IngestQueue:
+    """Cola de ingesta con un consumidor en segundo plano"""
+
+    def __init__(self, aplicar: Callable[[Any], None], max_lote: int = 256,
+                 umbral_backpressure: int = 1000, max_items: int = 100_000,
+                 max_upload_in: int = 600,
+                 contexto_lote: Callable[[], ContextManager] = nullcontext,
+                 al_fallar: Optional[Callable[[Exception], None]] = None):
+        self.aplicar = aplicar
+        self.contexto_lote = contexto_lote
+        # Notificación de cada item (o micro-lote) que falla en el consumidor
+        self.al_fallar = al_fallar
+        self.max_lote = max_lote
+        self.umbral_backpressure = umbral_backpressure
+        self.max_upload_in = max_upload_in
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_items)
+        self._tarea: Optional[asyncio.Task] = None
+        self.procesados = 0
+        self.errores = 0
+        self.ultimo_error: Optional[str] = None
+        # Items enviados y aún no aplicados (en la cola o esperando lugar en ella)
+        self._pendientes = 0
+        self.lotes = 0
+        self.ultimo_lote = 0
+        self.lag_s = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._tarea is not None and not self._tarea.done()
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        if not self.running:
+            self._tarea = asyncio.create_task(self._consumir())
+
+    async def submit(self, item: Any) -> None:
+        """
+        Encola un item. Si el consumidor no está corriendo (por ejemplo, sin
+        eventos de arranque), se aplica de inmediato y un error se propaga al llamador.
+        """
+        if not self.running:
+            self.aplicar(item)
+            self.procesados += 1
+            return
+        self._pendientes += 1
+        try:
+            # Con la cola llena, el request espera: contrapresión natural
+            await self._queue.put((time.monotonic(), item))
+        except BaseException:
+            self._pendientes -= 1
+            raise
+
+    async def join(self) -> None:
+        """
+        Espera a que se apliquen todos los items enviados. Al volver no queda
+        ninguno pendiente: hasta el próximo await, el store refleja todo lo recibido.
+        """
+        while self._pendientes and self.running:
+            await self._queue.join()
+            # Un envío que esperaba lugar en la cola llena todavía no entró
+            await asyncio.sleep(0)
+
+    def next_upload_in(self, base: int) -> int:
+        """Segundos hasta el próximo envío, aumentando con la profundidad de la cola"""
+        factor = 1 + self.depth // self.umbral_backpressure
+        return min(base * factor, max(base, self.max_upload_in))
+
+    def _aplicar(self, item: Any) -> None:
+        try:
+            self.aplicar(item)
+            self.procesados += 1
+        except Exception as e:
+            self.errores += 1
+            self.ultimo_error = f"{type(e).__name__}: {e}"
+            logger.exception("Error aplicando item de ingesta")
+            if self.al_fallar is not None:
+                self.al_fallar(e)
+
+    def _drenar(self, primero) -> None:
+        """Aplica un micro-lote: el primer item más los que ya esperan (hasta max_lote)"""
+        lote = [primero]
+        while len(lote) < self.max_lote:
+            try:
+                lote.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+
+        try:
+            with self.contexto_lote():
+                for _, item in lote:
+                    self._aplicar(item)
+        except Exception as e:
+            self.errores += 1
+            self.ultimo_error = f"{type(e).__name__}: {e}"
+            logger.exception("Error confirmando un micro-lote de ingesta")
+            if self.al_fallar is not None:
+                self.al_fallar(e)
+        self._pendientes -= len(lote)
+        for _ in lote:
+            self._queue.task_done()
+        self.lag_s = time.monotonic() - lote[-1][0]
+        self.lotes += 1
+        self.ultimo_lote = len(lote)
+
+    async def _consumir(self) -> None:
+        while True:
+            self._drenar(await self._queue.get())
+            # Ceder el event loop entre micro-lotes
+            await asyncio.sleep(0)
+
+    async def stop(self) -> None:
+        """Aplica todo lo pendiente y detiene el consumidor"""
+        if self._tarea is None:
+            return
+        self._tarea.cancel()
+        try:
+            await self._tarea
+        except asyncio.CancelledError:
+            pass
+        self._tarea = None
+        while not self._queue.empty():
+            self._drenar(self._queue.get_nowait())
+
+    def stats(self) -> dict:
+        oldest_lag = 0.0
+        if not self._queue.empty():
+            # El item más antiguo está al frente de la cola
+            oldest_lag = time.monotonic() - self._queue._queue[0][0]
+        return {
+            "running": self.running,
+            "depth": self.depth,
+            "lag_s": round(oldest_lag, 4),
+            "ultimo_lag_s": round(self.lag_s, 4),
+            "procesados": self.procesados,
+            "errores": self.errores,
+            "ultimo_error": self.ultimo_error,
+            "lotes": self.lotes,
+            "ultimo_lote": self.ultimo_lote,
+        }
@@ -0,0 +1,104 @@
+"""
+Difusión en vivo de puntos nuevos y cambios de estado (SSE / WebSocket)
+
+Cada evento se serializa una sola vez y los mismos bytes se entregan a todos
+los suscriptores interesados. Los suscriptores pueden filtrar por montacarga;
+un suscriptor lento pierde los eventos más antiguos en lugar de frenar la
+ingesta.
+"""
+
+import asyncio
+import json
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Set
+
+
+class Evento:
+    """Evento serializado una vez: JSON para WebSocket y bytes para SSE"""
+
+    __slots__ = ("tipo", "json", "sse", "creado")
+
+    def __init__(self, tipo: str, datos: dict):
+        self.tipo = tipo
+        self.json = json.dumps({"tipo": tipo, **datos}, separators=(",", ":"))
+        self.sse = f"event: {tipo}\ndata: {self.json}\n\n".encode()
+        self.creado = time.perf_counter()
+
+
+class Suscriptor:
+    def __init__(self, mc_ids: Optional[Set[int]], max_pendientes: int):
+        self.mc_ids = mc_ids
+        self.cola: asyncio.Queue = asyncio.Queue(maxsize=max_pendientes)
+        self.descartados = 0
+
+    def entregar(self, evento: Evento) -> None:
+        if self.cola.full():
+            # Suscriptor lento: descartar el evento más antiguo
+            self.cola.get_nowait()
+            self.descartados += 1
+        self.cola.put_nowait(evento)
+
+
+class LiveBroadcaster:
+    """Registro de suscriptores indexado por montacarga"""
+
+    def __init__(self, max_pendientes: int = 1000):
+        self.max_pendientes = max_pendientes
+        self._todos: Set[Suscriptor] = set()
+        self._por_montacarga: Dict[int, Set[Suscriptor]] = defaultdict(set)
+        self.publicados = 0
+
+    @property
+    def suscriptores(self) -> int:
+        return len(self._todos) + sum(len(s) for s in self._por_montacarga.values())
+
+    def has_subscribers(self, mc_id: int) -> bool:
+        return bool(self._todos) or bool(self._por_montacarga.get(mc_id))
+
+    def subscribe(self, mc_ids: Optional[Iterable[int]] = None) -> Suscriptor:
+        suscriptor = Suscriptor(set(mc_ids) if mc_ids else None, self.max_pendientes)
+        if suscriptor.mc_ids is None:
+            self._todos.add(suscriptor)
+        else:
+            for mc_id in suscriptor.mc_ids:
+                self._por_montacarga[mc_id].add(suscriptor)
+        return suscriptor
+
+    def unsubscribe(self, suscriptor: Suscriptor) -> None:
+        if suscriptor.mc_ids is None:
+            self._todos.discard(suscriptor)
+            return
+        for mc_id in suscriptor.mc_ids:
+            suscriptores = self._por_montacarga.get(mc_id)
+            if suscriptores is not None:
+                suscriptores.discard(suscriptor)
+                if not suscriptores:
+                    del self._por_montacarga[mc_id]
+
+    def publish(self, mc_id: int, tipo: str, datos: dict) -> Optional[Evento]:
+        """Serializa el evento una vez y lo entrega a los suscriptores del montacarga"""
+        if not self.has_subscribers(mc_id):
+            return None
+        evento = Evento(tipo, {"mc_id": mc_id, **datos})
+        for suscriptor in self._todos:
+            suscriptor.entregar(evento)
+        for suscriptor in self._por_montacarga.get(mc_id, ()):
+            suscriptor.entregar(evento)
+        self.publicados += 1
+        return evento
+
+    async def sse_stream(self, mc_ids: Optional[Iterable[int]] = None, keepalive: float = 15.0):
+        """Generador de Server-Sent Events para StreamingResponse"""
+        suscriptor = self.subscribe(mc_ids)
+        try:
+            yield b": conectado\n\n"
+            while True:
+                try:
+                    evento = await asyncio.wait_for(suscriptor.cola.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+                    continue
+                yield evento.sse
+        finally:
+            self.unsubscribe(suscriptor)
@@ -1,18 +1,52 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from typing import List, Optional
-from datetime import datetime
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+from typing import Dict, List, Optional
+from datetime import date, datetime, timedelta
+from contextlib import contextmanager
+import asyncio
 import uvicorn
 import os
 import json
+import logging
+import time
+import numpy as np
 import requests
 
+from .alerts import AlertEngine, load_rules
+from .archive import TripArchive
+from .binary_upload import BinaryFormatError, decode_upload
+from .columns import format_timestamps, parse_timestamp, parse_timestamps
+from .dedup import DedupWindow
+from .geocoding import GOOGLE_GEOCODING_URL, Geocoder
+from .geofence import GeofenceIndex, GeofenceTracker, load_zones
+from .gps_filter import GpsFilter
+from . import metrics
+from .heatmap import HeatmapGrid
+from .ingest import SEGUNDOS_POR_DIA, STATUS_NAMES, append_point, append_points, drop_duplicates
+from .sqlite_store import SQLiteStore
+from .ingest_queue import IngestQueue
+from .live import LiveBroadcaster
+from .metrics import BUCKETS_LOTE, Counter, Gauge, Histogram, MetricsMiddleware, etapa
+from .shared_log import PARTICIONES, open_shared
+from .simplify import SimplifyCache, tolerancia_zoom
+from .store import TelemetryStore, serialize_recorrido
+from .trip_metrics import recompute_trip_metrics
+from .wal import begin_compaction, compact, group_by_montacarga, recover
+
+logger = logging.getLogger(__name__)
+
+# Versión de la API (también en /health). 2.0.0: el timestamp de los puntos de
+# recorrido es siempre ISO completo (YYYY-MM-DDTHH:MM:SS); en 1.x los recorridos
+# de ejemplo respondían solo la hora (HH:MM)
+API_VERSION = "2.0.0"
+
 # Crear la instancia de FastAPI
 app = FastAPI(
     title="Reto Renault API",
     description="API backend para la aplicación Reto Renault",
-    version="1.0.0"
+    version=API_VERSION
 )
 
 # ========== PROXY SEGURO PARA GOOGLE MAPS (OPCIONAL) ==========
@@ -40,11 +74,22 @@ async def get_maps_script():
         "timestamp": datetime.now().isoformat()
     }
 
+# Geocoding sin bloquear el event loop: pool de hilos con sesión HTTP keep-alive,
+# caché LRU/TTL por dirección normalizada y una sola llamada por dirección en vuelo.
+# GEOCODING_URL permite apuntar a otro servidor (p. ej. un stub local en pruebas).
+GEOCODING_URL = os.getenv("GEOCODING_URL", GOOGLE_GEOCODING_URL)
+GEOCODING_CACHE_SIZE = int(os.getenv("GEOCODING_CACHE_SIZE", "10000"))
+GEOCODING_CACHE_TTL_S = float(os.getenv("GEOCODING_CACHE_TTL_S", "86400"))
+GEOCODING_TIMEOUT_S = 5.0
+
+geocoder = Geocoder(GEOCODING_URL, GEOCODING_TIMEOUT_S,
+                    max_entradas=GEOCODING_CACHE_SIZE, ttl_s=GEOCODING_CACHE_TTL_S)
+
 @app.post("/api/maps/geocode")
 async def proxy_geocoding(address: str):
     """
     Proxy para geocoding sin exponer la API key
-    Uso: POST /api/maps/geocode con {"address": "dirección a geocodificar"}
+    Uso: POST /api/maps/geocode?address=dirección a geocodificar
     """
     api_key = os.getenv("GOOGLE_MAPS_API_KEY")
     
@@ -55,16 +100,7 @@ async def proxy_geocoding(address: str):
         )
     
     try:
-        url = "https://maps.googleapis.com/maps/api/geocode/json"
-        params = {
-            "address": address,
-            "key": api_key
-        }
-        
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        
-        return response.json()
+        return await geocoder.geocode(address, api_key)
         
     except requests.RequestException as e:
         raise HTTPException(
@@ -72,6 +108,11 @@ async def proxy_geocoding(address: str):
             detail=f"Error en geocoding: {str(e)}"
         )
 
+@app.get("/api/maps/geocode/stats")
+async def get_geocoding_stats():
+    """Aciertos de la caché de geocoding, consultas coalescidas y llamadas a la API"""
+    return geocoder.stats()
+
 # Configurar CORS para permitir peticiones desde el frontend
 app.add_middleware(
     CORSMiddleware,
@@ -79,8 +120,48 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # El cursor de la página siguiente de los listados debe ser legible desde el navegador
+    expose_headers=["X-Next-Cursor"],
 )
 
+# ========== MÉTRICAS (PROMETHEUS) ==========
+
+# METRICS_ENABLED=0 desactiva la instrumentación (middleware y etapas internas)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+metrics.set_enabled(METRICS_ENABLED)
+INICIO_PROCESO = time.monotonic()
+
+HTTP_LATENCIA = metrics.registry.register(Histogram(
+    "reto_http_request_duration_seconds", "Latencia de las peticiones HTTP hasta el inicio de la respuesta",
+    ["ruta", "metodo", "status"]
+))
+PUNTOS_INGERIDOS = metrics.registry.register(Counter(
+    "reto_ingest_points_total", "Puntos aceptados por montacarga", ["mc_id"]
+))
+TAMANO_LOTE = metrics.registry.register(Histogram(
+    "reto_ingest_batch_points", "Puntos por envío del microcontrolador", ["endpoint"], buckets=BUCKETS_LOTE
+))
+ERRORES_INGESTA = metrics.registry.register(Counter(
+    "reto_ingest_errors_total", "Envíos del microcontrolador rechazados o con error", ["endpoint", "motivo"]
+))
+
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, latencia=HTTP_LATENCIA)
+
+def _contar_ingesta(endpoint: str, mc_id: int, puntos: int):
+    if metrics.enabled():
+        PUNTOS_INGERIDOS.labels(str(mc_id)).inc(puntos)
+        TAMANO_LOTE.labels(endpoint).observe(puntos)
+
+def _error_ingesta(endpoint: str, e: Exception) -> HTTPException:
+    """Cuenta el error y lo traduce: datos inválidos -> 400, fallo interno -> 500 (con traza en el log)"""
+    if isinstance(e, ValueError):
+        ERRORES_INGESTA.labels(endpoint, "datos_invalidos").inc()
+        return HTTPException(status_code=400, detail=f"Datos inválidos: {e}")
+    ERRORES_INGESTA.labels(endpoint, "interno").inc()
+    logger.exception("Error en la ingesta (%s)", endpoint)
+    return HTTPException(status_code=500, detail=f"Error procesando datos: {str(e)}")
+
 # Modelos Pydantic
 class Item(BaseModel):
     id: int
@@ -102,7 +183,7 @@ class Montacarga(BaseModel):
 class PuntoRecorrido(BaseModel):
     lat: float
     lng: float
-    timestamp: str
+    timestamp: str = Field(description="ISO YYYY-MM-DDTHH:MM:SS (desde la API 2.0.0; antes HH:MM)")
 
 class Recorrido(BaseModel):
     id: int
@@ -112,6 +193,24 @@ class Recorrido(BaseModel):
     hora_fin: str
     distancia_km: float
     puntos_recorrido: List[PuntoRecorrido]
+    tiempo_minutos: Optional[int] = None
+    velocidad_promedio: Optional[float] = None
+    velocidad_maxima: Optional[float] = None
+
+class RecorridoParcial(BaseModel):
+    """Recorrido de los listados paginados: solo trae los campos pedidos en fields="""
+    id: Optional[int] = None
+    montacarga_id: Optional[int] = None
+    fecha: Optional[str] = None
+    hora_inicio: Optional[str] = None
+    hora_fin: Optional[str] = None
+    distancia_km: Optional[float] = None
+    puntos_recorrido: Optional[List[PuntoRecorrido]] = Field(None, description="Con format=json")
+    polyline: Optional[str] = Field(None, description="Ruta codificada, con format=polyline")
+    total_puntos: Optional[int] = Field(None, description="Con fields=total_puntos o since=")
+    tiempo_minutos: Optional[int] = None
+    velocidad_promedio: Optional[float] = None
+    velocidad_maxima: Optional[float] = None
 
 # ========== MODELOS PARA MICROCONTROLADOR ==========
 
@@ -125,6 +224,17 @@ class MicrocontrollerData(BaseModel):
     battery: Optional[int] = Field(100, ge=0, le=100, description="Batería 0-100%")
     status: Optional[str] = Field("active", description="Estado: active|idle|maintenance")
 
+class PuntoCompacto(BaseModel):
+    """Punto compacto dentro de un lote"""
+    t: str = Field(..., description="ISO timestamp: YYYY-MM-DDTHH:MM:SS")
+    lat: float = Field(..., ge=-90, le=90)
+    lng: float = Field(..., ge=-180, le=180)
+    s: Optional[float] = Field(0.0, ge=0, description="Velocidad en km/h")
+    b: Optional[int] = Field(100, ge=0, le=100, description="Batería 0-100%")
+    st: Optional[str] = Field("active", description="Estado")
+
+_lote_adapter = TypeAdapter(List[PuntoCompacto])
+
 class MicrocontrollerBatch(BaseModel):
     """Para envío en lotes (más eficiente)"""
     mc_id: int = Field(..., description="ID del montacarga")
@@ -138,6 +248,15 @@ class MicrocontrollerResponse(BaseModel):
     next_upload_in: int = Field(60, description="Segundos hasta próximo envío")
     server_time: str
 
+class MicrocontrollerBatchResponse(MicrocontrollerResponse):
+    """Respuesta a un lote con el conteo de puntos aceptados y rechazados"""
+    accepted: int = Field(0, description="Puntos agregados al recorrido")
+    rejected: int = Field(0, description="Puntos descartados por validación")
+    rejected_indices: List[int] = Field(default_factory=list, description="Índices rechazados (primeros 50)")
+
+# Máximo de índices rechazados devueltos en la respuesta de un lote
+MAX_INDICES_RECHAZADOS = 50
+
 # Datos de ejemplo (en una aplicación real usarías una base de datos)
 items_db = [
     {"id": 1, "name": "Producto 1", "description": "Descripción del producto 1", "price": 29.99},
@@ -224,6 +343,505 @@ recorridos_db = [
     }
 ]
 
+def _zona_cuadrada(zona_id: int, nombre: str, lat: float, lng: float, radio: float = 0.00012) -> dict:
+    """Zona cuadrada centrada en el punto (radio 0.00012° ≈ 13 m)"""
+    return {
+        "id": zona_id,
+        "nombre": nombre,
+        "poligono": [[lat - radio, lng - radio], [lat - radio, lng + radio],
+                     [lat + radio, lng + radio], [lat + radio, lng - radio]]
+    }
+
+# Zonas del campus (geocercas) alrededor de los puntos de los recorridos de ejemplo
+zonas_db = [
+    _zona_cuadrada(1, "Entrada Principal UdeA", 6.268698, -75.569654),
+    _zona_cuadrada(2, "Biblioteca Central", 6.268917, -75.569257),
+    _zona_cuadrada(3, "Bloque 21 - Ingeniería", 6.269853, -75.569172),
+    _zona_cuadrada(4, "Laboratorios Ingeniería", 6.270069, -75.569829),
+    _zona_cuadrada(5, "Bloque 19 - Investigación", 6.269117, -75.569984),
+    _zona_cuadrada(6, "Parqueadero Principal", 6.267368, -75.567105),
+    _zona_cuadrada(7, "Teatro Universitario", 6.267447, -75.567944),
+    _zona_cuadrada(8, "Centro de Cómputo", 6.266494, -75.570905),
+]
+
+# Backend de almacenamiento: "memory" (por defecto) o "sqlite"
+TELEMETRY_STORE = os.getenv("TELEMETRY_STORE", "memory")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "data/telemetry.db")
+
+# Almacén indexado sobre los datos de ejemplo
+if TELEMETRY_STORE == "sqlite":
+    os.makedirs(os.path.dirname(SQLITE_PATH) or ".", exist_ok=True)
+    store = SQLiteStore(SQLITE_PATH, montacargas_db, recorridos_db)
+else:
+    store = TelemetryStore(montacargas_db, recorridos_db)
+
+# ========== PERSISTENCIA (LOG APPEND-ONLY + SNAPSHOTS) ==========
+
+# Directorio del log de telemetría; sin definir, los datos solo viven en memoria.
+# Solo aplica al backend "memory" (SQLite ya es durable).
+TELEMETRY_LOG_DIR = os.getenv("TELEMETRY_LOG_DIR")
+# Registros escritos en el log antes de compactar en un nuevo snapshot
+SNAPSHOT_EVERY = int(os.getenv("TELEMETRY_SNAPSHOT_EVERY", "500000"))
+
+telemetry_log = None
+recovery_info = None
+# Escritura en curso del snapshot de la última compactación (en un hilo)
+snapshot_en_curso = None
+
+async def _mantener_log():
+    """Sincroniza los registros pendientes y compacta el log periódicamente"""
+    global telemetry_log, snapshot_en_curso
+    while True:
+        await asyncio.sleep(telemetry_log.intervalo_sync)
+        telemetry_log.sync_if_pending()
+        if telemetry_log.registros_escritos >= SNAPSHOT_EVERY:
+            # El snapshot debe incluir todo lo escrito en el log que se va a borrar:
+            # se espera a que la cola aplique lo pendiente y se toma el estado sin
+            # ceder el loop; la escritura corre en un hilo mientras sigue la ingesta
+            await ingest_queue.join()
+            telemetry_log, escribir = begin_compaction(store, telemetry_log, gps_filter, dedup, alerts)
+            snapshot_en_curso = asyncio.ensure_future(asyncio.to_thread(escribir))
+            await asyncio.shield(snapshot_en_curso)
+
+# ========== RETENCIÓN (ARCHIVO COMPRIMIDO) ==========
+
+# Con ARCHIVE_DIR, los recorridos de más de RETENTION_HOT_DAYS días pasan a un
+# archivo comprimido en disco y se leen bajo demanda, con una caché LRU de
+# ARCHIVE_CACHE_CHUNKS chunks (montacarga, día). Solo aplica al backend "memory"
+# con un único proceso (con SHARED_STATE_DIR cada worker re-aplica todo el log).
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR")
+RETENTION_HOT_DAYS = int(os.getenv("RETENTION_HOT_DAYS", "7"))
+ARCHIVE_CACHE_CHUNKS = int(os.getenv("ARCHIVE_CACHE_CHUNKS", "64"))
+# Intervalo entre pasadas de retención (segundos)
+RETENTION_CHECK_S = 300
+# Fracción del archivo de datos ocupada por chunks reemplazados a partir de la cual se compacta
+ARCHIVE_COMPACT_RATIO = 0.5
+
+trip_archive = None
+
+def _compactar_archivo() -> int:
+    """Compacta el archivo si los chunks reemplazados ocupan demasiado; devuelve los bytes liberados"""
+    muertos = trip_archive.dead_bytes()
+    if muertos and muertos >= ARCHIVE_COMPACT_RATIO * (muertos + trip_archive.stats()["bytes_comprimidos"]):
+        return trip_archive.compact()
+    return 0
+
+async def _mantener_retencion():
+    """
+    Archiva periódicamente los recorridos que salieron de la ventana caliente
+    y compacta el archivo cuando los chunks reemplazados ocupan demasiado.
+    La compresión, la escritura y la compactación corren en un hilo; el
+    store solo se modifica en el loop (copias antes, confirmación después).
+    """
+    while True:
+        limite = (date.today() - timedelta(days=RETENTION_HOT_DAYS)).isoformat()
+        grupos = store.prepare_archive(limite)
+        if grupos:
+            entradas = await asyncio.to_thread(store.write_archive, grupos)
+            archivados = store.commit_archive(grupos, entradas)
+            logger.info("Retención: %d recorridos anteriores a %s archivados", archivados, limite)
+        liberados = await asyncio.to_thread(_compactar_archivo)
+        if liberados:
+            logger.info("Archivo compactado: %d bytes liberados", liberados)
+        await asyncio.sleep(RETENTION_CHECK_S)
+
+async def _con_puntos_archivados(recorridos: List[dict]) -> List[dict]:
+    """
+    Los recorridos (sin puntos, de page_recorridos) con sus puntos: los chunks
+    archivados se descomprimen en un hilo, no en el loop
+    """
+    if trip_archive is None:
+        return recorridos
+    claves = store.archived_keys(recorridos)
+    chunks = await asyncio.to_thread(trip_archive.chunks, claves) if claves else None
+    return store.with_points(recorridos, chunks)
+
+async def _precargar_archivado(recorrido_id: int) -> None:
+    """Lleva a la caché del archivo (en un hilo) el chunk de un recorrido archivado antes de leerlo"""
+    clave = store.archived_key(recorrido_id) if trip_archive is not None else None
+    if clave is not None:
+        await asyncio.to_thread(trip_archive.chunk, *clave)
+
+# ========== FILTRO GPS ==========
+
+# Filtro de ruido, outliers y paradas antes de almacenar (GPS_FILTER=0 lo desactiva).
+# Un hueco sin movimiento mayor que TRIP_IDLE_GAP_S segundos corta el recorrido.
+GPS_FILTER = os.getenv("GPS_FILTER", "1") != "0"
+TRIP_IDLE_GAP_S = int(os.getenv("TRIP_IDLE_GAP_S", "1800"))
+gps_filter = GpsFilter(gap_inactivo_s=TRIP_IDLE_GAP_S) if GPS_FILTER else None
+
+# ========== DEDUPLICACIÓN DE REENVÍOS ==========
+
+# Los puntos (mc_id, timestamp) ya recibidos se descartan al aplicarlos (reintentos
+# de envíos tras un timeout). La ventana cubre los últimos DEDUP_WINDOW_S segundos de
+# cada montacarga: dentro de ella los atrasados se insertan en orden, antes se descartan.
+# DEDUP_WINDOW_S=0 desactiva la deduplicación.
+DEDUP_WINDOW_S = int(os.getenv("DEDUP_WINDOW_S", "3600"))
+# Adelanto máximo (segundos) del reloj de un dispositivo sobre el del servidor: un
+# punto posterior se rechaza, así no mueve la marca de agua de la ventana ni los
+# horizontes del mapa de calor hacia el futuro
+MAX_CLOCK_SKEW_S = int(os.getenv("MAX_CLOCK_SKEW_S", "300"))
+dedup = DedupWindow(DEDUP_WINDOW_S, max_adelanto_s=MAX_CLOCK_SKEW_S) if DEDUP_WINDOW_S > 0 else None
+
+def _ts_limite() -> int:
+    """Último timestamp aceptado en la ingesta"""
+    return int(time.time()) + MAX_CLOCK_SKEW_S
+
+def _sin_duplicados(funcion, args):
+    """Argumentos del item sin los puntos ya recibidos; None si todos son reenvíos"""
+    if funcion is append_point:
+        return args if dedup.accept(args[0], args[1]) else None
+    return drop_duplicates(dedup, args)
+
+# ========== VARIOS WORKERS (LOG COMPARTIDO) ==========
+
+# Con SHARED_STATE_DIR, los workers (gunicorn -w N) escriben los puntos que reciben
+# en un log compartido, particionado por montacarga, y cada uno aplica todo el log
+# a su store. Solo aplica al backend "memory"; reemplaza a TELEMETRY_LOG_DIR (el
+# log ya es durable) y se compacta en snapshots cada TELEMETRY_SNAPSHOT_EVERY registros.
+SHARED_STATE_DIR = os.getenv("SHARED_STATE_DIR")
+# Particiones del log compartido (fijas durante la vida del directorio)
+SHARED_LOG_PARTITIONS = int(os.getenv("SHARED_LOG_PARTITIONS", str(PARTICIONES)))
+# Intervalo de lectura de registros nuevos del log compartido (segundos)
+SHARED_POLL_S = float(os.getenv("SHARED_POLL_S", "0.01"))
+# Registros leídos como máximo por iteración (acota cada lote de la cola)
+SHARED_READ_MAX = 50_000
+
+shared_log = None
+
+async def _seguir_log_compartido():
+    """Encola los registros nuevos del log compartido, escritos por este u otro worker"""
+    while True:
+        registros = shared_log.read_new(SHARED_READ_MAX)
+        for args in group_by_montacarga(registros, en_orden=True):
+            if store.has_montacarga(args[0]):
+                await ingest_queue.submit((append_points, args))
+        if len(registros) < SHARED_READ_MAX:
+            await asyncio.to_thread(shared_log.sync_if_pending)
+            if shared_log.compaction_due(SNAPSHOT_EVERY):
+                await _compactar_log_compartido()
+            await asyncio.sleep(SHARED_POLL_S)
+
+async def _compactar_log_compartido():
+    """Snapshot del log compartido en un solo worker (el que toma el lock de compactación)"""
+    if not shared_log.try_lock_compaction():
+        return
+    try:
+        # Otro worker pudo compactar antes de tomar el lock
+        if shared_log.compaction_due(SNAPSHOT_EVERY):
+            # El snapshot cubre lo leído: se espera a que la cola lo aplique y se
+            # escribe sin ceder el loop (no se lee del log mientras tanto)
+            await ingest_queue.join()
+            shared_log.compact(store, gps_filter, dedup, alerts)
+    finally:
+        shared_log.unlock_compaction()
+
+# ========== COLA DE INGESTA (WRITE-BEHIND) ==========
+
+# Difusión en vivo de puntos nuevos y cambios de estado
+live = LiveBroadcaster()
+
+# Rutas simplificadas por (recorrido, tolerancia); se invalidan al ingerir puntos
+simplify_cache = SimplifyCache()
+
+# Geocercas: GEOFENCE_FILE (JSON) reemplaza las zonas de ejemplo
+GEOFENCE_FILE = os.getenv("GEOFENCE_FILE")
+geofence = GeofenceTracker(GeofenceIndex(load_zones(GEOFENCE_FILE) if GEOFENCE_FILE else zonas_db))
+
+def _actualizar_zonas(funcion, args):
+    """Clasifica los puntos aplicados y publica las entradas/salidas de zona"""
+    mc_id = args[0]
+    if funcion is append_point:
+        _, ts, lat, lng = args[:4]
+        eventos = geofence.update(mc_id, ts, lat, lng)
+    else:
+        _, ts, lat, lng = args[:4]
+        eventos = geofence.update_many(mc_id, ts, lat, lng)
+    for evento in eventos:
+        live.publish(mc_id, "zona", evento)
+
+# Alertas: ALERT_RULES_FILE (JSON) reemplaza las reglas de ejemplo. Se evalúan
+# con los valores reportados por el dispositivo (antes del filtro GPS).
+ALERT_RULES_FILE = os.getenv("ALERT_RULES_FILE")
+# Intervalo de revisión de los vencimientos de las reglas sin_datos (segundos)
+ALERTS_TICK_S = 1.0
+
+reglas_alerta_db = [
+    {"id": "exceso_velocidad", "tipo": "velocidad", "max_kmh": 15, "severidad": "alta"},
+    {"id": "velocidad_parqueadero", "tipo": "velocidad", "zona_id": 6, "max_kmh": 8, "severidad": "media"},
+    {"id": "bateria_baja", "tipo": "bateria", "min": 20, "severidad": "media"},
+    {"id": "bateria_critica", "tipo": "bateria", "min": 10, "severidad": "alta"},
+    {"id": "estado_error", "tipo": "estado", "estados": ["error"], "severidad": "alta"},
+    {"id": "sin_datos", "tipo": "sin_datos", "segundos": 300, "severidad": "media"},
+]
+
+alerts = AlertEngine(load_rules(ALERT_RULES_FILE) if ALERT_RULES_FILE else reglas_alerta_db, geofence.index)
+
+def _evaluar_alertas(funcion, args):
+    """Evalúa las reglas sobre los puntos aplicados y publica las alertas que cambian"""
+    if funcion is append_point:
+        eventos = alerts.evaluate(*args)
+    else:
+        eventos = alerts.evaluate_many(*args)
+    for evento in eventos:
+        live.publish(evento["mc_id"], "alerta", evento)
+
+async def _revisar_sin_datos():
+    while True:
+        await asyncio.sleep(ALERTS_TICK_S)
+        for evento in alerts.tick():
+            live.publish(evento["mc_id"], "alerta", evento)
+
+# Mapa de calor incremental (visitas, permanencia y velocidad por celda y hora).
+# Las horas de más de HEATMAP_ROLLUP_DAYS días se agregan por día y lo anterior a
+# HEATMAP_RETENTION_DAYS días se descarta (contado desde la hora del servidor).
+HEATMAP_ROLLUP_DAYS = int(os.getenv("HEATMAP_ROLLUP_DAYS", "7"))
+HEATMAP_RETENTION_DAYS = int(os.getenv("HEATMAP_RETENTION_DAYS", "90"))
+heatmap = HeatmapGrid(rollup_horas=HEATMAP_ROLLUP_DAYS * 24, retencion_horas=HEATMAP_RETENTION_DAYS * 24,
+                      max_adelanto_s=MAX_CLOCK_SKEW_S)
+
+# Días que aún no entraron al mapa de calor, por (montacarga, día): ids de los
+# recorridos archivados, o None para un día guardado en el backend sqlite. Se
+# cargan la primera vez que una consulta cubre su día (o que llegan puntos de ese
+# día), así el arranque no descomprime el archivo ni lee todos los puntos guardados
+heatmap_pendientes = {}
+
+def _fecha(ts: int) -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime(ts))
+
+# Una carga a la vez: dos consultas simultáneas no agregan dos veces el mismo día
+_heatmap_lock = asyncio.Lock()
+
+def _cargar_dia_guardado(clave) -> None:
+    """Agrega al mapa de calor los puntos guardados de un día pendiente del backend sqlite"""
+    del heatmap_pendientes[clave]
+    for recorrido in store.recorridos_by_montacarga(clave[0], clave[1], clave[1]):
+        puntos = recorrido["puntos_recorrido"]
+        heatmap.backfill(clave[0], puntos.ts, puntos.lat, puntos.lng, puntos.speed)
+
+def _cargar_dias_guardados(mc_id: int, ts) -> None:
+    """Antes de almacenar puntos de un día guardado pendiente, carga lo que ya tenía"""
+    if not heatmap_pendientes:
+        return
+    for dia in np.unique(np.asarray(ts, dtype=np.int64) // SEGUNDOS_POR_DIA).tolist():
+        clave = (mc_id, _fecha(dia * SEGUNDOS_POR_DIA))
+        if clave in heatmap_pendientes and heatmap_pendientes[clave] is None:
+            _cargar_dia_guardado(clave)
+
+async def _cargar_heatmap_pendiente(desde_ts: Optional[int], hasta_ts: Optional[int]):
+    """Agrega al mapa de calor los días pendientes que se cruzan con la ventana"""
+    if not heatmap_pendientes:
+        return
+    async with _heatmap_lock:
+        # Lo anterior al horizonte de retención se descartaría al agregarlo
+        desde = max(_fecha(desde_ts) if desde_ts is not None else "", _fecha(heatmap.retention_start()))
+        hasta = _fecha(hasta_ts) if hasta_ts is not None else None
+        claves = []
+        for clave in list(heatmap_pendientes):
+            if clave[1] < desde:
+                del heatmap_pendientes[clave]
+            elif hasta is not None and clave[1] > hasta:
+                continue
+            elif heatmap_pendientes[clave] is None:
+                _cargar_dia_guardado(clave)
+            else:
+                claves.append(clave)
+        if not claves:
+            return
+        # Se descomprime fuera del loop; el mapa de calor se actualiza en él, como en la ingesta
+        chunks = await asyncio.to_thread(lambda: list(trip_archive.iter_chunks(claves)))
+        for entrada, recorridos in chunks:
+            ids = heatmap_pendientes.pop((entrada["mc_id"], entrada["fecha"]), ())
+            for recorrido_id in ids:
+                # Los borrados desde el arranque ya no están archivados
+                if recorrido_id in recorridos and store.is_archived(recorrido_id):
+                    puntos = recorridos[recorrido_id]
+                    heatmap.backfill(entrada["mc_id"], puntos.ts, puntos.lat, puntos.lng, puntos.speed)
+
+def _actualizar_heatmap(funcion, args):
+    heatmap.ingest(*args[:5])
+
+def _resumen_recorrido(recorrido: dict) -> dict:
+    return {k: recorrido[k] for k in ("id", "montacarga_id", "fecha", "hora_inicio", "hora_fin", "distancia_km")}
+
+def _publicar_puntos(mc_id: int, agregados: list):
+    """
+    Publica los puntos recién almacenados, un evento por recorrido: los que
+    dejó el filtro GPS (suavizados, sin outliers, incluidos los liberados de
+    una parada) y no los recibidos, cada uno en el recorrido al que se agregó.
+    """
+    por_recorrido: Dict[int, tuple] = {}
+    for recorrido, ts, lat, lng in agregados:
+        _, puntos = por_recorrido.setdefault(recorrido["id"], (recorrido, []))
+        timestamps = format_timestamps(np.asarray(ts, dtype=np.int64))
+        lats, lngs = np.asarray(lat, dtype=np.float64).tolist(), np.asarray(lng, dtype=np.float64).tolist()
+        puntos.extend({"lat": la, "lng": ln, "timestamp": t} for la, ln, t in zip(lats, lngs, timestamps))
+    for recorrido, puntos in por_recorrido.values():
+        puntos.sort(key=lambda p: p["timestamp"])
+        live.publish(mc_id, "puntos", {"recorrido": _resumen_recorrido(recorrido), "puntos": puntos})
+
+def _restaurar_montacarga(mc_id: int, ventana, filtro) -> None:
+    """Deshace la deduplicación y el filtro GPS de puntos que no quedaron almacenados"""
+    # Un reenvío no debe tomarse por duplicado ni filtrarse contra puntos que no existen
+    if dedup is not None:
+        dedup.restore(mc_id, ventana)
+    if gps_filter is not None:
+        gps_filter.restore(mc_id, filtro)
+
+def _actualizar_derivados(funcion, args, agregados, estado_anterior, estado):
+    """Zonas, mapa de calor, alertas y eventos en vivo de un item ya almacenado"""
+    mc_id = args[0]
+    if len(geofence.index):
+        _actualizar_zonas(funcion, args)
+    _actualizar_heatmap(funcion, args)
+    if alerts.reglas:
+        _evaluar_alertas(funcion, args)
+
+    if agregados is not None:
+        _publicar_puntos(mc_id, agregados)
+        if estado != estado_anterior:
+            live.publish(mc_id, "estado", {"estado": estado})
+
+# Micro-lote de la cola en curso (ver _lote_ingesta)
+_lote: Optional[dict] = None
+
+def _aplicar_ingesta(item):
+    """Aplica al store un item encolado: (función de app.ingest, argumentos)"""
+    funcion, args = item
+    mc_id = args[0]
+    ventana = dedup.checkpoint(mc_id) if dedup is not None else None
+    filtro = gps_filter.checkpoint(mc_id) if gps_filter is not None else None
+    if _lote is not None:
+        _lote["montacargas"].setdefault(mc_id, (ventana, filtro))
+    if dedup is not None:
+        args = _sin_duplicados(funcion, args)
+        if args is None:
+            return
+    _cargar_dias_guardados(mc_id, args[1])
+    estado_anterior = store.get_montacarga(mc_id)["estado"]
+    # Solo se anotan los puntos almacenados si alguien los va a recibir
+    agregados = [] if live.has_subscribers(mc_id) else None
+    try:
+        # Un item que falla no deja escrituras parciales (savepoint del backend sqlite)
+        with etapa("aplicar_ingesta"), store.savepoint():
+            resultado = funcion(store, *args, filtro=gps_filter, agregados=agregados)
+    except Exception:
+        _restaurar_montacarga(mc_id, ventana, filtro)
+        raise
+    for recorrido in (resultado if isinstance(resultado, list) else [resultado] if resultado else []):
+        simplify_cache.invalidate(recorrido["id"])
+
+    derivados = (funcion, args, agregados, estado_anterior, store.get_montacarga(mc_id)["estado"])
+    if _lote is None:
+        _actualizar_derivados(*derivados)
+    else:
+        _lote["derivados"].append(derivados)
+
+@contextmanager
+def _lote_ingesta():
+    """
+    Cada micro-lote de la cola se escribe en una sola transacción (backend sqlite).
+    Zonas, mapa de calor, alertas y eventos en vivo se actualizan al confirmarla;
+    si no se confirma, se deshacen la deduplicación y el filtro GPS del lote.
+    """
+    global _lote
+    lote = _lote = {"derivados": [], "montacargas": {}}
+    try:
+        with store.write_batch():
+            yield
+    except BaseException:
+        for mc_id, (ventana, filtro) in lote["montacargas"].items():
+            _restaurar_montacarga(mc_id, ventana, filtro)
+        raise
+    finally:
+        _lote = None
+    for derivados in lote["derivados"]:
+        try:
+            _actualizar_derivados(*derivados)
+        except Exception:
+            logger.exception("Error actualizando zonas, mapa de calor o alertas")
+            ERRORES_INGESTA.labels("cola", "interno").inc()
+
+# Los fallos del consumidor cuentan como errores de ingesta (endpoint "cola")
+ingest_queue = IngestQueue(
+    _aplicar_ingesta,
+    contexto_lote=_lote_ingesta,
+    al_fallar=lambda e: ERRORES_INGESTA.labels("cola", "interno").inc(),
+)
+
+# Gauges calculados en cada scrape de /metrics
+metrics.registry.register(Gauge(
+    "reto_store_recorridos", "Recorridos almacenados", lambda: store.count_recorridos()
+))
+metrics.registry.register(Gauge(
+    "reto_store_puntos", "Puntos almacenados en todos los recorridos", lambda: store.count_puntos()
+))
+metrics.registry.register(Gauge(
+    "reto_ingest_queue_depth", "Items pendientes en la cola de ingesta", lambda: ingest_queue.depth
+))
+metrics.registry.register(Gauge(
+    "reto_ingest_queue_lag_seconds", "Antigüedad del item más antiguo de la cola", lambda: ingest_queue.stats()["lag_s"]
+))
+
+# ========== CICLO DE VIDA ==========
+
+@app.on_event("startup")
+async def iniciar_servicios():
+    global store, telemetry_log, recovery_info, shared_log, trip_archive
+    if ARCHIVE_DIR and TELEMETRY_STORE == "memory" and not SHARED_STATE_DIR:
+        trip_archive = TripArchive(ARCHIVE_DIR, ARCHIVE_CACHE_CHUNKS)
+    if SHARED_STATE_DIR and TELEMETRY_STORE == "memory":
+        # Lo ya escrito se aplica antes de atender; lo nuevo, a medida que llega
+        store, shared_log, recovery_info = open_shared(
+            SHARED_STATE_DIR, store, SHARED_LOG_PARTITIONS, gps_filter, dedup, alerts
+        )
+        app.state.tarea_log = asyncio.create_task(_seguir_log_compartido())
+    elif TELEMETRY_LOG_DIR and TELEMETRY_STORE == "memory":
+        store, telemetry_log, recovery_info = recover(TELEMETRY_LOG_DIR, store, gps_filter, trip_archive, dedup, alerts)
+        app.state.tarea_log = asyncio.create_task(_mantener_log())
+    elif trip_archive is not None:
+        store.attach_archive(trip_archive)
+    # El mapa de calor parte de los puntos en memoria (datos iniciales y recuperados);
+    # los días archivados o guardados en sqlite solo se registran y se cargan cuando
+    # una consulta los pide
+    if TELEMETRY_STORE == "sqlite":
+        for clave in store.dias(_fecha(heatmap.retention_start())):
+            heatmap_pendientes[tuple(clave)] = None
+    else:
+        for recorrido in store.list_recorridos(archivados=False):
+            puntos = recorrido["puntos_recorrido"]
+            heatmap.ingest(recorrido["montacarga_id"], puntos.ts, puntos.lat, puntos.lng, puntos.speed)
+    if trip_archive is not None:
+        for entrada in trip_archive.entries():
+            ids = {meta["id"] for meta in entrada["recorridos"] if store.is_archived(meta["id"])}
+            if ids:
+                heatmap_pendientes[(entrada["mc_id"], entrada["fecha"])] = ids
+        app.state.tarea_retencion = asyncio.create_task(_mantener_retencion())
+    app.state.tarea_alertas = asyncio.create_task(_revisar_sin_datos())
+    ingest_queue.start()
+
+@app.on_event("shutdown")
+async def detener_servicios():
+    global telemetry_log
+    app.state.tarea_alertas.cancel()
+    if shared_log is not None:
+        app.state.tarea_log.cancel()
+    # Aplicar todo lo encolado antes de compactar el log
+    await ingest_queue.stop()
+    if shared_log is not None:
+        shared_log.close()
+    if telemetry_log is not None:
+        app.state.tarea_log.cancel()
+        if snapshot_en_curso is not None:
+            # Un snapshot posterior no puede terminar antes que el de la compactación en curso
+            await asyncio.wait([snapshot_en_curso])
+        telemetry_log = compact(store, telemetry_log, gps_filter, dedup, alerts)
+        telemetry_log.close()
+    if trip_archive is not None:
+        app.state.tarea_retencion.cancel()
+        trip_archive.close()
+    geocoder.close()
+
 # Rutas de la API
 @app.get("/")
 async def root():
@@ -231,7 +849,20 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "message": "API funcionando correctamente"}
+    return {
+        "status": "healthy",
+        "message": "API funcionando correctamente",
+        "api_version": API_VERSION,
+        "uptime_s": round(time.monotonic() - INICIO_PROCESO, 1),
+        "ingest_queue_depth": ingest_queue.depth,
+        "recovery": recovery_info,
+        "archivo": trip_archive.stats() if trip_archive is not None else None
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Métricas en formato de texto de Prometheus"""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/api/items", response_model=List[Item])
 async def get_items():
@@ -262,47 +893,216 @@ async def delete_item(item_id: int):
 # Nuevas rutas para el dashboard de montacargas
 @app.get("/api/montacargas", response_model=List[Montacarga])
 async def get_montacargas():
-    return montacargas_db
+    return store.list_montacargas()
 
 @app.get("/api/montacargas/{montacarga_id}", response_model=Montacarga)
 async def get_montacarga(montacarga_id: int):
-    for montacarga in montacargas_db:
-        if montacarga["id"] == montacarga_id:
-            return montacarga
+    montacarga = store.get_montacarga(montacarga_id)
+    if montacarga:
+        return montacarga
     return {"error": "Montacarga no encontrado"}
 
-@app.get("/api/recorridos", response_model=List[Recorrido])
-async def get_recorridos():
-    return recorridos_db
+# Campos que acepta la proyección ?fields= de los listados de recorridos
+CAMPOS_RECORRIDO = tuple(Recorrido.model_fields) + ("total_puntos",)
+MAX_LIMIT_RECORRIDOS = 1000
+
+def _parse_fields(fields: Optional[str]) -> tuple:
+    if fields is None:
+        return tuple(Recorrido.model_fields)
+    campos = tuple(c.strip() for c in fields.split(",") if c.strip())
+    desconocidos = [c for c in campos if c not in CAMPOS_RECORRIDO]
+    if desconocidos:
+        raise HTTPException(status_code=400, detail=f"Campos desconocidos: {', '.join(desconocidos)}")
+    return campos
+
+def _parse_since(since: Optional[str]) -> dict:
+    """
+    since= timestamp ISO o epoch en segundos: solo los puntos con ts posterior.
+    Los puntos tardíos con ts anterior no se reenvían (llegan por /api/live y /ws/live)
+    """
+    if since is None:
+        return {}
+    if since.isdigit():
+        return {"since_ts": int(since)}
+    try:
+        return {"since_ts": parse_timestamp(since)}
+    except ValueError:
+        raise HTTPException(status_code=400, detail="since debe ser un timestamp ISO o epoch en segundos")
+
+def _indices_simplificados(recorrido: dict, zoom: Optional[int]):
+    """Índices de la ruta simplificada para el zoom del mapa (cacheados por recorrido y tolerancia)"""
+    puntos = recorrido["puntos_recorrido"]
+    if zoom is None or len(puntos) < 3:
+        return None
+    tolerancia = tolerancia_zoom(zoom, float(puntos.lat[0]))
+    return simplify_cache.indices(recorrido["id"], puntos, tolerancia)
+
+# Los listados responden JSONResponse (sin response_model): el esquema se documenta aparte
+RESPUESTAS_PAGINA = {200: {
+    "model": List[RecorridoParcial],
+    "description": "Página de recorridos con los campos pedidos",
+    "headers": {"X-Next-Cursor": {
+        "description": "Cursor de la página siguiente (solo si la página está completa)",
+        "schema": {"type": "string"},
+    }},
+}}
+
+async def _pagina_recorridos(montacarga_id: Optional[int], cursor: Optional[int], limit: Optional[int],
+                       fields: Optional[str], since: Optional[str],
+                       desde: Optional[str], hasta: Optional[str],
+                       simplify: Optional[int] = None, format: str = "json") -> JSONResponse:
+    """
+    Serializa una página de recorridos sin pasar por la validación del response_model
+    (los datos ya vienen del store). X-Next-Cursor indica el cursor de la página siguiente.
+    """
+    campos = _parse_fields(fields)
+    filtros = _parse_since(since)
+    con_puntos = "puntos_recorrido" in campos or "total_puntos" in campos or bool(filtros)
+    # Con archivo, los puntos de los archivados se cargan después, fuera del loop
+    pagina = store.page_recorridos(montacarga_id, cursor, limit, desde, hasta,
+                                   con_puntos=con_puntos and trip_archive is None)
+    headers = {}
+    if limit is not None and len(pagina) == limit:
+        headers["X-Next-Cursor"] = str(pagina[-1]["id"])
+    if con_puntos and trip_archive is not None:
+        pagina = await _con_puntos_archivados(pagina)
+    simplificar = simplify is not None and "puntos_recorrido" in campos
+    with etapa("serializacion"):
+        return JSONResponse([
+            serialize_recorrido(
+                r, campos, **filtros,
+                indices=_indices_simplificados(r, simplify) if simplificar else None,
+                formato=format
+            )
+            for r in pagina
+        ], headers=headers)
+
+@app.get("/api/recorridos", response_model=None, responses=RESPUESTAS_PAGINA)
+async def get_recorridos(
+    cursor: Optional[int] = Query(None, description="Id del último recorrido de la página anterior"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_LIMIT_RECORRIDOS),
+    fields: Optional[str] = Query(None, description="Campos separados por coma, p. ej. id,fecha,distancia_km"),
+    since: Optional[str] = Query(None, description="Solo puntos posteriores a un timestamp ISO o epoch en segundos"),
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+    simplify: Optional[int] = Query(None, ge=0, le=22, description="Zoom del mapa: ruta simplificada (RDP)"),
+    format: str = Query("json", pattern="^(json|polyline)$", description="json o polyline codificada")
+):
+    """
+    Recorridos paginados por cursor (orden de id), con proyección de campos,
+    puntos incrementales (since), filtro por fechas desde/hasta (YYYY-MM-DD)
+    y ruta simplificada según el zoom del mapa
+    """
+    return await _pagina_recorridos(None, cursor, limit, fields, since, desde, hasta, simplify, format)
+
+@app.get("/api/recorridos/montacarga/{montacarga_id}", response_model=None, responses=RESPUESTAS_PAGINA)
+async def get_recorridos_by_montacarga(
+    montacarga_id: int,
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+    cursor: Optional[int] = Query(None, description="Id del último recorrido de la página anterior"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_LIMIT_RECORRIDOS),
+    fields: Optional[str] = Query(None, description="Campos separados por coma, p. ej. id,fecha,distancia_km"),
+    since: Optional[str] = Query(None, description="Solo puntos posteriores a un timestamp ISO o epoch en segundos"),
+    simplify: Optional[int] = Query(None, ge=0, le=22, description="Zoom del mapa: ruta simplificada (RDP)"),
+    format: str = Query("json", pattern="^(json|polyline)$", description="json o polyline codificada")
+):
+    """Recorridos de un montacarga, opcionalmente entre las fechas desde/hasta (YYYY-MM-DD)"""
+    return await _pagina_recorridos(montacarga_id, cursor, limit, fields, since, desde, hasta, simplify, format)
+
+@app.get("/api/recorridos/{recorrido_id}/puntos", response_model=List[PuntoRecorrido])
+async def get_puntos_recorrido(recorrido_id: int, desde: str, hasta: str):
+    """Puntos de un recorrido dentro de una ventana de tiempo (timestamps ISO)"""
+    if not store.has_recorrido(recorrido_id):
+        raise HTTPException(status_code=404, detail="Recorrido no encontrado")
+    try:
+        desde_ts, hasta_ts = parse_timestamp(desde), parse_timestamp(hasta)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Timestamps desde/hasta inválidos")
+    await _precargar_archivado(recorrido_id)
+    return store.puntos_en_ventana(recorrido_id, desde_ts, hasta_ts).to_dicts()
 
-@app.get("/api/recorridos/montacarga/{montacarga_id}", response_model=List[Recorrido])
-async def get_recorridos_by_montacarga(montacarga_id: int):
-    return [r for r in recorridos_db if r["montacarga_id"] == montacarga_id]
+@app.post("/api/recorridos/{recorrido_id}/recalcular", response_model=Recorrido)
+async def recalcular_recorrido(recorrido_id: int):
+    """
+    Recalcula en bloque las métricas de un recorrido (backfill o corrección de puntos)
+    """
+    await _precargar_archivado(recorrido_id)
+    recorrido = store.get_recorrido(recorrido_id)
+    if not recorrido:
+        raise HTTPException(status_code=404, detail="Recorrido no encontrado")
+    recompute_trip_metrics(recorrido)
+    store.refresh_recorrido(recorrido)
+    return serialize_recorrido(recorrido)
 
 @app.get("/api/dashboard/stats")
-async def get_dashboard_stats():
-    total_recorridos = len(recorridos_db)
-    distancia_total = sum(r["distancia_km"] for r in recorridos_db)
-    
-    # Calcular tiempo total
-    tiempo_total = 0
-    for rec in recorridos_db:
-        inicio = rec["hora_inicio"].split(":")
-        fin = rec["hora_fin"].split(":")
-        tiempo_inicio = int(inicio[0]) * 60 + int(inicio[1])
-        tiempo_fin = int(fin[0]) * 60 + int(fin[1])
-        tiempo_total += tiempo_fin - tiempo_inicio
-    
-    velocidad_promedio = (distancia_total / (tiempo_total / 60)) if tiempo_total > 0 else 0
-    
-    return {
-        "total_recorridos": total_recorridos,
-        "distancia_total": round(distancia_total, 2),
-        "tiempo_total": tiempo_total,
-        "velocidad_promedio": round(velocidad_promedio, 2),
-        "montacargas_activos": len([m for m in montacargas_db if m["estado"] == "Activo"]),
-        "montacargas_mantenimiento": len([m for m in montacargas_db if m["estado"] == "Mantenimiento"])
-    }
+async def get_dashboard_stats(desde: Optional[str] = None, hasta: Optional[str] = None):
+    """
+    Estadísticas del dashboard desde contadores incrementales (O(1)).
+    Con desde/hasta (YYYY-MM-DD) se suman los agregados diarios del rango.
+    """
+    return store.aggregates.stats(desde, hasta)
+
+# ========== ANALÍTICA ==========
+
+@app.get("/api/analytics/heatmap")
+async def get_heatmap(
+    lat_min: float = Query(..., ge=-90, le=90),
+    lat_max: float = Query(..., ge=-90, le=90),
+    lng_min: float = Query(..., ge=-180, le=180),
+    lng_max: float = Query(..., ge=-180, le=180),
+    desde: Optional[str] = Query(None, description="Timestamp ISO de inicio de la ventana"),
+    hasta: Optional[str] = Query(None, description="Timestamp ISO de fin de la ventana"),
+    resolucion: Optional[int] = Query(None, ge=0, le=len(heatmap.tamanos) - 1,
+                                      description="0 (celdas grandes) a 3 (~11 m); automática si se omite")
+):
+    """
+    Visitas, permanencia (s) y velocidad media por celda dentro del rectángulo,
+    sumadas desde las grillas pre-agregadas por hora
+    """
+    if lat_min > lat_max or lng_min > lng_max:
+        raise HTTPException(status_code=400, detail="Rectángulo inválido: min mayor que max")
+    try:
+        desde_ts = parse_timestamp(desde) if desde else None
+        hasta_ts = parse_timestamp(hasta) if hasta else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Timestamps desde/hasta inválidos")
+    await _cargar_heatmap_pendiente(desde_ts, hasta_ts)
+    return heatmap.query(lat_min, lat_max, lng_min, lng_max, desde_ts, hasta_ts, resolucion)
+
+# ========== GEOCERCAS ==========
+
+@app.get("/api/zonas")
+async def get_zonas():
+    return list(geofence.index.zonas.values())
+
+@app.get("/api/zonas/ocupacion")
+async def get_ocupacion_zonas():
+    """Montacargas dentro de cada zona y tiempo de permanencia acumulado (s)"""
+    return geofence.ocupacion()
+
+@app.get("/api/zonas/eventos")
+async def get_eventos_zonas(mc_id: Optional[int] = None, limit: int = Query(100, ge=1, le=1000)):
+    """Últimas entradas/salidas de zona (más recientes primero)"""
+    eventos = [e for e in reversed(geofence.eventos) if mc_id is None or e["mc_id"] == mc_id]
+    return eventos[:limit]
+
+# ========== ALERTAS ==========
+
+@app.get("/api/alertas")
+async def get_alertas(mc_id: Optional[int] = None):
+    """Alertas activas (opcionalmente de un montacarga)"""
+    return alerts.active(mc_id)
+
+@app.get("/api/alertas/eventos")
+async def get_eventos_alertas(mc_id: Optional[int] = None, limit: int = Query(100, ge=1, le=1000)):
+    """Últimas activaciones y resoluciones de alertas (más recientes primero)"""
+    eventos = [e for e in reversed(alerts.eventos) if mc_id is None or e["mc_id"] == mc_id]
+    return eventos[:limit]
+
+@app.get("/api/alertas/reglas")
+async def get_reglas_alertas():
+    return {"reglas": alerts.reglas, **alerts.stats()}
 
 # ========== ENDPOINTS PARA MICROCONTROLADOR ==========
 
@@ -314,120 +1114,220 @@ async def receive_microcontroller_data(data: MicrocontrollerData):
     """
     try:
         # Validar que el montacarga existe
-        montacarga_exists = any(m["id"] == data.mc_id for m in montacargas_db)
-        if not montacarga_exists:
+        if not store.has_montacarga(data.mc_id):
             raise HTTPException(status_code=404, detail=f"Montacarga {data.mc_id} no encontrado")
         
-        # Crear punto de recorrido
-        nuevo_punto = {
-            "lat": data.lat,
-            "lng": data.lng,
-            "timestamp": data.timestamp
-        }
-        
-        # Buscar recorrido activo del día o crear uno nuevo
-        fecha_hoy = data.timestamp.split('T')[0]
-        recorrido_activo = None
-        
-        for rec in recorridos_db:
-            if rec["montacarga_id"] == data.mc_id and rec["fecha"] == fecha_hoy:
-                recorrido_activo = rec
-                break
-        
-        if not recorrido_activo:
-            # Crear nuevo recorrido
-            nuevo_recorrido = {
-                "id": len(recorridos_db) + 1,
-                "montacarga_id": data.mc_id,
-                "fecha": fecha_hoy,
-                "hora_inicio": data.timestamp.split('T')[1][:5],
-                "hora_fin": data.timestamp.split('T')[1][:5],
-                "distancia_km": 0.0,
-                "puntos_recorrido": [nuevo_punto],
-                "tiempo_minutos": 0,
-                "velocidad_actual": data.speed or 0,
-                "bateria": data.battery or 100,
-                "estado": data.status or "active"
-            }
-            recorridos_db.append(nuevo_recorrido)
+        # El timestamp se interpreta una sola vez: log y cola reciben segundos epoch
+        with etapa("validacion"):
+            ts = parse_timestamp(data.timestamp)
+            if ts > _ts_limite():
+                raise ValueError(f"timestamp {data.timestamp} posterior a la hora del servidor")
+        if shared_log is not None:
+            # Se aplica al leerlo del log compartido (en todos los workers)
+            shared_log.append(
+                data.mc_id, ts, data.lat, data.lng,
+                data.speed or 0, 100 if data.battery is None else data.battery, data.status or "active"
+            )
         else:
-            # Actualizar recorrido existente
-            recorrido_activo["puntos_recorrido"].append(nuevo_punto)
-            recorrido_activo["hora_fin"] = data.timestamp.split('T')[1][:5]
-            
-            # Calcular distancia aproximada (simplificada)
-            if len(recorrido_activo["puntos_recorrido"]) > 1:
-                puntos = recorrido_activo["puntos_recorrido"]
-                ultimo = puntos[-2]
-                actual = puntos[-1]
-                # Fórmula simplificada de distancia
-                dist_aprox = ((actual["lat"] - ultimo["lat"])**2 + (actual["lng"] - ultimo["lng"])**2)**0.5 * 111
-                recorrido_activo["distancia_km"] += dist_aprox
+            if telemetry_log is not None:
+                telemetry_log.append(
+                    data.mc_id, ts, data.lat, data.lng,
+                    data.speed or 0, 100 if data.battery is None else data.battery, data.status or "active"
+                )
+            await ingest_queue.submit((append_point, (
+                data.mc_id, ts, data.lat, data.lng,
+                data.speed or 0, 100 if data.battery is None else data.battery, data.status or "active"
+            )))
+        _contar_ingesta("data", data.mc_id, 1)
         
-        # Actualizar estado del montacarga
-        for montacarga in montacargas_db:
-            if montacarga["id"] == data.mc_id:
-                if data.status == "maintenance":
-                    montacarga["estado"] = "Mantenimiento"
-                else:
-                    montacarga["estado"] = "Activo"
-                break
-        
-        return MicrocontrollerResponse(
-            success=True,
-            message="Datos recibidos correctamente",
-            next_upload_in=30,  # Próximo envío en 30 segundos
-            server_time=datetime.now().isoformat()
-        )
+        with etapa("respuesta"):
+            return MicrocontrollerResponse(
+                success=True,
+                message="Datos recibidos correctamente",
+                next_upload_in=ingest_queue.next_upload_in(30),  # Próximo envío en 30 segundos (más si la cola está llena)
+                server_time=datetime.now().isoformat()
+            )
         
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error procesando datos: {str(e)}")
+        raise _error_ingesta("data", e)
+
+def _validar_lote(data: List[dict]):
+    """
+    Valida los puntos compactos de un lote. Devuelve los puntos válidos,
+    sus índices originales y los índices rechazados.
+    """
+    try:
+        return _lote_adapter.validate_python(data), list(range(len(data))), []
+    except ValidationError as e:
+        rechazados = sorted({error["loc"][0] for error in e.errors()})
+    
+    excluidos = set(rechazados)
+    indices = [i for i in range(len(data)) if i not in excluidos]
+    return _lote_adapter.validate_python([data[i] for i in indices]), indices, rechazados
 
-@app.post("/api/microcontroller/batch", response_model=MicrocontrollerResponse)
+@app.post("/api/microcontroller/batch", response_model=MicrocontrollerBatchResponse)
 async def receive_batch_data(batch: MicrocontrollerBatch):
     """
     Endpoint para recibir datos en lote (más eficiente para conexiones intermitentes)
     Ejemplo de uso cuando el microcontrolador almacena datos offline
+    
+    Los puntos se validan en una sola pasada; los inválidos se rechazan
+    individualmente sin afectar al resto del lote.
     """
+    if not store.has_montacarga(batch.mc_id):
+        raise HTTPException(status_code=404, detail=f"Montacarga {batch.mc_id} no encontrado")
+    
     try:
-        montacarga_exists = any(m["id"] == batch.mc_id for m in montacargas_db)
-        if not montacarga_exists:
-            raise HTTPException(status_code=404, detail=f"Montacarga {batch.mc_id} no encontrado")
+        # Validar todo el lote con el modelo tipado en una sola pasada
+        with etapa("validacion"):
+            puntos, indices, errores = _validar_lote(batch.data)
+            ts, invalidos = parse_timestamps([p.t for p in puntos])
+            futuros = np.flatnonzero(ts > _ts_limite()).tolist()
+            if futuros:
+                invalidos = sorted(set(invalidos) | set(futuros))
+            if invalidos:
+                errores = sorted(errores + [indices[i] for i in invalidos])
+                validos = np.ones(len(puntos), dtype=bool)
+                validos[invalidos] = False
+                ts = ts[validos]
+                puntos = [p for p, ok in zip(puntos, validos.tolist()) if ok]
+            
+            lat = np.array([p.lat for p in puntos], dtype=np.float64)
+            lng = np.array([p.lng for p in puntos], dtype=np.float64)
+            speed = np.array([p.s or 0 for p in puntos], dtype=np.float32)
+            battery = np.array([100 if p.b is None else p.b for p in puntos], dtype=np.uint8)
+            status = [p.st or "active" for p in puntos]
+            # En orden de timestamp: al re-aplicar el log (en_orden) el envío es un solo tramo
+            if len(ts) > 1 and np.any(ts[1:] < ts[:-1]):
+                orden = np.argsort(ts, kind="stable")
+                ts, lat, lng, speed, battery = ts[orden], lat[orden], lng[orden], speed[orden], battery[orden]
+                status = [status[i] for i in orden.tolist()]
         
-        puntos_procesados = 0
+        if shared_log is not None:
+            shared_log.append_many(batch.mc_id, ts, lat, lng, speed, battery, status)
+        else:
+            if telemetry_log is not None:
+                telemetry_log.append_many(batch.mc_id, ts, lat, lng, speed, battery, status)
+            await ingest_queue.submit((append_points, (batch.mc_id, ts, lat, lng, speed, battery, status)))
+        _contar_ingesta("batch", batch.mc_id, len(puntos))
         
-        for punto_data in batch.data:
-            # Procesar cada punto del lote
-            punto = MicrocontrollerData(
-                mc_id=batch.mc_id,
-                timestamp=punto_data.get("t"),
-                lat=punto_data.get("lat"),
-                lng=punto_data.get("lng"),
-                speed=punto_data.get("s", 0),
-                battery=punto_data.get("b", 100),
-                status=punto_data.get("st", "active")
+        with etapa("respuesta"):
+            return MicrocontrollerBatchResponse(
+                success=len(puntos) > 0 or not batch.data,
+                message=f"Lote procesado: {len(puntos)} puntos",
+                next_upload_in=ingest_queue.next_upload_in(120),  # Próximo lote en 2 minutos (más si la cola está llena)
+                server_time=datetime.now().isoformat(),
+                accepted=len(puntos),
+                rejected=len(errores),
+                rejected_indices=errores[:MAX_INDICES_RECHAZADOS]
             )
-            
-            # Usar la misma lógica del endpoint individual
-            await receive_microcontroller_data(punto)
-            puntos_procesados += 1
-        
-        return MicrocontrollerResponse(
-            success=True,
-            message=f"Lote procesado: {puntos_procesados} puntos",
-            next_upload_in=120,  # Próximo lote en 2 minutos
-            server_time=datetime.now().isoformat()
-        )
         
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error procesando lote: {str(e)}")
+        raise _error_ingesta("batch", e)
+
+@app.post("/api/microcontroller/binary", response_model=MicrocontrollerBatchResponse)
+async def receive_binary_data(request: Request):
+    """
+    Lote en formato binario compacto (application/octet-stream, 14 bytes por punto).
+    Ver app/binary_upload.py y MICROCONTROLLER_API.md para el formato.
+    """
+    cuerpo = await request.body()
+    try:
+        with etapa("validacion"):
+            mc_id, ts, lat, lng, speed, battery, codigos = decode_upload(cuerpo)
+    except BinaryFormatError as e:
+        raise _error_ingesta("binary", e)
+    if not store.has_montacarga(mc_id):
+        raise HTTPException(status_code=404, detail=f"Montacarga {mc_id} no encontrado")
+
+    try:
+        with etapa("validacion"):
+            validos = (np.abs(lat) <= 90) & (np.abs(lng) <= 180) & (battery <= 100) & (ts <= _ts_limite())
+            errores = np.flatnonzero(~validos).tolist()
+            if errores:
+                ts, lat, lng, speed, battery, codigos = (
+                    v[validos] for v in (ts, lat, lng, speed, battery, codigos)
+                )
+            # Códigos desconocidos se guardan como active (igual que status_name)
+            status = np.asarray(STATUS_NAMES)[np.where(codigos < len(STATUS_NAMES), codigos, 0)].tolist()
+
+        if len(ts):
+            if shared_log is not None:
+                shared_log.append_many(mc_id, ts, lat, lng, speed, battery, status)
+            else:
+                if telemetry_log is not None:
+                    telemetry_log.append_many(mc_id, ts, lat, lng, speed, battery, status)
+                await ingest_queue.submit((append_points, (mc_id, ts, lat, lng, speed, battery, status)))
+        _contar_ingesta("binary", mc_id, len(ts))
+
+        with etapa("respuesta"):
+            return MicrocontrollerBatchResponse(
+                success=len(ts) > 0 or not errores,
+                message=f"Lote procesado: {len(ts)} puntos",
+                next_upload_in=ingest_queue.next_upload_in(120),
+                server_time=datetime.now().isoformat(),
+                accepted=len(ts),
+                rejected=len(errores),
+                rejected_indices=errores[:MAX_INDICES_RECHAZADOS]
+            )
+
+    except Exception as e:
+        raise _error_ingesta("binary", e)
+
+# ========== STREAM EN VIVO ==========
+
+@app.get("/api/live")
+async def live_stream(mc_id: Optional[List[int]] = Query(None)):
+    """
+    Server-Sent Events con los puntos nuevos ("puntos") y cambios de estado ("estado").
+    Filtrar con ?mc_id=1&mc_id=2; sin filtro se reciben todos los montacargas.
+    """
+    return StreamingResponse(
+        live.sse_stream(mc_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/ws/live")
+async def live_websocket(websocket: WebSocket, mc_id: Optional[List[int]] = Query(None)):
+    """Mismos eventos que /api/live, como mensajes JSON por WebSocket"""
+    await websocket.accept()
+    suscriptor = live.subscribe(mc_id)
+
+    async def enviar_eventos():
+        while True:
+            evento = await suscriptor.cola.get()
+            await websocket.send_text(evento.json)
+
+    envio = asyncio.create_task(enviar_eventos())
+    try:
+        # Esperar la desconexión del cliente mientras se envían los eventos
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    except WebSocketDisconnect:
+        pass
+    finally:
+        envio.cancel()
+        live.unsubscribe(suscriptor)
+
+@app.get("/api/ingest/queue")
+async def get_ingest_queue_stats():
+    """Profundidad y retraso (lag) de la cola de ingesta y contadores del filtro GPS y de la deduplicación"""
+    estadisticas = ingest_queue.stats()
+    if gps_filter is not None:
+        estadisticas["filtro_gps"] = gps_filter.stats()
+    if dedup is not None:
+        estadisticas["deduplicacion"] = dedup.stats()
+    return estadisticas
 
 @app.get("/api/microcontroller/config/{mc_id}")
 async def get_microcontroller_config(mc_id: int):
     """
     Endpoint para que el microcontrolador obtenga su configuración
     """
-    montacarga = next((m for m in montacargas_db if m["id"] == mc_id), None)
+    montacarga = store.get_montacarga(mc_id)
     if not montacarga:
         raise HTTPException(status_code=404, detail="Montacarga no encontrado")
     
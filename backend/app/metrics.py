@@ -0,0 +1,228 @@
+"""
+Métricas estilo Prometheus (formato de texto de exposición 0.0.4), sin dependencias
+
+- Counter e Histogram con etiquetas: `metrica.labels("1").inc()`.
+- Gauges calculados al momento del scrape (tamaño del store, cola de ingesta).
+- `etapa("nombre")`: context manager que mide una etapa interna del hot path
+  (validación, búsqueda de recorrido, métricas de distancia, respuesta...).
+- MetricsMiddleware: latencia por ruta (plantilla, no la URL concreta) hasta el
+  inicio de la respuesta, de modo que el SSE no cuenta su duración completa.
+
+Con set_enabled(False), etapa() devuelve un contexto nulo compartido (una
+comprobación de bandera, sin medir ni reservar memoria) y el middleware no se
+instala; las series quedan vacías.
+"""
+
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Buckets de latencia en segundos (de 100 us a 10 s)
+BUCKETS_LATENCIA = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0)
+BUCKETS_LOTE = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+_habilitado = True
+_NULO = nullcontext()
+
+
+def set_enabled(habilitado: bool) -> None:
+    global _habilitado
+    _habilitado = habilitado
+
+
+def enabled() -> bool:
+    return _habilitado
+
+
+def _etiquetas(nombres: Sequence[str], valores: Tuple[str, ...]) -> str:
+    if not nombres:
+        return ""
+    pares = ",".join(f'{n}="{str(v)}"' for n, v in zip(nombres, valores))
+    return "{" + pares + "}"
+
+
+def _numero(valor: float) -> str:
+    return str(int(valor)) if float(valor).is_integer() else repr(float(valor))
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._hijos: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *valores):
+        hijo = self._hijos.get(valores)
+        if hijo is None:
+            hijo = self._hijos[valores] = self._nuevo_hijo()
+        return hijo
+
+    def _nuevo_hijo(self):
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+        for valores, hijo in sorted(self._hijos.items()):
+            lineas += self._render_hijo(_etiquetas(self.etiquetas, valores), valores, hijo)
+        return lineas
+
+
+class _ValorContador:
+    __slots__ = ("valor",)
+
+    def __init__(self):
+        self.valor = 0.0
+
+    def inc(self, cantidad: float = 1) -> None:
+        self.valor += cantidad
+
+
+class Counter(_Metrica):
+    tipo = "counter"
+
+    def _nuevo_hijo(self):
+        return _ValorContador()
+
+    def inc(self, cantidad: float = 1) -> None:
+        self.labels().inc(cantidad)
+
+    def _render_hijo(self, etiquetas, valores, hijo):
+        return [f"{self.nombre}{etiquetas} {_numero(hijo.valor)}"]
+
+
+class _ValorHistograma:
+    __slots__ = ("limites", "conteos", "suma", "total")
+
+    def __init__(self, limites: Tuple[float, ...]):
+        self.limites = limites
+        self.conteos = [0] * len(limites)
+        self.suma = 0.0
+        self.total = 0
+
+    def observe(self, valor: float) -> None:
+        self.suma += valor
+        self.total += 1
+        i = bisect_left(self.limites, valor)
+        if i < len(self.conteos):
+            self.conteos[i] += 1
+
+
+class Histogram(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (),
+                 buckets: Sequence[float] = BUCKETS_LATENCIA):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(buckets)
+
+    def _nuevo_hijo(self):
+        return _ValorHistograma(self.buckets)
+
+    def observe(self, valor: float) -> None:
+        self.labels().observe(valor)
+
+    def _render_hijo(self, etiquetas, valores, hijo):
+        lineas = []
+        acumulado = 0
+        for limite, conteo in zip(self.buckets, hijo.conteos):
+            acumulado += conteo
+            le = _etiquetas(self.etiquetas + ("le",), valores + (_numero(limite),))
+            lineas.append(f"{self.nombre}_bucket{le} {acumulado}")
+        le = _etiquetas(self.etiquetas + ("le",), valores + ("+Inf",))
+        lineas.append(f"{self.nombre}_bucket{le} {hijo.total}")
+        lineas.append(f"{self.nombre}_sum{etiquetas} {repr(hijo.suma)}")
+        lineas.append(f"{self.nombre}_count{etiquetas} {hijo.total}")
+        return lineas
+
+
+class Gauge:
+    """Gauge calculado al hacer scrape: la función devuelve un valor o {etiquetas: valor}"""
+
+    def __init__(self, nombre: str, ayuda: str, funcion: Callable, etiquetas: Sequence[str] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.funcion = funcion
+        self.etiquetas = tuple(etiquetas)
+
+    def render(self) -> List[str]:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} gauge"]
+        valor = self.funcion()
+        valores = valor.items() if isinstance(valor, dict) else [((), valor)]
+        for etiquetas, v in sorted(valores):
+            etiquetas = etiquetas if isinstance(etiquetas, tuple) else (etiquetas,)
+            lineas.append(f"{self.nombre}{_etiquetas(self.etiquetas, etiquetas)} {_numero(v)}")
+        return lineas
+
+
+class Registry:
+    def __init__(self):
+        self._metricas: List = []
+
+    def register(self, metrica):
+        self._metricas.append(metrica)
+        return metrica
+
+    def render(self) -> str:
+        lineas = []
+        for metrica in self._metricas:
+            lineas += metrica.render()
+        return "\n".join(lineas) + "\n"
+
+
+registry = Registry()
+
+ETAPAS = registry.register(Histogram(
+    "reto_stage_seconds", "Duración de las etapas internas de la ingesta y las consultas", ["etapa"]
+))
+
+
+class _Etapa:
+    __slots__ = ("_hijo", "_inicio")
+
+    def __init__(self, hijo: _ValorHistograma):
+        self._hijo = hijo
+
+    def __enter__(self):
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        self._hijo.observe(time.perf_counter() - self._inicio)
+        return False
+
+
+def etapa(nombre: str):
+    """Mide el bloque en reto_stage_seconds{etapa=nombre}; contexto nulo si está desactivado"""
+    if not _habilitado:
+        return _NULO
+    return _Etapa(ETAPAS.labels(nombre))
+
+
+class MetricsMiddleware:
+    """Middleware ASGI: latencia de las peticiones HTTP por ruta, método y status"""
+
+    def __init__(self, app, latencia: Histogram):
+        self.app = app
+        self.latencia = latencia
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        inicio = time.perf_counter()
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                # La ruta (plantilla con {parametros}) la deja el router en el scope
+                ruta = getattr(scope.get("route"), "path", "sin_ruta")
+                self.latencia.labels(ruta, scope["method"], str(mensaje["status"])).observe(
+                    time.perf_counter() - inicio
+                )
+            await send(mensaje)
+
+        await self.app(scope, receive, enviar)
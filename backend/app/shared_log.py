@@ -0,0 +1,328 @@
+"""
+Log de ingesta compartido entre workers (gunicorn -w N)
+
+Con varios procesos, cada worker tendría su propia copia del store. En su lugar,
+todos los workers escriben los puntos que reciben en un log append-only (mismo
+formato de registro que el log de app/wal.py) y cada uno aplica a su store
+todos los registros del log. Como la ingesta es determinista, los stores de
+todos los workers coinciden (mismos recorridos con los mismos ids).
+
+- Particiones: el log se divide en un archivo por partición de montacarga
+  (mc_id % particiones), cada uno con su propio lock de escritura, así los
+  envíos de montacargas de distintas particiones no se serializan entre sí.
+  Cada worker intercala las particiones en el orden en que las lee, pero el
+  estado no depende de ese orden: un montacarga está en una sola partición
+  (su orden es el de escritura) y los ids de recorridos se reparten por
+  partición (TelemetryStore.partition_ids).
+- Compactación: cada partición se escribe por generaciones. El worker que
+  toma el lock de compactación escribe un snapshot del store con la posición
+  leída de cada partición, rota todas las particiones a una nueva generación
+  (un registro de sello cierra la anterior) y borra las generaciones que el
+  snapshot ya cubre. Un worker que arranca carga el snapshot y lee desde esas
+  posiciones. Un worker atrasado en más de una generación no encontraría la
+  siguiente; con el umbral de compactación en cientos de miles de registros
+  eso no ocurre en la práctica. El snapshot incluye la ventana de
+  deduplicación y las alertas en esas posiciones: un worker que arranca parte
+  del mismo estado que los que ya aplicaron el log.
+- Rendimiento: cada worker aplica todos los registros, así que varios workers
+  reparten la atención HTTP (validación y lecturas) pero no la ingesta.
+"""
+
+import glob
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .alerts import AlertEngine
+from .dedup import DedupWindow
+from .gps_filter import GpsFilter
+from .store import TelemetryStore
+from .wal import MAGIC, RECORD_DTYPE, TelemetryLog, load_snapshot, replay, seed_dedup, write_snapshot
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo modo de un proceso
+    fcntl = None
+
+PARTICIONES = 4
+LOCK_COMPACTACION = "compact.lock"
+# mc_id del registro que cierra una generación
+SELLO = 0xFFFFFFFF
+
+
+def partition_path(directorio: str, particion: int, generacion: int) -> str:
+    return os.path.join(directorio, f"ingest-{particion}-{generacion:06d}.log")
+
+
+def _generaciones(directorio: str, particion: int) -> List[int]:
+    prefijo = f"ingest-{particion}-"
+    return sorted(
+        int(os.path.basename(path)[len(prefijo):-len(".log")])
+        for path in glob.glob(os.path.join(directorio, prefijo + "*.log"))
+    )
+
+
+class _Particion:
+    """Archivo de escritura (generación más reciente) y posición de lectura de una partición"""
+
+    __slots__ = ("indice", "lock", "generacion_escritura", "fd", "pendientes",
+                 "generacion", "lectura", "offset", "resto", "sellada", "leidos_generacion")
+
+    def __init__(self, indice: int, lock: int):
+        self.indice = indice
+        self.lock = lock
+        self.generacion_escritura = 0
+        self.fd = -1
+        self.pendientes = 0
+        self.generacion = 0
+        self.lectura = None
+        # Posición (bytes) del siguiente registro sin leer de la generación en lectura
+        self.offset = len(MAGIC)
+        # Bytes de un registro leído a medias (escritura de otro worker en curso)
+        self.resto = b""
+        self.sellada = False
+        self.leidos_generacion = 0
+
+
+class SharedLog(TelemetryLog):
+    """Log compartido particionado: escritura con lock por partición y lectura incremental por worker"""
+
+    def __init__(self, directorio: str, particiones: int = PARTICIONES,
+                 posiciones: Optional[Dict[str, list]] = None, intervalo_sync: float = 0.05):
+        if fcntl is None:
+            raise RuntimeError("El log compartido requiere fcntl (Linux/macOS)")
+        os.makedirs(directorio, exist_ok=True)
+        for path in glob.glob(os.path.join(directorio, "ingest-*-*.log")):
+            if int(os.path.basename(path).split("-")[1]) >= particiones:
+                raise ValueError(f"{path} no corresponde a {particiones} particiones")
+        self.directorio = directorio
+        self.intervalo_sync = intervalo_sync
+        self.registros_escritos = 0
+        self.registros_leidos = 0
+        self._lock_compactacion = os.open(os.path.join(directorio, LOCK_COMPACTACION), os.O_RDWR | os.O_CREAT, 0o644)
+
+        self._particiones: List[_Particion] = []
+        for indice in range(particiones):
+            lock = os.open(os.path.join(directorio, f"ingest-{indice}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+            particion = _Particion(indice, lock)
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                generaciones = _generaciones(directorio, indice)
+                if not generaciones:
+                    self._crear(indice, 0)
+                    generaciones = [0]
+                particion.generacion_escritura = generaciones[-1]
+                particion.fd = os.open(partition_path(directorio, indice, generaciones[-1]),
+                                       os.O_WRONLY | os.O_APPEND)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+            generacion, offset = (posiciones or {}).get(str(indice), (generaciones[0], len(MAGIC)))
+            self._abrir_lectura(particion, generacion, offset)
+            self._particiones.append(particion)
+
+    def _crear(self, indice: int, generacion: int) -> None:
+        """Crea el archivo de una generación (con el lock de la partición tomado)"""
+        fd = os.open(partition_path(self.directorio, indice, generacion), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        try:
+            os.write(fd, MAGIC)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _abrir_lectura(self, particion: _Particion, generacion: int, offset: int) -> None:
+        if particion.lectura is not None:
+            particion.lectura.close()
+        path = partition_path(self.directorio, particion.indice, generacion)
+        particion.lectura = open(path, "rb")
+        if particion.lectura.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"Archivo de log inválido: {path}")
+        particion.lectura.seek(offset)
+        particion.generacion = generacion
+        particion.offset = offset
+        particion.resto = b""
+        particion.sellada = False
+        particion.leidos_generacion = (offset - len(MAGIC)) // RECORD_DTYPE.itemsize
+
+    def _seguir_rotacion(self, particion: _Particion) -> None:
+        """Pasa la escritura a la generación más reciente (con el lock de la partición tomado)"""
+        while os.path.exists(partition_path(self.directorio, particion.indice, particion.generacion_escritura + 1)):
+            if particion.pendientes:
+                os.fsync(particion.fd)
+                particion.pendientes = 0
+            os.close(particion.fd)
+            particion.generacion_escritura += 1
+            particion.fd = os.open(partition_path(self.directorio, particion.indice, particion.generacion_escritura),
+                                   os.O_WRONLY | os.O_APPEND)
+
+    def _escribir(self, registros: np.ndarray) -> None:
+        # Un solo write con O_APPEND bajo el lock de la partición: los registros
+        # de cada envío quedan contiguos
+        if not len(registros):
+            return
+        particion = self._particiones[int(registros["mc_id"][0]) % len(self._particiones)]
+        datos = registros.tobytes()
+        fcntl.flock(particion.lock, fcntl.LOCK_EX)
+        try:
+            self._seguir_rotacion(particion)
+            os.write(particion.fd, datos)
+        finally:
+            fcntl.flock(particion.lock, fcntl.LOCK_UN)
+        self.registros_escritos += len(registros)
+        particion.pendientes += len(registros)
+
+    def _leer(self, particion: _Particion, max_registros: Optional[int]) -> np.ndarray:
+        if particion.sellada:
+            # La siguiente generación se crea antes de escribir el sello
+            self._abrir_lectura(particion, particion.generacion + 1, len(MAGIC))
+        tamano = -1 if max_registros is None else max_registros * RECORD_DTYPE.itemsize - len(particion.resto)
+        datos = particion.resto + particion.lectura.read(tamano)
+        completos = len(datos) // RECORD_DTYPE.itemsize
+        registros = np.frombuffer(datos, dtype=RECORD_DTYPE, count=completos)
+        sello = np.flatnonzero(registros["mc_id"] == SELLO)
+        if len(sello):
+            registros = registros[:sello[0]]
+            particion.sellada = True
+            particion.resto = b""
+        else:
+            particion.resto = datos[completos * RECORD_DTYPE.itemsize:]
+        particion.offset += len(registros) * RECORD_DTYPE.itemsize
+        particion.leidos_generacion += len(registros)
+        self.registros_leidos += len(registros)
+        return registros
+
+    def read_new(self, max_registros: Optional[int] = None) -> np.ndarray:
+        """Registros completos escritos (por cualquier worker) desde la última lectura, por partición"""
+        partes = []
+        restantes = max_registros
+        for particion in self._particiones:
+            while restantes is None or restantes > 0:
+                registros = self._leer(particion, restantes)
+                partes.append(registros)
+                if restantes is not None:
+                    restantes -= len(registros)
+                if not particion.sellada:
+                    break
+        return np.concatenate(partes) if partes else np.empty(0, dtype=RECORD_DTYPE)
+
+    def positions(self) -> Dict[str, list]:
+        """Generación y offset del siguiente registro sin leer de cada partición"""
+        posiciones = {}
+        for particion in self._particiones:
+            if particion.sellada:
+                posiciones[str(particion.indice)] = [particion.generacion + 1, len(MAGIC)]
+            else:
+                posiciones[str(particion.indice)] = [particion.generacion, particion.offset]
+        return posiciones
+
+    # ---------- Compactación ----------
+
+    def compaction_due(self, umbral: int) -> bool:
+        """True si la generación en lectura supera `umbral` registros y nadie la rotó todavía"""
+        if sum(p.leidos_generacion for p in self._particiones) < umbral:
+            return False
+        return not any(
+            p.sellada or os.path.exists(partition_path(self.directorio, p.indice, p.generacion + 1))
+            for p in self._particiones
+        )
+
+    def try_lock_compaction(self) -> bool:
+        try:
+            fcntl.flock(self._lock_compactacion, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+
+    def unlock_compaction(self) -> None:
+        fcntl.flock(self._lock_compactacion, fcntl.LOCK_UN)
+
+    def rotate(self) -> None:
+        """Cierra la generación de escritura de cada partición con un sello y abre la siguiente"""
+        sello = np.zeros(1, dtype=RECORD_DTYPE)
+        sello["mc_id"] = SELLO
+        for particion in self._particiones:
+            fcntl.flock(particion.lock, fcntl.LOCK_EX)
+            try:
+                self._seguir_rotacion(particion)
+                self._crear(particion.indice, particion.generacion_escritura + 1)
+                os.write(particion.fd, sello.tobytes())
+                self._seguir_rotacion(particion)
+            finally:
+                fcntl.flock(particion.lock, fcntl.LOCK_UN)
+
+    def compact(self, store: TelemetryStore, filtro: Optional[GpsFilter] = None,
+                dedup: Optional[DedupWindow] = None, alertas: Optional[AlertEngine] = None) -> None:
+        """
+        Con el lock de compactación tomado y todo lo leído ya aplicado al store
+        (y a `dedup` y `alertas`): snapshot en las posiciones leídas, rotación
+        y borrado de lo cubierto
+        """
+        posiciones = self.positions()
+        generacion = max(p.generacion_escritura for p in self._particiones) + 1
+        write_snapshot(store, self.directorio, generacion, filtro,
+                       extra={"particiones": len(self._particiones), "posiciones": posiciones},
+                       dedup=dedup, alertas=alertas)
+        self.rotate()
+        for particion in self._particiones:
+            for anterior in _generaciones(self.directorio, particion.indice):
+                if anterior < posiciones[str(particion.indice)][0]:
+                    os.remove(partition_path(self.directorio, particion.indice, anterior))
+
+    def sync(self) -> None:
+        for particion in self._particiones:
+            if particion.pendientes:
+                os.fsync(particion.fd)
+                particion.pendientes = 0
+
+    def sync_if_pending(self) -> None:
+        # Sin hilo de fsync propio: el worker lo llama fuera del event loop
+        self.sync()
+
+    def close(self) -> None:
+        if self._particiones and not self._particiones[0].lectura.closed:
+            self.sync()
+            for particion in self._particiones:
+                os.close(particion.fd)
+                os.close(particion.lock)
+                particion.lectura.close()
+            os.close(self._lock_compactacion)
+
+
+def open_shared(directorio: str, store_inicial: TelemetryStore, particiones: int = PARTICIONES,
+                filtro: Optional[GpsFilter] = None, dedup: Optional[DedupWindow] = None,
+                alertas: Optional[AlertEngine] = None) -> Tuple[TelemetryStore, SharedLog, dict]:
+    """
+    Estado de un worker al arrancar: último snapshot (o `store_inicial`) más
+    lo escrito en el log desde las posiciones del snapshot, con el mismo filtro
+    GPS, la misma ventana de deduplicación y las mismas alertas que la ingesta
+    (restaurados del snapshot). Devuelve el store, el log abierto e
+    información de la recuperación.
+    """
+    inicio = time.perf_counter()
+    os.makedirs(directorio, exist_ok=True)
+    lock = os.open(os.path.join(directorio, LOCK_COMPACTACION), os.O_RDWR | os.O_CREAT, 0o644)
+    # Sin compactaciones en curso mientras se carga el snapshot y se abren las particiones
+    fcntl.flock(lock, fcntl.LOCK_SH)
+    try:
+        store, meta = load_snapshot(directorio, filtro, dedup, alertas)
+        if store is None:
+            store = store_inicial
+            if dedup is not None:
+                seed_dedup(dedup, store)
+        elif meta.get("particiones") != particiones:
+            raise ValueError(f"El snapshot de {directorio} es de {meta.get('particiones')} particiones")
+        log = SharedLog(directorio, particiones, meta.get("posiciones"))
+    finally:
+        fcntl.flock(lock, fcntl.LOCK_UN)
+        os.close(lock)
+
+    store.partition_ids(particiones)
+    aplicados = replay(store, log.read_new(), filtro, en_orden=True, dedup=dedup, alertas=alertas)
+    info = {
+        "worker": os.getpid(),
+        "particiones": particiones,
+        "puntos_reaplicados": aplicados,
+        "segundos_total": round(time.perf_counter() - inicio, 4),
+    }
+    return store, log, info
@@ -0,0 +1,163 @@
+"""
+Simplificación de rutas para el mapa (Ramer–Douglas–Peucker) y polilíneas codificadas
+
+La tolerancia depende del zoom: a un zoom dado, los puntos que se desvían
+menos de un píxel de la línea simplificada no cambian lo que se dibuja.
+Las versiones simplificadas se cachean por (recorrido, tolerancia).
+"""
+
+import math
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+import numpy as np
+
+from .columns import PointColumns
+
+# Metros por píxel en el ecuador a zoom 0 (proyección Web Mercator de Google Maps)
+METROS_POR_PIXEL_Z0 = 156543.03392
+
+# Desviación máxima, en píxeles de pantalla, entre la ruta real y la simplificada
+PIXELES_TOLERANCIA = 1.0
+
+RADIO_TIERRA_M = 6371008.8
+
+
+def tolerancia_zoom(zoom: int, lat: float = 0.0, pixeles: float = PIXELES_TOLERANCIA) -> float:
+    """Tolerancia en metros equivalente a `pixeles` al nivel de zoom dado"""
+    return METROS_POR_PIXEL_Z0 * math.cos(math.radians(lat)) / (2 ** zoom) * pixeles
+
+
+def _proyectar(lat: np.ndarray, lng: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Proyección equirectangular local en metros (suficiente a escala de un recorrido)"""
+    lat0 = math.radians(float(lat.mean()))
+    x = np.radians(lng) * math.cos(lat0) * RADIO_TIERRA_M
+    y = np.radians(lat) * RADIO_TIERRA_M
+    return x, y
+
+
+def rdp_indices(lat: np.ndarray, lng: np.ndarray, tolerancia_m: float) -> np.ndarray:
+    """
+    Índices de los puntos que conserva Ramer–Douglas–Peucker.
+
+    Vectorizado por niveles: en cada pasada se calcula con NumPy la distancia de
+    los puntos pendientes a la cuerda de su tramo y se dividen a la vez todos los
+    tramos cuya desviación máxima supera la tolerancia. Los puntos de tramos que
+    ya no se dividen salen de la siguiente pasada.
+    """
+    n = len(lat)
+    if n < 3 or tolerancia_m <= 0:
+        return np.arange(n)
+
+    x, y = _proyectar(lat, lng)
+    conservados = np.array([0, n - 1])
+    pendientes = np.arange(1, n - 1)
+    while pendientes.size:
+        # Tramo de cada punto pendiente: [conservados[k], conservados[k + 1]]
+        tramo = np.searchsorted(conservados, pendientes) - 1
+        i, j = conservados[tramo], conservados[tramo + 1]
+        dx, dy = x[j] - x[i], y[j] - y[i]
+        px, py = x[pendientes] - x[i], y[pendientes] - y[i]
+        largo = np.hypot(dx, dy)
+        degenerados = largo == 0
+        largo[degenerados] = 1.0
+        distancias = np.abs(px * dy - py * dx) / largo
+        if degenerados.any():
+            # Tramo de largo cero: distancia al punto inicial
+            distancias[degenerados] = np.hypot(px[degenerados], py[degenerados])
+
+        # Los pendientes están ordenados: cada tramo es un bloque contiguo
+        nuevo_bloque = np.empty(len(tramo), dtype=bool)
+        nuevo_bloque[0] = True
+        np.not_equal(tramo[1:], tramo[:-1], out=nuevo_bloque[1:])
+        bloque = np.cumsum(nuevo_bloque) - 1
+        maximos = np.maximum.reduceat(distancias, np.flatnonzero(nuevo_bloque))
+        dividir = (maximos > tolerancia_m)[bloque]
+        if not dividir.any():
+            break
+
+        # Primer punto de máxima desviación en cada tramo a dividir
+        candidatos = np.flatnonzero(dividir & (distancias == maximos[bloque]))
+        bloques = bloque[candidatos]
+        primeros = np.empty(len(candidatos), dtype=bool)
+        primeros[0] = True
+        np.not_equal(bloques[1:], bloques[:-1], out=primeros[1:])
+        elegidos = candidatos[primeros]
+        conservados = np.sort(np.concatenate((conservados, pendientes[elegidos])))
+        dividir[elegidos] = False
+        pendientes = pendientes[dividir]
+    return conservados
+
+
+def encode_polyline(lat: np.ndarray, lng: np.ndarray) -> str:
+    """Codifica la ruta en el formato de polilínea de Google (precisión 1e-5), vectorizado"""
+    if len(lat) == 0:
+        return ""
+    valores = np.empty(2 * len(lat), dtype=np.int64)
+    valores[0::2] = np.round(np.asarray(lat) * 1e5)
+    valores[1::2] = np.round(np.asarray(lng) * 1e5)
+    # Deltas por coordenada respecto al punto anterior
+    valores[2:] = valores[2:] - valores[:-2]
+
+    zigzag = ((valores << 1) ^ (valores >> 63)).astype(np.uint64)
+    # Hasta 7 grupos de 5 bits por valor (cabe en 32 bits con signo)
+    desplazamientos = np.arange(7, dtype=np.uint64) * np.uint64(5)
+    grupos = (zigzag[:, None] >> desplazamientos) & np.uint64(0x1F)
+    cantidad = 1 + ((zigzag[:, None] >> desplazamientos[1:]) > 0).sum(axis=1)
+    posicion = np.arange(7)
+    usados = posicion < cantidad[:, None]
+    continua = posicion < (cantidad - 1)[:, None]
+    caracteres = (grupos | np.where(continua, 0x20, 0).astype(np.uint64)) + np.uint64(63)
+    return caracteres[usados].astype(np.uint8).tobytes().decode("ascii")
+
+
+class SimplifyCache:
+    """
+    Cache LRU de índices simplificados por (recorrido, tolerancia).
+
+    Cada entrada guarda la cantidad de puntos con que se calculó: si se
+    agregaron puntos se recalcula. invalidate() la descarta al ingerir.
+    """
+
+    def __init__(self, max_entradas: int = 4096):
+        self.max_entradas = max_entradas
+        self._entradas: "OrderedDict[Tuple[int, float], Tuple[int, np.ndarray]]" = OrderedDict()
+        self._por_recorrido: Dict[int, set] = {}
+        self.aciertos = 0
+        self.fallos = 0
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+    def indices(self, recorrido_id: int, puntos: PointColumns, tolerancia_m: float) -> np.ndarray:
+        clave = (recorrido_id, round(tolerancia_m, 3))
+        entrada = self._entradas.get(clave)
+        if entrada is not None and entrada[0] == len(puntos):
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada[1]
+
+        self.fallos += 1
+        indices = rdp_indices(puntos.lat, puntos.lng, tolerancia_m)
+        self._entradas[clave] = (len(puntos), indices)
+        self._entradas.move_to_end(clave)
+        self._por_recorrido.setdefault(recorrido_id, set()).add(clave)
+        while len(self._entradas) > self.max_entradas:
+            viejo, _ = self._entradas.popitem(last=False)
+            self._descartar_clave(viejo)
+        return indices
+
+    def invalidate(self, recorrido_id: int) -> None:
+        for clave in self._por_recorrido.pop(recorrido_id, ()):
+            self._entradas.pop(clave, None)
+
+    def _descartar_clave(self, clave: Tuple[int, float]) -> None:
+        claves = self._por_recorrido.get(clave[0])
+        if claves is not None:
+            claves.discard(clave)
+            if not claves:
+                del self._por_recorrido[clave[0]]
+
+    def stats(self) -> dict:
+        return {"entradas": len(self._entradas), "aciertos": self.aciertos, "fallos": self.fallos}
+
@@ -0,0 +1,478 @@
+"""
+Backend de almacenamiento SQLite (modo WAL) con la misma interfaz que TelemetryStore
+
+- Montacargas: cacheados en memoria, escritura directa (write-through) en la tabla.
+- Recorridos: el recorrido activo de cada montacarga se mantiene en memoria para
+  que la ingesta siga operando sobre columnas NumPy; refresh_recorrido persiste
+  la fila del recorrido y los puntos nuevos con un único executemany.
+- Índices en (montacarga_id, fecha) y (trip_id, ts) para consultas por rango
+  de fechas y ventanas de tiempo sin recorrer el historial.
+- write_batch agrupa las escrituras de un micro-lote de la cola de ingesta en
+  una sola transacción (un commit por lote, no por envío); savepoint hace
+  atómico cada item del lote. Si una transacción o un item se deshacen, el
+  estado en memoria de lo que escribieron (recorridos activos, montacargas,
+  agregados y cantidad de puntos) se vuelve a leer de la base.
+- Un solo proceso escritor: los ids nuevos y el recorrido activo se mantienen
+  en memoria, así que la base se abre con un lock exclusivo (un segundo worker
+  sobre el mismo archivo falla al arrancar).
+"""
+
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .aggregates import DashboardAggregates
+from .columns import PointColumns
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin lock entre procesos
+    fcntl = None
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS montacargas (
+    id INTEGER PRIMARY KEY,
+    codigo TEXT NOT NULL,
+    modelo TEXT NOT NULL,
+    estado TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS recorridos (
+    id INTEGER PRIMARY KEY,
+    montacarga_id INTEGER NOT NULL,
+    fecha TEXT NOT NULL,
+    hora_inicio TEXT NOT NULL,
+    hora_fin TEXT NOT NULL,
+    distancia_km REAL NOT NULL,
+    extra TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_recorridos_montacarga_fecha ON recorridos (montacarga_id, fecha);
+CREATE INDEX IF NOT EXISTS idx_recorridos_fecha ON recorridos (fecha);
+CREATE TABLE IF NOT EXISTS puntos (
+    trip_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    lat REAL NOT NULL,
+    lng REAL NOT NULL,
+    speed REAL NOT NULL,
+    battery INTEGER NOT NULL,
+    PRIMARY KEY (trip_id, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_puntos_trip_ts ON puntos (trip_id, ts);
+"""
+
+COLUMNAS_RECORRIDO = ("id", "montacarga_id", "fecha", "hora_inicio", "hora_fin", "distancia_km")
+
+SQL_INSERT_RECORRIDO = (
+    "INSERT INTO recorridos (id, montacarga_id, fecha, hora_inicio, hora_fin, distancia_km, extra) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+SQL_UPDATE_RECORRIDO = "UPDATE recorridos SET hora_inicio = ?, hora_fin = ?, distancia_km = ?, extra = ? WHERE id = ?"
+SQL_INSERT_PUNTO = "INSERT INTO puntos (trip_id, seq, ts, lat, lng, speed, battery) VALUES (?, ?, ?, ?, ?, ?, ?)"
+SQL_SELECT_RECORRIDO = "SELECT id, montacarga_id, fecha, hora_inicio, hora_fin, distancia_km, extra FROM recorridos"
+SQL_SELECT_PUNTOS = "SELECT trip_id, ts, lat, lng, speed, battery FROM puntos"
+
+
+def _extra(recorrido: dict) -> str:
+    """Campos del recorrido fuera de las columnas fijas, como JSON"""
+    return json.dumps(
+        {k: v for k, v in recorrido.items() if k not in COLUMNAS_RECORRIDO and k != "puntos_recorrido"},
+        default=float
+    )
+
+
+def _filas_puntos(recorrido_id: int, puntos: PointColumns, desde: int) -> Iterable[tuple]:
+    return zip(
+        [recorrido_id] * (len(puntos) - desde),
+        range(desde, len(puntos)),
+        puntos.ts[desde:].tolist(),
+        puntos.lat[desde:].tolist(),
+        puntos.lng[desde:].tolist(),
+        puntos.speed[desde:].tolist(),
+        puntos.battery[desde:].tolist(),
+    )
+
+
+def _columnas_desde_filas(filas: List[tuple]) -> PointColumns:
+    """Filas (ts, lat, lng, speed, battery) -> PointColumns"""
+    puntos = PointColumns(max(len(filas), 1))
+    if filas:
+        ts, lat, lng, speed, battery = zip(*filas)
+        puntos.extend(lat, lng, ts, speed, battery)
+    return puntos
+
+
+class SQLiteStore:
+    """TelemetryStore persistente sobre SQLite"""
+
+    def __init__(self, path: str, montacargas: Iterable[dict] = (), recorridos: Iterable[dict] = ()):
+        self._lock = None
+        if fcntl is not None and path != ":memory:":
+            self._lock = open(path + ".lock", "w")
+            try:
+                fcntl.flock(self._lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self._lock.close()
+                raise RuntimeError(
+                    f"{path} ya está abierta por otro proceso: el backend sqlite admite un solo worker"
+                )
+        self._db = sqlite3.connect(path, check_same_thread=False, cached_statements=256)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+        self.aggregates = DashboardAggregates()
+        self._montacargas: Dict[int, dict] = {}
+        # Recorridos activos en memoria: (montacarga_id, fecha) -> recorrido
+        self._activos: Dict[Tuple[int, str], dict] = {}
+        # Puntos ya persistidos por recorrido (los siguientes se insertan en refresh)
+        self._persistidos: Dict[int, int] = {}
+        # Dentro de write_batch las escrituras no hacen commit propio
+        self._en_lote = False
+        # Escrito en la transacción (o savepoint) en curso: recorrido id -> fecha e ids de montacargas
+        self._tocados: Optional[Tuple[Dict[int, str], Set[int]]] = None
+
+        for montacarga_id, codigo, modelo, estado in self._db.execute("SELECT id, codigo, modelo, estado FROM montacargas"):
+            self._montacargas[montacarga_id] = {"id": montacarga_id, "codigo": codigo, "modelo": modelo, "estado": estado}
+            self.aggregates.estado_changed(None, estado)
+        self._next_id = (self._db.execute("SELECT MAX(id) FROM recorridos").fetchone()[0] or 0) + 1
+        for recorrido in self._leer_recorridos("", (), con_puntos=False):
+            self.aggregates.recorrido_changed(recorrido)
+        # Se lleva al día en cada escritura: /metrics no cuenta la tabla en cada consulta
+        self._n_puntos = self._contar_puntos()
+
+        # Base de datos nueva: cargar los datos iniciales
+        if not self._montacargas:
+            for montacarga in montacargas:
+                self.add_montacarga(montacarga)
+            for recorrido in recorridos:
+                self.add_recorrido(recorrido)
+
+    def close(self) -> None:
+        self._db.close()
+        if self._lock is not None:
+            self._lock.close()
+
+    @contextmanager
+    def write_batch(self):
+        """
+        Una sola transacción para todas las escrituras del bloque (commit al salir).
+        Si el bloque falla o el commit no se completa, se deshace entera y el
+        estado en memoria de lo escrito se vuelve a leer de la base.
+        """
+        if self._en_lote:
+            yield
+            return
+        self._en_lote = True
+        self._tocados = ({}, set())
+        try:
+            with self._db:
+                yield
+        except BaseException:
+            if self._db.in_transaction:
+                self._db.rollback()
+            self._restaurar(*self._tocados)
+            raise
+        finally:
+            self._en_lote = False
+            self._tocados = None
+
+    @contextmanager
+    def savepoint(self):
+        """
+        Escrituras de un item de ingesta: todas o ninguna. Dentro de write_batch
+        es un SAVEPOINT (si el item falla, el resto del lote se confirma igual);
+        fuera, una transacción propia.
+        """
+        if not self._en_lote:
+            with self.write_batch():
+                yield
+            return
+        if not self._db.in_transaction:
+            # Sin transacción abierta, RELEASE confirmaría el item por su cuenta
+            self._db.execute("BEGIN")
+        lote = self._tocados
+        self._tocados = ({}, set())
+        self._db.execute("SAVEPOINT item")
+        try:
+            yield
+        except BaseException:
+            self._db.execute("ROLLBACK TO item")
+            self._db.execute("RELEASE item")
+            self._restaurar(*self._tocados)
+            raise
+        else:
+            self._db.execute("RELEASE item")
+        finally:
+            lote[0].update(self._tocados[0])
+            lote[1].update(self._tocados[1])
+            self._tocados = lote
+
+    @contextmanager
+    def _transaccion(self):
+        """Transacción propia de una escritura, salvo dentro de write_batch"""
+        with self.write_batch():
+            yield
+
+    # ---------- Montacargas ----------
+
+    def add_montacarga(self, montacarga: dict) -> dict:
+        anterior = self._montacargas.get(montacarga["id"])
+        with self._transaccion():
+            self._tocados[1].add(montacarga["id"])
+            self._db.execute(
+                "INSERT OR REPLACE INTO montacargas (id, codigo, modelo, estado) VALUES (?, ?, ?, ?)",
+                (montacarga["id"], montacarga["codigo"], montacarga["modelo"], montacarga["estado"])
+            )
+        self._montacargas[montacarga["id"]] = montacarga
+        self.aggregates.estado_changed(anterior["estado"] if anterior else None, montacarga["estado"])
+        return montacarga
+
+    def get_montacarga(self, montacarga_id: int) -> Optional[dict]:
+        return self._montacargas.get(montacarga_id)
+
+    def has_montacarga(self, montacarga_id: int) -> bool:
+        return montacarga_id in self._montacargas
+
+    def list_montacargas(self) -> List[dict]:
+        return list(self._montacargas.values())
+
+    def set_estado(self, montacarga_id: int, estado: str) -> None:
+        montacarga = self._montacargas.get(montacarga_id)
+        if montacarga is not None and montacarga["estado"] != estado:
+            with self._transaccion():
+                self._tocados[1].add(montacarga_id)
+                self._db.execute("UPDATE montacargas SET estado = ? WHERE id = ?", (estado, montacarga_id))
+            self.aggregates.estado_changed(montacarga["estado"], estado)
+            montacarga["estado"] = estado
+
+    # ---------- Recorridos ----------
+
+    def add_recorrido(self, recorrido: dict) -> dict:
+        """Inserta un recorrido con sus puntos en una sola transacción"""
+        puntos = recorrido.get("puntos_recorrido", [])
+        if not isinstance(puntos, PointColumns):
+            puntos = recorrido["puntos_recorrido"] = PointColumns.from_dicts(puntos, recorrido["fecha"])
+
+        with self._transaccion():
+            self._tocados[0][recorrido["id"]] = recorrido["fecha"]
+            self._db.execute(SQL_INSERT_RECORRIDO, (
+                recorrido["id"], recorrido["montacarga_id"], recorrido["fecha"],
+                recorrido["hora_inicio"], recorrido["hora_fin"], recorrido["distancia_km"], _extra(recorrido)
+            ))
+            self._db.executemany(SQL_INSERT_PUNTO, _filas_puntos(recorrido["id"], puntos, 0))
+        self._persistidos[recorrido["id"]] = len(puntos)
+        self._n_puntos += len(puntos)
+        self._next_id = max(self._next_id, recorrido["id"] + 1)
+
+        # Como en TelemetryStore, el recorrido más reciente del día es el activo
+        clave = (recorrido["montacarga_id"], recorrido["fecha"])
+        if self._ultimo_id(*clave) == recorrido["id"]:
+            self._cachear_activo(clave, recorrido)
+
+        self.aggregates.recorrido_changed(recorrido)
+        return recorrido
+
+    def create_recorrido(self, **campos) -> dict:
+        recorrido = {"id": self._next_id, **campos}
+        return self.add_recorrido(recorrido)
+
+    def refresh_recorrido(self, recorrido: dict, desde: Optional[int] = None) -> None:
+        """
+        Persiste la fila del recorrido y sus puntos nuevos (executemany). Con
+        `desde` (inserción de puntos atrasados), reescribe los puntos desde esa posición.
+        """
+        puntos = recorrido["puntos_recorrido"]
+        persistidos = anteriores = self._persistidos.get(recorrido["id"], 0)
+        with self._transaccion():
+            self._tocados[0][recorrido["id"]] = recorrido["fecha"]
+            if desde is not None and desde < persistidos:
+                self._db.execute("DELETE FROM puntos WHERE trip_id = ? AND seq >= ?", (recorrido["id"], desde))
+                persistidos = desde
+            self._db.execute(SQL_UPDATE_RECORRIDO, (
+                recorrido["hora_inicio"], recorrido["hora_fin"], recorrido["distancia_km"],
+                _extra(recorrido), recorrido["id"]
+            ))
+            if len(puntos) > persistidos:
+                self._db.executemany(SQL_INSERT_PUNTO, _filas_puntos(recorrido["id"], puntos, persistidos))
+        self._persistidos[recorrido["id"]] = len(puntos)
+        self._n_puntos += len(puntos) - anteriores
+        self.aggregates.recorrido_changed(recorrido)
+
+    def delete_recorrido(self, recorrido_id: int) -> bool:
+        """Elimina el recorrido y sus puntos en una sola transacción"""
+        encontrados = self._leer_recorridos("WHERE id = ?", (recorrido_id,), con_puntos=False)
+        if not encontrados:
+            return False
+        recorrido = encontrados[0]
+        with self._transaccion():
+            self._tocados[0][recorrido_id] = recorrido["fecha"]
+            borrados = self._db.execute("DELETE FROM puntos WHERE trip_id = ?", (recorrido_id,)).rowcount
+            self._db.execute("DELETE FROM recorridos WHERE id = ?", (recorrido_id,))
+        self._persistidos.pop(recorrido_id, None)
+        self._n_puntos -= borrados
+        # El activo del día se vuelve a leer de la base (el anterior, si queda alguno)
+        self._activos.pop((recorrido["montacarga_id"], recorrido["fecha"]), None)
+        self.aggregates.recorrido_removed(recorrido)
+        return True
+
+    def has_recorrido(self, recorrido_id: int) -> bool:
+        return self._db.execute("SELECT 1 FROM recorridos WHERE id = ?", (recorrido_id,)).fetchone() is not None
+
+    def get_recorrido(self, recorrido_id: int) -> Optional[dict]:
+        for recorrido in self._activos.values():
+            if recorrido["id"] == recorrido_id:
+                return recorrido
+        encontrados = self._leer_recorridos("WHERE id = ?", (recorrido_id,))
+        return encontrados[0] if encontrados else None
+
+    def get_recorrido_activo(self, montacarga_id: int, fecha: str) -> Optional[dict]:
+        clave = (montacarga_id, fecha)
+        recorrido = self._activos.get(clave)
+        if recorrido is None:
+            ultimo_id = self._ultimo_id(montacarga_id, fecha)
+            if ultimo_id is None:
+                return None
+            recorrido = self._leer_recorridos("WHERE id = ?", (ultimo_id,))[0]
+            self._cachear_activo(clave, recorrido)
+        return recorrido
+
+    def get_recorrido_anterior(self, montacarga_id: int, fecha: str, ts: int) -> Optional[dict]:
+        """Recorrido del día que empezó más tarde sin pasar de `ts` (índices por día y por trip_id, ts)"""
+        fila = self._db.execute(
+            "SELECT trip_id, MIN(ts) AS inicio FROM puntos WHERE trip_id IN "
+            "(SELECT id FROM recorridos WHERE montacarga_id = ? AND fecha = ?) "
+            "GROUP BY trip_id HAVING inicio <= ? ORDER BY inicio DESC, trip_id DESC LIMIT 1",
+            (montacarga_id, fecha, ts)
+        ).fetchone()
+        return None if fila is None else self.get_recorrido(fila[0])
+
+    def list_recorridos(self, archivados: bool = True) -> List[dict]:
+        # Sin niveles de retención: todos los recorridos viven en la base de datos
+        return self._leer_recorridos("", ())
+
+    def recorridos_by_montacarga(self, montacarga_id: int, desde: Optional[str] = None,
+                                 hasta: Optional[str] = None) -> List[dict]:
+        return self._leer_recorridos(
+            "WHERE montacarga_id = ? AND fecha >= ? AND fecha <= ?",
+            (montacarga_id, desde or "", hasta or "9999-12-31")
+        )
+
+    def page_recorridos(self, montacarga_id: Optional[int] = None, cursor: Optional[int] = None,
+                        limit: Optional[int] = None, desde: Optional[str] = None,
+                        hasta: Optional[str] = None, con_puntos: bool = True) -> List[dict]:
+        """Página de recorridos con id > cursor; sin puntos si con_puntos es False"""
+        condiciones, params = ["id > ?", "fecha >= ?", "fecha <= ?"], [cursor or 0, desde or "", hasta or "9999-12-31"]
+        if montacarga_id is not None:
+            condiciones.append("montacarga_id = ?")
+            params.append(montacarga_id)
+        return self._leer_recorridos(
+            "WHERE " + " AND ".join(condiciones), tuple(params), con_puntos=con_puntos, limit=limit
+        )
+
+    def puntos_en_ventana(self, recorrido_id: int, desde_ts: int, hasta_ts: int) -> PointColumns:
+        """Puntos de un recorrido con desde_ts <= ts <= hasta_ts (índice trip_id, ts)"""
+        filas = self._db.execute(
+            "SELECT ts, lat, lng, speed, battery FROM puntos WHERE trip_id = ? AND ts BETWEEN ? AND ? ORDER BY ts",
+            (recorrido_id, desde_ts, hasta_ts)
+        ).fetchall()
+        return _columnas_desde_filas(filas)
+
+    def count_recorridos(self) -> int:
+        return self.aggregates.total_recorridos
+
+    def count_puntos(self) -> int:
+        return self._n_puntos
+
+    def dias(self, desde: str = "") -> List[Tuple[int, str]]:
+        """(montacarga_id, fecha) con recorridos desde esa fecha, sin leer sus puntos"""
+        return self._db.execute(
+            "SELECT DISTINCT montacarga_id, fecha FROM recorridos WHERE fecha >= ?", (desde,)
+        ).fetchall()
+
+    # ---------- Internos ----------
+
+    def _contar_puntos(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM puntos").fetchone()[0]
+
+    def _restaurar(self, recorridos: Dict[int, str], montacargas: Set[int]) -> None:
+        """Vuelve a leer de la base lo escrito en una transacción o savepoint deshechos"""
+        for clave in [c for c, r in self._activos.items() if r["id"] in recorridos]:
+            del self._activos[clave]
+        ids = list(recorridos)
+        guardados = {}
+        for i in range(0, len(ids), 500):
+            bloque = ids[i:i + 500]
+            for recorrido in self._leer_recorridos(f"WHERE id IN ({','.join('?' * len(bloque))})", tuple(bloque),
+                                                   con_puntos=False):
+                guardados[recorrido["id"]] = recorrido
+        for recorrido_id, fecha in recorridos.items():
+            self._persistidos.pop(recorrido_id, None)
+            if recorrido_id in guardados:
+                self.aggregates.recorrido_changed(guardados[recorrido_id])
+            else:
+                # Creado en la transacción deshecha
+                self.aggregates.recorrido_removed({"id": recorrido_id, "fecha": fecha})
+
+        for montacarga_id in montacargas:
+            fila = self._db.execute(
+                "SELECT codigo, modelo, estado FROM montacargas WHERE id = ?", (montacarga_id,)
+            ).fetchone()
+            montacarga = self._montacargas.get(montacarga_id)
+            anterior = montacarga["estado"] if montacarga is not None else None
+            if fila is None:
+                if montacarga is not None:
+                    del self._montacargas[montacarga_id]
+                    self.aggregates.estados[anterior] -= 1
+                continue
+            if montacarga is None:
+                montacarga = self._montacargas[montacarga_id] = {"id": montacarga_id}
+            montacarga.update(zip(("codigo", "modelo", "estado"), fila))
+            if anterior != fila[2]:
+                self.aggregates.estado_changed(anterior, fila[2])
+        self._n_puntos = self._contar_puntos()
+
+    def _ultimo_id(self, montacarga_id: int, fecha: str) -> Optional[int]:
+        return self._db.execute(
+            "SELECT MAX(id) FROM recorridos WHERE montacarga_id = ? AND fecha = ?", (montacarga_id, fecha)
+        ).fetchone()[0]
+
+    def _cachear_activo(self, clave: Tuple[int, str], recorrido: dict) -> None:
+        """Mantiene en memoria un único recorrido activo por montacarga"""
+        for otra in [c for c in self._activos if c[0] == clave[0]]:
+            del self._activos[otra]
+        self._activos[clave] = recorrido
+
+    def _leer_recorridos(self, where: str, params: tuple, con_puntos: bool = True,
+                         limit: Optional[int] = None) -> List[dict]:
+        recorridos = []
+        orden = "ORDER BY id" if limit is None else "ORDER BY id LIMIT ?"
+        parametros = params if limit is None else (*params, limit)
+        for fila in self._db.execute(f"{SQL_SELECT_RECORRIDO} {where} {orden}", parametros):
+            recorrido = dict(zip(COLUMNAS_RECORRIDO, fila[:-1]))
+            recorrido.update(json.loads(fila[-1]))
+            recorridos.append(recorrido)
+        if not con_puntos or not recorridos:
+            return recorridos
+
+        if where:
+            ids = [r["id"] for r in recorridos]
+            filas = []
+            for i in range(0, len(ids), 500):
+                bloque = ids[i:i + 500]
+                filas += self._db.execute(
+                    f"{SQL_SELECT_PUNTOS} WHERE trip_id IN ({','.join('?' * len(bloque))}) ORDER BY trip_id, seq",
+                    bloque
+                ).fetchall()
+        else:
+            filas = self._db.execute(f"{SQL_SELECT_PUNTOS} ORDER BY trip_id, seq").fetchall()
+
+        trip_ids = np.fromiter((f[0] for f in filas), dtype=np.int64, count=len(filas))
+        for recorrido in recorridos:
+            inicio, fin = np.searchsorted(trip_ids, [recorrido["id"], recorrido["id"] + 1])
+            recorrido["puntos_recorrido"] = _columnas_desde_filas([f[1:] for f in filas[inicio:fin]])
+            self._persistidos[recorrido["id"]] = fin - inicio
+        return recorridos
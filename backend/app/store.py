@@ -0,0 +1,473 @@
+"""
+Almacén en memoria de montacargas y recorridos con índices de acceso O(1)
+"""
+
+import heapq
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from contextlib import nullcontext
+from itertools import islice
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from .aggregates import DashboardAggregates
+from .columns import PointColumns
+from .simplify import encode_polyline
+
+
+_por_id = itemgetter("id")
+
+
+def _seleccion(puntos: PointColumns, indices: Optional[np.ndarray],
+               since_ts: Optional[int]) -> Optional[np.ndarray]:
+    """Combina la simplificación (indices) con el filtro since; None = todos los puntos"""
+    if since_ts is None:
+        return indices
+    if indices is None:
+        return np.flatnonzero(puntos.ts > since_ts)
+    return indices[puntos.ts[indices] > since_ts]
+
+
+def serialize_recorrido(recorrido: dict, campos: Optional[Sequence[str]] = None,
+                        since_ts: Optional[int] = None, indices: Optional[np.ndarray] = None, formato: str = "json") -> dict:
+    """
+    Copia del recorrido con los puntos en el formato JSON de la API.
+
+    - campos: proyección; si no incluye "puntos_recorrido" los puntos no se serializan.
+      "total_puntos" agrega la cantidad de puntos del recorrido. Los puntos solo se
+      leen si se piden (los stores pueden omitirlos con con_puntos=False).
+    - since_ts: solo los puntos con ts posterior (epoch). Es estable ante
+      inserciones tardías, que desplazan las posiciones de los puntos siguientes.
+    - indices: puntos a incluir (ruta simplificada).
+    - formato: "json" (lista de puntos) o "polyline" (campo "polyline" codificado).
+    """
+    if campos is None:
+        salida = dict(recorrido)
+    else:
+        salida = {c: recorrido.get(c) for c in campos if c not in ("puntos_recorrido", "total_puntos")}
+
+    puntos = recorrido.get("puntos_recorrido")
+    if campos is None or "puntos_recorrido" in campos:
+        seleccion = _seleccion(puntos, indices, since_ts)
+        if formato == "polyline":
+            salida.pop("puntos_recorrido", None)
+            if seleccion is None:
+                salida["polyline"] = encode_polyline(puntos.lat, puntos.lng)
+            else:
+                salida["polyline"] = encode_polyline(puntos.lat[seleccion], puntos.lng[seleccion])
+        else:
+            salida["puntos_recorrido"] = puntos.to_dicts(indices=seleccion)
+    if (campos is not None and "total_puntos" in campos) or since_ts is not None:
+        salida["total_puntos"] = len(puntos)
+    return salida
+
+
+def _en_rango(recorrido: dict, desde: Optional[str], hasta: Optional[str]) -> bool:
+    return (desde is None or recorrido["fecha"] >= desde) and (hasta is None or recorrido["fecha"] <= hasta)
+
+
+class TelemetryStore:
+    """
+    Reemplaza las búsquedas lineales sobre montacargas_db y recorridos_db.
+
+    Índices mantenidos:
+    - montacargas por id
+    - recorridos por id (en orden de creación)
+    - recorridos por montacarga
+    - recorrido activo por (montacarga_id, fecha)
+    - (fecha, id) ordenados, global y por montacarga, para el filtro desde/hasta
+    - inicios (ts del primer punto) de los recorridos en memoria por
+      (montacarga_id, fecha), ordenados para buscar con bisect
+
+    Además mantiene los agregados del dashboard (ver DashboardAggregates).
+
+    Con un archivo (attach_archive), los recorridos de días antiguos quedan
+    solo como metadatos en los índices y sus puntos se leen bajo demanda del
+    archivo comprimido; las lecturas devuelven copias con los puntos cargados.
+    Los metadatos indexados de un recorrido archivado son los del índice del
+    archivo (con "n_puntos"), sin aporte guardado en los agregados ni inicio
+    indexado.
+    """
+
+    def __init__(self, montacargas: Iterable[dict] = (), recorridos: Iterable[dict] = ()):
+        self._montacargas: Dict[int, dict] = {}
+        self._recorridos: Dict[int, dict] = {}
+        # Todos los recorridos ordenados por id (para paginar por cursor)
+        self._orden: List[dict] = []
+        self._por_montacarga: Dict[int, List[dict]] = defaultdict(list)
+        # [(fecha, id)] ordenadas, global y por montacarga (filtro desde/hasta con bisect)
+        self._fechas: List[Tuple[str, int]] = []
+        self._fechas_por_montacarga: Dict[int, List[Tuple[str, int]]] = defaultdict(list)
+        self._activos: Dict[Tuple[int, str], dict] = {}
+        # (montacarga_id, fecha) -> [(ts de inicio, id)] ordenada; id -> ts de inicio indexado
+        self._inicios: Dict[Tuple[int, str], List[Tuple[int, int]]] = defaultdict(list)
+        self._inicio_de: Dict[int, int] = {}
+        self._next_id = 1
+        # Con partition_ids: siguiente id por partición de montacarga
+        self._particiones = 0
+        self._next_por_particion: Dict[int, int] = {}
+        self.aggregates = DashboardAggregates()
+        self._archivo = None
+        # Ids de los recorridos archivados
+        self._archivados: Set[int] = set()
+        self._puntos_archivados = 0
+
+        for montacarga in montacargas:
+            self.add_montacarga(montacarga)
+        for recorrido in recorridos:
+            self.add_recorrido(recorrido)
+
+    # ---------- Montacargas ----------
+
+    def add_montacarga(self, montacarga: dict) -> dict:
+        anterior = self._montacargas.get(montacarga["id"])
+        self._montacargas[montacarga["id"]] = montacarga
+        self.aggregates.estado_changed(anterior["estado"] if anterior else None, montacarga["estado"])
+        return montacarga
+
+    def get_montacarga(self, montacarga_id: int) -> Optional[dict]:
+        return self._montacargas.get(montacarga_id)
+
+    def has_montacarga(self, montacarga_id: int) -> bool:
+        return montacarga_id in self._montacargas
+
+    def list_montacargas(self) -> List[dict]:
+        return list(self._montacargas.values())
+
+    def set_estado(self, montacarga_id: int, estado: str) -> None:
+        montacarga = self._montacargas.get(montacarga_id)
+        if montacarga is not None and montacarga["estado"] != estado:
+            self.aggregates.estado_changed(montacarga["estado"], estado)
+            montacarga["estado"] = estado
+
+    # ---------- Recorridos ----------
+
+    def add_recorrido(self, recorrido: dict) -> dict:
+        """Registra un recorrido existente (con id) en todos los índices"""
+        recorrido_id = recorrido["id"]
+        puntos = recorrido.get("puntos_recorrido", [])
+        if not isinstance(puntos, PointColumns):
+            recorrido["puntos_recorrido"] = PointColumns.from_dicts(puntos, recorrido["fecha"])
+        self._indexar(recorrido)
+        self._indexar_inicio(recorrido)
+        # El recorrido activo del día es el más reciente (los cortes por inactividad abren uno nuevo)
+        clave = (recorrido["montacarga_id"], recorrido["fecha"])
+        activo = self._activos.get(clave)
+        if activo is None or activo["id"] < recorrido_id:
+            self._activos[clave] = recorrido
+        self.aggregates.recorrido_changed(recorrido)
+        return recorrido
+
+    def _indexar(self, recorrido: dict) -> None:
+        recorrido_id = recorrido["id"]
+        self._recorridos[recorrido_id] = recorrido
+        for lista in (self._orden, self._por_montacarga[recorrido["montacarga_id"]]):
+            if not lista or lista[-1]["id"] < recorrido_id:
+                lista.append(recorrido)
+            else:
+                insort(lista, recorrido, key=_por_id)
+        for fechas in (self._fechas, self._fechas_por_montacarga[recorrido["montacarga_id"]]):
+            insort(fechas, (recorrido["fecha"], recorrido_id))
+        self._reservar_id(recorrido_id)
+
+    def _reservar_id(self, recorrido_id: int) -> None:
+        self._next_id = max(self._next_id, recorrido_id + 1)
+        if self._particiones:
+            particion = recorrido_id % self._particiones
+            self._next_por_particion[particion] = max(
+                self._next_por_particion.get(particion, 0), recorrido_id + self._particiones
+            )
+
+    def _indexar_inicio(self, recorrido: dict) -> None:
+        """Ubica el recorrido en los inicios de su día según su primer punto (sin puntos, no figura)"""
+        puntos = recorrido.get("puntos_recorrido")
+        inicio = int(puntos.ts[0]) if puntos is not None and len(puntos) else None
+        anterior = self._inicio_de.get(recorrido["id"])
+        if inicio == anterior:
+            return
+        clave = (recorrido["montacarga_id"], recorrido["fecha"])
+        if anterior is not None:
+            self._quitar_inicio(clave, recorrido["id"])
+        if inicio is not None:
+            insort(self._inicios[clave], (inicio, recorrido["id"]))
+            self._inicio_de[recorrido["id"]] = inicio
+
+    def _quitar_inicio(self, clave: Tuple[int, str], recorrido_id: int) -> None:
+        inicio = self._inicio_de.pop(recorrido_id, None)
+        if inicio is None:
+            return
+        inicios = self._inicios[clave]
+        del inicios[bisect_right(inicios, (inicio, recorrido_id)) - 1]
+        if not inicios:
+            del self._inicios[clave]
+
+    def refresh_recorrido(self, recorrido: dict, desde: Optional[int] = None) -> None:
+        """
+        Debe llamarse tras modificar distancia u horas de un recorrido. `desde`:
+        primer punto desplazado por una inserción (los backends persistentes lo reescriben).
+        """
+        if recorrido["id"] in self._archivados:
+            # Las lecturas de archivados son copias: se actualizan los metadatos indexados
+            indexado = self._recorridos[recorrido["id"]]
+            self.aggregates.archived_changed(recorrido, indexado)
+            indexado.update((k, v) for k, v in recorrido.items() if k not in ("puntos_recorrido", "n_puntos"))
+            return
+        self._indexar_inicio(recorrido)
+        self.aggregates.recorrido_changed(recorrido)
+
+    def partition_ids(self, particiones: int) -> None:
+        """
+        Reparte los ids de los recorridos nuevos por partición de montacarga
+        (montacarga_id % particiones): los de la partición p son crecientes y
+        congruentes con p, así el id depende solo del orden de ingesta de la
+        partición y no de cómo se intercalan las demás (log compartido particionado).
+        """
+        self._particiones = particiones
+        self._next_por_particion = {}
+        for recorrido_id in self._recorridos:
+            self._reservar_id(recorrido_id)
+
+    def create_recorrido(self, **campos) -> dict:
+        """Crea un recorrido asignándole el siguiente id disponible (de su partición, si las hay)"""
+        if self._particiones:
+            particion = campos["montacarga_id"] % self._particiones
+            recorrido_id = self._next_por_particion.get(particion, particion or self._particiones)
+        else:
+            recorrido_id = self._next_id
+        recorrido = {"id": recorrido_id, **campos}
+        return self.add_recorrido(recorrido)
+
+    def delete_recorrido(self, recorrido_id: int) -> bool:
+        """
+        Elimina un recorrido de los índices y de los agregados (si está
+        archivado, también de su chunk). Devuelve False si no existía.
+        """
+        recorrido = self._recorridos.pop(recorrido_id, None)
+        if recorrido is None:
+            return False
+        for lista in (self._orden, self._por_montacarga[recorrido["montacarga_id"]]):
+            del lista[bisect_right(lista, recorrido_id, key=_por_id) - 1]
+        for fechas in (self._fechas, self._fechas_por_montacarga[recorrido["montacarga_id"]]):
+            del fechas[bisect_left(fechas, (recorrido["fecha"], recorrido_id))]
+
+        clave = (recorrido["montacarga_id"], recorrido["fecha"])
+        self._quitar_inicio(clave, recorrido_id)
+        if recorrido_id in self._archivados:
+            self._archivados.discard(recorrido_id)
+            self._puntos_archivados -= recorrido["n_puntos"]
+            self._archivo.remove(*clave, recorrido_id)
+            self.aggregates.archived_removed(recorrido)
+            return True
+        if self._activos.get(clave) is recorrido:
+            # El activo pasa a ser el anterior del mismo día que siga en memoria
+            del self._activos[clave]
+            for otro in reversed(self._por_montacarga[recorrido["montacarga_id"]]):
+                if otro["fecha"] == recorrido["fecha"] and otro["id"] not in self._archivados:
+                    self._activos[clave] = otro
+                    break
+        self.aggregates.recorrido_removed(recorrido)
+        return True
+
+    def has_recorrido(self, recorrido_id: int) -> bool:
+        return recorrido_id in self._recorridos
+
+    def get_recorrido(self, recorrido_id: int) -> Optional[dict]:
+        recorrido = self._recorridos.get(recorrido_id)
+        return None if recorrido is None else self._con_puntos(recorrido)
+
+    def get_recorrido_activo(self, montacarga_id: int, fecha: str) -> Optional[dict]:
+        return self._activos.get((montacarga_id, fecha))
+
+    def get_recorrido_anterior(self, montacarga_id: int, fecha: str, ts: int) -> Optional[dict]:
+        """
+        Recorrido en memoria del día que empezó más tarde sin pasar de `ts`
+        (O(log n) en los recorridos del día). Los archivados no se consideran.
+        """
+        inicios = self._inicios.get((montacarga_id, fecha))
+        if not inicios:
+            return None
+        i = bisect_right(inicios, (ts, float("inf")))
+        return self._recorridos[inicios[i - 1][1]] if i else None
+
+    def list_recorridos(self, archivados: bool = True) -> List[dict]:
+        """Todos los recorridos; con archivados=False, solo los que están en memoria"""
+        if not self._archivados:
+            return list(self._recorridos.values())
+        if not archivados:
+            return [r for r in self._recorridos.values() if r["id"] not in self._archivados]
+        return [self._con_puntos(r) for r in self._recorridos.values()]
+
+    def recorridos_by_montacarga(self, montacarga_id: int, desde: Optional[str] = None,
+                                 hasta: Optional[str] = None) -> List[dict]:
+        recorridos = self._por_montacarga.get(montacarga_id, ())
+        return [self._con_puntos(r) for r in recorridos if _en_rango(r, desde, hasta)]
+
+    def page_recorridos(self, montacarga_id: Optional[int] = None, cursor: Optional[int] = None,
+                        limit: Optional[int] = None, desde: Optional[str] = None,
+                        hasta: Optional[str] = None, con_puntos: bool = True) -> List[dict]:
+        """
+        Recorridos con id > cursor, en orden de id, filtrados por fecha y
+        limitados a `limit`. El costo depende del tamaño de la página, no del historial.
+        Con desde/hasta, si el rango de fechas (bisect en el índice de fechas)
+        tiene menos recorridos que los posteriores al cursor, se recorre solo el rango.
+        """
+        recorridos = self._orden if montacarga_id is None else self._por_montacarga.get(montacarga_id, [])
+        inicio = 0 if cursor is None else bisect_right(recorridos, cursor, key=_por_id)
+        if desde is not None or hasta is not None:
+            fechas = self._fechas if montacarga_id is None else self._fechas_por_montacarga.get(montacarga_id, [])
+            primera = 0 if desde is None else bisect_left(fechas, (desde,))
+            ultima = len(fechas) if hasta is None else bisect_right(fechas, (hasta, float("inf")))
+            if ultima - primera < len(recorridos) - inicio:
+                ids = [i for _, i in islice(fechas, primera, ultima) if cursor is None or i > cursor]
+                ids = sorted(ids) if limit is None else heapq.nsmallest(limit, ids)
+                return [self._con_puntos(self._recorridos[i]) if con_puntos else self._recorridos[i] for i in ids]
+        pagina = []
+        for recorrido in islice(recorridos, inicio, None):
+            if _en_rango(recorrido, desde, hasta):
+                pagina.append(self._con_puntos(recorrido) if con_puntos else recorrido)
+                if limit is not None and len(pagina) >= limit:
+                    break
+        return pagina
+
+    def puntos_en_ventana(self, recorrido_id: int, desde_ts: int, hasta_ts: int) -> PointColumns:
+        """Puntos de un recorrido con desde_ts <= ts <= hasta_ts"""
+        puntos = self._con_puntos(self._recorridos[recorrido_id])["puntos_recorrido"]
+        mascara = (puntos.ts >= desde_ts) & (puntos.ts <= hasta_ts)
+        ventana = PointColumns(max(int(mascara.sum()), 1))
+        ventana.extend(puntos.lat[mascara], puntos.lng[mascara], puntos.ts[mascara],
+                       puntos.speed[mascara], puntos.battery[mascara])
+        return ventana
+
+    def count_recorridos(self) -> int:
+        return len(self._recorridos)
+
+    def write_batch(self):
+        """Sin transacciones en memoria (ver SQLiteStore.write_batch)"""
+        return nullcontext()
+
+    def savepoint(self):
+        """Sin transacciones en memoria (ver SQLiteStore.savepoint)"""
+        return nullcontext()
+
+    def count_puntos(self) -> int:
+        return self._puntos_archivados + sum(
+            len(r["puntos_recorrido"]) for r in self._recorridos.values() if r["id"] not in self._archivados
+        )
+
+    # ---------- Retención (archivo comprimido) ----------
+
+    def _con_puntos(self, recorrido: dict, chunks: Optional[dict] = None) -> dict:
+        """
+        El recorrido tal cual si está en memoria; si está archivado, una copia
+        con sus puntos (de `chunks`, si los trae, o leídos del archivo)
+        """
+        if recorrido["id"] not in self._archivados:
+            return recorrido
+        clave = (recorrido["montacarga_id"], recorrido["fecha"])
+        chunk = chunks.get(clave) if chunks is not None else None
+        if chunk is None or recorrido["id"] not in chunk:
+            chunk = self._archivo.chunk(*clave)
+        copia = {k: v for k, v in recorrido.items() if k != "n_puntos"}
+        copia["puntos_recorrido"] = chunk[recorrido["id"]]
+        return copia
+
+    def with_points(self, recorridos: Sequence[dict], chunks: Optional[dict] = None) -> List[dict]:
+        """
+        Los recorridos (de page_recorridos con con_puntos=False) con sus puntos,
+        sin los borrados desde entonces. `chunks`: los de archived_keys leídos
+        antes (p. ej. en un hilo) con TripArchive.chunks
+        """
+        actuales = (self._recorridos.get(recorrido["id"]) for recorrido in recorridos)
+        return [self._con_puntos(recorrido, chunks) for recorrido in actuales if recorrido is not None]
+
+    def archived_keys(self, recorridos: Iterable[dict]) -> List[Tuple[int, str]]:
+        """Chunks (montacarga, fecha) del archivo que hacen falta para leer los puntos de los recorridos"""
+        return list({(r["montacarga_id"], r["fecha"]) for r in recorridos if r["id"] in self._archivados})
+
+    def archived_key(self, recorrido_id: int) -> Optional[Tuple[int, str]]:
+        """Chunk (montacarga, fecha) del recorrido si está archivado"""
+        if recorrido_id not in self._archivados:
+            return None
+        recorrido = self._recorridos[recorrido_id]
+        return recorrido["montacarga_id"], recorrido["fecha"]
+
+    def is_archived(self, recorrido_id: int) -> bool:
+        return recorrido_id in self._archivados
+
+    def attach_archive(self, archivo) -> None:
+        """
+        Usa `archivo` (TripArchive) para los recorridos antiguos y registra los
+        ya archivados. Si un recorrido también está en memoria (el snapshot es
+        anterior al archivado), se conserva el de memoria y se vuelve a archivar.
+        """
+        self._archivo = archivo
+        for entrada in archivo.entries():
+            for meta in entrada["recorridos"]:
+                if meta["id"] in self._recorridos:
+                    continue
+                self._indexar(meta)
+                self._archivados.add(meta["id"])
+                self._puntos_archivados += meta["n_puntos"]
+                self.aggregates.archived_changed(meta, None)
+
+    def archive_before(self, fecha_limite: str) -> int:
+        """
+        Mueve al archivo los puntos de los recorridos con fecha anterior a
+        `fecha_limite` (YYYY-MM-DD), un chunk por montacarga y día. Los
+        metadatos siguen indexados. Devuelve la cantidad de recorridos archivados.
+        """
+        grupos = self.prepare_archive(fecha_limite)
+        return self.commit_archive(grupos, self.write_archive(grupos))
+
+    def prepare_archive(self, fecha_limite: str) -> Dict[Tuple[int, str], List[dict]]:
+        """
+        Primer paso de archive_before: copias (con puntos) de los recorridos a
+        archivar por chunk. write_archive las comprime y escribe sin tocar los
+        índices (puede correr en un hilo) y commit_archive confirma el cambio.
+        """
+        grupos: Dict[Tuple[int, str], List[dict]] = defaultdict(list)
+        for recorrido in self._recorridos.values():
+            if recorrido["fecha"] < fecha_limite and recorrido["id"] not in self._archivados:
+                grupos[(recorrido["montacarga_id"], recorrido["fecha"])].append(
+                    {**recorrido, "puntos_recorrido": recorrido["puntos_recorrido"].copy()}
+                )
+        return dict(grupos)
+
+    def write_archive(self, grupos: Dict[Tuple[int, str], List[dict]]) -> Dict[Tuple[int, str], dict]:
+        """Escribe los chunks de prepare_archive; devuelve la entrada del índice de cada uno"""
+        return {clave: self._archivo.write(*clave, copias) for clave, copias in grupos.items()}
+
+    def commit_archive(self, grupos: Dict[Tuple[int, str], List[dict]],
+                       entradas: Dict[Tuple[int, str], dict]) -> int:
+        """
+        Último paso de archive_before: los recorridos que no cambiaron desde
+        prepare_archive pasan a indexarse con los metadatos del archivo. Los
+        borrados o modificados mientras tanto (raro: puntos tardíos de días
+        viejos) salen del chunk y siguen en memoria hasta la pasada siguiente.
+        Devuelve la cantidad de recorridos archivados.
+        """
+        archivados = 0
+        for clave, copias in grupos.items():
+            metas = {meta["id"]: meta for meta in entradas[clave]["recorridos"]}
+            for copia in copias:
+                recorrido = self._recorridos.get(copia["id"])
+                if recorrido is None or len(recorrido["puntos_recorrido"]) != len(copia["puntos_recorrido"]) or any(
+                    recorrido.get(k) != v for k, v in copia.items() if k != "puntos_recorrido"
+                ):
+                    self._archivo.remove(*clave, copia["id"])
+                    continue
+                meta = metas[copia["id"]]
+                self._recorridos[meta["id"]] = meta
+                for lista in (self._orden, self._por_montacarga[meta["montacarga_id"]]):
+                    lista[bisect_right(lista, meta["id"], key=_por_id) - 1] = meta
+                self._quitar_inicio(clave, meta["id"])
+                if self._activos.get(clave) is recorrido:
+                    # Un punto tardío de ese día abre un recorrido nuevo en memoria
+                    del self._activos[clave]
+                self._archivados.add(meta["id"])
+                self._puntos_archivados += meta["n_puntos"]
+                self.aggregates.forget(meta["id"])
+                archivados += 1
+        return archivados
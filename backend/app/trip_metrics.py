@@ -0,0 +1,131 @@
+"""
+Motor de métricas de recorrido (NumPy)
+
+Distancia haversine, duración, tiempo en movimiento vs. inactivo y velocidades
+promedio/máxima, calculadas sobre arreglos completos en una sola pasada o de
+forma incremental al agregar un punto (o al insertar puntos atrasados, solo
+sobre los segmentos afectados).
+"""
+
+import numpy as np
+
+from .columns import PointColumns
+
+RADIO_TIERRA_KM = 6371.0088
+
+# Por debajo de esta velocidad (km/h) un segmento cuenta como tiempo inactivo
+VELOCIDAD_INACTIVO_KMH = 1.0
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Distancia haversine en km; acepta escalares o arreglos NumPy"""
+    lat1, lng1, lat2, lng2 = (np.radians(v) for v in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * np.arcsin(np.sqrt(a))
+
+
+def segment_distances_km(lat: np.ndarray, lng: np.ndarray) -> np.ndarray:
+    """Distancia de cada segmento consecutivo (n - 1 valores)"""
+    return haversine_km(lat[:-1], lng[:-1], lat[1:], lng[1:])
+
+
+def _segmentos(lat: np.ndarray, lng: np.ndarray, ts: np.ndarray):
+    """Distancia, duración y velocidad de cada segmento consecutivo"""
+    distancias = segment_distances_km(lat, lng)
+    dt = np.diff(ts)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        velocidades = np.where(dt > 0, distancias / dt * 3600.0, 0.0)
+    return distancias, dt, velocidades
+
+
+def compute_trip_metrics(puntos: PointColumns, umbral_inactivo: float = VELOCIDAD_INACTIVO_KMH) -> dict:
+    """Calcula todas las métricas de un recorrido sobre sus columnas completas"""
+    if len(puntos) < 2:
+        return {
+            "distancia_km": 0.0,
+            "tiempo_minutos": 0,
+            "tiempo_movimiento_s": 0,
+            "tiempo_inactivo_s": 0,
+            "velocidad_promedio": 0.0,
+            "velocidad_maxima": 0.0,
+        }
+
+    distancias, dt, velocidades = _segmentos(puntos.lat, puntos.lng, puntos.ts)
+    en_movimiento = velocidades >= umbral_inactivo
+    duracion_s = int(puntos.ts[-1] - puntos.ts[0])
+    distancia_km = float(distancias.sum())
+    tiempo_movimiento_s = int(dt[en_movimiento].sum())
+
+    return {
+        "distancia_km": distancia_km,
+        "tiempo_minutos": duracion_s // 60,
+        "tiempo_movimiento_s": tiempo_movimiento_s,
+        "tiempo_inactivo_s": duracion_s - tiempo_movimiento_s,
+        "velocidad_promedio": distancia_km / (duracion_s / 3600) if duracion_s > 0 else 0.0,
+        "velocidad_maxima": float(velocidades.max()),
+    }
+
+
+def update_trip_metrics(recorrido: dict, umbral_inactivo: float = VELOCIDAD_INACTIVO_KMH) -> None:
+    """
+    Actualiza en O(1) las métricas del recorrido tras agregar su último punto.
+    Equivale a compute_trip_metrics sobre el recorrido completo.
+    """
+    puntos = recorrido["puntos_recorrido"]
+    if len(puntos) < 2:
+        return
+
+    lat, lng, ts = puntos.lat, puntos.lng, puntos.ts
+    distancia = float(haversine_km(lat[-2], lng[-2], lat[-1], lng[-1]))
+    dt = int(ts[-1] - ts[-2])
+    velocidad = distancia / dt * 3600.0 if dt > 0 else 0.0
+
+    recorrido["distancia_km"] = recorrido.get("distancia_km", 0.0) + distancia
+    if velocidad >= umbral_inactivo:
+        recorrido["tiempo_movimiento_s"] = recorrido.get("tiempo_movimiento_s", 0) + dt
+
+    duracion_s = int(ts[-1] - ts[0])
+    recorrido["tiempo_minutos"] = duracion_s // 60
+    recorrido["tiempo_inactivo_s"] = duracion_s - recorrido.get("tiempo_movimiento_s", 0)
+    recorrido["velocidad_promedio"] = recorrido["distancia_km"] / (duracion_s / 3600) if duracion_s > 0 else 0.0
+    recorrido["velocidad_maxima"] = max(recorrido.get("velocidad_maxima", 0.0), velocidad)
+
+
+def segment_metrics(puntos: PointColumns, desde: int, fin: int,
+                    umbral_inactivo: float = VELOCIDAD_INACTIVO_KMH) -> tuple:
+    """(distancia, tiempo en movimiento, velocidad máxima) de los segmentos entre los puntos [desde, fin)"""
+    lat, lng, ts = puntos.lat[desde:fin], puntos.lng[desde:fin], puntos.ts[desde:fin]
+    if len(ts) < 2:
+        return 0.0, 0, 0.0
+    distancias, dt, velocidades = _segmentos(lat, lng, ts)
+    return float(distancias.sum()), int(dt[velocidades >= umbral_inactivo].sum()), float(velocidades.max())
+
+
+def merge_trip_metrics(recorrido: dict, desde: int, fin: int, anteriores: tuple,
+                       umbral_inactivo: float = VELOCIDAD_INACTIVO_KMH) -> None:
+    """
+    Actualiza las métricas tras insertar puntos entre los puntos [desde, fin):
+    reemplaza el aporte de esos segmentos antes de insertar (`anteriores`, de
+    segment_metrics) por el actual, sin recorrer el resto del recorrido.
+    """
+    puntos = recorrido["puntos_recorrido"]
+    distancia, movimiento, maxima = segment_metrics(puntos, desde, fin, umbral_inactivo)
+    distancia_previa, movimiento_previo, maxima_previa = anteriores
+    if maxima < maxima_previa >= recorrido.get("velocidad_maxima", 0.0):
+        # La velocidad máxima estaba en un segmento reemplazado: no se puede descontar
+        recompute_trip_metrics(recorrido)
+        return
+
+    recorrido["distancia_km"] = recorrido.get("distancia_km", 0.0) - distancia_previa + distancia
+    recorrido["tiempo_movimiento_s"] = recorrido.get("tiempo_movimiento_s", 0) - movimiento_previo + movimiento
+    duracion_s = int(puntos.ts[-1] - puntos.ts[0]) if len(puntos) else 0
+    recorrido["tiempo_minutos"] = duracion_s // 60
+    recorrido["tiempo_inactivo_s"] = duracion_s - recorrido["tiempo_movimiento_s"]
+    recorrido["velocidad_promedio"] = recorrido["distancia_km"] / (duracion_s / 3600) if duracion_s > 0 else 0.0
+    recorrido["velocidad_maxima"] = max(recorrido.get("velocidad_maxima", 0.0), maxima)
+
+
+def recompute_trip_metrics(recorrido: dict) -> dict:
+    """Recalcula en bloque las métricas (lotes, correcciones y backfill)"""
+    recorrido.update(compute_trip_metrics(recorrido["puntos_recorrido"]))
+    return recorrido
@@ -0,0 +1,416 @@
+"""
+Log binario append-only (write-ahead) de puntos aceptados y snapshots del estado
+
+- Cada punto aceptado se escribe como un registro de tamaño fijo antes de
+  aplicarse al store. Los fsync se agrupan (group commit): se sincroniza al
+  acumular `group_size` registros o tras `intervalo_sync` segundos. El fsync
+  lo hace un hilo propio del log, para no bloquear el event loop.
+- Un snapshot compacta el estado completo de montacargas y recorridos
+  (columnas NumPy + metadatos JSON), junto con el del filtro GPS, la ventana
+  de deduplicación y las alertas, y rota el log a una nueva generación. El
+  estado se toma en el loop (vistas copy-on-write de los puntos) y el
+  snapshot se escribe en un hilo.
+- Al arrancar se carga el último snapshot y se re-aplica la cola del log
+  de forma vectorizada, en tramos consecutivos de cada montacarga.
+"""
+
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .alerts import AlertEngine
+from .archive import TripArchive
+from .columns import PointColumns
+from .dedup import DedupWindow
+from .gps_filter import GpsFilter
+from .ingest import append_points, drop_duplicates, status_code, status_name
+from .store import TelemetryStore
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"RRWAL001"
+
+RECORD_DTYPE = np.dtype([
+    ("mc_id", "<u4"),
+    ("ts", "<i8"),
+    ("lat", "<f8"),
+    ("lng", "<f8"),
+    ("speed", "<f4"),
+    ("battery", "u1"),
+    ("status", "u1"),
+])
+
+SNAPSHOT_FILE = "snapshot.npz"
+COLUMNAS_SNAPSHOT = ("lat", "lng", "ts", "speed", "battery")
+
+
+def log_path(directorio: str, generacion: int) -> str:
+    return os.path.join(directorio, f"telemetry-{generacion:06d}.log")
+
+
+def _fsync_directorio(directorio: str) -> None:
+    fd = os.open(directorio, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class TelemetryLog:
+    """
+    Archivo de log de una generación con group commit de fsync. La escritura
+    solo vacía el buffer al sistema operativo; el fsync corre en un hilo.
+    """
+
+    def __init__(self, directorio: str, generacion: int, group_size: int = 512, intervalo_sync: float = 0.05):
+        self.directorio = directorio
+        self.generacion = generacion
+        self.group_size = group_size
+        self.intervalo_sync = intervalo_sync
+        self.registros_escritos = 0
+        self._pendientes = 0
+        self._ultimo_sync = time.monotonic()
+
+        self.path = log_path(directorio, generacion)
+        nuevo = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self._file = open(self.path, "ab")
+        if nuevo:
+            self._file.write(MAGIC)
+            self.sync()
+            _fsync_directorio(directorio)
+
+        self._sync_pedido = threading.Event()
+        self._cerrando = False
+        self._hilo_sync = threading.Thread(target=self._sincronizar, name=f"wal-sync-{generacion}", daemon=True)
+        self._hilo_sync.start()
+
+    def append(self, mc_id: int, ts: int, lat: float, lng: float,
+               speed: float = 0.0, battery: int = 100, status: str = "active") -> None:
+        registro = np.array(
+            [(mc_id, ts, lat, lng, speed, battery, status_code(status))], dtype=RECORD_DTYPE
+        )
+        self._escribir(registro)
+
+    def append_many(self, mc_id: int, ts: np.ndarray, lat: np.ndarray, lng: np.ndarray,
+                    speed: np.ndarray, battery: np.ndarray, status: Sequence[str]) -> None:
+        registros = np.empty(len(ts), dtype=RECORD_DTYPE)
+        registros["mc_id"] = mc_id
+        registros["ts"] = ts
+        registros["lat"] = lat
+        registros["lng"] = lng
+        registros["speed"] = speed
+        registros["battery"] = battery
+        registros["status"] = [status_code(st) for st in status]
+        self._escribir(registros)
+
+    def _escribir(self, registros: np.ndarray) -> None:
+        self._file.write(registros.tobytes())
+        self.registros_escritos += len(registros)
+        self._pendientes += len(registros)
+        if self._pendientes >= self.group_size or time.monotonic() - self._ultimo_sync >= self.intervalo_sync:
+            self.request_sync()
+
+    def request_sync(self) -> None:
+        """Vacía el buffer al sistema operativo y pide el fsync al hilo (no bloquea)"""
+        self._file.flush()
+        self._pendientes = 0
+        self._ultimo_sync = time.monotonic()
+        self._sync_pedido.set()
+
+    def _sincronizar(self) -> None:
+        """Hilo de fsync: un pedido cubre todo lo vaciado antes de atenderlo"""
+        while True:
+            self._sync_pedido.wait()
+            self._sync_pedido.clear()
+            if self._cerrando:
+                return
+            try:
+                os.fsync(self._file.fileno())
+            except OSError:
+                logger.exception("Error en fsync de %s", self.path)
+
+    def sync(self) -> None:
+        """Vacía el buffer y hace fsync de todo lo escrito hasta ahora (bloqueante)"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pendientes = 0
+        self._ultimo_sync = time.monotonic()
+
+    def sync_if_pending(self) -> None:
+        if self._pendientes:
+            self.request_sync()
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._cerrando = True
+            self._sync_pedido.set()
+            self._hilo_sync.join()
+            self.sync()
+            self._file.close()
+
+
+def read_log(path: str) -> np.ndarray:
+    """
+    Lee todos los registros de un archivo de log. Un registro final incompleto
+    (escritura interrumpida por una caída) se descarta y se trunca del archivo.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"Archivo de log inválido: {path}")
+        datos = f.read()
+
+    completos = len(datos) // RECORD_DTYPE.itemsize
+    if completos * RECORD_DTYPE.itemsize != len(datos):
+        logger.warning("Registro incompleto al final de %s; se descarta", path)
+        with open(path, "r+b") as f:
+            f.truncate(len(MAGIC) + completos * RECORD_DTYPE.itemsize)
+    return np.frombuffer(datos, dtype=RECORD_DTYPE, count=completos)
+
+
+def group_by_montacarga(registros: np.ndarray, en_orden: bool = False):
+    """
+    Agrupa registros del log por montacarga y genera los argumentos de
+    append_points: (mc_id, ts, lat, lng, speed, battery, status).
+
+    Por defecto junta todos los registros de cada montacarga (conservando su
+    orden relativo). Con `en_orden` respeta el orden global del log: corta en
+    tramos consecutivos del mismo montacarga con timestamps no decrecientes, de
+    modo que aplicar los registros en una o varias lecturas da el mismo estado.
+    """
+    if len(registros) == 0:
+        return
+    if en_orden:
+        cortes = np.flatnonzero((np.diff(registros["mc_id"]) != 0) | (np.diff(registros["ts"]) < 0)) + 1
+        inicios = np.concatenate(([0], cortes))
+        mc_ids = registros["mc_id"][inicios]
+    else:
+        registros = registros[np.argsort(registros["mc_id"], kind="stable")]
+        mc_ids, inicios = np.unique(registros["mc_id"], return_index=True)
+    fines = np.append(inicios[1:], len(registros))
+    for mc_id, inicio, fin in zip(mc_ids.tolist(), inicios.tolist(), fines.tolist()):
+        grupo = registros[inicio:fin]
+        yield (mc_id, grupo["ts"], grupo["lat"], grupo["lng"], grupo["speed"], grupo["battery"],
+               [status_name(codigo) for codigo in grupo["status"].tolist()])
+
+
+def replay(store: TelemetryStore, registros: np.ndarray, filtro: Optional[GpsFilter] = None,
+           en_orden: bool = False, dedup: Optional[DedupWindow] = None,
+           alertas: Optional[AlertEngine] = None) -> int:
+    """
+    Re-aplica registros del log al store agrupando por montacarga. Como en la
+    ingesta, append_points ordena cada grupo por timestamp antes de pasarlo por
+    el filtro. Por defecto un grupo junta todos los registros del montacarga, así
+    que un envío atrasado se aplica en su lugar y no al final; con `en_orden`
+    los grupos son los tramos del log (ver group_by_montacarga). Con `dedup`,
+    los reenvíos se descartan igual que en la ingesta, y con `alertas` las
+    reglas se evalúan sobre los puntos aplicados (sin publicar los eventos).
+    """
+    aplicados = 0
+    for args in group_by_montacarga(registros, en_orden):
+        if not store.has_montacarga(args[0]):
+            continue
+        if dedup is not None:
+            args = drop_duplicates(dedup, args)
+            if args is None:
+                continue
+        append_points(store, *args, filtro=filtro)
+        if alertas is not None and alertas.reglas:
+            alertas.evaluate_many(*args)
+        aplicados += len(args[1])
+    return aplicados
+
+
+# ---------- Snapshots ----------
+
+def write_snapshot(store: TelemetryStore, directorio: str, generacion: int,
+                   filtro: Optional[GpsFilter] = None, extra: Optional[dict] = None,
+                   dedup: Optional[DedupWindow] = None, alertas: Optional[AlertEngine] = None) -> None:
+    """
+    Escribe atómicamente (tmp + rename) el estado completo del store y, con
+    `filtro`, `dedup` y `alertas`, el del filtro GPS, la ventana de
+    deduplicación y las alertas. `generacion` es la primera generación de log
+    NO incluida en el snapshot; `extra` se agrega a los metadatos.
+    """
+    save_snapshot(directorio, *capture_snapshot(store, generacion, filtro, extra, dedup, alertas))
+
+
+def capture_snapshot(store: TelemetryStore, generacion: int, filtro: Optional[GpsFilter] = None,
+                     extra: Optional[dict] = None, dedup: Optional[DedupWindow] = None,
+                     alertas: Optional[AlertEngine] = None) -> Tuple[bytes, List[PointColumns]]:
+    """
+    Parte de write_snapshot que lee el estado (en el loop): los metadatos ya
+    codificados en JSON y una vista copy-on-write de los puntos de cada
+    recorrido, que los puntos que lleguen después no modifican.
+    """
+    # Los recorridos archivados ya son durables en el archivo comprimido
+    recorridos = store.list_recorridos(archivados=False)
+    meta = {
+        "generacion": generacion,
+        "montacargas": store.list_montacargas(),
+        "recorridos": [
+            {**{k: v for k, v in r.items() if k != "puntos_recorrido"}, "n_puntos": len(r["puntos_recorrido"])}
+            for r in recorridos
+        ],
+    }
+    if filtro is not None:
+        meta["filtro_gps"] = filtro.export_state()
+    if dedup is not None:
+        meta["dedup"] = dedup.export_state()
+    if alertas is not None:
+        meta["alertas"] = alertas.export_state()
+    meta.update(extra or {})
+    return json.dumps(meta, default=float).encode(), [r["puntos_recorrido"].view() for r in recorridos]
+
+
+def save_snapshot(directorio: str, meta: bytes, puntos: List[PointColumns]) -> None:
+    """Parte de write_snapshot que copia y escribe los puntos (puede correr en un hilo)"""
+    columnas = {
+        nombre: np.concatenate([getattr(p, nombre) for p in puntos]) if puntos else np.empty(0)
+        for nombre in COLUMNAS_SNAPSHOT
+    }
+    tmp = os.path.join(directorio, SNAPSHOT_FILE + ".tmp")
+    with open(tmp, "wb") as f:
+        np.savez(f, meta=np.frombuffer(meta, dtype=np.uint8), **columnas)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, os.path.join(directorio, SNAPSHOT_FILE))
+    _fsync_directorio(directorio)
+
+
+def load_snapshot(directorio: str, filtro: Optional[GpsFilter] = None,
+                  dedup: Optional[DedupWindow] = None,
+                  alertas: Optional[AlertEngine] = None) -> Tuple[Optional[TelemetryStore], dict]:
+    """
+    Carga el snapshot si existe (y restaura en `filtro`, `dedup` y `alertas`
+    el estado guardado; un snapshot sin ventana de deduplicación, o con otra
+    duración, la siembra con los puntos almacenados). Devuelve (store,
+    metadatos): "generacion" es la generación desde la que re-aplicar el log,
+    más los `extra` de write_snapshot.
+    """
+    path = os.path.join(directorio, SNAPSHOT_FILE)
+    if not os.path.exists(path):
+        return None, {"generacion": 0}
+
+    with np.load(path) as datos:
+        meta = json.loads(datos["meta"].tobytes())
+        columnas = {nombre: datos[nombre] for nombre in COLUMNAS_SNAPSHOT}
+    if filtro is not None:
+        filtro.load_state(meta.get("filtro_gps", {}))
+
+    recorridos = []
+    inicio = 0
+    for recorrido in meta["recorridos"]:
+        fin = inicio + recorrido.pop("n_puntos")
+        puntos = PointColumns(max(fin - inicio, 1))
+        puntos.extend(*(columnas[nombre][inicio:fin] for nombre in COLUMNAS_SNAPSHOT))
+        recorrido["puntos_recorrido"] = puntos
+        recorridos.append(recorrido)
+        inicio = fin
+
+    store = TelemetryStore(meta.pop("montacargas"), recorridos)
+    del meta["recorridos"]
+    meta.pop("filtro_gps", None)
+    estado_dedup = meta.pop("dedup", None)
+    if dedup is not None:
+        if estado_dedup is not None and estado_dedup["ventana_s"] == dedup.ventana_s:
+            dedup.load_state(estado_dedup)
+        else:
+            seed_dedup(dedup, store)
+    estado_alertas = meta.pop("alertas", None)
+    if alertas is not None and estado_alertas is not None:
+        alertas.load_state(estado_alertas)
+    return store, meta
+
+
+def seed_dedup(dedup: DedupWindow, store: TelemetryStore) -> None:
+    """Ventana de deduplicación a partir de los puntos en memoria (sin estado guardado)"""
+    for recorrido in store.list_recorridos(archivados=False):
+        dedup.seed(recorrido["montacarga_id"], recorrido["puntos_recorrido"].ts)
+
+
+def compact(store: TelemetryStore, log: TelemetryLog, filtro: Optional[GpsFilter] = None,
+            dedup: Optional[DedupWindow] = None, alertas: Optional[AlertEngine] = None) -> TelemetryLog:
+    """
+    Escribe un snapshot, rota el log a una nueva generación y borra las
+    anteriores. Con `filtro`, `dedup` y `alertas`, su estado entra en el snapshot.
+    """
+    nuevo, escribir = begin_compaction(store, log, filtro, dedup, alertas)
+    escribir()
+    return nuevo
+
+
+def begin_compaction(store: TelemetryStore, log: TelemetryLog, filtro: Optional[GpsFilter] = None,
+                     dedup: Optional[DedupWindow] = None,
+                     alertas: Optional[AlertEngine] = None) -> Tuple[TelemetryLog, Callable[[], None]]:
+    """
+    Parte de compact que corre en el loop: abre la generación siguiente del
+    log y toma el estado (ver capture_snapshot). Devuelve el log nuevo y la
+    escritura, que cierra el log anterior, escribe el snapshot y borra las
+    generaciones que cubre; puede correr en un hilo mientras la ingesta sigue
+    en el log nuevo. Una caída antes de terminarla deja el snapshot anterior
+    y todas las generaciones.
+    """
+    nueva_generacion = log.generacion + 1
+    meta, puntos = capture_snapshot(store, nueva_generacion, filtro, dedup=dedup, alertas=alertas)
+    nuevo = TelemetryLog(log.directorio, nueva_generacion, log.group_size, log.intervalo_sync)
+
+    def escribir() -> None:
+        log.close()
+        save_snapshot(log.directorio, meta, puntos)
+        for path in glob.glob(os.path.join(log.directorio, "telemetry-*.log")):
+            if path < log_path(log.directorio, nueva_generacion):
+                os.remove(path)
+
+    return nuevo, escribir
+
+
+def recover(directorio: str, store_inicial: TelemetryStore, filtro: Optional[GpsFilter] = None,
+            archivo: Optional[TripArchive] = None, dedup: Optional[DedupWindow] = None,
+            alertas: Optional[AlertEngine] = None, **opciones_log) -> Tuple[TelemetryStore, TelemetryLog, dict]:
+    """
+    Recupera el estado: último snapshot (o `store_inicial` si no hay) más la
+    cola del log, re-aplicada en el orden del log y con el mismo filtro GPS que
+    la ingesta (restaurado desde el snapshot), de modo que los recorridos
+    nuevos reciben los mismos ids y los mismos puntos filtrados. Con `archivo`,
+    los recorridos archivados se registran antes de re-aplicar el log (los
+    recorridos nuevos no reutilizan sus ids). Con `dedup` y `alertas`, la
+    ventana de deduplicación y las alertas parten del snapshot y la cola se
+    re-aplica sobre ellas como en la ingesta. Devuelve el store, el log
+    abierto para escritura e información de la recuperación.
+    """
+    inicio = time.perf_counter()
+    os.makedirs(directorio, exist_ok=True)
+
+    store, meta = load_snapshot(directorio, filtro, dedup, alertas)
+    generacion = meta["generacion"]
+    if store is None:
+        store = store_inicial
+        if dedup is not None:
+            seed_dedup(dedup, store)
+    if archivo is not None:
+        store.attach_archive(archivo)
+    t_snapshot = time.perf_counter() - inicio
+
+    aplicados = 0
+    ultima = generacion
+    for path in sorted(glob.glob(os.path.join(directorio, "telemetry-*.log"))):
+        if path < log_path(directorio, generacion):
+            continue
+        aplicados += replay(store, read_log(path), filtro, en_orden=True, dedup=dedup, alertas=alertas)
+        ultima = int(os.path.basename(path)[len("telemetry-"):-len(".log")])
+
+    info = {
+        "generacion": ultima,
+        "recorridos": store.count_recorridos(),
+        "puntos_reaplicados": aplicados,
+        "segundos_snapshot": round(t_snapshot, 4),
+        "segundos_total": round(time.perf_counter() - inicio, 4),
+    }
+    logger.info("Recuperación de telemetría: %s", info)
+    return store, TelemetryLog(directorio, ultima, **opciones_log), info
@@ -0,0 +1 @@
+# Scripts de benchmark del backend (ejecutar desde backend/: python -m benchmarks.<nombre>)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Benchmark: motor de reglas de alerta con 10k montacargas y 100 reglas
+
+Reglas: 30 de velocidad global, 30 de velocidad por zona (8 zonas), 20 de
+batería, 10 de estado y 10 sin_datos; 20 de ellas limitadas a algunos
+montacargas. Mide la evaluación punto a punto (1M puntos) y por lotes, la
+compara con un evaluador ingenuo (todas las reglas en cada punto) sobre los
+primeros puntos, verificando que ambos emiten los mismos eventos, y mide
+tick() con el heap de vencimientos (sin vencidos y con los 10k vencidos).
+Uso (desde backend/): python -m benchmarks.bench_alerts
+"""
+
+import time
+
+import numpy as np
+
+from app.alerts import AlertEngine
+from app.geofence import GeofenceIndex
+
+MONTACARGAS = 10_000
+PUNTOS = 1_000_000
+PUNTOS_COMPARACION = 100_000
+ESTADOS = ["active", "idle", "maintenance", "charging", "error"]
+
+
+def zonas_grilla():
+    zonas = []
+    for k in range(8):
+        lat, lng = 6.2660 + (k // 4) * 0.002, -75.5710 + (k % 4) * 0.001
+        zonas.append({"id": k + 1, "nombre": f"Zona {k + 1}",
+                      "poligono": [[lat, lng], [lat + 0.0006, lng], [lat + 0.0006, lng + 0.0006], [lat, lng + 0.0006]]})
+    return zonas
+
+
+def generar_reglas(rng):
+    reglas = []
+    for k in range(30):
+        reglas.append({"id": f"vel_{k}", "tipo": "velocidad", "max_kmh": float(8 + k * 0.5)})
+    for k in range(30):
+        reglas.append({"id": f"vel_zona_{k}", "tipo": "velocidad", "zona_id": k % 8 + 1, "max_kmh": float(4 + k % 10)})
+    for k in range(20):
+        reglas.append({"id": f"bat_{k}", "tipo": "bateria", "min": float(5 + k * 2)})
+    for k in range(10):
+        reglas.append({"id": f"estado_{k}", "tipo": "estado", "estados": [ESTADOS[k % 5]]})
+    for k in range(10):
+        reglas.append({"id": f"sin_datos_{k}", "tipo": "sin_datos", "segundos": 60.0 * (k + 1)})
+    for indice in rng.choice(len(reglas), 20, replace=False).tolist():
+        reglas[indice]["mc_ids"] = set(rng.choice(MONTACARGAS, 100, replace=False).tolist())
+    return reglas
+
+
+class EvaluadorIngenuo:
+    """Referencia: recorre todas las reglas en cada punto (sin la regla sin_datos)"""
+
+    def __init__(self, reglas, zonas):
+        self.reglas = [(i, r) for i, r in enumerate(reglas) if r["tipo"] != "sin_datos"]
+        self.zonas = zonas
+        self.activas = {}
+
+    def evaluate(self, mc_id, ts, lat, lng, speed, battery, status):
+        zona = self.zonas.classify(lat, lng)
+        nuevas = set()
+        for indice, regla in self.reglas:
+            if regla.get("mc_ids") is not None and mc_id not in regla["mc_ids"]:
+                continue
+            tipo = regla["tipo"]
+            if ((tipo == "velocidad" and speed > regla["max_kmh"]
+                 and (regla.get("zona_id") is None or regla.get("zona_id") == zona))
+                    or (tipo == "bateria" and battery < regla["min"])
+                    or (tipo == "estado" and status in regla["estados"])):
+                nuevas.add(indice)
+        anteriores = self.activas.get(mc_id, set())
+        self.activas[mc_id] = nuevas
+        # Mismo costo de armar los eventos que el motor
+        return [{"alerta": "activa", "regla": indice, "mc_id": mc_id, "ts": ts} for indice in nuevas - anteriores] + \
+               [{"alerta": "resuelta", "regla": indice, "mc_id": mc_id, "ts": ts} for indice in anteriores - nuevas]
+
+
+def generar_puntos(rng, n):
+    """
+    Rondas en las que cada montacarga envía un punto: posición y velocidad como
+    caminatas aleatorias, batería que baja de a poco y status que cambia rara vez
+    """
+    rondas = n // MONTACARGAS
+    forma = (rondas, MONTACARGAS)
+    lat = 6.2660 + np.clip(rng.uniform(0, 0.0026, MONTACARGAS) + rng.normal(0, 2e-5, forma).cumsum(axis=0), 0, 0.0026)
+    lng = -75.5710 + np.clip(rng.uniform(0, 0.0040, MONTACARGAS) + rng.normal(0, 2e-5, forma).cumsum(axis=0), 0, 0.0040)
+    speed = np.clip(rng.uniform(0, 15, MONTACARGAS) + rng.normal(0, 1, forma).cumsum(axis=0), 0, 25)
+    battery = np.clip(rng.uniform(5, 100, MONTACARGAS) - rng.uniform(0, 0.3, forma).cumsum(axis=0), 0, 100).round()
+    codigos = np.empty(forma, dtype=np.int64)
+    codigos[0] = 0
+    for ronda in range(1, rondas):
+        cambia = rng.random(MONTACARGAS) < 0.01
+        codigos[ronda] = np.where(cambia, rng.integers(0, 5, MONTACARGAS), codigos[ronda - 1])
+    status = [ESTADOS[k] for k in codigos.ravel().tolist()]
+    mc = np.tile(np.arange(MONTACARGAS), rondas)
+    return mc.tolist(), lat.ravel().tolist(), lng.ravel().tolist(), speed.ravel().tolist(), battery.ravel().tolist(), status
+
+
+def main():
+    rng = np.random.default_rng(11)
+    zonas = GeofenceIndex(zonas_grilla())
+    reglas = generar_reglas(rng)
+    reloj = [0.0]
+    motor = AlertEngine(reglas, zonas, reloj=lambda: reloj[0])
+    mc, lat, lng, speed, battery, status = generar_puntos(rng, PUNTOS)
+
+    # Equivalencia con el evaluador ingenuo (eventos de reglas por punto)
+    ingenuo = EvaluadorIngenuo(reglas, zonas)
+    indice_regla = {r["id"]: i for i, r in enumerate(reglas)}
+    inicio = time.perf_counter()
+    esperados = [ingenuo.evaluate(mc[i], i, lat[i], lng[i], speed[i], battery[i], status[i])
+                 for i in range(PUNTOS_COMPARACION)]
+    t_ingenuo = time.perf_counter() - inicio
+    iguales = True
+    for i in range(PUNTOS_COMPARACION):
+        eventos = motor.evaluate(mc[i], i, lat[i], lng[i], speed[i], battery[i], status[i])
+        obtenidos = {(indice_regla[e["regla_id"]], e["alerta"]) for e in eventos if e["tipo"] != "sin_datos"}
+        iguales &= obtenidos == {(e["regla"], e["alerta"]) for e in esperados[i]}
+    print(f"{len(reglas)} reglas, {MONTACARGAS:,} montacargas; mismos eventos que el evaluador ingenuo "
+          f"en {PUNTOS_COMPARACION:,} puntos: {iguales}")
+    print(f"evaluador ingenuo      : {PUNTOS_COMPARACION / t_ingenuo:12,.0f} puntos/s")
+
+    inicio = time.perf_counter()
+    for i in range(PUNTOS_COMPARACION, PUNTOS):
+        motor.evaluate(mc[i], i, lat[i], lng[i], speed[i], battery[i], status[i])
+    t_motor = time.perf_counter() - inicio
+    n = PUNTOS - PUNTOS_COMPARACION
+    print(f"motor (punto a punto)  : {n / t_motor:12,.0f} puntos/s  ({t_motor / n * 1e6:.2f} us/punto)")
+
+    # Lotes de 100 puntos: las 100 rondas de cada montacarga en una llamada
+    lote = PUNTOS // MONTACARGAS
+    ts = np.arange(lote, dtype=np.int64)
+    columnas = [np.asarray(x).reshape(lote, MONTACARGAS) for x in (lat, lng, speed, battery)]
+    estados = np.asarray(status).reshape(lote, MONTACARGAS)
+    motor_lotes = AlertEngine(reglas, zonas, reloj=lambda: reloj[0])
+    inicio = time.perf_counter()
+    for k in range(MONTACARGAS):
+        motor_lotes.evaluate_many(k, ts, *(c[:, k] for c in columnas), estados[:, k].tolist())
+    t_lotes = time.perf_counter() - inicio
+    print(f"motor (lotes de {lote})  : {PUNTOS / t_lotes:12,.0f} puntos/s")
+
+    inicio = time.perf_counter()
+    for _ in range(1000):
+        motor.tick()
+    print(f"tick sin vencimientos  : {(time.perf_counter() - inicio) / 1000 * 1e6:8.2f} us  "
+          f"({motor.stats()['vencimientos_programados']:,} vencimientos programados)")
+    reloj[0] = 61.0
+    inicio = time.perf_counter()
+    vencidas = motor.tick()
+    print(f"tick con {len(vencidas):,} alertas sin_datos vencidas: {(time.perf_counter() - inicio) * 1e3:.1f} ms  "
+          f"alertas activas: {motor.stats()['alertas_activas']:,}")
+
+
+if __name__ == "__main__":
+    main()
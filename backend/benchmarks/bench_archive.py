@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark: retención por niveles (memoria caliente + archivo comprimido)
+
+Genera 90 días de historial para 20 montacargas (un recorrido diario de
+1440 puntos), archiva todo lo anterior a los últimos 7 días y compara la
+memoria de puntos residente, el tamaño del archivo y la latencia de lectura
+de un recorrido caliente, archivado sin caché (LRU fría) y archivado en caché.
+Verifica además que los puntos leídos del archivo son idénticos a los originales.
+Uso (desde backend/): python -m benchmarks.bench_archive
+"""
+
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from app.archive import TripArchive
+from app.store import TelemetryStore
+
+DIAS = 90
+DIAS_CALIENTES = 7
+MONTACARGAS = 20
+PUNTOS_DIA = 1440  # un punto por minuto durante 24 h
+CACHE_CHUNKS = 64
+INICIO = date(2025, 7, 1)
+
+
+def generar(store):
+    rng = np.random.default_rng(3)
+    originales = {}
+    for d in range(DIAS):
+        fecha = (INICIO + timedelta(days=d)).isoformat()
+        base = int(np.datetime64(fecha, "s").astype(np.int64))
+        for mc_id in range(1, MONTACARGAS + 1):
+            recorrido = store.create_recorrido(montacarga_id=mc_id, fecha=fecha, hora_inicio="00:00",
+                                               hora_fin="23:59", distancia_km=0.0, puntos_recorrido=[])
+            puntos = recorrido["puntos_recorrido"]
+            puntos.extend(
+                # Coordenadas con 6 decimales y velocidad con 1, como las envían los dispositivos
+                lat=np.round(6.2687 + rng.normal(0, 2e-5, PUNTOS_DIA).cumsum(), 6),
+                lng=np.round(-75.5697 + rng.normal(0, 2e-5, PUNTOS_DIA).cumsum(), 6),
+                ts=base + np.arange(PUNTOS_DIA, dtype=np.int64) * 60,
+                speed=np.round(rng.uniform(0, 12, PUNTOS_DIA), 1).astype(np.float32),
+                battery=np.linspace(100, 20, PUNTOS_DIA).astype(np.uint8),
+            )
+            originales[recorrido["id"]] = {c: getattr(puntos, c).copy() for c in ("lat", "lng", "ts", "speed", "battery")}
+    return originales
+
+
+def bytes_puntos(store):
+    return sum(len(r["puntos_recorrido"]) * 29 for r in store.list_recorridos(archivados=False))
+
+
+def latencia(funcion, repeticiones):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return (time.perf_counter() - inicio) / repeticiones * 1e3
+
+
+def main():
+    store = TelemetryStore(
+        [{"id": i, "codigo": f"MC-{i:03d}", "modelo": "Sim", "estado": "Activo"} for i in range(1, MONTACARGAS + 1)]
+    )
+    originales = generar(store)
+    total = store.count_puntos()
+    antes = bytes_puntos(store)
+
+    with tempfile.TemporaryDirectory() as directorio:
+        archivo = TripArchive(directorio, CACHE_CHUNKS)
+        store.attach_archive(archivo)
+        limite = (INICIO + timedelta(days=DIAS - DIAS_CALIENTES)).isoformat()
+        inicio = time.perf_counter()
+        archivados = store.archive_before(limite)
+        t_archivo = time.perf_counter() - inicio
+        stats = archivo.stats()
+
+        print(f"historial: {DIAS} días x {MONTACARGAS} montacargas, {total:,} puntos ({antes / 1e6:.1f} MB de columnas)")
+        print(f"archivado: {archivados} recorridos en {t_archivo:.2f} s, {stats['bytes_comprimidos'] / 1e6:.1f} MB en disco "
+              f"(x{stats['puntos'] * 29 / stats['bytes_comprimidos']:.1f} de compresión)")
+        print(f"memoria de puntos residente: {bytes_puntos(store) / 1e6:.1f} MB calientes "
+              f"+ caché LRU <= {CACHE_CHUNKS * PUNTOS_DIA * 29 / 1e6:.1f} MB  (count_puntos={store.count_puntos():,})")
+
+        caliente = store.recorridos_by_montacarga(1, limite)[0]["id"]
+        frios = iter(range(1, archivados + 1))
+        print(f"lectura caliente        : {latencia(lambda: store.get_recorrido(caliente), 2000):.4f} ms")
+        print(f"lectura archivada (fría): {latencia(lambda: store.get_recorrido(next(frios)), 500):.4f} ms")
+        print(f"lectura archivada (LRU) : {latencia(lambda: store.get_recorrido(1), 2000):.4f} ms")
+        rango = latencia(lambda: store.recorridos_by_montacarga(1, "2025-07-01", "2025-07-31"), 5)
+        print(f"montacarga 1, 31 días archivados: {rango:.2f} ms")
+
+        iguales = all(
+            np.array_equal(getattr(store.get_recorrido(i)["puntos_recorrido"], c), valores)
+            for i, columnas in originales.items() for c, valores in columnas.items()
+        )
+        print(f"puntos idénticos tras archivar: {iguales}  "
+              f"caché: {archivo.stats()['cache_chunks']} chunks, {archivo.aciertos} aciertos, {archivo.fallos} fallos")
+        archivo.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark: ingesta de un lote offline de 10k puntos
+
+Compara el procesamiento punto a punto (un MicrocontrollerData y un
+append_point por punto, como hacía el endpoint original) con el
+pipeline en bloque de /api/microcontroller/batch.
+Uso (desde backend/): python -m benchmarks.bench_batch
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from app import main
+from app.columns import parse_timestamp
+from app.ingest import append_point
+from app.store import TelemetryStore
+
+PUNTOS = 10_000
+
+
+def generar_lote():
+    inicio = datetime(2025, 10, 18, 22, 0, 0)
+    return [
+        {
+            "t": (inicio + timedelta(seconds=5 * i)).isoformat(),
+            "lat": 6.2687 + i * 1e-6,
+            "lng": -75.5697 - i * 1e-6,
+            "s": 8.5,
+            "b": 90 - i // 1000,
+            "st": "active",
+        }
+        for i in range(PUNTOS)
+    ]
+
+
+def nuevo_store():
+    return TelemetryStore([{"id": 1, "codigo": "MC-001", "modelo": "Sim", "estado": "Activo"}])
+
+
+def por_punto(lote):
+    store = nuevo_store()
+    for punto_data in lote:
+        punto = main.MicrocontrollerData(
+            mc_id=1, timestamp=punto_data["t"], lat=punto_data["lat"], lng=punto_data["lng"],
+            speed=punto_data["s"], battery=punto_data["b"], status=punto_data["st"]
+        )
+        append_point(store, 1, parse_timestamp(punto.timestamp), punto.lat, punto.lng, punto.speed, punto.battery, punto.status)
+    return store
+
+
+def en_bloque(lote):
+    main.store = nuevo_store()
+    respuesta = asyncio.run(main.receive_batch_data(main.MicrocontrollerBatch(mc_id=1, data=lote)))
+    return main.store, respuesta
+
+
+def main_bench():
+    lote = generar_lote()
+
+    inicio = time.perf_counter()
+    store_a = por_punto(lote)
+    t_punto = (time.perf_counter() - inicio) * 1000
+
+    inicio = time.perf_counter()
+    store_b, respuesta = en_bloque(lote)
+    t_bloque = (time.perf_counter() - inicio) * 1000
+
+    dist_a = sum(r["distancia_km"] for r in store_a.list_recorridos())
+    dist_b = sum(r["distancia_km"] for r in store_b.list_recorridos())
+    print(f"Puntos: {PUNTOS:,} (cruzando medianoche -> {store_b.count_recorridos()} recorridos)")
+    print(f"punto a punto : {t_punto:8.1f} ms  distancia={dist_a:.4f} km")
+    print(f"en bloque     : {t_bloque:8.1f} ms  distancia={dist_b:.4f} km  "
+          f"aceptados={respuesta.accepted} rechazados={respuesta.rejected}")
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark: subida binaria compacta vs. lote JSON
+
+Compara bytes por punto (JSON, JSON gzip y binario) y el rendimiento de
+decodificación: json.loads + validación + parseo de timestamps del lote
+JSON contra np.frombuffer + sumas acumuladas del formato binario. También
+mide el request completo a ambos endpoints con TestClient.
+Uso (desde backend/): python -m benchmarks.bench_binary
+"""
+
+import gzip
+import json
+import time
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from app import main
+from app.binary_upload import decode_upload, encode_upload
+from app.columns import parse_timestamps
+from app.store import TelemetryStore
+
+PUNTOS = 10_000
+REPETICIONES = 5
+
+
+def generar_puntos():
+    rng = np.random.default_rng(3)
+    ts = 1_760_824_800 + np.cumsum(rng.integers(1, 6, PUNTOS))
+    lat = 6.2687 + np.cumsum(rng.normal(0, 2e-6, PUNTOS))
+    lng = -75.5697 + np.cumsum(rng.normal(0, 2e-6, PUNTOS))
+    speed = rng.uniform(0, 15, PUNTOS).round(2)
+    battery = np.linspace(95, 60, PUNTOS).astype(np.uint8)
+    status = ["active"] * PUNTOS
+    return ts, lat, lng, speed, battery, status
+
+
+def cuerpo_json(ts, lat, lng, speed, battery, status) -> bytes:
+    fechas = np.datetime_as_string(ts.astype("datetime64[s]"))
+    datos = [
+        {"t": t, "lat": round(la, 7), "lng": round(ln, 7), "s": s, "b": b, "st": st}
+        for t, la, ln, s, b, st in zip(fechas.tolist(), lat.tolist(), lng.tolist(),
+                                        speed.tolist(), battery.tolist(), status)
+    ]
+    return json.dumps({"mc_id": 1, "data": datos}, separators=(",", ":")).encode()
+
+
+def decodificar_json(cuerpo: bytes):
+    """Mismo trabajo que /api/microcontroller/batch antes de encolar"""
+    lote = json.loads(cuerpo)
+    puntos, _, _ = main._validar_lote(lote["data"])
+    ts, _ = parse_timestamps([p.t for p in puntos])
+    lat = np.array([p.lat for p in puntos], dtype=np.float64)
+    lng = np.array([p.lng for p in puntos], dtype=np.float64)
+    speed = np.array([p.s or 0 for p in puntos], dtype=np.float32)
+    battery = np.array([100 if p.b is None else p.b for p in puntos], dtype=np.uint8)
+    return ts, lat, lng, speed, battery
+
+
+def medir(func):
+    inicio = time.perf_counter()
+    for _ in range(REPETICIONES):
+        resultado = func()
+    return (time.perf_counter() - inicio) / REPETICIONES * 1e3, resultado
+
+
+def main_bench():
+    puntos = generar_puntos()
+    json_bytes = cuerpo_json(*puntos)
+    binario = encode_upload(1, *puntos)
+
+    print(f"Puntos: {PUNTOS:,}")
+    for nombre, tamano in (("json", len(json_bytes)), ("json gzip", len(gzip.compress(json_bytes))),
+                           ("binario", len(binario)), ("binario gzip", len(gzip.compress(binario)))):
+        print(f"{nombre:13}: {tamano / PUNTOS:7.1f} bytes/punto  ({tamano / 1024:8.1f} KiB)")
+
+    ms_json, (ts_j, lat_j, _, _, _) = medir(lambda: decodificar_json(json_bytes))
+    ms_bin, (_, ts_b, lat_b, _, _, _, _) = medir(lambda: decode_upload(binario))
+    print(f"decodificar json   : {ms_json:8.2f} ms  ({PUNTOS / ms_json / 1e3:8.2f} M puntos/s)")
+    print(f"decodificar binario: {ms_bin:8.2f} ms  ({PUNTOS / ms_bin / 1e3:8.2f} M puntos/s)")
+    print(f"mismos datos       : ts={np.array_equal(ts_j, ts_b)} "
+          f"lat max err={np.abs(lat_j - lat_b).max():.1e}")
+
+    main.store = TelemetryStore([{"id": 1, "codigo": "MC-001", "modelo": "Sim", "estado": "Activo"}])
+    with TestClient(main.app) as cliente:
+        headers_json = {"Content-Type": "application/json"}
+        headers_bin = {"Content-Type": "application/octet-stream"}
+        ms_req_json, _ = medir(lambda: cliente.post("/api/microcontroller/batch", content=json_bytes, headers=headers_json))
+        ms_req_bin, _ = medir(lambda: cliente.post("/api/microcontroller/binary", content=binario, headers=headers_bin))
+    print(f"request batch json : {ms_req_json:8.2f} ms")
+    print(f"request binario    : {ms_req_bin:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main_bench()
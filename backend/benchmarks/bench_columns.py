@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Benchmark: memoria de 1M puntos GPS en dicts vs. columnas tipadas
+
+Uso (desde backend/): python -m benchmarks.bench_columns
+"""
+
+import time
+import tracemalloc
+
+import numpy as np
+
+from app.columns import PointColumns, format_timestamps
+
+PUNTOS = 1_000_000
+BASE_TS = 1_760_774_400  # 2025-10-18T08:00:00
+
+
+def generar_datos():
+    rng = np.random.default_rng(42)
+    lat = 6.2687 + rng.normal(0, 1e-3, PUNTOS).cumsum() * 1e-3
+    lng = -75.5697 + rng.normal(0, 1e-3, PUNTOS).cumsum() * 1e-3
+    ts = BASE_TS + np.arange(PUNTOS, dtype=np.int64) * 30
+    return lat.tolist(), lng.tolist(), ts
+
+
+def medir(construir):
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    resultado = construir()
+    duracion = time.perf_counter() - inicio
+    memoria, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return resultado, memoria, duracion
+
+
+def main():
+    lat, lng, ts = generar_datos()
+
+    def layout_dicts():
+        # Cada punto guarda además su propio string de timestamp
+        timestamps = format_timestamps(ts)
+        return [
+            {"lat": la, "lng": ln, "timestamp": t}
+            for la, ln, t in zip(lat, lng, timestamps)
+        ]
+
+    def layout_columnar():
+        columnas = PointColumns()
+        for i in range(PUNTOS):
+            columnas.append(lat[i], lng[i], int(ts[i]), 12.5, 90)
+        return columnas
+
+    dicts, mem_dicts, t_dicts = medir(layout_dicts)
+    del dicts
+    columnas, mem_cols, t_cols = medir(layout_columnar)
+
+    print(f"Puntos: {PUNTOS:,}")
+    print(f"dicts     : {mem_dicts / 1e6:8.1f} MB  ({mem_dicts / PUNTOS:6.1f} B/punto)  {t_dicts:.2f}s")
+    print(f"columnar  : {mem_cols / 1e6:8.1f} MB  ({mem_cols / PUNTOS:6.1f} B/punto)  {t_cols:.2f}s")
+    print(f"reservado : {columnas.nbytes / 1e6:8.1f} MB en columnas (capacidad tras duplicaciones)")
+    print(f"reducción : {mem_dicts / mem_cols:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
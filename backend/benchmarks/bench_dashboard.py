@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /api/dashboard/stats con recorrido completo vs. agregados incrementales
+
+Incluye la verificación de consistencia de los contadores contra un recálculo.
+Uso (desde backend/): python -m benchmarks.bench_dashboard
+"""
+
+import time
+
+from app.aggregates import minutos_recorrido
+from app.store import TelemetryStore
+
+RECORRIDOS = 100_000
+CONSULTAS = 200
+
+
+def generar_store():
+    montacargas = [{"id": i, "codigo": f"MC-{i:03d}", "modelo": "Sim", "estado": "Activo"} for i in range(1, 101)]
+    recorridos = [
+        {
+            "id": i + 1,
+            "montacarga_id": i % 100 + 1,
+            "fecha": f"2025-{i // 100 % 12 + 1:02d}-{i // 1200 % 28 + 1:02d}",
+            "hora_inicio": f"{8 + i % 4:02d}:00",
+            "hora_fin": f"{9 + i % 4:02d}:{i % 60:02d}",
+            "distancia_km": 1.0 + (i % 7) * 0.1,
+            "puntos_recorrido": [],
+        }
+        for i in range(RECORRIDOS)
+    ]
+    return TelemetryStore(montacargas, recorridos)
+
+
+def stats_recorrido_completo(store):
+    """Réplica del cálculo original de get_dashboard_stats"""
+    recorridos = store.list_recorridos()
+    distancia_total = sum(r["distancia_km"] for r in recorridos)
+    tiempo_total = sum(minutos_recorrido(r) for r in recorridos)
+    activos = len([m for m in store.list_montacargas() if m["estado"] == "Activo"])
+    return len(recorridos), distancia_total, tiempo_total, activos
+
+
+def medir(func):
+    inicio = time.perf_counter()
+    for _ in range(CONSULTAS):
+        func()
+    return (time.perf_counter() - inicio) / CONSULTAS * 1e6
+
+
+def main():
+    store = generar_store()
+    t_completo = medir(lambda: stats_recorrido_completo(store))
+    t_incremental = medir(lambda: store.aggregates.stats())
+    t_rango = medir(lambda: store.aggregates.stats("2025-03-01", "2025-06-30"))
+
+    print(f"Recorridos: {RECORRIDOS:,}")
+    print(f"recorrido completo : {t_completo:10.1f} us/consulta")
+    print(f"incremental        : {t_incremental:10.1f} us/consulta")
+    print(f"rango por días     : {t_rango:10.1f} us/consulta")
+
+    diferencias = store.aggregates.check(store.list_recorridos(), store.list_montacargas())
+    print("consistencia       :", "OK" if not diferencias else diferencias)
+
+
+if __name__ == "__main__":
+    main()
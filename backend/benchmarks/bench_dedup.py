@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Benchmark: reenvíos de lotes y puntos atrasados (deduplicación + inserción en orden)
+
+Simula 50 montacargas que envían lotes de 10 puntos durante 8 horas; el 20 %
+de los lotes se reenvía (timeout con el lote ya aplicado) y el 5 % llega
+tarde, después de 1 a 3 lotes posteriores. Compara la distancia con la del
+recorrido real en tres casos: la ingesta anterior (append a ciegas), la
+ingesta actual sin ventana de deduplicación y con ella. Mide además el costo
+de insertar un punto atrasado según el largo del recorrido (frente a
+recalcular las métricas completas) y el de la ventana de deduplicación.
+Uso (desde backend/): python -m benchmarks.bench_dedup
+"""
+
+import time
+
+import numpy as np
+
+from app.columns import PointColumns
+from app.dedup import DedupWindow
+from app.ingest import append_points, drop_duplicates
+from app.store import TelemetryStore
+from app.trip_metrics import compute_trip_metrics, recompute_trip_metrics
+
+MONTACARGAS = 50
+PUNTOS = 2880  # un punto cada 10 s durante 8 h
+LOTE = 10
+REENVIOS = 0.20
+ATRASADOS = 0.05
+INICIO = int(np.datetime64("2025-11-20T06:00:00", "s").astype(np.int64))
+
+
+def generar(rng):
+    """Recorrido real de cada montacarga (caminata aleatoria, un punto cada 10 s)"""
+    recorridos = {}
+    for mc_id in range(1, MONTACARGAS + 1):
+        recorridos[mc_id] = (
+            INICIO + np.arange(PUNTOS, dtype=np.int64) * 10,
+            6.2687 + rng.normal(0, 2e-5, PUNTOS).cumsum(),
+            -75.5697 + rng.normal(0, 2e-5, PUNTOS).cumsum(),
+            rng.uniform(0, 12, PUNTOS).astype(np.float32),
+            np.full(PUNTOS, 90, dtype=np.uint8),
+        )
+    return recorridos
+
+
+def envios(rng, recorridos):
+    """Lotes en orden de llegada: reenvíos duplicados y lotes demorados"""
+    llegadas = []
+    for mc_id, columnas in recorridos.items():
+        pendientes = []
+        for inicio in range(0, PUNTOS, LOTE):
+            lote = (mc_id, *(c[inicio:inicio + LOTE] for c in columnas))
+            if rng.random() < ATRASADOS:
+                pendientes.append([int(rng.integers(1, 4)), lote])
+            else:
+                llegadas.append(lote)
+                if rng.random() < REENVIOS:
+                    llegadas.append(lote)
+            for demorado in pendientes:
+                demorado[0] -= 1
+            llegadas += [lote for espera, lote in pendientes if espera == 0]
+            pendientes = [p for p in pendientes if p[0] > 0]
+        llegadas += [lote for _, lote in pendientes]
+    return llegadas
+
+
+def nuevo_store():
+    return TelemetryStore(
+        [{"id": i, "codigo": f"MC-{i:03d}", "modelo": "Sim", "estado": "Activo"} for i in range(1, MONTACARGAS + 1)]
+    )
+
+
+def ingesta_anterior(llegadas):
+    """Implementación anterior: cada lote se agrega al final y se recalcula el recorrido"""
+    recorridos = {}
+    for mc_id, ts, lat, lng, speed, battery in llegadas:
+        columnas = recorridos.setdefault(mc_id, {"puntos_recorrido": PointColumns()})
+        orden = np.argsort(ts, kind="stable")
+        columnas["puntos_recorrido"].extend(lat[orden], lng[orden], ts[orden], speed[orden], battery[orden])
+        recompute_trip_metrics(columnas)
+    return recorridos
+
+
+def ingesta_actual(llegadas, dedup):
+    store = nuevo_store()
+    for mc_id, ts, lat, lng, speed, battery in llegadas:
+        args = (mc_id, ts, lat, lng, speed, battery, ["active"] * len(ts))
+        if dedup is not None:
+            args = drop_duplicates(dedup, args)
+            if args is None:
+                continue
+        append_points(store, *args)
+    return {r["montacarga_id"]: r for r in store.list_recorridos()}
+
+
+def resumen(nombre, recorridos, reales, segundos, puntos):
+    error = np.mean([abs(recorridos[mc]["distancia_km"] / reales[mc] - 1) for mc in reales]) * 100
+    ordenados = sum(bool(np.all(np.diff(r["puntos_recorrido"].ts) > 0)) for r in recorridos.values())
+    almacenados = sum(len(r["puntos_recorrido"]) for r in recorridos.values())
+    print(f"{nombre:28s}: error distancia {error:6.2f} %  puntos {almacenados:,} de {puntos:,}  "
+          f"recorridos en orden {ordenados}/{len(reales)}  {segundos * 1e3:7.0f} ms")
+
+
+def latencia_insercion(rng, n):
+    """Inserta puntos atrasados (hasta 1 h antes del final) en un recorrido de n puntos"""
+    puntos = PointColumns(n + 2048)
+    puntos.extend(6.2687 + rng.normal(0, 2e-5, n).cumsum(), -75.5697 + rng.normal(0, 2e-5, n).cumsum(),
+                  INICIO + np.arange(n, dtype=np.int64) * 10, rng.uniform(0, 12, n), np.full(n, 90))
+    recorrido = {"puntos_recorrido": puntos, "distancia_km": 0.0}
+    recompute_trip_metrics(recorrido)
+    store = nuevo_store()
+    store.add_recorrido({"id": 1, "montacarga_id": 1, "fecha": "2025-11-20", "hora_inicio": "06:00",
+                         "hora_fin": "23:59", **recorrido})
+    repeticiones = 1000
+    lat, lng = np.array([6.2687]), np.array([-75.5697])
+    speed, battery = np.array([5.0], dtype=np.float32), np.array([90], dtype=np.uint8)
+    inicio = time.perf_counter()
+    for k in range(repeticiones):
+        # Un ts nuevo entre dos puntos originales, entre 60 y 360 puntos (10 s) antes del final
+        ts = np.array([INICIO + (n - 60 - k % 300) * 10 + 1 + k // 300], dtype=np.int64)
+        append_points(store, 1, ts, lat, lng, speed, battery, ["active"])
+    t_insercion = (time.perf_counter() - inicio) / repeticiones * 1e6
+    inicio = time.perf_counter()
+    for _ in range(20):
+        compute_trip_metrics(puntos)
+    t_completo = (time.perf_counter() - inicio) / 20 * 1e6
+    iguales = all(abs(v - store.get_recorrido(1)[k]) < 1e-6 for k, v in compute_trip_metrics(puntos).items())
+    return t_insercion, t_completo, iguales
+
+
+def main():
+    rng = np.random.default_rng(5)
+    recorridos = generar(rng)
+    reales = {mc: compute_trip_metrics(_columnas(c))["distancia_km"] for mc, c in recorridos.items()}
+    llegadas = envios(rng, recorridos)
+    puntos = sum(len(l[1]) for l in llegadas)
+    print(f"{MONTACARGAS} montacargas x {PUNTOS:,} puntos; {len(llegadas):,} envíos ({puntos:,} puntos, "
+          f"{REENVIOS:.0%} de lotes reenviados, {ATRASADOS:.0%} atrasados)")
+
+    inicio = time.perf_counter()
+    anterior = ingesta_anterior(llegadas)
+    resumen("anterior (append a ciegas)", anterior, reales, time.perf_counter() - inicio, puntos)
+    inicio = time.perf_counter()
+    sin_ventana = ingesta_actual(llegadas, None)
+    resumen("inserción en orden, sin dedup", sin_ventana, reales, time.perf_counter() - inicio, puntos)
+    dedup = DedupWindow()
+    inicio = time.perf_counter()
+    actual = ingesta_actual(llegadas, dedup)
+    resumen("inserción en orden + dedup", actual, reales, time.perf_counter() - inicio, puntos)
+    iguales = all(np.array_equal(actual[mc]["puntos_recorrido"].ts, recorridos[mc][0]) for mc in recorridos)
+    print(f"puntos idénticos al recorrido real: {iguales}  dedup: {dedup.stats()}")
+
+    print("punto atrasado (hasta 1 h antes del final) frente a recalcular el recorrido:")
+    for n in (1_000, 10_000, 100_000, 1_000_000):
+        t_insercion, t_completo, ok = latencia_insercion(rng, n)
+        print(f"  {n:>9,} puntos: inserción {t_insercion:8.1f} us   recálculo completo {t_completo:10.1f} us   "
+              f"métricas iguales: {ok}")
+
+    ventana = DedupWindow()
+    ts = (INICIO + np.arange(1_000_000, dtype=np.int64) * 10).tolist()
+    inicio = time.perf_counter()
+    for i, t in enumerate(ts):
+        ventana.accept(i % 1000, t)
+    t_punto = (time.perf_counter() - inicio) / len(ts) * 1e6
+    lotes = np.arange(100_000, dtype=np.int64).reshape(10_000, LOTE) * 10 + INICIO
+    inicio = time.perf_counter()
+    for k, lote in enumerate(lotes):
+        ventana.accept_many(1000 + k % 1000, lote)
+    t_lote = (time.perf_counter() - inicio) / lotes.size * 1e6
+    print(f"ventana de {ventana.ventana_s} s: accept {t_punto:.2f} us/punto, accept_many (lotes de {LOTE}) "
+          f"{t_lote:.2f} us/punto, {ventana.ventana_s // 8} bytes por montacarga")
+
+
+def _columnas(columnas):
+    ts, lat, lng, speed, battery = columnas
+    puntos = PointColumns(len(ts))
+    puntos.extend(lat, lng, ts, speed, battery)
+    return puntos
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Benchmark: filtro GPS sobre recorridos sintéticos con ruido
+
+Genera recorridos con verdad conocida (tramos en movimiento, paradas con
+jitter, picos de outliers y huecos de inactividad de más de 30 min), los
+re-aplica con y sin GpsFilter y compara la distancia contra la real, los
+puntos almacenados y el número de recorridos. También verifica que la ruta
+punto a punto (append_point) y la de lotes (append_points) dan lo mismo.
+Uso (desde backend/): python -m benchmarks.bench_filter
+"""
+
+import time
+
+import numpy as np
+
+from app.gps_filter import GpsFilter
+from app.ingest import append_point, append_points
+from app.store import TelemetryStore
+from app.trip_metrics import haversine_km
+
+MONTACARGAS = 20
+INTERVALO_S = 5
+RUIDO_M = 4.0
+PROB_OUTLIER = 0.01
+INICIO = 1_760_767_200  # 2025-10-18 06:00 UTC
+METROS_POR_GRADO = 111_195.0
+LOTE = 60
+
+
+def generar(rng):
+    """Por montacarga: tramos alternos de marcha y parada, con huecos largos"""
+    datos = []
+    for mc_id in range(1, MONTACARGAS + 1):
+        ts, lat, lng, speed, real_lat, real_lng = [], [], [], [], [], []
+        t, la, ln, rumbo = INICIO, 6.2670, -75.5686, rng.uniform(0, 2 * np.pi)
+        recorridos = 1
+        for tramo in range(12):
+            if tramo % 4 == 3:
+                # Hueco de inactividad: 40 min sin datos (mitad) o detenido (mitad)
+                recorridos += tramo < 11
+                if tramo % 8 == 3:
+                    t += 2400
+                    continue
+                pasos, velocidad = 2400 // INTERVALO_S, 0.0
+            elif tramo % 2 == 1:
+                pasos, velocidad = int(rng.integers(24, 120)), 0.0  # parada de 2-10 min
+            else:
+                pasos, velocidad = int(rng.integers(60, 240)), rng.uniform(2.0, 4.0)  # m/s
+            for _ in range(pasos):
+                t += INTERVALO_S
+                rumbo += rng.normal(0, 0.15)
+                la += velocidad * INTERVALO_S * np.cos(rumbo) / METROS_POR_GRADO
+                ln += velocidad * INTERVALO_S * np.sin(rumbo) / METROS_POR_GRADO
+                ruido = rng.normal(0, RUIDO_M, 2)
+                if rng.random() < PROB_OUTLIER:
+                    ruido += rng.choice([-1, 1], 2) * 300
+                ts.append(t)
+                real_lat.append(la)
+                real_lng.append(ln)
+                lat.append(la + ruido[0] / METROS_POR_GRADO)
+                lng.append(ln + ruido[1] / METROS_POR_GRADO)
+                speed.append(velocidad * 3.6 + abs(rng.normal(0, 0.3)) if velocidad else 0.0)
+        real_km = float(haversine_km(np.array(real_lat[:-1]), np.array(real_lng[:-1]),
+                                     np.array(real_lat[1:]), np.array(real_lng[1:])).sum())
+        datos.append((mc_id, np.array(ts, dtype=np.int64), np.array(lat), np.array(lng),
+                      np.array(speed), real_km, recorridos))
+    return datos
+
+
+def nuevo_store():
+    return TelemetryStore([
+        {"id": mc_id, "codigo": f"MC-{mc_id:03d}", "modelo": "Sim", "estado": "Activo"}
+        for mc_id in range(1, MONTACARGAS + 1)
+    ])
+
+
+def por_lotes(datos, filtro):
+    store = nuevo_store()
+    for mc_id, ts, lat, lng, speed, _, _ in datos:
+        battery = np.full(len(ts), 90, dtype=np.int64)
+        for i in range(0, len(ts), LOTE):
+            append_points(store, mc_id, ts[i:i + LOTE], lat[i:i + LOTE], lng[i:i + LOTE],
+                          speed[i:i + LOTE], battery[i:i + LOTE], ["active"] * len(ts[i:i + LOTE]), filtro=filtro)
+    return store
+
+
+def por_punto(datos, filtro):
+    store = nuevo_store()
+    for mc_id, ts, lat, lng, speed, _, _ in datos:
+        for t, la, ln, s in zip(ts.tolist(), lat.tolist(), lng.tolist(), speed.tolist()):
+            append_point(store, mc_id, t, la, ln, s, 90, "active", filtro=filtro)
+    return store
+
+
+def resumen(store):
+    return [
+        (r["montacarga_id"], len(r["puntos_recorrido"]), round(r["distancia_km"], 6))
+        for r in store.list_recorridos()
+    ]
+
+
+def errores(store, datos):
+    """Error relativo de distancia por montacarga y recorridos con la cantidad esperada"""
+    distancia, cantidad = {}, {}
+    for r in store.list_recorridos():
+        distancia[r["montacarga_id"]] = distancia.get(r["montacarga_id"], 0.0) + r["distancia_km"]
+        cantidad[r["montacarga_id"]] = cantidad.get(r["montacarga_id"], 0) + 1
+    error = [abs(distancia[d[0]] - d[5]) / d[5] for d in datos]
+    correctos = sum(cantidad[d[0]] == d[6] for d in datos)
+    return 100 * float(np.mean(error)), correctos
+
+
+def main():
+    rng = np.random.default_rng(15)
+    datos = generar(rng)
+    total = sum(len(d[1]) for d in datos)
+    real_km = sum(d[5] for d in datos)
+
+    inicio = time.perf_counter()
+    crudo = por_lotes(datos, None)
+    s_crudo = time.perf_counter() - inicio
+
+    filtro = GpsFilter()
+    inicio = time.perf_counter()
+    filtrado = por_lotes(datos, filtro)
+    s_filtrado = time.perf_counter() - inicio
+
+    individual = por_punto(datos, GpsFilter())
+
+    for nombre, store, segundos in (("sin filtro", crudo, s_crudo), ("con filtro", filtrado, s_filtrado)):
+        error, correctos = errores(store, datos)
+        puntos = sum(len(r["puntos_recorrido"]) for r in store.list_recorridos())
+        print(f"{nombre:11s}: error distancia {error:7.1f} %  recorridos correctos {correctos:3d}/{MONTACARGAS}  "
+              f"puntos {puntos:8,}  ({total / segundos:10,.0f} puntos/s)")
+    print(f"Puntos crudos: {total:,}  distancia real: {real_km:.1f} km  filtro: {filtro.stats()}")
+    print("punto a punto == lotes:", resumen(individual) == resumen(filtrado))
+
+
+if __name__ == "__main__":
+    main()
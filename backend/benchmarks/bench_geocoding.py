@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Benchmark: geocoding sin bloquear la ingesta, caché y coalescencia
+
+Reemplaza la API de Google por un servidor stub local que tarda 200 ms en
+responder (GEOCODING_URL) y, con la app en proceso (httpx + ASGITransport):
+- mide la latencia de POST /api/microcontroller/data sola, con geocodings
+  de direcciones distintas en vuelo, y con la implementación anterior
+  (requests.get dentro del handler async) para comparar;
+- lanza 100 consultas concurrentes de la misma dirección escrita de formas
+  distintas y cuenta las llamadas que llegan al stub;
+- mide la latencia de una consulta servida desde la caché.
+Uso (desde backend/): python -m benchmarks.bench_geocoding
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+import numpy as np
+import requests
+
+DEMORA_STUB_S = 0.2
+INGESTAS = 300
+INGESTAS_BLOQUEANTE = 10
+INTERVALO_INGESTA_S = 0.005
+GEOCODINGS_EN_VUELO = 16
+CONCURRENTES = 100
+
+
+class StubGeocoding(BaseHTTPRequestHandler):
+    """Responde como la API de geocoding de Google, con demora fija"""
+
+    llamadas = 0
+
+    def do_GET(self):
+        StubGeocoding.llamadas += 1
+        direccion = parse_qs(urlparse(self.path).query).get("address", [""])[0]
+        time.sleep(DEMORA_STUB_S)
+        cuerpo = json.dumps({
+            "status": "OK",
+            "results": [{"formatted_address": direccion, "geometry": {"location": {"lat": 6.2687, "lng": -75.5697}}}],
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+
+def iniciar_stub() -> ThreadingHTTPServer:
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), StubGeocoding)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+async def latencias_ingesta(cliente, desde: int, cantidad: int) -> np.ndarray:
+    """
+    Un punto cada INTERVALO_INGESTA_S; la latencia se mide desde el instante
+    planificado del envío, así cuenta también la espera por un loop bloqueado.
+    """
+    latencias = []
+    inicio = time.perf_counter()
+    for i in range(cantidad):
+        planificado = inicio + i * INTERVALO_INGESTA_S
+        await asyncio.sleep(max(0.0, planificado - time.perf_counter()))
+        segundos = desde + i
+        punto = {"mc_id": 1, "timestamp": f"2025-11-20T{8 + segundos // 3600:02d}:{segundos // 60 % 60:02d}:{segundos % 60:02d}",
+                 "lat": 6.2687 + i * 1e-5, "lng": -75.5697, "speed": 6.0, "battery": 90}
+        respuesta = await cliente.post("/api/microcontroller/data", json=punto)
+        latencias.append(time.perf_counter() - planificado)
+        assert respuesta.status_code == 200, respuesta.text
+    return np.array(latencias) * 1e3
+
+
+async def geocodings_continuos(cliente, prefijo: str, parar: asyncio.Event):
+    """Mantiene GEOCODINGS_EN_VUELO consultas de direcciones distintas (sin caché) en vuelo"""
+    contador = 0
+
+    async def trabajador(k):
+        nonlocal contador
+        while not parar.is_set():
+            contador += 1
+            await cliente.post("/api/maps/geocode", params={"address": f"{prefijo} calle {k}-{contador}"})
+            # Cede el loop entre consultas (con la implementación bloqueante, ASGITransport no lo haría)
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(trabajador(k) for k in range(GEOCODINGS_EN_VUELO)))
+
+
+async def escenario(cliente, nombre: str, desde: int, prefijo=None, cantidad=INGESTAS):
+    parar = asyncio.Event()
+    fondo = asyncio.ensure_future(geocodings_continuos(cliente, prefijo, parar)) if prefijo else None
+    await asyncio.sleep(0.05)
+    latencias = await latencias_ingesta(cliente, desde, cantidad)
+    parar.set()
+    if fondo is not None:
+        await fondo
+    print(f"{nombre:38s} p50 {np.percentile(latencias, 50):7.2f} ms  p99 {np.percentile(latencias, 99):7.2f} ms  "
+          f"max {latencias.max():7.2f} ms")
+
+
+async def main():
+    stub = iniciar_stub()
+    os.environ["GEOCODING_URL"] = f"http://127.0.0.1:{stub.server_address[1]}/maps/api/geocode/json"
+    os.environ.setdefault("GOOGLE_MAPS_API_KEY", "stub")
+    from app import main as api
+
+    await api.iniciar_servicios()
+    try:
+        transporte = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://bench", timeout=60) as cliente:
+            print(f"stub de geocoding con {DEMORA_STUB_S * 1e3:.0f} ms de demora")
+            await escenario(cliente, "ingesta sola", 0)
+            await escenario(cliente, f"ingesta + {GEOCODINGS_EN_VUELO} geocodings en vuelo", INGESTAS, "nueva")
+
+            # Implementación anterior: requests.get bloqueante dentro del handler async
+            original = api.geocoder.geocode
+
+            async def bloqueante(direccion, api_key):
+                respuesta = requests.get(api.GEOCODING_URL, params={"address": direccion, "key": api_key})
+                respuesta.raise_for_status()
+                return respuesta.json()
+
+            api.geocoder.geocode = bloqueante
+            # Pocas ingestas: cada una espera detrás de varias llamadas bloqueantes
+            await escenario(cliente, "ingesta + geocoding anterior (bloquea)", 2 * INGESTAS, "anterior",
+                            INGESTAS_BLOQUEANTE)
+            api.geocoder.geocode = original
+
+            llamadas = StubGeocoding.llamadas
+            variantes = ["Calle 10 # 20-30, Medellín", "  calle 10 # 20-30,   MEDELLÍN ", "CALLE 10 # 20-30, medellín"]
+            inicio = time.perf_counter()
+            respuestas = await asyncio.gather(*(
+                cliente.post("/api/maps/geocode", params={"address": variantes[i % len(variantes)]})
+                for i in range(CONCURRENTES)
+            ))
+            t_concurrentes = time.perf_counter() - inicio
+            assert all(r.status_code == 200 for r in respuestas)
+            print(f"{CONCURRENTES} consultas concurrentes de la misma dirección: {StubGeocoding.llamadas - llamadas} "
+                  f"llamada(s) al stub en {t_concurrentes * 1e3:.0f} ms")
+
+            inicio = time.perf_counter()
+            for _ in range(200):
+                await cliente.post("/api/maps/geocode", params={"address": variantes[0]})
+            print(f"consulta desde la caché: {(time.perf_counter() - inicio) / 200 * 1e3:.2f} ms  "
+                  f"estadísticas: {(await cliente.get('/api/maps/geocode/stats')).json()}")
+    finally:
+        await api.detener_servicios()
+        stub.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark: clasificación de puntos en 1.000 geocercas
+
+Compara la búsqueda lineal (probar todos los polígonos) con el índice de
+grilla, punto a punto (ingesta individual) y en lote (classify_many), y
+verifica que las tres clasificaciones coinciden.
+Uso (desde backend/): python -m benchmarks.bench_geofence
+"""
+
+import time
+
+import numpy as np
+
+from app.geofence import GeofenceIndex, GeofenceTracker
+
+ZONAS = 1_000
+PUNTOS = 20_000
+CENTRO = (6.2670, -75.5686)
+
+
+def generar_zonas(rng):
+    """Polígonos de 8 vértices irregulares (15-40 m) repartidos en ~2.5 km²"""
+    zonas = []
+    angulos = np.linspace(0, 2 * np.pi, 8, endpoint=False)
+    for zona_id in range(1, ZONAS + 1):
+        lat0 = CENTRO[0] + rng.uniform(-0.007, 0.007)
+        lng0 = CENTRO[1] + rng.uniform(-0.007, 0.007)
+        radios = rng.uniform(0.00015, 0.00035, 8)
+        poligono = np.stack((lat0 + radios * np.sin(angulos), lng0 + radios * np.cos(angulos)), axis=1)
+        zonas.append({"id": zona_id, "nombre": f"Zona {zona_id}", "poligono": poligono.tolist()})
+    return zonas
+
+
+def lineal(index, lat, lng):
+    """Sin índice: cada punto contra todos los polígonos (en orden de área)"""
+    poligonos = sorted(index._poligonos, key=lambda p: p.area)
+    resultado = []
+    for la, ln in zip(lat.tolist(), lng.tolist()):
+        zona = -1
+        for poligono in poligonos:
+            if poligono.contiene(np.array([la]), np.array([ln]))[0]:
+                zona = poligono.zona_id
+                break
+        resultado.append(zona)
+    return np.array(resultado)
+
+
+def main():
+    rng = np.random.default_rng(11)
+    index = GeofenceIndex(generar_zonas(rng))
+    lat = CENTRO[0] + rng.uniform(-0.0075, 0.0075, PUNTOS)
+    lng = CENTRO[1] + rng.uniform(-0.0075, 0.0075, PUNTOS)
+
+    muestra = 500
+    inicio = time.perf_counter()
+    esperado = lineal(index, lat[:muestra], lng[:muestra])
+    us_lineal = (time.perf_counter() - inicio) / muestra * 1e6
+
+    inicio = time.perf_counter()
+    por_punto = [index.classify(la, ln) for la, ln in zip(lat.tolist(), lng.tolist())]
+    us_punto = (time.perf_counter() - inicio) / PUNTOS * 1e6
+    por_punto = np.array([-1 if z is None else z for z in por_punto])
+
+    inicio = time.perf_counter()
+    en_lote = index.classify_many(lat, lng)
+    us_lote = (time.perf_counter() - inicio) / PUNTOS * 1e6
+
+    tracker = GeofenceTracker(index)
+    ts = np.arange(PUNTOS, dtype=np.int64) * 5
+    inicio = time.perf_counter()
+    eventos = tracker.update_many(1, ts, lat, lng)
+    ms_tracker = (time.perf_counter() - inicio) * 1e3
+
+    print(f"Zonas: {ZONAS:,}  celdas: {len(index._celdas):,}  puntos: {PUNTOS:,} "
+          f"({np.count_nonzero(en_lote >= 0):,} dentro de alguna zona)")
+    print(f"lineal        : {us_lineal:9.2f} us/punto")
+    print(f"grilla (1 pt) : {us_punto:9.2f} us/punto  ({1e6 / us_punto:10,.0f} puntos/s)")
+    print(f"grilla (lote) : {us_lote:9.2f} us/punto  ({1e6 / us_lote:10,.0f} puntos/s)")
+    print(f"tracker lote  : {ms_tracker:9.2f} ms  ({len(eventos):,} eventos entrada/salida)")
+    print("coinciden     :", np.array_equal(esperado, por_punto[:muestra]) and np.array_equal(por_punto, en_lote))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark: mapa de calor desde grillas pre-agregadas vs. recorrer los puntos crudos
+
+Ingiere lotes de 50 montacargas durante un día y compara la consulta de
+/api/analytics/heatmap (suma de celdas por hora) con agregar los puntos
+crudos en cada consulta, verificando que las visitas coinciden. Mide además
+una consulta de una zona pequeña (solo visita sus tiles) y el tamaño de la
+grilla tras 30 días con y sin la agregación diaria de las horas antiguas.
+Uso (desde backend/): python -m benchmarks.bench_heatmap
+"""
+
+import time
+
+import numpy as np
+
+from app.heatmap import HeatmapGrid
+
+MONTACARGAS = 50
+PUNTOS_POR_MONTACARGA = 17_280  # un día a un punto cada 5 s
+LOTE = 120
+CONSULTAS = 20
+CAJA = (6.2600, 6.2740, -75.5760, -75.5620)
+ZONA = (6.2665, 6.2675, -75.5695, -75.5685)  # ~110 m de lado
+DIAS_HISTORIA = 30
+INICIO = 1_760_745_600
+
+
+def generar(rng):
+    datos = []
+    for mc_id in range(1, MONTACARGAS + 1):
+        ts = INICIO + np.arange(PUNTOS_POR_MONTACARGA, dtype=np.int64) * 5
+        lat = 6.2670 + np.cumsum(rng.normal(0, 2e-5, PUNTOS_POR_MONTACARGA)).clip(-0.006, 0.006)
+        lng = -75.5690 + np.cumsum(rng.normal(0, 2e-5, PUNTOS_POR_MONTACARGA)).clip(-0.006, 0.006)
+        speed = rng.uniform(0, 15, PUNTOS_POR_MONTACARGA)
+        datos.append((mc_id, ts, lat, lng, speed))
+    return datos
+
+
+def escaneo_crudo(datos, tamano, desde_ts, hasta_ts):
+    """Alternativa sin pre-agregación: filtrar y agrupar todos los puntos en cada consulta"""
+    ts = np.concatenate([d[1] for d in datos])
+    lat = np.concatenate([d[2] for d in datos])
+    lng = np.concatenate([d[3] for d in datos])
+    dentro = (ts >= desde_ts) & (ts <= hasta_ts) & (lat >= CAJA[0]) & (lat <= CAJA[1]) \
+        & (lng >= CAJA[2]) & (lng <= CAJA[3])
+    celdas = np.stack((np.floor(lat[dentro] / tamano), np.floor(lng[dentro] / tamano)), axis=1)
+    return np.unique(celdas, axis=0, return_counts=True)
+
+
+def main():
+    rng = np.random.default_rng(5)
+    datos = generar(rng)
+    # Reloj fijo al final de los datos: el descarte se mide desde la hora del servidor
+    heatmap = HeatmapGrid(reloj=lambda: INICIO + PUNTOS_POR_MONTACARGA * 5)
+
+    inicio = time.perf_counter()
+    for mc_id, ts, lat, lng, speed in datos:
+        for i in range(0, len(ts), LOTE):
+            heatmap.ingest(mc_id, ts[i:i + LOTE], lat[i:i + LOTE], lng[i:i + LOTE], speed[i:i + LOTE])
+    s_ingesta = time.perf_counter() - inicio
+    total = MONTACARGAS * PUNTOS_POR_MONTACARGA
+
+    # Ventana de la tarde (buckets horarios completos)
+    desde_ts, hasta_ts = INICIO + 12 * 3600, INICIO + 18 * 3600 - 1
+    resolucion = heatmap.resolucion_para(*CAJA)
+    inicio = time.perf_counter()
+    for _ in range(CONSULTAS):
+        resultado = heatmap.query(*CAJA, desde_ts, hasta_ts)
+    ms_grilla = (time.perf_counter() - inicio) / CONSULTAS * 1e3
+
+    inicio = time.perf_counter()
+    for _ in range(CONSULTAS):
+        _, conteos = escaneo_crudo(datos, heatmap.tamanos[resolucion], desde_ts, hasta_ts)
+    ms_crudo = (time.perf_counter() - inicio) / CONSULTAS * 1e3
+
+    visitas = sum(c["visitas"] for c in resultado["celdas"])
+    print(f"Puntos: {total:,} ({MONTACARGAS} montacargas, lotes de {LOTE})")
+    print(f"ingesta       : {s_ingesta:8.2f} s  ({total / s_ingesta:10,.0f} puntos/s)")
+    print(f"consulta grilla: {ms_grilla:8.2f} ms  resolución {resolucion}, {len(resultado['celdas']):,} celdas")
+    print(f"escaneo crudo : {ms_crudo:8.2f} ms")
+    print("coinciden     :", visitas == int(conteos.sum()))
+
+    inicio = time.perf_counter()
+    for _ in range(CONSULTAS):
+        zona = heatmap.query(*ZONA, resolucion=3)
+    ms_zona = (time.perf_counter() - inicio) / CONSULTAS * 1e3
+    print(f"consulta zona : {ms_zona:8.2f} ms  resolución 3, {len(zona['celdas']):,} celdas "
+          f"(tiles en la grilla: {heatmap.stats()['tiles'][3]})")
+
+    print(f"{DIAS_HISTORIA} días, 10 montacargas (un punto cada 30 s):")
+    for nombre, rollup_horas in (("horas 7 días + días", 7 * 24), ("solo horas", DIAS_HISTORIA * 24)):
+        historia = HeatmapGrid(rollup_horas=rollup_horas, reloj=lambda: INICIO + DIAS_HISTORIA * 86400)
+        n = DIAS_HISTORIA * 2880
+        for mc_id, ts, lat, lng, speed in datos[:10]:
+            ts = INICIO + np.arange(n, dtype=np.int64) * 30
+            lat, lng, speed = np.resize(lat, n), np.resize(lng, n), np.resize(speed, n)
+            for i in range(0, n, LOTE):
+                historia.ingest(mc_id, ts[i:i + LOTE], lat[i:i + LOTE], lng[i:i + LOTE], speed[i:i + LOTE])
+        inicio = time.perf_counter()
+        for _ in range(CONSULTAS):
+            historia.query(*CAJA)
+        ms = (time.perf_counter() - inicio) / CONSULTAS * 1e3
+        stats = historia.stats()
+        print(f"  {nombre:20s}: buckets {sum(stats['buckets']):>8,}  celdas {sum(stats['celdas']):>10,}  "
+              f"consulta 30 días {ms:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
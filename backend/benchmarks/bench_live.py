@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark: latencia de difusión del stream en vivo con 500 suscriptores locales
+
+La mitad de los suscriptores escucha toda la flota y la otra mitad filtra por
+un montacarga. Se mide el tiempo entre la publicación de un evento y su
+recepción en cada suscriptor.
+Uso (desde backend/): python -m benchmarks.bench_live
+"""
+
+import asyncio
+import time
+
+import numpy as np
+
+from app.live import LiveBroadcaster
+
+SUSCRIPTORES = 500
+EVENTOS = 200
+MONTACARGAS = 50
+
+
+async def suscriptor(live, mc_ids, latencias, total):
+    s = live.subscribe(mc_ids)
+    try:
+        for _ in range(total):
+            evento = await s.cola.get()
+            latencias.append(time.perf_counter() - evento.creado)
+    finally:
+        live.unsubscribe(s)
+
+
+async def main():
+    live = LiveBroadcaster()
+    latencias = []
+    eventos_por_mc = EVENTOS // MONTACARGAS
+
+    tareas = []
+    for i in range(SUSCRIPTORES):
+        if i % 2 == 0:
+            tareas.append(asyncio.create_task(suscriptor(live, None, latencias, EVENTOS)))
+        else:
+            mc_id = i % MONTACARGAS + 1
+            tareas.append(asyncio.create_task(suscriptor(live, [mc_id], latencias, eventos_por_mc)))
+    await asyncio.sleep(0)
+
+    inicio = time.perf_counter()
+    t_publicar = 0.0
+    for i in range(EVENTOS):
+        mc_id = i % MONTACARGAS + 1
+        t0 = time.perf_counter()
+        live.publish(mc_id, "puntos", {
+            "recorrido": {"id": mc_id, "montacarga_id": mc_id, "fecha": "2025-10-18"},
+            "puntos": [{"lat": 6.2687, "lng": -75.5697, "timestamp": "2025-10-18T08:00:00"}],
+        })
+        t_publicar += time.perf_counter() - t0
+        # Ceder el loop para que los suscriptores consuman (como entre requests reales)
+        await asyncio.sleep(0)
+    await asyncio.gather(*tareas)
+    total = time.perf_counter() - inicio
+
+    lat_ms = np.array(latencias) * 1000
+    print(f"Suscriptores: {SUSCRIPTORES} | eventos publicados: {live.publicados} (1 serialización c/u)")
+    print(f"entregas: {len(latencias):,} en {total * 1000:.1f} ms ({len(latencias) / total:,.0f} entregas/s)")
+    print(f"publish: {t_publicar / EVENTOS * 1e6:.1f} us/evento")
+    print(f"latencia de difusión: p50={np.percentile(lat_ms, 50):.3f} ms  "
+          f"p99={np.percentile(lat_ms, 99):.3f} ms  max={lat_ms.max():.3f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark: métricas de un recorrido de 100k puntos
+
+Compara el bucle por punto original (distancia euclidiana en grados x 111)
+con el cálculo vectorizado haversine de app.trip_metrics.
+Uso (desde backend/): python -m benchmarks.bench_metrics
+"""
+
+import math
+import time
+
+import numpy as np
+
+from app.columns import PointColumns
+from app.trip_metrics import compute_trip_metrics, haversine_km
+
+PUNTOS = 100_000
+BASE_TS = 1_760_774_400  # 2025-10-18T08:00:00
+
+
+def generar_recorrido():
+    rng = np.random.default_rng(7)
+    puntos = PointColumns()
+    puntos.extend(
+        lat=6.2687 + rng.normal(0, 3e-4, PUNTOS).cumsum(),
+        lng=-75.5697 + rng.normal(0, 3e-4, PUNTOS).cumsum(),
+        ts=BASE_TS + np.arange(PUNTOS, dtype=np.int64) * 30,
+    )
+    return puntos
+
+
+def bucle_original(puntos_dict):
+    distancia = 0.0
+    for ultimo, actual in zip(puntos_dict, puntos_dict[1:]):
+        distancia += ((actual["lat"] - ultimo["lat"])**2 + (actual["lng"] - ultimo["lng"])**2)**0.5 * 111
+    return distancia
+
+
+def bucle_haversine(puntos_dict):
+    distancia = 0.0
+    for ultimo, actual in zip(puntos_dict, puntos_dict[1:]):
+        distancia += float(haversine_km(ultimo["lat"], ultimo["lng"], actual["lat"], actual["lng"]))
+    return distancia
+
+
+def medir(func, *args, repeticiones=3):
+    mejor = math.inf
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = func(*args)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return resultado, mejor * 1000
+
+
+def main():
+    puntos = generar_recorrido()
+    puntos_dict = [{"lat": la, "lng": ln} for la, ln in zip(puntos.lat.tolist(), puntos.lng.tolist())]
+
+    d_orig, t_orig = medir(bucle_original, puntos_dict)
+    d_hav, t_hav = medir(bucle_haversine, puntos_dict, repeticiones=1)
+    metricas, t_vec = medir(compute_trip_metrics, puntos)
+
+    print(f"Puntos: {PUNTOS:,}")
+    print(f"bucle euclidiano x111 : {t_orig:9.1f} ms  distancia={d_orig:.3f} km (solo distancia)")
+    print(f"bucle haversine       : {t_hav:9.1f} ms  distancia={d_hav:.3f} km (solo distancia)")
+    print(f"vectorizado NumPy     : {t_vec:9.1f} ms  distancia={metricas['distancia_km']:.3f} km (todas las métricas)")
+    print(f"métricas: {metricas}")
+
+
+if __name__ == "__main__":
+    main()
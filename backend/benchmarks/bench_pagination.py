@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark: listado completo de recorridos vs. páginas con proyección de campos
+
+Compara el tamaño del payload y el tiempo de serialización de /api/recorridos
+(todos los puntos + validación del response_model) contra las vistas de lista
+(fields sin puntos, limit) y las consultas incrementales (since).
+Uso (desde backend/): python -m benchmarks.bench_pagination
+"""
+
+import json
+import time
+from typing import List
+
+from pydantic import TypeAdapter
+
+from app.main import Recorrido
+from app.store import TelemetryStore, serialize_recorrido
+
+RECORRIDOS = 1_000
+PUNTOS_POR_RECORRIDO = 500
+REPETICIONES = 5
+
+CAMPOS_LISTA = ("id", "montacarga_id", "fecha", "hora_inicio", "hora_fin", "distancia_km", "total_puntos")
+
+
+def generar_store():
+    montacargas = [{"id": i, "codigo": f"MC-{i:03d}", "modelo": "Sim", "estado": "Activo"} for i in range(1, 11)]
+    recorridos = [
+        {
+            "id": i + 1,
+            "montacarga_id": i % 10 + 1,
+            "fecha": f"2025-09-{i // 40 + 1:02d}",
+            "hora_inicio": "08:00",
+            "hora_fin": "16:19",
+            "distancia_km": 3.5,
+            "puntos_recorrido": [
+                {"lat": 6.26 + j * 1e-5, "lng": -75.56 - j * 1e-5, "timestamp": f"{8 + j // 60:02d}:{j % 60:02d}"}
+                for j in range(PUNTOS_POR_RECORRIDO)
+            ],
+        }
+        for i in range(RECORRIDOS)
+    ]
+    return TelemetryStore(montacargas, recorridos)
+
+
+def medir(func):
+    payload = func()
+    inicio = time.perf_counter()
+    for _ in range(REPETICIONES):
+        func()
+    return (time.perf_counter() - inicio) / REPETICIONES * 1e3, len(payload)
+
+
+def main():
+    store = generar_store()
+    adapter = TypeAdapter(List[Recorrido])
+
+    def completo():
+        # Camino original: todos los puntos y validación del response_model
+        datos = adapter.validate_python([serialize_recorrido(r) for r in store.list_recorridos()])
+        return adapter.dump_json(datos)
+
+    def lista():
+        return json.dumps([serialize_recorrido(r, CAMPOS_LISTA) for r in store.page_recorridos()]).encode()
+
+    def pagina():
+        return json.dumps([serialize_recorrido(r, CAMPOS_LISTA) for r in store.page_recorridos(limit=50)]).encode()
+
+    def incremental():
+        # Un cliente que ya tiene los primeros puntos de cada recorrido de un montacarga
+        return json.dumps([
+            serialize_recorrido(r, ("id", "puntos_recorrido"), since_ts=int(r["puntos_recorrido"].ts[-6]))
+            for r in store.page_recorridos(montacarga_id=1)
+        ]).encode()
+
+    print(f"Recorridos: {RECORRIDOS:,} x {PUNTOS_POR_RECORRIDO} puntos")
+    for nombre, func in (("completo + validación", completo), ("lista sin puntos", lista),
+                         ("página limit=50", pagina), ("since por montacarga", incremental)):
+        ms, tamano = medir(func)
+        print(f"{nombre:22}: {ms:9.2f} ms  {tamano / 1024:10.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
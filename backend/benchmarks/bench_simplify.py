@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Benchmark: simplificación de rutas (RDP) y polilínea codificada en recorridos de 50k puntos
+
+Mide, por nivel de zoom, los puntos conservados, el tamaño del payload
+(JSON completo, JSON simplificado y polilínea) y el tiempo con cache fría y caliente.
+Uso (desde backend/): python -m benchmarks.bench_simplify
+"""
+
+import json
+import time
+
+import numpy as np
+
+from app.columns import PointColumns
+from app.simplify import SimplifyCache, tolerancia_zoom
+from app.store import serialize_recorrido
+
+PUNTOS = 50_000
+ZOOMS = (14, 16, 18, 20)
+
+
+def generar_recorrido(semilla: int = 7) -> dict:
+    """Montacarga recorriendo pasillos: tramos rectos, giros de 90° y ruido GPS de ~1 m"""
+    rng = np.random.default_rng(semilla)
+    rumbo = np.cumsum(np.where(rng.random(PUNTOS) < 0.01, rng.choice([-np.pi / 2, np.pi / 2], PUNTOS), 0.0))
+    paso_m = rng.uniform(0.5, 2.0, PUNTOS)
+    x = np.cumsum(paso_m * np.cos(rumbo)) + rng.normal(0, 1.0, PUNTOS)
+    y = np.cumsum(paso_m * np.sin(rumbo)) + rng.normal(0, 1.0, PUNTOS)
+
+    puntos = PointColumns(PUNTOS)
+    lat = 6.2675 + y / 111_195.0
+    lng = -75.5690 + x / (111_195.0 * np.cos(np.radians(6.2675)))
+    puntos.extend(lat, lng, 1_757_232_000 + np.arange(PUNTOS, dtype=np.int64))
+    return {"id": 1, "montacarga_id": 1, "fecha": "2025-09-07", "hora_inicio": "00:00",
+            "hora_fin": "13:53", "distancia_km": 0.0, "puntos_recorrido": puntos}
+
+
+def medir(func, repeticiones: int = 3):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        resultado = func()
+    return (time.perf_counter() - inicio) / repeticiones * 1e3, resultado
+
+
+def main():
+    recorrido = generar_recorrido()
+    puntos = recorrido["puntos_recorrido"]
+    campos = ("id", "puntos_recorrido")
+
+    ms, completo = medir(lambda: json.dumps(serialize_recorrido(recorrido, campos)))
+    print(f"Puntos: {PUNTOS:,}")
+    print(f"{'completo':>8}: {PUNTOS:7,} puntos  {len(completo) / 1024:9.1f} KiB  {ms:8.2f} ms")
+
+    for zoom in ZOOMS:
+        cache = SimplifyCache()
+        tolerancia = tolerancia_zoom(zoom, float(puntos.lat[0]))
+        ms_frio, indices = medir(lambda: SimplifyCache().indices(1, puntos, tolerancia), repeticiones=1)
+        cache.indices(1, puntos, tolerancia)
+        ms_cache, _ = medir(lambda: cache.indices(1, puntos, tolerancia), repeticiones=100)
+        ms_json, cuerpo = medir(lambda: json.dumps(serialize_recorrido(recorrido, campos, indices=indices)))
+        ms_poly, poly = medir(lambda: json.dumps(
+            serialize_recorrido(recorrido, campos, indices=indices, formato="polyline")
+        ))
+        print(
+            f"zoom {zoom:>3}: {len(indices):7,} puntos (tol {tolerancia:5.2f} m)  "
+            f"json {len(cuerpo) / 1024:8.1f} KiB {ms_json:7.2f} ms  "
+            f"polyline {len(poly) / 1024:7.1f} KiB {ms_poly:6.2f} ms  "
+            f"rdp {ms_frio:7.1f} ms  cache {ms_cache * 1e3:6.1f} us"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark: backend en memoria vs. SQLite (WAL)
+
+Mide la ingesta punto a punto y por lotes, y las consultas de recorridos por
+rango de fechas y de puntos en una ventana de tiempo.
+Uso (desde backend/): python -m benchmarks.bench_sqlite
+"""
+
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from app.ingest import append_point, append_points
+from app.sqlite_store import SQLiteStore
+from app.store import TelemetryStore
+
+MONTACARGAS = 20
+DIAS = 30
+PUNTOS_POR_DIA = 2_000
+PUNTOS_INDIVIDUALES = 2_000
+BASE_TS = 1_759_276_800  # 2025-10-01T00:00:00
+
+
+def montacargas():
+    return [{"id": i, "codigo": f"MC-{i:03d}", "modelo": "Sim", "estado": "Activo"} for i in range(1, MONTACARGAS + 1)]
+
+
+def ingesta_lotes(store):
+    rng = np.random.default_rng(3)
+    inicio = time.perf_counter()
+    for dia in range(DIAS):
+        for mc_id in range(1, MONTACARGAS + 1):
+            ts = BASE_TS + dia * 86400 + 28800 + np.arange(PUNTOS_POR_DIA, dtype=np.int64) * 15
+            lat = 6.2687 + rng.normal(0, 1e-4, PUNTOS_POR_DIA).cumsum()
+            lng = -75.5697 + rng.normal(0, 1e-4, PUNTOS_POR_DIA).cumsum()
+            append_points(store, mc_id, ts, lat, lng,
+                          np.full(PUNTOS_POR_DIA, 6.0, dtype=np.float32),
+                          np.full(PUNTOS_POR_DIA, 90, dtype=np.uint8),
+                          ["active"] * PUNTOS_POR_DIA)
+    return DIAS * MONTACARGAS * PUNTOS_POR_DIA / (time.perf_counter() - inicio)
+
+
+def ingesta_individual(store):
+    inicio = time.perf_counter()
+    for i in range(PUNTOS_INDIVIDUALES):
+        ts = 1_761_955_200 + 28800 + i * 10  # 2025-11-01T08:00:00 + i * 10 s
+        append_point(store, i % MONTACARGAS + 1, ts, 6.2687 + i * 1e-6, -75.5697, 6.0, 90, "active")
+    return PUNTOS_INDIVIDUALES / (time.perf_counter() - inicio)
+
+
+def consultas(store, repeticiones=20):
+    inicio = time.perf_counter()
+    for i in range(repeticiones):
+        store.recorridos_by_montacarga(i % MONTACARGAS + 1, "2025-10-10", "2025-10-12")
+    t_rango = (time.perf_counter() - inicio) / repeticiones * 1000
+
+    recorrido_id = store.recorridos_by_montacarga(1, "2025-10-15", "2025-10-15")[0]["id"]
+    desde = BASE_TS + 14 * 86400 + 32400
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        ventana = store.puntos_en_ventana(recorrido_id, desde, desde + 600)
+    t_ventana = (time.perf_counter() - inicio) / repeticiones * 1000
+    return t_rango, t_ventana, len(ventana)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directorio:
+        backends = {
+            "memoria": TelemetryStore(montacargas()),
+            "sqlite": SQLiteStore(os.path.join(directorio, "bench.db"), montacargas()),
+        }
+        total = DIAS * MONTACARGAS * PUNTOS_POR_DIA
+        print(f"{total:,} puntos en lotes ({DIAS} días x {MONTACARGAS} montacargas) + {PUNTOS_INDIVIDUALES:,} individuales")
+        print(f"{'backend':>8} {'lotes (pt/s)':>14} {'individual (pt/s)':>18} {'rango fechas (ms)':>18} {'ventana 10 min (ms)':>20}")
+        for nombre, store in backends.items():
+            lotes = ingesta_lotes(store)
+            individual = ingesta_individual(store)
+            t_rango, t_ventana, n = consultas(store)
+            print(f"{nombre:>8} {lotes:>14,.0f} {individual:>18,.0f} {t_rango:>18.2f} {t_ventana:>17.3f} ({n} pts)")
+        backends["sqlite"].close()
+
+
+if __name__ == "__main__":
+    main()
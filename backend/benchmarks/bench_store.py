@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark: latencia de ingesta vs. número de recorridos acumulados
+
+Compara la búsqueda lineal original sobre listas con el TelemetryStore indexado.
+Uso (desde backend/): python -m benchmarks.bench_store
+"""
+
+import time
+
+from app.store import TelemetryStore
+
+MONTACARGAS = 500
+INGESTAS = 2000
+
+
+def generar_historial(total_recorridos):
+    montacargas = [
+        {"id": i, "codigo": f"MC-{i:03d}", "modelo": "Sim", "estado": "Activo"}
+        for i in range(1, MONTACARGAS + 1)
+    ]
+    recorridos = [
+        {
+            "id": i + 1,
+            "montacarga_id": (i % MONTACARGAS) + 1,
+            "fecha": f"2024-{(i // MONTACARGAS) // 28 % 12 + 1:02d}-{(i // MONTACARGAS) % 28 + 1:02d}",
+            "distancia_km": 0.0,
+            "puntos_recorrido": [],
+        }
+        for i in range(total_recorridos)
+    ]
+    return montacargas, recorridos
+
+
+def ingesta_lineal(montacargas_db, recorridos_db, mc_id, fecha):
+    """Réplica de la lógica original de receive_microcontroller_data"""
+    if not any(m["id"] == mc_id for m in montacargas_db):
+        return
+    recorrido_activo = None
+    for rec in recorridos_db:
+        if rec["montacarga_id"] == mc_id and rec["fecha"] == fecha:
+            recorrido_activo = rec
+            break
+    if recorrido_activo is None:
+        recorrido_activo = {"id": len(recorridos_db) + 1, "montacarga_id": mc_id,
+                            "fecha": fecha, "puntos_recorrido": []}
+        recorridos_db.append(recorrido_activo)
+    recorrido_activo["puntos_recorrido"].append(None)
+    for montacarga in montacargas_db:
+        if montacarga["id"] == mc_id:
+            montacarga["estado"] = "Activo"
+            break
+
+
+def ingesta_indexada(store, mc_id, fecha):
+    if not store.has_montacarga(mc_id):
+        return
+    recorrido_activo = store.get_recorrido_activo(mc_id, fecha)
+    if recorrido_activo is None:
+        recorrido_activo = store.create_recorrido(montacarga_id=mc_id, fecha=fecha, puntos_recorrido=[])
+    recorrido_activo["puntos_recorrido"].append(6.2687, -75.5697, 0)
+    store.set_estado(mc_id, "Activo")
+
+
+def medir(func):
+    inicio = time.perf_counter()
+    for i in range(INGESTAS):
+        func((i % MONTACARGAS) + 1, "2025-10-18")
+    return (time.perf_counter() - inicio) / INGESTAS * 1e6
+
+
+def main():
+    print(f"{'recorridos':>12} {'lineal (us)':>14} {'indexado (us)':>14}")
+    for total in (1_000, 10_000, 100_000):
+        montacargas, recorridos = generar_historial(total)
+        lineal = medir(lambda mc, f: ingesta_lineal(montacargas, recorridos, mc, f))
+
+        montacargas, recorridos = generar_historial(total)
+        store = TelemetryStore(montacargas, recorridos)
+        indexado = medir(lambda mc, f: ingesta_indexada(store, mc, f))
+
+        print(f"{total:>12} {lineal:>14.2f} {indexado:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark: escritura del log de telemetría y tiempo de recuperación
+
+Escribe 1M de puntos (100 montacargas) en un directorio temporal y mide
+el arranque en frío re-aplicando el log completo y tras compactar en un
+snapshot. Objetivo: < 1 s de recuperación.
+Uso (desde backend/): python -m benchmarks.bench_wal
+"""
+
+import tempfile
+import time
+
+import numpy as np
+
+from app.store import TelemetryStore
+from app.wal import compact, recover
+
+PUNTOS = 1_000_000
+MONTACARGAS = 100
+LOTE = 1_000
+BASE_TS = 1_760_774_400  # 2025-10-18T08:00:00
+
+
+def store_vacio():
+    return TelemetryStore(
+        [{"id": i, "codigo": f"MC-{i:03d}", "modelo": "Sim", "estado": "Activo"} for i in range(1, MONTACARGAS + 1)]
+    )
+
+
+def escribir(log):
+    rng = np.random.default_rng(1)
+    por_montacarga = PUNTOS // MONTACARGAS
+    inicio = time.perf_counter()
+    for mc_id in range(1, MONTACARGAS + 1):
+        lat = 6.2687 + rng.normal(0, 1e-4, por_montacarga).cumsum()
+        lng = -75.5697 + rng.normal(0, 1e-4, por_montacarga).cumsum()
+        # 5 s entre puntos: ~14 h de datos por montacarga
+        ts = BASE_TS + np.arange(por_montacarga, dtype=np.int64) * 5
+        speed = np.full(por_montacarga, 8.0, dtype=np.float32)
+        battery = np.full(por_montacarga, 80, dtype=np.uint8)
+        status = ["active"] * por_montacarga
+        for i in range(0, por_montacarga, LOTE):
+            j = i + LOTE
+            log.append_many(mc_id, ts[i:j], lat[i:j], lng[i:j], speed[i:j], battery[i:j], status[i:j])
+    log.sync()
+    return time.perf_counter() - inicio
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directorio:
+        _, log, _ = recover(directorio, store_vacio())
+        t_escritura = escribir(log)
+        log.close()
+        print(f"escritura de {PUNTOS:,} puntos en lotes de {LOTE}: {t_escritura:.2f} s "
+              f"({PUNTOS / t_escritura:,.0f} puntos/s)")
+
+        store, log, info = recover(directorio, store_vacio())
+        print(f"recuperación solo con log : {info['segundos_total']:.3f} s  "
+              f"({info['puntos_reaplicados']:,} puntos, {info['recorridos']} recorridos)")
+        total = sum(len(r["puntos_recorrido"]) for r in store.list_recorridos())
+
+        inicio = time.perf_counter()
+        log = compact(store, log)
+        log.close()
+        print(f"compactación (snapshot)   : {time.perf_counter() - inicio:.3f} s")
+
+        store, log, info = recover(directorio, store_vacio())
+        log.close()
+        print(f"recuperación con snapshot : {info['segundos_total']:.3f} s  "
+              f"({info['recorridos']} recorridos)")
+        assert sum(len(r["puntos_recorrido"]) for r in store.list_recorridos()) == total == PUNTOS
+
+
+if __name__ == "__main__":
+    main()
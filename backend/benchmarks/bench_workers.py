@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark: throughput de ingesta con 1, 2 y 4 workers de gunicorn
+
+Levanta gunicorn con SHARED_STATE_DIR (log compartido entre workers) y un
+generador de carga local: varios procesos cliente envían lotes de 10 puntos
+por HTTP keep-alive durante unos segundos. Al terminar, consulta los
+recorridos desde conexiones nuevas (repartidas entre workers) y verifica que
+todos los workers tienen el mismo estado.
+Uso (desde backend/): python -m benchmarks.bench_workers [workers ...]
+"""
+
+import hashlib
+import http.client
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+PUERTO = 8765
+CLIENTES = 8
+SEGUNDOS = 5
+PUNTOS_POR_LOTE = 10
+MONTACARGAS = 3
+
+
+def esperar_servidor(timeout=30):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            conexion = http.client.HTTPConnection("127.0.0.1", PUERTO, timeout=1)
+            conexion.request("GET", "/health")
+            if conexion.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("El servidor no arrancó")
+
+
+def cliente(k, segundos, resultados):
+    """Envía lotes de un montacarga en un día propio (timestamps crecientes)"""
+    conexion = http.client.HTTPConnection("127.0.0.1", PUERTO)
+    mc_id = k % MONTACARGAS + 1
+    i = enviados = 0
+    limite = time.monotonic() + segundos
+    while time.monotonic() < limite:
+        datos = []
+        for _ in range(PUNTOS_POR_LOTE):
+            hora, resto = divmod(i * 5, 3600)
+            datos.append({
+                "t": f"2025-11-{k + 1:02d}T{6 + hora:02d}:{resto // 60:02d}:{resto % 60:02d}",
+                "lat": 6.2670 + (i % 200) * 2e-5, "lng": -75.5686, "s": 8.0, "b": 90, "st": "active",
+            })
+            i += 1
+        cuerpo = json.dumps({"mc_id": mc_id, "data": datos})
+        conexion.request("POST", "/api/microcontroller/batch", cuerpo, {"Content-Type": "application/json"})
+        respuesta = conexion.getresponse()
+        respuesta.read()
+        if respuesta.status == 200:
+            enviados += 1
+    resultados.put(enviados)
+
+
+def estado_por_worker(muestras=40):
+    """
+    Hash de los recorridos vistos por cada worker (una conexión nueva por
+    muestra). La distancia se compara al milímetro: según cómo agrupe cada
+    worker los registros leídos del log, la suma incremental puede diferir en
+    el último bit.
+    """
+    hashes = defaultdict(set)
+    for _ in range(muestras):
+        conexion = http.client.HTTPConnection("127.0.0.1", PUERTO)
+        conexion.request("GET", "/health")
+        worker = json.loads(conexion.getresponse().read())["recovery"]["worker"]
+        conexion.request("GET", "/api/recorridos?fields=id,montacarga_id,fecha,distancia_km,total_puntos")
+        recorridos = json.loads(conexion.getresponse().read())
+        for recorrido in recorridos:
+            recorrido["distancia_km"] = round(recorrido["distancia_km"], 6)
+        hashes[worker].add(hashlib.sha1(json.dumps(recorridos).encode()).hexdigest())
+        conexion.close()
+    return hashes
+
+
+def medir(workers):
+    directorio = tempfile.mkdtemp(prefix="bench_workers_")
+    entorno = {**os.environ, "SHARED_STATE_DIR": directorio}
+    servidor = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-w", str(workers), "-k", "uvicorn.workers.UvicornWorker",
+         "app.main:app", "--bind", f"127.0.0.1:{PUERTO}", "--log-level", "warning"],
+        env=entorno,
+    )
+    try:
+        esperar_servidor()
+        resultados = multiprocessing.Queue()
+        procesos = [multiprocessing.Process(target=cliente, args=(k, SEGUNDOS, resultados)) for k in range(CLIENTES)]
+        for p in procesos:
+            p.start()
+        lotes = sum(resultados.get() for _ in procesos)
+        for p in procesos:
+            p.join()
+        time.sleep(1)  # que todos los workers apliquen la cola del log
+        hashes = estado_por_worker()
+        return lotes / SEGUNDOS, hashes
+    finally:
+        servidor.terminate()
+        servidor.wait()
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+def main():
+    lista = [int(w) for w in sys.argv[1:]] or [1, 2, 4]
+    print(f"CPUs: {os.cpu_count()}  clientes: {CLIENTES}  lotes de {PUNTOS_POR_LOTE} puntos, {SEGUNDOS} s por medición")
+    base = None
+    for workers in lista:
+        lotes_s, hashes = medir(workers)
+        base = base or lotes_s
+        coinciden = len(set.union(*hashes.values())) == 1
+        print(f"{workers} worker(s): {lotes_s:8,.0f} lotes/s  ({lotes_s * PUNTOS_POR_LOTE:9,.0f} puntos/s, "
+              f"x{lotes_s / base:.2f})  workers consultados: {len(hashes)}  mismo estado: {coinciden}")
+
+
+if __name__ == "__main__":
+    main()
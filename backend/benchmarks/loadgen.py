@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+Generador de carga para la API de la flota
+
+Simula N montacargas con recorridos realistas (marcha y paradas por el campus
+a 5-15 km/h, un punto GPS cada 5 s de tiempo simulado) enviando a una tasa
+configurable por /api/microcontroller/data (punto a punto) y /batch (lotes),
+junto con lectores concurrentes del dashboard. Reporta throughput, latencia
+p50/p99 por grupo de endpoints y crecimiento de memoria, y escribe un JSON
+para comparar resultados entre commits.
+
+Modos:
+- inproc: la app en el mismo proceso vía ASGI (sin red ni servidor).
+- http: HTTP local contra un uvicorn lanzado por el script (o --url).
+
+Uso (desde backend/; requiere httpx):
+    python -m benchmarks.loadgen --modo inproc --montacargas 50 --segundos 20
+    python -m benchmarks.loadgen --modo http --salida resultados.json --comparar base.json
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import httpx
+import numpy as np
+
+CENTRO = (6.2670, -75.5686)
+INICIO_SIMULADO = datetime(2025, 11, 3, 6, 0, 0)
+PASO_SIMULADO_S = 5
+METROS_POR_GRADO = 111_195.0
+DIRECTORIO_RESULTADOS = os.path.join(os.path.dirname(__file__), "results")
+
+# Consultas de los lectores del dashboard (se alternan en orden)
+CONSULTAS_DASHBOARD = [
+    ("dashboard", "/api/dashboard/stats"),
+    ("recorridos", "/api/recorridos?limit=50&fields=id,montacarga_id,fecha,distancia_km,total_puntos"),
+    ("ruta", "/api/recorridos/montacarga/{mc_id}?limit=5&simplify=16&format=polyline"),
+    ("zonas", "/api/zonas/ocupacion"),
+    ("heatmap", "/api/analytics/heatmap?lat_min=6.26&lat_max=6.274&lng_min=-75.576&lng_max=-75.562"),
+]
+
+
+def registrar_flota(store, montacargas: int) -> None:
+    """Registra los montacargas simulados que aún no existan"""
+    for mc_id in range(1, montacargas + 1):
+        if not store.has_montacarga(mc_id):
+            store.add_montacarga({"id": mc_id, "codigo": f"MC-{mc_id:03d}", "modelo": "Simulado", "estado": "Activo"})
+
+
+def memoria_rss_mb(pid: int):
+    """RSS del proceso en MB (Linux); None si no está disponible"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for linea in f:
+                if linea.startswith("VmRSS:"):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+class Recorrido:
+    """Recorrido simulado de un montacarga: tramos de marcha con giros suaves y paradas"""
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.lat = CENTRO[0] + rng.uniform(-0.004, 0.004)
+        self.lng = CENTRO[1] + rng.uniform(-0.004, 0.004)
+        self.rumbo = rng.uniform(0, 2 * math.pi)
+        self.velocidad_kmh = 0.0
+        self.pasos_tramo = 0
+        self.tiempo = INICIO_SIMULADO
+        self.bateria = 100.0
+
+    def siguiente(self) -> dict:
+        if self.pasos_tramo == 0:
+            # Nuevo tramo: marcha (70%) o parada
+            en_marcha = self.rng.random() < 0.7
+            self.velocidad_kmh = self.rng.uniform(5, 15) if en_marcha else 0.0
+            self.pasos_tramo = self.rng.randint(12, 120) if en_marcha else self.rng.randint(6, 60)
+        self.pasos_tramo -= 1
+        self.tiempo += timedelta(seconds=PASO_SIMULADO_S)
+        if self.velocidad_kmh:
+            self.rumbo += self.rng.gauss(0, 0.2)
+            metros = self.velocidad_kmh / 3.6 * PASO_SIMULADO_S
+            # Rebotar hacia el centro al salir del campus
+            if abs(self.lat - CENTRO[0]) > 0.006 or abs(self.lng - CENTRO[1]) > 0.006:
+                self.rumbo = math.atan2(CENTRO[1] - self.lng, CENTRO[0] - self.lat)
+            self.lat += metros * math.cos(self.rumbo) / METROS_POR_GRADO
+            self.lng += metros * math.sin(self.rumbo) / METROS_POR_GRADO
+            self.bateria = max(self.bateria - 0.01, 5)
+        ruido = 3 / METROS_POR_GRADO
+        return {
+            "t": self.tiempo.isoformat(timespec="seconds"),
+            "lat": round(self.lat + self.rng.gauss(0, ruido), 7),
+            "lng": round(self.lng + self.rng.gauss(0, ruido), 7),
+            "s": round(self.velocidad_kmh, 1),
+            "b": int(self.bateria),
+            "st": "active",
+        }
+
+
+class Medicion:
+    """Latencias (s) y errores por grupo de endpoints"""
+
+    def __init__(self):
+        self.latencias = defaultdict(list)
+        self.errores = defaultdict(int)
+        self.puntos = 0
+
+    async def medir(self, grupo: str, peticion):
+        inicio = time.perf_counter()
+        try:
+            respuesta = await peticion
+            ok = respuesta.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        self.latencias[grupo].append(time.perf_counter() - inicio)
+        if not ok:
+            self.errores[grupo] += 1
+        return ok
+
+    def resumen(self, segundos: float) -> dict:
+        resultado = {}
+        for grupo, latencias in sorted(self.latencias.items()):
+            ms = np.array(latencias) * 1e3
+            resultado[grupo] = {
+                "peticiones": len(ms),
+                "errores": self.errores[grupo],
+                "req_s": round(len(ms) / segundos, 1),
+                "p50_ms": round(float(np.percentile(ms, 50)), 3),
+                "p99_ms": round(float(np.percentile(ms, 99)), 3),
+                "max_ms": round(float(ms.max()), 3),
+            }
+        return resultado
+
+
+async def montacarga(cliente, medicion, mc_id, lote, tasa, fin, rng):
+    """
+    Envía puntos a `tasa` por segundo: uno por petición (lote=0) o en lotes.
+    Con tasa <= 0 envía sin pausa (lazo cerrado, para medir capacidad).
+    """
+    recorrido = Recorrido(rng)
+    periodo = (lote or 1) / tasa if tasa > 0 else 0.0
+    siguiente = time.perf_counter() + rng.uniform(0, periodo)  # desfasar los envíos
+    while siguiente < fin:
+        espera = siguiente - time.perf_counter()
+        if espera > 0:
+            await asyncio.sleep(espera)
+        else:
+            await asyncio.sleep(0)
+        siguiente = siguiente + periodo if periodo else time.perf_counter()
+        if lote:
+            datos = [recorrido.siguiente() for _ in range(lote)]
+            ok = await medicion.medir("batch", cliente.post(
+                "/api/microcontroller/batch", json={"mc_id": mc_id, "data": datos}))
+            medicion.puntos += len(datos) if ok else 0
+        else:
+            p = recorrido.siguiente()
+            ok = await medicion.medir("data", cliente.post("/api/microcontroller/data", json={
+                "mc_id": mc_id, "timestamp": p["t"], "lat": p["lat"], "lng": p["lng"],
+                "speed": p["s"], "battery": p["b"], "status": p["st"],
+            }))
+            medicion.puntos += 1 if ok else 0
+
+
+async def lector(cliente, medicion, montacargas, intervalo, fin, rng):
+    """Lector del dashboard: recorre las consultas típicas en bucle"""
+    k = rng.randrange(len(CONSULTAS_DASHBOARD))
+    while time.perf_counter() < fin:
+        grupo, ruta = CONSULTAS_DASHBOARD[k % len(CONSULTAS_DASHBOARD)]
+        await medicion.medir(grupo, cliente.get(ruta.format(mc_id=rng.randint(1, montacargas))))
+        k += 1
+        await asyncio.sleep(intervalo)
+
+
+async def esperar_cola(cliente, timeout=60.0) -> float:
+    """Espera a que la cola de ingesta se vacíe; devuelve los segundos de espera"""
+    inicio = time.perf_counter()
+    while time.perf_counter() - inicio < timeout:
+        if (await cliente.get("/api/ingest/queue")).json()["depth"] == 0:
+            break
+        await asyncio.sleep(0.05)
+    return time.perf_counter() - inicio
+
+
+async def ejecutar(cliente, args, pid) -> dict:
+    rng = random.Random(args.semilla)
+    medicion = Medicion()
+    memoria_inicial = memoria_rss_mb(pid) if pid else None
+
+    inicio = time.perf_counter()
+    fin = inicio + args.segundos
+    en_lote = round(args.montacargas * args.fraccion_lote)
+    tareas = [
+        montacarga(cliente, medicion, mc_id, args.lote if mc_id <= en_lote else 0,
+                   args.tasa, fin, random.Random(rng.random()))
+        for mc_id in range(1, args.montacargas + 1)
+    ]
+    tareas += [
+        lector(cliente, medicion, args.montacargas, args.intervalo_lectura, fin, random.Random(rng.random()))
+        for _ in range(args.lectores)
+    ]
+    await asyncio.gather(*tareas)
+    segundos = time.perf_counter() - inicio
+    drenado_s = await esperar_cola(cliente)
+
+    memoria_final = memoria_rss_mb(pid) if pid else None
+    memoria = None
+    if memoria_inicial is not None and memoria_final is not None:
+        memoria = {
+            "rss_inicial_mb": round(memoria_inicial, 1),
+            "rss_final_mb": round(memoria_final, 1),
+            "crecimiento_mb": round(memoria_final - memoria_inicial, 1),
+            "kb_por_1000_puntos": round((memoria_final - memoria_inicial) * 1024 / max(medicion.puntos, 1) * 1000, 2),
+        }
+    return {
+        "segundos": round(segundos, 2),
+        "puntos": medicion.puntos,
+        "puntos_s": round(medicion.puntos / segundos, 1),
+        "drenado_cola_s": round(drenado_s, 3),
+        "endpoints": medicion.resumen(segundos),
+        "memoria": memoria,
+    }
+
+
+async def ejecutar_inproc(args) -> dict:
+    from app import main
+
+    registrar_flota(main.store, args.montacargas)
+    await main.iniciar_servicios()
+    try:
+        transporte = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://loadgen", timeout=30) as cliente:
+            return await ejecutar(cliente, args, os.getpid())
+    finally:
+        await main.detener_servicios()
+
+
+def _puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def ejecutar_http(args) -> dict:
+    servidor = None
+    url = args.url
+    if url is None:
+        puerto = _puerto_libre()
+        url = f"http://127.0.0.1:{puerto}"
+        servidor = subprocess.Popen([sys.executable, "-m", "benchmarks.loadgen", "--servir", str(puerto),
+                                     "--montacargas", str(args.montacargas)])
+    limites = httpx.Limits(max_connections=args.montacargas + args.lectores)
+    try:
+        async with httpx.AsyncClient(base_url=url, timeout=30, limits=limites) as cliente:
+            for _ in range(300):
+                try:
+                    if (await cliente.get("/health")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError(f"El servidor no responde en {url}")
+            return await ejecutar(cliente, args, servidor.pid if servidor else None)
+    finally:
+        if servidor is not None:
+            servidor.terminate()
+            servidor.wait()
+
+
+def servir(puerto: int, montacargas: int) -> None:
+    """Servidor para el modo http: la app con la flota simulada registrada"""
+    import uvicorn
+
+    from app import main
+
+    registrar_flota(main.store, montacargas)
+    uvicorn.run(main.app, host="127.0.0.1", port=puerto, log_level="warning")
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconocido"
+
+
+def imprimir(resultado: dict, base: dict = None) -> None:
+    r = resultado["resultados"]
+    print(f"Modo {resultado['config']['modo']}  commit {resultado['commit']}  "
+          f"{r['puntos']:,} puntos en {r['segundos']} s ({r['puntos_s']:,.0f} puntos/s), "
+          f"cola drenada en {r['drenado_cola_s']} s")
+    print(f"{'endpoint':11s} {'req':>7s} {'err':>5s} {'req/s':>8s} {'p50 ms':>8s} {'p99 ms':>8s} {'max ms':>8s}")
+    for grupo, e in r["endpoints"].items():
+        linea = (f"{grupo:11s} {e['peticiones']:7d} {e['errores']:5d} {e['req_s']:8.1f} "
+                 f"{e['p50_ms']:8.2f} {e['p99_ms']:8.2f} {e['max_ms']:8.2f}")
+        previo = base["resultados"]["endpoints"].get(grupo) if base else None
+        if previo:
+            linea += f"   p99 {100 * (e['p99_ms'] / previo['p99_ms'] - 1):+6.1f} % vs base"
+        print(linea)
+    if r["memoria"]:
+        m = r["memoria"]
+        print(f"memoria: {m['rss_inicial_mb']} -> {m['rss_final_mb']} MB "
+              f"(+{m['crecimiento_mb']} MB, {m['kb_por_1000_puntos']} KB/1000 puntos)")
+    if base:
+        previo = base["resultados"]["puntos_s"]
+        print(f"throughput: {100 * (r['puntos_s'] / previo - 1):+.1f} % vs base ({base['commit']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--modo", choices=("inproc", "http"), default="inproc")
+    parser.add_argument("--url", help="Servidor existente (modo http); por defecto se lanza uno local")
+    parser.add_argument("--montacargas", type=int, default=50)
+    parser.add_argument("--tasa", type=float, default=2.0,
+                        help="Puntos por segundo por montacarga (0: sin pausa, lazo cerrado)")
+    parser.add_argument("--lote", type=int, default=10, help="Puntos por petición /batch")
+    parser.add_argument("--fraccion-lote", type=float, default=0.5, help="Fracción de montacargas que usa /batch")
+    parser.add_argument("--lectores", type=int, default=4, help="Lectores concurrentes del dashboard")
+    parser.add_argument("--intervalo-lectura", type=float, default=0.2, help="Pausa (s) entre consultas de un lector")
+    parser.add_argument("--segundos", type=float, default=10.0)
+    parser.add_argument("--semilla", type=int, default=17)
+    parser.add_argument("--salida", help="JSON de resultados (por defecto benchmarks/results/)")
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior para comparar")
+    parser.add_argument("--servir", type=int, metavar="PUERTO", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.servir:
+        servir(args.servir, args.montacargas)
+        return
+
+    ejecutor = ejecutar_inproc if args.modo == "inproc" else ejecutar_http
+    resultado = {
+        "commit": _commit(),
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "config": {k: v for k, v in vars(args).items() if k not in ("servir", "salida", "comparar")},
+        "resultados": asyncio.run(ejecutor(args)),
+    }
+
+    base = None
+    if args.comparar:
+        with open(args.comparar) as f:
+            base = json.load(f)
+    imprimir(resultado, base)
+
+    salida = args.salida
+    if salida is None:
+        os.makedirs(DIRECTORIO_RESULTADOS, exist_ok=True)
+        salida = os.path.join(DIRECTORIO_RESULTADOS, f"loadgen-{args.modo}-{resultado['commit']}.json")
+    with open(salida, "w") as f:
+        json.dump(resultado, f, indent=2)
+    print("Resultados:", salida)
+
+
+if __name__ == "__main__":
+    main()
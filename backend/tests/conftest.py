@@ -0,0 +1,13 @@
+"""Fixtures compartidas"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+
+
+@pytest.fixture(scope="session")
+def cliente():
+    # Una sola vez por sesión: la cola de ingesta queda ligada al loop del primer arranque
+    with TestClient(main.app) as cliente:
+        yield cliente
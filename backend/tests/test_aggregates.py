@@ -0,0 +1,117 @@
+"""Agregados incrementales del dashboard frente a un recálculo completo"""
+
+import numpy as np
+import pytest
+
+from app.aggregates import DashboardAggregates
+from app.archive import TripArchive
+from app.gps_filter import GpsFilter
+from app.ingest import append_points
+from app.sqlite_store import SQLiteStore
+from app.store import TelemetryStore
+
+MONTACARGAS = [
+    {"id": 1, "codigo": "MC-001", "modelo": "Sim", "estado": "Activo"},
+    {"id": 2, "codigo": "MC-002", "modelo": "Sim", "estado": "Mantenimiento"},
+    {"id": 3, "codigo": "MC-003", "modelo": "Sim", "estado": "Activo"},
+]
+
+
+def _ingerir(store, rng):
+    """Tres días de puntos por montacarga, con cortes por inactividad (varios recorridos por día)"""
+    filtro = GpsFilter()
+    for dia in ("2025-11-18", "2025-11-19", "2025-11-20"):
+        inicio = int(np.datetime64(f"{dia}T06:00:00", "s").astype(np.int64))
+        for mc_id in (1, 2, 3):
+            for tramo in range(3):
+                n = 40
+                ts = inicio + tramo * 3 * 3600 + np.arange(n, dtype=np.int64) * 30
+                append_points(
+                    store, mc_id, ts,
+                    6.2687 + rng.normal(0, 2e-5, n).cumsum(), -75.5697 + rng.normal(0, 2e-5, n).cumsum(),
+                    rng.uniform(1, 12, n).astype(np.float32), np.full(n, 90, dtype=np.uint8),
+                    ["active"] * n, filtro=filtro,
+                )
+
+
+def _recalculado(store):
+    """Agregados construidos desde cero con los recorridos y montacargas actuales"""
+    agregados = DashboardAggregates()
+    for montacarga in store.list_montacargas():
+        agregados.estado_changed(None, montacarga["estado"])
+    for recorrido in store.list_recorridos():
+        agregados.recorrido_changed(recorrido)
+    return agregados
+
+
+def _verificar(store):
+    assert store.aggregates.check(store.list_recorridos(), store.list_montacargas()) == {}
+    recalculado = _recalculado(store)
+    assert store.aggregates.stats() == recalculado.stats()
+    for dia in ("2025-11-18", "2025-11-19", "2025-11-20"):
+        assert store.aggregates.stats(desde=dia, hasta=dia) == recalculado.stats(desde=dia, hasta=dia)
+
+
+def test_ingesta_archivado_y_borrado(tmp_path):
+    rng = np.random.default_rng(3)
+    store = TelemetryStore([dict(m) for m in MONTACARGAS])
+    _ingerir(store, rng)
+    assert store.count_recorridos() == 27
+    _verificar(store)
+
+    archivo = TripArchive(str(tmp_path / "archivo"))
+    store.attach_archive(archivo)
+    assert store.archive_before("2025-11-20") == 18
+    _verificar(store)
+
+    # Un archivado, el activo de un día caliente y uno intermedio
+    archivado = store.recorridos_by_montacarga(1, "2025-11-18", "2025-11-18")[0]["id"]
+    activo = store.get_recorrido_activo(2, "2025-11-20")["id"]
+    intermedio = store.recorridos_by_montacarga(3, "2025-11-20", "2025-11-20")[1]["id"]
+    for recorrido_id in (archivado, activo, intermedio):
+        assert store.delete_recorrido(recorrido_id)
+    assert not store.delete_recorrido(archivado)
+    assert store.get_recorrido(archivado) is None
+    assert store.get_recorrido_activo(2, "2025-11-20")["id"] < activo
+    store.set_estado(2, "Activo")
+    _verificar(store)
+
+    # Ingesta posterior sobre el activo que quedó y con el archivo reabierto
+    _ingerir(store, rng)
+    _verificar(store)
+    archivo.close()
+    reabierto = TelemetryStore([dict(m) for m in MONTACARGAS])
+    reabierto.attach_archive(TripArchive(str(tmp_path / "archivo")))
+    assert archivado not in {r["id"] for r in reabierto.list_recorridos()}
+    _verificar(reabierto)
+
+
+def test_sqlite_ingesta_y_borrado(tmp_path):
+    rng = np.random.default_rng(4)
+    path = str(tmp_path / "telemetria.db")
+    store = SQLiteStore(path, [dict(m) for m in MONTACARGAS])
+    _ingerir(store, rng)
+    activo = store.get_recorrido_activo(1, "2025-11-19")["id"]
+    assert store.delete_recorrido(activo)
+    assert store.delete_recorrido(activo - 1)
+    _verificar(store)
+    store.close()
+
+    # Los agregados reconstruidos al abrir la base coinciden con el recálculo
+    reabierto = SQLiteStore(path)
+    _verificar(reabierto)
+    reabierto.close()
+
+
+@pytest.mark.parametrize("fecha", ["2025-11-18", "2025-11-20"])
+def test_borrar_todos_los_recorridos_de_un_dia(tmp_path, fecha):
+    store = TelemetryStore([dict(m) for m in MONTACARGAS])
+    _ingerir(store, np.random.default_rng(5))
+    store.attach_archive(TripArchive(str(tmp_path / "archivo")))
+    store.archive_before("2025-11-20")
+    for mc_id in (1, 2, 3):
+        for recorrido in store.recorridos_by_montacarga(mc_id, fecha, fecha):
+            store.delete_recorrido(recorrido["id"])
+    assert fecha not in store.aggregates.por_dia
+    assert store.get_recorrido_activo(1, fecha) is None
+    _verificar(store)
@@ -0,0 +1,149 @@
+"""Alertas: cruces de umbral por máscara de bits, reglas por zona, sin_datos con heap perezoso y filtro mc_ids"""
+
+import numpy as np
+
+from app.alerts import AlertEngine
+from app.geofence import GeofenceIndex
+
+REGLAS = [
+    {"id": "rapido", "tipo": "velocidad", "max_kmh": 10},
+    {"id": "muy_rapido", "tipo": "velocidad", "max_kmh": 20, "severidad": "alta"},
+    {"id": "bateria", "tipo": "bateria", "min": 20},
+    {"id": "error", "tipo": "estado", "estados": ["error", "fault"]},
+    {"id": "bodega", "tipo": "velocidad", "max_kmh": 5, "zona_id": 1},
+    {"id": "mc2", "tipo": "velocidad", "max_kmh": 15, "mc_ids": [2]},
+]
+BODEGA = {"id": 1, "nombre": "Bodega", "poligono": [[6.26, -75.58], [6.26, -75.57], [6.27, -75.57], [6.27, -75.58]]}
+DENTRO, FUERA = (6.265, -75.575), (6.28, -75.575)
+
+
+class Reloj:
+    def __init__(self, ahora: float = 0.0):
+        self.ahora = ahora
+
+    def __call__(self) -> float:
+        return self.ahora
+
+
+def _cambios(eventos):
+    return [(e["regla_id"], e["alerta"]) for e in eventos]
+
+
+def _violada(regla, mc_id, speed, battery, status, zona):
+    if regla.get("mc_ids") is not None and mc_id not in regla["mc_ids"]:
+        return False
+    if regla["tipo"] == "velocidad":
+        return speed > regla["max_kmh"] and regla.get("zona_id") in (None, zona)
+    if regla["tipo"] == "bateria":
+        return battery < regla["min"]
+    return status in regla["estados"]
+
+
+def test_umbrales_cruzados_sin_repetir_mientras_se_cumplen():
+    motor = AlertEngine(REGLAS)
+    velocidades = [5, 12, 15, 25, 25, 12, 5]
+    eventos = [_cambios(motor.evaluate(1, i, *FUERA, v, 90, "active")) for i, v in enumerate(velocidades)]
+    assert eventos == [[], [("rapido", "activa")], [], [("muy_rapido", "activa")], [],
+                       [("muy_rapido", "resuelta")], [("rapido", "resuelta")]]
+    # Batería por debajo del mínimo (estricto) y estado en la lista
+    assert _cambios(motor.evaluate(1, 10, *FUERA, 0, 19, "active")) == [("bateria", "activa")]
+    assert _cambios(motor.evaluate(1, 11, *FUERA, 0, 10, "fault")) == [("error", "activa")]
+    assert _cambios(motor.evaluate(1, 12, *FUERA, 0, 20, "error")) == [("bateria", "resuelta")]
+    assert [a["regla_id"] for a in motor.active(1)] == ["error"]
+    assert motor.active(2) == []
+
+
+def test_lote_igual_a_evaluar_cada_regla():
+    """evaluate_many (desordenado) frente a una evaluación directa de todas las reglas en orden de ts"""
+    zonas = GeofenceIndex([BODEGA])
+    motor = AlertEngine(REGLAS, zonas)
+    rng = np.random.default_rng(7)
+    n = 400
+    ts = rng.permutation(n)
+    dentro = rng.random(n) < 0.5
+    lat = np.where(dentro, DENTRO[0], FUERA[0])
+    lng = np.full(n, DENTRO[1])
+    speed = rng.choice([0.0, 4.0, 7.0, 12.0, 18.0, 25.0], n)
+    battery = rng.choice([5.0, 19.0, 20.0, 60.0], n)
+    status = rng.choice(["active", "error", "idle"], n).tolist()
+
+    esperados = []
+    for mc_id in (1, 2):
+        eventos = []
+        for inicio in range(0, n, 50):
+            lote = slice(inicio, inicio + 50)
+            eventos += motor.evaluate_many(mc_id, ts[lote], lat[lote], lng[lote], speed[lote], battery[lote],
+                                           status[lote])
+        activas = set()
+        for inicio in range(0, n, 50):
+            for i in sorted(range(inicio, min(inicio + 50, n)), key=lambda i: ts[i]):
+                zona = 1 if dentro[i] else None
+                for regla in REGLAS:
+                    violada = _violada(regla, mc_id, speed[i], battery[i], status[i], zona)
+                    if violada != (regla["id"] in activas):
+                        activas ^= {regla["id"]}
+                        esperados.append((mc_id, int(ts[i]), regla["id"], "activa" if violada else "resuelta"))
+        assert [(e["mc_id"], e["ts"], e["regla_id"], e["alerta"]) for e in eventos] == \
+            [e for e in esperados if e[0] == mc_id]
+        assert sorted(a["regla_id"] for a in motor.active(mc_id)) == sorted(activas)
+    assert motor.evaluados == 2 * n
+
+
+def test_velocidad_por_zona():
+    motor = AlertEngine(REGLAS, GeofenceIndex([BODEGA]))
+    assert _cambios(motor.evaluate(1, 0, *DENTRO, 8, 90, "active")) == [("bodega", "activa")]
+    assert _cambios(motor.evaluate(1, 1, *FUERA, 8, 90, "active")) == [("bodega", "resuelta")]
+    assert _cambios(motor.evaluate(1, 2, *DENTRO, 12, 90, "active")) == [("rapido", "activa"), ("bodega", "activa")]
+    assert _cambios(motor.evaluate(1, 3, *DENTRO, 4, 90, "active")) == [("rapido", "resuelta"),
+                                                                       ("bodega", "resuelta")]
+    # Sin zonas cargadas, la regla por zona nunca se evalúa
+    sin_zonas = AlertEngine(REGLAS, GeofenceIndex([]))
+    assert _cambios(sin_zonas.evaluate(1, 0, *DENTRO, 8, 90, "active")) == []
+
+
+def test_filtro_mc_ids():
+    motor = AlertEngine(REGLAS + [{"id": "silencio", "tipo": "sin_datos", "segundos": 60, "mc_ids": [2]}],
+                        reloj=Reloj())
+    assert _cambios(motor.evaluate(1, 0, *FUERA, 16, 90, "active")) == [("rapido", "activa")]
+    assert _cambios(motor.evaluate(2, 0, *FUERA, 16, 90, "active")) == [("rapido", "activa"), ("mc2", "activa")]
+    assert _cambios(motor.evaluate(3, 0, *FUERA, 16, 90, "active")) == [("rapido", "activa")]
+    # sin_datos filtrada: solo se programa el vencimiento del montacarga 2
+    assert motor.stats()["vencimientos_programados"] == 1
+    motor.reloj.ahora = 100
+    assert [(e["mc_id"], e["regla_id"]) for e in motor.tick()] == [(2, "silencio")]
+
+
+def test_sin_datos_con_reprogramacion_perezosa():
+    reloj = Reloj()
+    motor = AlertEngine([{"id": "silencio", "tipo": "sin_datos", "segundos": 60}], reloj=reloj)
+    motor.evaluate(1, 1000, *FUERA, 5, 90, "active")
+    motor.evaluate(2, 1000, *FUERA, 5, 90, "active")
+    assert motor.stats()["vencimientos_programados"] == 2
+
+    # Un dato nuevo no toca el heap: la entrada vieja se reprograma al vencer
+    reloj.ahora = 30
+    assert motor.tick() == []
+    reloj.ahora = 50
+    motor.evaluate_many(1, np.array([1050]), np.array([FUERA[0]]), np.array([FUERA[1]]),
+                        np.array([5.0]), np.array([90]), ["active"])
+    assert motor.stats()["vencimientos_programados"] == 2
+    reloj.ahora = 60
+    alertas = motor.tick()
+    assert [(e["mc_id"], e["alerta"], e["valor"]) for e in alertas] == [(2, "activa", 60.0)]
+    assert motor._vencimientos == [(110.0, 0, 1)]
+
+    reloj.ahora = 110
+    assert [(e["mc_id"], e["alerta"]) for e in motor.tick()] == [(1, "activa")]
+    assert motor.stats()["vencimientos_programados"] == 0
+    # Vencida, no se vuelve a emitir hasta que lleguen datos
+    reloj.ahora = 500
+    assert motor.tick() == []
+
+    # Los datos nuevos la resuelven y vuelven a programarla desde ahora
+    eventos = motor.evaluate(2, 1500, *FUERA, 5, 90, "active")
+    assert [(e["mc_id"], e["alerta"], e["ts"]) for e in eventos] == [(2, "resuelta", 1500)]
+    assert [a["mc_id"] for a in motor.active()] == [1]
+    reloj.ahora = 559
+    assert motor.tick() == []
+    reloj.ahora = 560
+    assert [(e["mc_id"], e["alerta"]) for e in motor.tick()] == [(2, "activa")]
@@ -0,0 +1,159 @@
+"""Archivo comprimido: compactación, reapertura tras una compactación interrumpida y archivado fuera del loop"""
+
+import os
+import threading
+
+import numpy as np
+
+from app import main
+from app.archive import ARCHIVE_FILE, INDEX_FILE, TripArchive
+from app.columns import PointColumns
+from app.ingest import append_point
+from app.store import TelemetryStore
+
+INICIO = int(np.datetime64("2025-11-20T06:00:00", "s").astype(np.int64))
+
+
+def _recorrido(recorrido_id, mc_id, fecha, rng, n=50):
+    puntos = PointColumns(n)
+    puntos.extend(6.2687 + rng.normal(0, 2e-4, n), -75.5697 + rng.normal(0, 2e-4, n),
+                  INICIO + recorrido_id * 3600 + np.arange(n) * 30, rng.uniform(0, 12, n), np.full(n, 80))
+    return {"id": recorrido_id, "montacarga_id": mc_id, "fecha": fecha, "hora_inicio": "06:00",
+            "hora_fin": "06:25", "distancia_km": 1.5, "puntos_recorrido": puntos}
+
+
+def _contenido(archivo):
+    return {
+        (e["mc_id"], e["fecha"]): {
+            i: (p.ts.tolist(), p.lat.tolist()) for i, p in archivo.chunk(e["mc_id"], e["fecha"]).items()
+        }
+        for e in archivo.entries()
+    }
+
+
+def _llenar(directorio, rng):
+    """Tres días de dos montacargas, con recorridos tardíos y borrados que reescriben chunks"""
+    archivo = TripArchive(directorio)
+    siguiente = 1
+    for fecha in ("2025-11-18", "2025-11-19", "2025-11-20"):
+        for mc_id in (1, 2):
+            archivo.write(mc_id, fecha, [_recorrido(siguiente, mc_id, fecha, rng),
+                                         _recorrido(siguiente + 1, mc_id, fecha, rng)])
+            siguiente += 2
+    archivo.write(1, "2025-11-19", [_recorrido(siguiente, 1, "2025-11-19", rng)])
+    archivo.remove(2, "2025-11-18", 3)
+    archivo.remove(2, "2025-11-18", 4)
+    archivo.remove(1, "2025-11-20", 9)
+    return archivo
+
+
+def test_compactacion_libera_los_chunks_reemplazados(tmp_path):
+    directorio = str(tmp_path)
+    archivo = _llenar(directorio, np.random.default_rng(1))
+    antes = _contenido(archivo)
+    vivos = archivo.stats()["bytes_comprimidos"]
+    assert archivo.dead_bytes() > 0
+
+    liberados = archivo.compact()
+    assert liberados > 0 and archivo.dead_bytes() == 0
+    assert archivo.stats()["bytes_comprimidos"] == vivos
+    assert _contenido(archivo) == antes
+    assert sorted(os.listdir(directorio)) == ["archive-1.dat", INDEX_FILE]
+
+    # Lo escrito después de compactar se agrega al archivo nuevo y sobrevive la reapertura
+    archivo.write(2, "2025-11-21", [_recorrido(20, 2, "2025-11-21", np.random.default_rng(2))])
+    antes = _contenido(archivo)
+    archivo.close()
+    reabierto = TripArchive(directorio)
+    assert _contenido(reabierto) == antes
+    assert reabierto.dead_bytes() == 0
+
+    # Una segunda compactación reemplaza al archivo de la primera
+    reabierto.remove(2, "2025-11-21", 20)
+    reabierto.compact()
+    assert sorted(os.listdir(directorio)) == ["archive-2.dat", INDEX_FILE]
+    reabierto.close()
+
+
+def test_compactacion_interrumpida_conserva_el_archivo_anterior(tmp_path):
+    directorio = str(tmp_path)
+    archivo = _llenar(directorio, np.random.default_rng(3))
+    antes = _contenido(archivo)
+    archivo.close()
+    # Caída antes del rename del índice: el archivo de datos nuevo y el índice temporal sobran
+    with open(os.path.join(directorio, "archive-1.dat"), "wb") as f:
+        f.write(b"\x00" * 100)
+    with open(os.path.join(directorio, INDEX_FILE + ".tmp"), "w") as f:
+        f.write('{"archivo": "archive-1.dat"}\n')
+
+    reabierto = TripArchive(directorio)
+    assert _contenido(reabierto) == antes
+    assert sorted(os.listdir(directorio)) == sorted([ARCHIVE_FILE, INDEX_FILE])
+    reabierto.close()
+
+
+def _store_con_archivo(directorio):
+    store = TelemetryStore([{"id": i, "codigo": f"MC-{i:03d}", "modelo": "Sim", "estado": "Activo"} for i in (1, 2)])
+    rng = np.random.default_rng(4)
+    for recorrido_id in range(1, 7):
+        store.add_recorrido(_recorrido(recorrido_id, 1 + recorrido_id % 2, "2025-11-20", rng))
+    archivo = TripArchive(directorio)
+    store.attach_archive(archivo)
+    return store, archivo
+
+
+def test_archivado_en_dos_pasos_con_cambios_intermedios(tmp_path):
+    store, archivo = _store_con_archivo(str(tmp_path))
+    stats = store.aggregates.stats()
+    grupos = store.prepare_archive("2025-11-21")
+    # Mientras se escriben los chunks (en un hilo, en la API) llegan un punto tardío y un borrado
+    append_point(store, 1, INICIO + 2 * 3600 + 45, 6.27, -75.57)
+    store.delete_recorrido(4)
+    entradas = store.write_archive(grupos)
+    assert store.commit_archive(grupos, entradas) == 4
+
+    # El modificado sigue en memoria y el borrado no queda en el archivo
+    assert not store.is_archived(2) and len(store.get_recorrido(2)["puntos_recorrido"]) == 51
+    assert sorted(m["id"] for e in archivo.entries() for m in e["recorridos"]) == [1, 3, 5, 6]
+    assert store.count_puntos() == 5 * 50 + 1
+
+    # Los archivados se indexan con los metadatos del archivo, sin aporte guardado
+    metas = {m["id"]: m for e in archivo.entries() for m in e["recorridos"]}
+    assert all(store._recorridos[i] is metas[i] for i in (1, 3, 5, 6))
+    assert set(store.aggregates._aportes) == {2}
+    assert store.aggregates.check(store.list_recorridos(), store.list_montacargas()) == {}
+    assert store.aggregates.stats()["total_recorridos"] == stats["total_recorridos"] - 1
+    assert "n_puntos" not in store.get_recorrido(1)
+
+    # Cambios y borrados de archivados siguen llevando los agregados
+    recorrido = store.get_recorrido(3)
+    recorrido["distancia_km"] = 2.5
+    store.refresh_recorrido(recorrido)
+    store.delete_recorrido(5)
+    assert store.aggregates.check(store.list_recorridos(), store.list_montacargas()) == {}
+    assert metas[3]["distancia_km"] == 2.5  # el índice del archivo comparte los metadatos
+    archivo.close()
+
+
+def test_lecturas_de_archivados_fuera_del_loop(cliente, tmp_path, monkeypatch):
+    store, archivo = _store_con_archivo(str(tmp_path))
+    store.archive_before("2025-11-21")
+    hilos = []
+    leer = archivo._leer
+
+    def espia(entrada):
+        hilos.append(threading.current_thread().name)
+        return leer(entrada)
+
+    monkeypatch.setattr(archivo, "_leer", espia)
+    monkeypatch.setattr(main, "store", store)
+    monkeypatch.setattr(main, "trip_archive", archivo)
+    respuesta = cliente.get("/api/recorridos", params={"fields": "id,total_puntos", "limit": 4})
+    assert [r["total_puntos"] for r in respuesta.json()] == [50] * 4
+    assert respuesta.headers["X-Next-Cursor"] == "4"
+    respuesta = cliente.get("/api/recorridos/6/puntos",
+                            params={"desde": "2025-11-20T00:00:00", "hasta": "2025-11-21T00:00:00"})
+    assert len(respuesta.json()) == 50
+    # Cada chunk se descomprimió una vez, en los hilos del executor del loop
+    assert len(hilos) == 2 and all(nombre.startswith("asyncio") for nombre in hilos)
+    archivo.close()
@@ -0,0 +1,91 @@
+"""Endpoint binario: envíos mal formados (400), puntos fuera de rango, métricas de etapas y codificación"""
+
+import struct
+import time
+
+import numpy as np
+import pytest
+
+from app import main
+from app.binary_upload import HEADER, MAGIC, VERSION, decode_upload, encode_upload
+from app.metrics import ETAPAS
+
+URL = "/api/microcontroller/binary"
+HEADERS = {"Content-Type": "application/octet-stream"}
+
+
+def _envio(ts, mc_id=1):
+    n = len(ts)
+    return encode_upload(mc_id, np.asarray(ts, dtype=np.int64), np.full(n, 6.2687), np.full(n, -75.5697),
+                         np.full(n, 5.0), np.full(n, 90), ["active"] * n)
+
+
+def _invalidos():
+    return main.ERRORES_INGESTA.labels("binary", "datos_invalidos").valor
+
+
+@pytest.mark.parametrize("cuerpo", [
+    b"",
+    b"RB\x01",
+    HEADER.pack(b"XX", VERSION, 1, 1_763_600_000, 0, 0),
+    HEADER.pack(MAGIC, 9, 1, 1_763_600_000, 0, 0),
+    HEADER.pack(MAGIC, VERSION, 1, 1_763_600_000, 0, 0) + b"\x00" * 5,
+    HEADER.pack(MAGIC, VERSION, 1, -1, 0, 0),
+    HEADER.pack(MAGIC, VERSION, 1, 2 ** 63 - 1, 0, 0) + b"\x00" * 8 + struct.pack("<HHBB", 60000, 0, 90, 0),
+], ids=["vacio", "corto", "magic", "version", "largo", "epoch_negativo", "epoch_desborda"])
+def test_envio_mal_formado_responde_400(cliente, cuerpo):
+    antes = _invalidos()
+    respuesta = cliente.post(URL, content=cuerpo, headers=HEADERS)
+    assert respuesta.status_code == 400, respuesta.text
+    assert _invalidos() == antes + 1
+
+
+def test_puntos_fuera_de_rango_se_rechazan(cliente):
+    # Hasta MAX_CLOCK_SKEW_S después de la hora del servidor
+    limite = int(time.time()) + main.MAX_CLOCK_SKEW_S
+    respuesta = cliente.post(URL, content=_envio([limite - 60, limite - 30, limite + 3600]), headers=HEADERS)
+    assert respuesta.status_code == 200, respuesta.text
+    datos = respuesta.json()
+    assert (datos["accepted"], datos["rejected"], datos["rejected_indices"]) == (2, 1, [2])
+
+    respuesta = cliente.post(URL, content=_envio([]), headers=HEADERS)
+    assert respuesta.status_code == 200
+    assert respuesta.json()["accepted"] == 0
+
+
+def test_montacarga_desconocido_y_etapa_respuesta(cliente):
+    assert cliente.post(URL, content=_envio([1_763_600_000], mc_id=999), headers=HEADERS).status_code == 404
+
+    respuestas = ETAPAS.labels("respuesta").total
+    respuesta = cliente.post(URL, content=_envio(1_763_600_000 + np.arange(5) * 30), headers=HEADERS)
+    assert respuesta.status_code == 200
+    assert respuesta.json()["accepted"] == 5
+    assert ETAPAS.labels("respuesta").total == respuestas + 1
+
+
+def test_codificacion_ida_y_vuelta_en_los_limites_del_formato():
+    ts = 1_763_600_000 + np.array([0, 0, 65535, 65536])
+    lat = np.array([6.2687, -84.0, 90.0, 6.2687])
+    speed = np.array([0.0, 655.35, 12.5, 0.004])
+    mc_id, ts2, lat2, _, speed2, battery2, _ = decode_upload(encode_upload(
+        7, ts, lat, np.full(4, -75.5697), speed, np.array([0, 255, 90, 90]), ["active"] * 4))
+    assert mc_id == 7 and ts2.tolist() == ts.tolist()
+    assert lat2 == pytest.approx(lat, abs=1e-7) and speed2 == pytest.approx([0.0, 655.35, 12.5, 0.0])
+    assert battery2.tolist() == [0, 255, 90, 90]
+
+
+@pytest.mark.parametrize("campo,valores", [
+    ("dt", {"ts": [0, 65536]}),
+    ("dt", {"ts": [60, 0]}),
+    ("speed", {"speed": [5.0, 655.36]}),
+    ("speed", {"speed": [-0.01, 5.0]}),
+    ("speed", {"speed": [float("nan"), 5.0]}),
+    ("dlng", {"lng": [-179.0, 179.0]}),
+    ("battery", {"battery": [90, 256]}),
+])
+def test_codificacion_rechaza_valores_que_no_entran_en_su_campo(campo, valores):
+    puntos = {"ts": [0, 30], "lat": [6.2687, 6.2688], "lng": [-75.5697, -75.5697], "speed": [5.0, 5.0],
+              "battery": [90, 90], **valores}
+    puntos["ts"] = 1_763_600_000 + np.array(puntos["ts"])
+    with pytest.raises(ValueError, match=f"^{campo} del punto"):
+        encode_upload(1, *(np.array(puntos[c]) for c in ("ts", "lat", "lng", "speed", "battery")), ["active"] * 2)
@@ -0,0 +1,70 @@
+"""Columnas de puntos: timestamps en lote frente al punto individual y vistas copy-on-write"""
+
+import numpy as np
+import pytest
+
+from app.columns import PointColumns, parse_timestamp, parse_timestamps
+
+VARIANTES = [
+    "2025-10-18T08:00:00",
+    "2025-10-18T08:00",
+    "2025-10-18T08:00:00Z",
+    "2025-10-18T08:00:00+05:00",
+    "2025-10-18 08:00:00",
+    "2025-10-18T08:00:00.700",
+    "2025-10-18",
+]
+INVALIDOS = ["2025", "2025-13-01T00:00:00", "ayer", ""]
+
+
+@pytest.mark.parametrize("timestamp", VARIANTES)
+def test_lote_igual_que_punto_individual(timestamp):
+    ts, invalidos = parse_timestamps([timestamp])
+    assert invalidos == []
+    assert ts.tolist() == [parse_timestamp(timestamp)]
+
+
+@pytest.mark.parametrize("timestamp", INVALIDOS)
+def test_rechaza_lo_mismo_que_el_punto_individual(timestamp):
+    with pytest.raises(ValueError):
+        parse_timestamp(timestamp)
+    ts, invalidos = parse_timestamps(["2025-10-18T08:00:00", timestamp])
+    assert invalidos == [1]
+    assert ts.tolist() == [parse_timestamp("2025-10-18T08:00:00"), -1]
+
+
+def test_desplazamiento_horario_se_ignora_en_ambos_caminos():
+    # La hora es la local del dispositivo: el desplazamiento no mueve el punto
+    lote = ["2025-10-18T08:00:00", "2025-10-18T08:00:00+05:00"]
+    ts, _ = parse_timestamps(lote)
+    assert ts[0] == ts[1] == 1760774400
+
+
+def test_lote_mixto_conserva_el_orden():
+    lote = [f"2025-10-18T08:{m:02d}:00" for m in range(10)] + ["2025-10-18 09:00:00"]
+    ts, invalidos = parse_timestamps(lote)
+    assert invalidos == []
+    assert ts.tolist() == [parse_timestamp(t) for t in lote]
+
+
+
+def test_vista_no_cambia_al_agregar_ni_insertar():
+    puntos = PointColumns(4)
+    puntos.extend(np.arange(3.0), np.arange(3.0), np.array([10, 20, 30]))
+    vista = puntos.view()
+    assert vista.ts is not puntos.ts and np.shares_memory(vista.ts, puntos.ts)
+
+    # Al final (con y sin reubicar los buffers) se escribe más allá de la vista
+    puntos.append(3.0, 3.0, 40)
+    puntos.extend(np.array([4.0, 5.0]), np.array([4.0, 5.0]), np.array([50, 60]))
+    otra = puntos.view()
+    # Un punto atrasado desplaza los posteriores: se escribe sobre una copia
+    puntos.merge(np.array([9.0]), np.array([9.0]), np.array([15]))
+    assert vista.ts.tolist() == [10, 20, 30] and vista.lat.tolist() == [0.0, 1.0, 2.0]
+    assert otra.ts.tolist() == [10, 20, 30, 40, 50, 60]
+    assert puntos.ts.tolist() == [10, 15, 20, 30, 40, 50, 60]
+    assert not np.shares_memory(otra.ts, puntos.ts)
+    # Sin vistas nuevas, los merges siguientes escriben en su lugar
+    antes = puntos._data["ts"]
+    puntos.merge(np.array([9.0]), np.array([9.0]), np.array([25]))
+    assert puntos._data["ts"] is antes and puntos.ts.tolist() == [10, 15, 20, 25, 30, 40, 50, 60]
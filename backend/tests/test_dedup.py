@@ -0,0 +1,49 @@
+"""Ventana de deduplicación: reenvíos, atrasados, puntos fuera de ventana y relojes adelantados"""
+
+import numpy as np
+
+from app.dedup import DedupWindow
+
+INICIO = 1_763_600_000
+
+
+def test_reenvios_y_atrasados():
+    dedup = DedupWindow(ventana_s=600)
+    lote = INICIO + np.arange(10) * 30
+    assert dedup.accept_many(1, lote).all()
+    # Reenvío completo, y uno parcial con un punto nuevo y otro repetido dentro del lote
+    assert not dedup.accept_many(1, lote).any()
+    assert dedup.accept_many(1, np.array([lote[-1], lote[-1] + 30, lote[-1] + 30])).tolist() == [False, True, False]
+    # Atrasado dentro de la ventana: se acepta una sola vez; otro montacarga no comparte ventana
+    assert dedup.accept(1, int(lote[3]) + 5) and not dedup.accept(1, int(lote[3]) + 5)
+    assert dedup.accept(2, int(lote[0]))
+    # Anterior a la ventana: no se distingue de uno ya recibido
+    assert not dedup.accept(1, int(lote[-1]) + 30 - 600)
+    assert dedup.stats() == {"ventana_s": 600, "montacargas": 2, "recibidos": 27, "duplicados": 13,
+                             "atrasados": 1, "fuera_de_ventana": 1, "futuros": 0}
+
+
+def test_punto_del_futuro_no_mueve_la_marca():
+    dedup = DedupWindow(ventana_s=600, max_adelanto_s=300, reloj=lambda: INICIO + 60)
+    assert dedup.accept(1, INICIO)
+    futuro = int(np.datetime64("2099-01-01T00:00:00", "s").astype(np.int64))
+    assert not dedup.accept(1, futuro)
+    assert dedup.accept_many(1, np.array([INICIO + 30, futuro, INICIO + 300])).tolist() == [True, False, True]
+    assert not dedup.accept_many(1, np.array([futuro])).any()
+    # Los puntos reales siguientes se siguen aceptando
+    assert dedup.accept(1, INICIO + 60)
+    assert dedup.stats()["futuros"] == 3 and dedup.stats()["fuera_de_ventana"] == 0
+    # Un montacarga cuyo primer envío es del futuro no queda con ventana
+    assert not dedup.accept_many(2, np.array([futuro])).any()
+    assert dedup.accept(2, INICIO)
+
+
+def test_checkpoint_y_restore():
+    dedup = DedupWindow(ventana_s=600)
+    dedup.accept_many(1, INICIO + np.arange(5) * 30)
+    estado = dedup.checkpoint(1)
+    dedup.accept_many(1, INICIO + np.arange(5, 40) * 30)
+    dedup.restore(1, estado)
+    assert dedup.accept_many(1, INICIO + np.arange(3, 8) * 30).tolist() == [False, False, True, True, True]
+    dedup.restore(2, dedup.checkpoint(2))
+    assert dedup.accept(2, INICIO)
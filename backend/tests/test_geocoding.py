@@ -0,0 +1,164 @@
+"""Geocoding contra un servidor stub: caché, coalescencia de consultas y errores de la API"""
+
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+from fastapi.testclient import TestClient
+
+from app import main
+from app.geocoding import Geocoder
+
+DEMORA_S = 0.2
+
+
+class Stub(BaseHTTPRequestHandler):
+    """
+    Responde como la API de Google según la dirección: "lenta ..." tarda
+    DEMORA_S, "error ..." responde 500, "cuota ..." OVER_QUERY_LIMIT y
+    "nada ..." ZERO_RESULTS
+    """
+
+    llamadas = []
+
+    def do_GET(self):
+        direccion = parse_qs(urlparse(self.path).query)["address"][0]
+        Stub.llamadas.append(direccion)
+        if direccion.startswith("lenta"):
+            time.sleep(DEMORA_S)
+        if direccion.startswith("error"):
+            self.send_response(500)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        estado = "OVER_QUERY_LIMIT" if direccion.startswith("cuota") else \
+            "ZERO_RESULTS" if direccion.startswith("nada") else "OK"
+        cuerpo = json.dumps({"status": estado, "results": [{"formatted_address": direccion}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def url():
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), Stub)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{servidor.server_address[1]}/geocode/json"
+    servidor.shutdown()
+    servidor.server_close()
+
+
+@pytest.fixture
+def geocoder(url):
+    Stub.llamadas.clear()
+    geocoder = Geocoder(url, timeout_s=2.0, max_entradas=2, ttl_s=0.5)
+    yield geocoder
+    geocoder.close()
+
+
+def test_cache_por_direccion_normalizada(geocoder):
+    async def consultar():
+        primero = await geocoder.geocode("Calle 10 # 43-20, Medellín", "clave")
+        repetido = await geocoder.geocode("  calle 10 #  43-20,  MEDELLÍN ", "clave")
+        return primero, repetido
+
+    primero, repetido = asyncio.run(consultar())
+    assert primero is repetido and primero["status"] == "OK"
+    assert len(Stub.llamadas) == 1
+    assert (geocoder.aciertos, geocoder.fallos) == (1, 1)
+
+    # ZERO_RESULTS también es definitiva; con max_entradas=2 sale la menos usada
+    asyncio.run(geocoder.geocode("nada aquí", "clave"))
+    asyncio.run(geocoder.geocode("Calle 10 # 43-20, Medellín", "clave"))
+    asyncio.run(geocoder.geocode("Carrera 50", "clave"))
+    asyncio.run(geocoder.geocode("Calle 10 # 43-20, Medellín", "clave"))
+    assert len(Stub.llamadas) == 3
+    asyncio.run(geocoder.geocode("nada aquí", "clave"))
+    assert Stub.llamadas[-1] == "nada aquí" and len(Stub.llamadas) == 4
+
+    # Vencido el TTL se vuelve a consultar
+    time.sleep(0.6)
+    asyncio.run(geocoder.geocode("Calle 10 # 43-20, Medellín", "clave"))
+    assert len(Stub.llamadas) == 5
+
+
+def test_consultas_concurrentes_comparten_una_llamada(geocoder):
+    async def consultar():
+        variantes = [f"lenta {'  ' * (i % 3)}Avenida {'ORIENTAL' if i % 2 else 'oriental'}" for i in range(20)]
+        tareas = [asyncio.ensure_future(geocoder.geocode(v, "clave")) for v in variantes]
+        await asyncio.sleep(DEMORA_S / 4)
+        # El que lanzó la llamada se desconecta: los demás siguen esperando su resultado
+        tareas[0].cancel()
+        resultados = await asyncio.gather(*tareas[1:])
+        return tareas[0], resultados
+
+    cancelada, resultados = asyncio.run(consultar())
+    assert cancelada.cancelled()
+    assert len(Stub.llamadas) == 1
+    assert all(r is resultados[0] and r["status"] == "OK" for r in resultados)
+    assert (geocoder.fallos, geocoder.coalescidas) == (1, 19)
+    assert geocoder.stats()["en_vuelo"] == 0
+    # La respuesta quedó en caché aunque su iniciador se fue
+    asyncio.run(geocoder.geocode("lenta avenida oriental", "clave"))
+    assert len(Stub.llamadas) == 1
+
+
+def test_errores_de_la_api_no_se_cachean(geocoder):
+    async def consultar(direccion, n):
+        return await asyncio.gather(*(geocoder.geocode(direccion, "clave") for _ in range(n)),
+                                    return_exceptions=True)
+
+    # Un 500 llega como excepción a todas las consultas coalescidas
+    errores = asyncio.run(consultar("error 500", 5))
+    assert all(isinstance(e, requests.HTTPError) for e in errores)
+    assert len(Stub.llamadas) == 1
+    asyncio.run(consultar("error 500", 1))
+    assert len(Stub.llamadas) == 2
+
+    # Un error de cuota es una respuesta válida pero no definitiva
+    assert asyncio.run(consultar("cuota", 1))[0]["status"] == "OVER_QUERY_LIMIT"
+    asyncio.run(consultar("cuota", 1))
+    assert len(Stub.llamadas) == 4
+    assert geocoder.stats()["entradas"] == 0 and geocoder.stats()["en_vuelo"] == 0
+
+
+def test_timeout_de_la_api(url):
+    Stub.llamadas.clear()
+    geocoder = Geocoder(url, timeout_s=DEMORA_S / 4)
+    try:
+        with pytest.raises(requests.Timeout):
+            asyncio.run(geocoder.geocode("lenta calle 1", "clave"))
+        assert geocoder.stats()["en_vuelo"] == 0
+        # La siguiente consulta vuelve a intentarlo
+        with pytest.raises(requests.Timeout):
+            asyncio.run(geocoder.geocode("lenta calle 1", "clave"))
+        assert geocoder.llamadas == 2
+    finally:
+        geocoder.close()
+
+
+def test_endpoint_responde_500_ante_errores(url, monkeypatch):
+    monkeypatch.setattr(main, "geocoder", Geocoder(url, timeout_s=DEMORA_S / 4))
+    cliente = TestClient(main.app)
+    monkeypatch.delenv("GOOGLE_MAPS_API_KEY", raising=False)
+    assert cliente.post("/api/maps/geocode", params={"address": "Carrera 50"}).status_code == 500
+
+    monkeypatch.setenv("GOOGLE_MAPS_API_KEY", "clave")
+    respuesta = cliente.post("/api/maps/geocode", params={"address": "Carrera 50"})
+    assert respuesta.status_code == 200 and respuesta.json()["status"] == "OK"
+    for direccion in ("error 1", "lenta 1"):
+        respuesta = cliente.post("/api/maps/geocode", params={"address": direccion})
+        assert respuesta.status_code == 500
+        assert respuesta.json()["detail"].startswith("Error en geocoding")
+    assert cliente.get("/api/maps/geocode/stats").json()["llamadas_api"] == 3
+    main.geocoder.close()
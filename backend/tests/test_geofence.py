@@ -0,0 +1,101 @@
+"""Geocercas: clasificación por grilla, zonas que cruzan celdas, eventos de entrada/salida y permanencia"""
+
+import numpy as np
+import pytest
+
+from app.geofence import GeofenceIndex, GeofenceTracker
+
+ZONAS = [
+    # Bodega en L (cóncava) con un muelle dentro; la rampa es un triángulo aparte
+    {"id": 1, "nombre": "Bodega", "poligono": [[0.0, 0.0], [0.0, 3.0], [1.0, 3.0], [1.0, 1.0], [3.0, 1.0], [3.0, 0.0]]},
+    {"id": 2, "nombre": "Muelle", "poligono": [[0.2, 0.2], [0.2, 0.6], [0.6, 0.6], [0.6, 0.2]]},
+    {"id": 3, "nombre": "Rampa", "poligono": [[2.0, 2.0], [2.0, 4.0], [4.0, 2.0]]},
+]
+
+
+def _contiene(poligono, lat, lng):
+    """Cruce de rayos punto a punto, sin precálculos"""
+    dentro = False
+    for (lat1, lng1), (lat2, lng2) in zip(poligono, poligono[1:] + poligono[:1]):
+        if (lat1 > lat) != (lat2 > lat) and lng < lng1 + (lat - lat1) * (lng2 - lng1) / (lat2 - lat1):
+            dentro = not dentro
+    return dentro
+
+
+def _area(poligono):
+    return abs(sum(a[0] * b[1] - b[0] * a[1] for a, b in zip(poligono, poligono[1:] + poligono[:1]))) / 2
+
+
+def _zona_lineal(lat, lng):
+    """Recorre todas las zonas; en las superpuestas gana la de menor área"""
+    zonas = [z for z in ZONAS if _contiene(z["poligono"], lat, lng)]
+    return min(zonas, key=lambda z: _area(z["poligono"]))["id"] if zonas else None
+
+
+@pytest.mark.parametrize("celda", [None, 0.07, 0.5, 10.0])
+def test_clasificacion_por_grilla_igual_a_recorrer_todas_las_zonas(celda):
+    """Con celdas pequeñas cada zona cruza muchas celdas; con una grande todas comparten una"""
+    index = GeofenceIndex(ZONAS, celda_grados=celda)
+    rng = np.random.default_rng(3)
+    lat, lng = rng.uniform(-0.5, 4.5, 3000), rng.uniform(-0.5, 4.5, 3000)
+    esperadas = [_zona_lineal(la, ln) for la, ln in zip(lat.tolist(), lng.tolist())]
+    assert [index.classify(la, ln) for la, ln in zip(lat.tolist(), lng.tolist())] == esperadas
+    assert index.classify_many(lat, lng).tolist() == [-1 if z is None else z for z in esperadas]
+    assert {z for z in esperadas} == {None, 1, 2, 3}
+
+
+def test_zona_que_cruza_celdas():
+    index = GeofenceIndex(ZONAS, celda_grados=0.5)
+    # La bodega toca todas las celdas de su rectángulo envolvente, aunque su hueco no esté dentro
+    celdas_bodega = {c for c, poligonos in index._celdas.items() if any(p.zona_id == 1 for p in poligonos)}
+    assert celdas_bodega == {(i, j) for i in range(7) for j in range(7)}
+    # Las celdas compartidas prueban primero la zona más pequeña
+    assert [p.zona_id for p in index._celdas[(0, 0)]] == [2, 1]
+    # Un punto en el hueco de la L cae en celdas de la bodega y de la rampa, pero fuera de ambas
+    assert index.classify(1.9, 2.5) is None and index.classify(2.5, 2.5) == 3
+    # Puntos a ambos lados de un borde de celda dentro de la misma zona
+    assert index.classify_many(np.array([0.49, 0.51, 0.75]), np.array([2.0, 2.0, 0.7])).tolist() == [1, 1, 1]
+    assert GeofenceIndex([]).classify(0.5, 0.5) is None
+    assert GeofenceIndex([]).classify_many(np.array([0.5]), np.array([0.5])).tolist() == [-1]
+
+
+def test_entradas_y_salidas():
+    tracker = GeofenceTracker(GeofenceIndex(ZONAS))
+    recorrido = [(0, 5.0, 5.0), (10, 0.8, 2.0), (20, 0.9, 2.5), (30, 0.4, 0.4), (50, 2.5, 0.5), (80, 5.0, 5.0)]
+    eventos = [e for ts, lat, lng in recorrido for e in tracker.update(1, ts, lat, lng)]
+    assert [(e["evento"], e["zona_id"], e["ts"], e.get("permanencia_s")) for e in eventos] == [
+        ("entrada", 1, 10, None),
+        ("salida", 1, 30, 20), ("entrada", 2, 30, None),
+        ("salida", 2, 50, 20), ("entrada", 1, 50, None),
+        ("salida", 1, 80, 30),
+    ]
+    assert list(tracker.eventos) == eventos
+    # Un punto atrasado no altera la secuencia
+    assert tracker.update(1, 60, 0.4, 0.4) == [] and tracker.zona_actual(1) is None
+
+    # El lote produce los mismos eventos que punto a punto, aunque llegue desordenado
+    lote = GeofenceTracker(GeofenceIndex(ZONAS))
+    ts, lat, lng = (np.array(v) for v in zip(*recorrido[::-1]))
+    assert lote.update_many(1, ts, lat, lng) == eventos
+    assert lote.permanencia_s == tracker.permanencia_s == {1: 50, 2: 20}
+
+
+def test_permanencia_y_ocupacion():
+    tracker = GeofenceTracker(GeofenceIndex(ZONAS))
+    tracker.update(1, 0, 0.5, 2.0)
+    tracker.update(2, 0, 0.5, 2.5)
+    tracker.update(3, 0, 2.5, 2.5)
+    # Puntos dentro de la misma zona extienden la estadía en curso
+    tracker.update_many(1, np.array([30, 60]), np.array([0.5, 0.6]), np.array([2.0, 2.1]))
+    tracker.update(2, 100, 5.0, 5.0)
+    tracker.update(3, 40, 2.6, 2.6)
+
+    ocupacion = {z["zona_id"]: z for z in tracker.ocupacion()}
+    assert (ocupacion[1]["montacargas"], ocupacion[1]["ocupacion"]) == ([1], 1)
+    # Bodega: 100 s del montacarga 2 (cerrada) + 60 s del 1 (en curso)
+    assert ocupacion[1]["permanencia_s"] == 160
+    assert (ocupacion[2]["ocupacion"], ocupacion[2]["permanencia_s"]) == (0, 0)
+    assert (ocupacion[3]["montacargas"], ocupacion[3]["permanencia_s"]) == ([3], 40)
+    assert ocupacion[1]["nombre"] == "Bodega"
+    # La permanencia acumulada solo cuenta las estadías cerradas
+    assert tracker.permanencia_s == {1: 100}
@@ -0,0 +1,118 @@
+"""Filtro GPS: outliers, paradas, cortes por inactividad y puntos atrasados"""
+
+import json
+
+import numpy as np
+
+from app.gps_filter import GpsFilter
+from app.ingest import append_points
+from app.store import TelemetryStore
+
+INICIO = int(np.datetime64("2025-11-20T06:00:00", "s").astype(np.int64))
+LAT, LNG = 6.2687, -75.5697
+METRO = 1 / 111_195  # grados de latitud por metro
+
+
+def _store():
+    return TelemetryStore([{"id": 1, "codigo": "MC-001", "modelo": "Sim", "estado": "Activo"}])
+
+
+def _ingerir(store, filtro, ts, lat, speed):
+    n = len(ts)
+    return append_points(store, 1, np.asarray(ts, dtype=np.int64), np.asarray(lat, dtype=np.float64),
+                         np.full(n, LNG), np.asarray(speed, dtype=np.float32), np.full(n, 90, dtype=np.uint8),
+                         ["active"] * n, filtro=filtro)
+
+
+def test_outlier_descartado():
+    filtro = GpsFilter()
+    assert len(filtro.procesar(1, INICIO, LAT, LNG, 5.0)) == 1
+    # 1 km en 30 s (120 km/h): imposible para un montacarga
+    assert filtro.procesar(1, INICIO + 30, LAT + 1000 * METRO, LNG, 5.0) == []
+    salida = filtro.procesar(1, INICIO + 60, LAT + 20 * METRO, LNG, 5.0)
+    assert len(salida) == 1 and not salida[0].corte
+    # El outlier no movió el estado: el punto siguiente queda cerca de su medición
+    assert abs(salida[0].lat - LAT) < 25 * METRO
+    assert filtro.stats()["descartados"] == 1
+
+
+def test_parada_suprime_jitter_y_conserva_duracion():
+    filtro = GpsFilter()
+    store = _store()
+    rng = np.random.default_rng(1)
+    n = 20
+    ts = INICIO + np.arange(n) * 30
+    # En marcha 5 puntos, 10 detenido con jitter de ±3 m y de nuevo en marcha
+    lat = LAT + np.concatenate((np.arange(5) * 40, 160 + rng.uniform(-3, 3, 10), 200 + np.arange(5) * 40)) * METRO
+    speed = np.concatenate((np.full(5, 5.0), np.zeros(10), np.full(5, 5.0)))
+    _ingerir(store, filtro, ts, lat, speed)
+
+    recorrido = store.list_recorridos()[0]
+    puntos = recorrido["puntos_recorrido"]
+    # Se conservan el inicio y el final de la parada, ambos en el anclaje
+    assert len(puntos) == n - 8
+    parada = np.flatnonzero(puntos.speed == 0)
+    assert puntos.ts[parada].tolist() == [int(ts[5]), int(ts[14])]
+    assert puntos.lat[parada[0]] == puntos.lat[parada[1]]
+    assert filtro.stats()["suprimidos"] == 8
+    assert recorrido["hora_inicio"] == "06:00" and recorrido["hora_fin"] == "06:09"
+
+
+def test_hueco_de_inactividad_corta_el_recorrido():
+    filtro = GpsFilter(gap_inactivo_s=1800)
+    store = _store()
+    ts = INICIO + np.arange(10) * 30
+    lat = LAT + np.arange(10) * 40 * METRO
+    _ingerir(store, filtro, ts, lat, np.full(10, 5.0))
+    # Sin datos durante una hora
+    _ingerir(store, filtro, ts + 3600 + 300, lat, np.full(10, 5.0))
+    # Detenido más de media hora y luego en marcha
+    parado = ts[-1] + 3900 + np.arange(1, 80) * 30
+    _ingerir(store, filtro, parado, np.full(len(parado), lat[-1]), np.zeros(len(parado)))
+    _ingerir(store, filtro, parado[-1] + 30 + np.arange(5) * 30, lat[-1] + np.arange(1, 6) * 40 * METRO,
+             np.full(5, 5.0))
+
+    recorridos = store.list_recorridos()
+    assert [len(r["puntos_recorrido"]) for r in recorridos] == [10, 12, 5]
+    # La parada larga cierra el segundo recorrido con su último punto
+    assert recorridos[1]["puntos_recorrido"].ts[-1] == parado[-1]
+    assert recorridos[1]["puntos_recorrido"].speed[-1] == 0
+
+
+def test_puntos_atrasados_pasan_por_el_filtro():
+    filtro = GpsFilter()
+    store = _store()
+    ts = INICIO + np.arange(10) * 30
+    lat = LAT + np.arange(10) * 40 * METRO
+    _ingerir(store, filtro, ts, lat, np.full(10, 5.0))
+    _ingerir(store, filtro, ts[-1] + np.arange(1, 6) * 30, np.full(5, lat[-1]), np.zeros(5))
+
+    # Un outlier atrasado se descarta, el jitter atrasado de la parada se
+    # suprime y uno válido se inserta en orden
+    assert _ingerir(store, filtro, [ts[5] + 10], [LAT + 10_000 * METRO], [5.0]) == []
+    assert _ingerir(store, filtro, [ts[-1] + 45], [lat[-1] + 2 * METRO], [0.0]) == []
+    _ingerir(store, filtro, [ts[5] + 10], [LAT + 215 * METRO], [5.0])
+
+    puntos = store.list_recorridos()[0]["puntos_recorrido"]
+    assert len(puntos) == 12
+    assert puntos.ts.tolist() == sorted(puntos.ts.tolist())
+    assert int(ts[5]) + 10 in puntos.ts.tolist()
+    assert filtro.stats()["descartados"] == 1
+    assert filtro.stats()["suprimidos"] == 4 + 1
+
+
+def test_estado_exportado_continua_igual():
+    rng = np.random.default_rng(2)
+    ts = INICIO + np.arange(200) * 30
+    lat = LAT + rng.normal(0, 5, 200).cumsum() * METRO
+    speed = np.where(rng.random(200) < 0.3, 0.0, 5.0)
+
+    continuo = GpsFilter()
+    salida = [continuo.procesar(1, *p) for p in zip(ts.tolist(), lat.tolist(), [LNG] * 200, speed.tolist())]
+    restaurado = GpsFilter()
+    for p in zip(ts[:120].tolist(), lat[:120].tolist(), [LNG] * 120, speed[:120].tolist()):
+        restaurado.procesar(1, *p)
+    copia = GpsFilter()
+    copia.load_state(json.loads(json.dumps(restaurado.export_state())))
+    for i, p in enumerate(zip(ts[120:].tolist(), lat[120:].tolist(), [LNG] * 80, speed[120:].tolist())):
+        assert copia.procesar(1, *p) == salida[120 + i]
@@ -0,0 +1,187 @@
+"""Mapa de calor: consultas por tile, agregación diaria y retención"""
+
+import numpy as np
+
+from app.heatmap import _BITS_BUCKET, SEGUNDOS_POR_BUCKET, TILE, HeatmapGrid
+
+DIA = 86400
+INICIO = 1_760_745_600  # 2025-10-18T00:00:00
+
+
+class Reloj:
+    """Hora del servidor controlada por la prueba"""
+
+    def __init__(self, ahora):
+        self.ahora = ahora
+
+    def __call__(self):
+        return self.ahora
+
+
+def _crudo(ts, lat, lng, caja, tamano, desde=None, hasta=None):
+    """Visitas por celda recorriendo los puntos crudos (celdas que tocan el rectángulo)"""
+    fila, columna = np.floor(lat / tamano), np.floor(lng / tamano)
+    dentro = (fila >= np.floor(caja[0] / tamano)) & (fila <= np.floor(caja[1] / tamano)) \
+        & (columna >= np.floor(caja[2] / tamano)) & (columna <= np.floor(caja[3] / tamano))
+    if desde is not None:
+        dentro &= ts >= desde
+    if hasta is not None:
+        dentro &= ts <= hasta
+    celdas, conteos = np.unique(np.stack((fila[dentro], columna[dentro]), axis=1), axis=0, return_counts=True)
+    return {(int(f), int(c)): int(n) for (f, c), n in zip(celdas, conteos)}
+
+
+def _visitas(resultado):
+    tamano = resultado["tamano_celda"]
+    return {
+        (int(np.floor(c["lat"] / tamano)), int(np.floor(c["lng"] / tamano))): c["visitas"]
+        for c in resultado["celdas"]
+    }
+
+
+def _puntos(rng, n, dias=1):
+    ts = np.sort(rng.integers(INICIO, INICIO + dias * DIA, n))
+    # Alrededor de un cruce de tiles en las cuatro resoluciones (y de lat/lng negativos)
+    lat = rng.uniform(-0.05, 0.05, n)
+    lng = rng.uniform(-75.62, -75.52, n)
+    return ts, lat, lng, rng.uniform(0, 15, n)
+
+
+def test_consulta_por_rectangulo_igual_al_escaneo():
+    rng = np.random.default_rng(1)
+    ts, lat, lng, speed = _puntos(rng, 20_000)
+    heatmap = HeatmapGrid(reloj=Reloj(INICIO + DIA))
+    for i in range(0, len(ts), 500):
+        heatmap.ingest(1, ts[i:i + 500], lat[i:i + 500], lng[i:i + 500], speed[i:i + 500])
+
+    for resolucion, tamano in enumerate(heatmap.tamanos):
+        # Rectángulos que cubren tiles completos, parciales y ninguno
+        for caja in ((-0.05, 0.05, -75.62, -75.52), (-0.013, 0.021, -75.571, -75.553),
+                     (0.001, 0.0012, -75.5601, -75.5599), (10.0, 10.1, 20.0, 20.1)):
+            esperado = _crudo(ts, lat, lng, caja, tamano)
+            assert _visitas(heatmap.query(*caja, resolucion=resolucion)) == esperado
+
+    # Ventana de la tarde (horas completas)
+    desde, hasta = INICIO + 12 * 3600, INICIO + 18 * 3600 - 1
+    caja = (-0.02, 0.02, -75.6, -75.55)
+    assert _visitas(heatmap.query(*caja, desde, hasta, resolucion=1)) == \
+        _crudo(ts, lat, lng, caja, heatmap.tamanos[1], desde, hasta)
+    assert heatmap.stats()["tiles"][3] > 1
+
+
+def test_consulta_solo_visita_los_tiles_del_rectangulo():
+    heatmap = HeatmapGrid(tamanos=(0.001,), reloj=Reloj(INICIO + DIA))
+    n = 64 * TILE
+    heatmap.ingest(1, INICIO + np.arange(n), np.linspace(0, 0.001 * n, n, endpoint=False), np.zeros(n), np.zeros(n))
+    assert heatmap.stats()["tiles"] == [64]
+    visitados = []
+
+    class Espia(dict):
+        def get(self, clave, defecto=None):
+            visitados.append(clave)
+            return super().get(clave, defecto)
+
+    heatmap._niveles[0] = Espia(heatmap._niveles[0])
+    resultado = heatmap.query(0.0005, 0.0015, -0.0005, 0.0005, resolucion=0)
+    assert visitados == [(0, -1), (0, 0)]
+    assert sum(c["visitas"] for c in resultado["celdas"]) == 2
+
+
+def test_agregacion_diaria_y_retencion():
+    rng = np.random.default_rng(2)
+    ts, lat, lng, speed = _puntos(rng, 30_000, dias=10)
+    ultimo_dia = INICIO + 9 * DIA
+    heatmap = HeatmapGrid(rollup_horas=3 * 24, retencion_horas=6 * 24, reloj=Reloj(ultimo_dia + DIA - 1))
+    for i in range(0, len(ts), 300):
+        heatmap.ingest(1 + i // 300 % 3, ts[i:i + 300], lat[i:i + 300], lng[i:i + 300], speed[i:i + 300])
+
+    caja = (-0.05, 0.05, -75.62, -75.52)
+    # Días 0-2 vencidos, 3-5 agregados por día, 6-9 por hora
+    vigentes = ts >= ultimo_dia - 6 * DIA
+    assert heatmap.descartados == int((~vigentes).sum())
+    assert _visitas(heatmap.query(*caja, resolucion=0)) == _crudo(ts[vigentes], lat[vigentes], lng[vigentes],
+                                                                  caja, heatmap.tamanos[0])
+    buckets = heatmap.stats()["buckets"][0]
+    assert buckets < 3 * 24 * 4 + 4 * 24 * 4  # menos que un bucket por hora y tile
+
+    # Sobre el tramo diario, la ventana se resuelve a días completos
+    desde = ultimo_dia - 5 * DIA + 10 * 3600
+    resultado = heatmap.query(*caja, desde, desde + 3600, resolucion=0)
+    dia = ultimo_dia - 5 * DIA
+    assert _visitas(resultado) == _crudo(ts, lat, lng, caja, heatmap.tamanos[0], dia, dia + DIA - 1)
+    # Sobre el tramo horario, a horas
+    desde = ultimo_dia + 10 * 3600
+    assert _visitas(heatmap.query(*caja, desde, desde + 3599, resolucion=0)) == \
+        _crudo(ts, lat, lng, caja, heatmap.tamanos[0], desde, desde + 3599)
+
+    # Un punto atrasado del tramo diario se suma a su día; uno vencido se descarta
+    descartados = heatmap.descartados
+    heatmap.ingest(9, [dia + 5], [0.0], [-75.56], [1.0])
+    heatmap.ingest(9, [INICIO + 5], [0.0], [-75.56], [1.0])
+    assert heatmap.descartados == descartados + 1
+    total = sum(c["visitas"] for c in heatmap.query(*caja, dia, dia + 60, resolucion=0)["celdas"])
+    assert total == int(((ts >= dia) & (ts < dia + DIA)).sum()) + 1
+
+
+def test_backfill_de_dias_archivados():
+    rng = np.random.default_rng(3)
+    ts, lat, lng, speed = _puntos(rng, 2_000, dias=2)
+    antiguo = ts < INICIO + DIA
+    caja = (-0.05, 0.05, -75.62, -75.52)
+
+    # En vivo solo el segundo día; el primero llega después desde el archivo
+    heatmap = HeatmapGrid(reloj=Reloj(INICIO + 2 * DIA))
+    heatmap.ingest(1, ts[~antiguo][:500], lat[~antiguo][:500], lng[~antiguo][:500], speed[~antiguo][:500])
+    heatmap.backfill(1, ts[antiguo], lat[antiguo], lng[antiguo], speed[antiguo])
+    # El envío siguiente sigue encadenado al último punto en vivo
+    heatmap.ingest(1, ts[~antiguo][500:], lat[~antiguo][500:], lng[~antiguo][500:], speed[~antiguo][500:])
+
+    referencia = HeatmapGrid(reloj=Reloj(INICIO + 2 * DIA))
+    referencia.ingest(1, ts[antiguo], lat[antiguo], lng[antiguo], speed[antiguo])
+    referencia.ingest(2, ts[~antiguo], lat[~antiguo], lng[~antiguo], speed[~antiguo])
+    assert heatmap.query(*caja, resolucion=1) == referencia.query(*caja, resolucion=1)
+    assert heatmap.retention_start() <= INICIO
+
+    # Lo anterior al horizonte de retención se descarta
+    corto = HeatmapGrid(rollup_horas=24, retencion_horas=24, reloj=Reloj(int(ts[-1]) + 3 * DIA))
+    corto.ingest(1, ts[-1:] + 3 * DIA, lat[-1:], lng[-1:], speed[-1:])
+    assert corto.retention_start() > ts[-1]
+    corto.backfill(1, ts[antiguo], lat[antiguo], lng[antiguo], speed[antiguo])
+    assert corto.descartados == int(antiguo.sum())
+
+
+def test_horizontes_segun_la_hora_del_servidor():
+    rng = np.random.default_rng(4)
+    ts, lat, lng, speed = _puntos(rng, 1_000)
+    caja = (-0.05, 0.05, -75.62, -75.52)
+    reloj = Reloj(INICIO + DIA)
+    heatmap = HeatmapGrid(rollup_horas=24, retencion_horas=2 * 24, max_adelanto_s=300, reloj=reloj)
+    heatmap.ingest(1, ts, lat, lng, speed)
+    esperado = _visitas(heatmap.query(*caja, resolucion=0))
+
+    # Un reloj adelantado no mueve los horizontes ni encadena la permanencia
+    heatmap.ingest(1, [INICIO + 400 * DIA, INICIO + DIA + 299], [0.0, 0.0], [-75.56, -75.56], [1.0, 1.0])
+    assert heatmap.descartados == 1
+    heatmap.ingest(1, [INICIO + DIA + 301], [0.0], [-75.56], [1.0])
+    assert heatmap.descartados == 2 and heatmap._ultimo[1][0] == INICIO + DIA + 299
+    esperado[(0, int(np.floor(-75.56 / heatmap.tamanos[0])))] += 1
+    assert _visitas(heatmap.query(*caja, resolucion=0)) == esperado
+    # Los puntos reales siguientes se agregan
+    reloj.ahora += 600
+    heatmap.ingest(1, [INICIO + DIA + 301], [0.0], [-75.56], [1.0])
+    assert heatmap.descartados == 2
+
+    # Sin ingesta, el avance del reloj también vence los datos en la consulta
+    reloj.ahora = INICIO + 4 * DIA
+    assert heatmap.query(*caja, resolucion=0)["celdas"] == []
+    assert heatmap.retention_start() == INICIO + 2 * DIA
+
+
+def test_buckets_fuera_del_rango_de_la_clave():
+    # Con un adelanto enorme, los buckets que no caben en la clave empaquetada se descartan
+    limite = (1 << _BITS_BUCKET) * SEGUNDOS_POR_BUCKET
+    heatmap = HeatmapGrid(max_adelanto_s=limite, reloj=Reloj(limite))
+    heatmap.ingest(1, [-SEGUNDOS_POR_BUCKET, limite - 1, limite], [0.0] * 3, [-75.56] * 3, [1.0] * 3)
+    assert heatmap.descartados == 2
+    celdas = heatmap.query(-1.0, 1.0, -76.0, -75.0, resolucion=0)["celdas"]
+    assert [c["visitas"] for c in celdas] == [1]
@@ -0,0 +1,168 @@
+"""Ingesta: recorrido de un punto atrasado, puntos de días archivados y reintentos tras un fallo"""
+
+import time
+
+import numpy as np
+import pytest
+
+from app import main
+from app.archive import TripArchive
+from app.dedup import DedupWindow
+from app.gps_filter import GpsFilter
+from app.ingest import append_point, append_points
+from app.sqlite_store import SQLiteStore
+from app.store import TelemetryStore
+from app.trip_metrics import compute_trip_metrics
+
+MONTACARGAS = [{"id": i, "codigo": f"MC-{i:03d}", "modelo": "Sim", "estado": "Activo"} for i in (1, 2)]
+INICIO = int(np.datetime64("2025-11-18T06:00:00", "s").astype(np.int64))
+
+
+def _envio(ts, mc_id=1):
+    n = len(ts)
+    return (mc_id, np.asarray(ts, dtype=np.int64), 6.2687 + np.arange(n) * 1e-4, np.full(n, -75.5697),
+            np.full(n, 5.0, dtype=np.float32), np.full(n, 90, dtype=np.uint8), ["active"] * n)
+
+
+def _recorridos_del_dia(store, inicio=INICIO):
+    """Tres recorridos por montacarga en el día (el filtro corta tras una hora sin datos)"""
+    filtro = GpsFilter(gap_inactivo_s=1800)
+    for tramo in range(3):
+        for mc_id in (1, 2):
+            append_points(store, *_envio(inicio + tramo * 2 * 3600 + np.arange(20) * 30, mc_id), filtro=filtro)
+
+
+def _anterior_lineal(store, mc_id, fecha, ts):
+    anteriores = [r for r in store.recorridos_by_montacarga(mc_id, fecha, fecha)
+                  if len(r["puntos_recorrido"]) and r["puntos_recorrido"].ts[0] <= ts]
+    return max(anteriores, key=lambda r: (r["puntos_recorrido"].ts[0], r["id"]))["id"] if anteriores else None
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        yield TelemetryStore([dict(m) for m in MONTACARGAS])
+    else:
+        store = SQLiteStore(str(tmp_path / "reto.db"), [dict(m) for m in MONTACARGAS])
+        yield store
+        store.close()
+
+
+def test_punto_atrasado_va_al_recorrido_que_empezo_antes(store):
+    _recorridos_del_dia(store)
+    primero, segundo, tercero = (r["id"] for r in store.recorridos_by_montacarga(1, "2025-11-18", "2025-11-18"))
+    assert store.get_recorrido_activo(1, "2025-11-18")["id"] == tercero
+
+    # Atrasados dentro del primero y del segundo recorrido, en orden de ts
+    assert append_point(store, 1, INICIO + 2 * 3600 + 45, 6.27, -75.57)["id"] == segundo
+    assert append_point(store, 1, INICIO + 100, 6.27, -75.57)["id"] == primero
+    assert len(store.get_recorrido(segundo)["puntos_recorrido"]) == 21
+
+    # Al borrar el segundo, sus atrasados van al primero
+    assert store.delete_recorrido(segundo)
+    assert append_point(store, 1, INICIO + 2 * 3600 + 75, 6.27, -75.57)["id"] == primero
+
+    # El índice coincide con un recorrido lineal de los recorridos del día
+    for ts in INICIO + np.arange(-600, 6 * 3600, 450):
+        anterior = store.get_recorrido_anterior(1, "2025-11-18", int(ts))
+        assert (anterior and anterior["id"]) == _anterior_lineal(store, 1, "2025-11-18", int(ts))
+
+
+def test_puntos_de_un_dia_archivado_no_modifican_el_archivo(tmp_path):
+    store = TelemetryStore([dict(m) for m in MONTACARGAS])
+    _recorridos_del_dia(store)
+    archivo = TripArchive(str(tmp_path))
+    store.attach_archive(archivo)
+    assert store.archive_before("2025-11-19") == 6
+    chunk = {i: p.ts.tolist() for i, p in archivo.chunk(1, "2025-11-18").items()}
+    puntos = store.count_puntos()
+    assert store.get_recorrido_anterior(1, "2025-11-18", INICIO + 3 * 3600) is None
+
+    # Atrasados de ese día: van a un recorrido nuevo en memoria, no a los archivados
+    nuevo = append_points(store, *_envio(INICIO + 2 * 3600 + 45 + np.arange(3) * 30))[0]
+    assert not store.is_archived(nuevo["id"])
+    assert append_point(store, 1, INICIO + 100, 6.27, -75.57)["id"] == nuevo["id"]
+    assert {i: p.ts.tolist() for i, p in archivo.chunk(1, "2025-11-18").items()} == chunk
+    assert store.count_puntos() == puntos + 4
+
+    # La retención lo suma al chunk del día
+    assert store.archive_before("2025-11-19") == 1
+    assert sorted(archivo.chunk(1, "2025-11-18")) == sorted([*chunk, nuevo["id"]])
+    assert store.count_puntos() == puntos + 4
+
+
+def test_atrasados_en_orden_y_distancia_recalculada(store):
+    rng = np.random.default_rng(4)
+    n = 120
+    ts = INICIO + np.arange(n) * 30
+    lat = 6.2687 + rng.normal(0, 1e-4, n).cumsum()
+    lng = -75.5697 + rng.normal(0, 1e-4, n).cumsum()
+    # Llegan en lotes desordenados, con reenvíos y puntos sueltos atrasados
+    dedup = DedupWindow()
+    orden = rng.permutation(n)
+    envios = [orden[i:i + 15] for i in range(0, n, 15)]
+    envios.insert(3, envios[1])
+    for indices in envios:
+        args = _envio(ts[indices])
+        args = (1, args[1], lat[indices], lng[indices], *args[4:])
+        nuevos = dedup.accept_many(1, args[1])
+        if nuevos.any():
+            append_points(store, 1, *(v[nuevos] for v in args[1:6]), ["active"] * int(nuevos.sum()))
+    assert dedup.stats()["duplicados"] == 15
+
+    recorrido = store.get_recorrido_activo(1, "2025-11-18")
+    puntos = recorrido["puntos_recorrido"]
+    assert puntos.ts.tolist() == ts.tolist()
+    assert puntos.lat.tolist() == lat.tolist()
+    completo = compute_trip_metrics(puntos)
+    assert recorrido["distancia_km"] == pytest.approx(completo["distancia_km"], rel=1e-9)
+    assert (recorrido["hora_inicio"], recorrido["hora_fin"]) == ("06:00", "06:59")
+
+
+def test_punto_del_futuro_no_bloquea_la_ingesta(cliente):
+    """Un reloj adelantado se rechaza y los puntos reales siguientes se aceptan"""
+    iso = [time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(time.time() + dt)) for dt in (-60, -30, -10)]
+    futuro = "2099-01-01T00:00:00"
+    respuesta = cliente.post("/api/microcontroller/data",
+                             json={"mc_id": 2, "timestamp": futuro, "lat": 6.27, "lng": -75.57})
+    assert respuesta.status_code == 400
+    recibidos, fuera = main.dedup.recibidos, main.dedup.fuera_de_ventana
+    lote = [{"t": t, "lat": 6.27 + i * 1e-4, "lng": -75.57, "s": 5.0} for i, t in enumerate(iso[:2])]
+    respuesta = cliente.post("/api/microcontroller/batch",
+                             json={"mc_id": 2, "data": [lote[0], {**lote[0], "t": futuro}, lote[1]]})
+    assert (respuesta.json()["accepted"], respuesta.json()["rejected_indices"]) == (2, [1])
+    respuesta = cliente.post("/api/microcontroller/data",
+                             json={"mc_id": 2, "timestamp": iso[2], "lat": 6.2702, "lng": -75.57, "speed": 5.0})
+    assert respuesta.status_code == 200
+    limite = time.monotonic() + 5
+    while main.dedup.recibidos < recibidos + 3 and time.monotonic() < limite:
+        time.sleep(0.01)
+    assert main.dedup.recibidos == recibidos + 3
+    assert main.dedup.fuera_de_ventana == fuera and main.dedup.futuros == 0
+
+
+def test_fallo_al_aplicar_no_deja_los_puntos_como_recibidos(monkeypatch):
+    monkeypatch.setattr(main, "store", TelemetryStore([dict(m) for m in MONTACARGAS]))
+    monkeypatch.setattr(main, "dedup", DedupWindow())
+    monkeypatch.setattr(main, "gps_filter", None)
+
+    def falla(store, *args, filtro=None, agregados=None):
+        raise RuntimeError("disco lleno")
+
+    anteriores = _envio(INICIO + np.arange(5) * 30)
+    main._aplicar_ingesta((append_points, anteriores))
+    envio = _envio(INICIO + np.arange(3, 10) * 30)
+    with pytest.raises(RuntimeError):
+        main._aplicar_ingesta((falla, envio))
+    # El reintento se acepta completo (salvo los dos que ya estaban) y se almacena
+    main._aplicar_ingesta((append_points, envio))
+    assert main.store.count_puntos() == 10
+    assert main.dedup.stats()["duplicados"] == 2 + 2
+
+    # Un punto nuevo que falla también puede reintentarse
+    with pytest.raises(RuntimeError):
+        main._aplicar_ingesta((falla, _envio([INICIO + 3600], mc_id=2)))
+    main._aplicar_ingesta((append_points, _envio([INICIO + 3600], mc_id=2)))
+    assert main.store.count_puntos() == 11
+    main._aplicar_ingesta((append_points, _envio([INICIO + 3600], mc_id=2)))
+    assert main.store.count_puntos() == 11
@@ -0,0 +1,51 @@
+"""Cola de ingesta: errores del consumidor y espera de lo pendiente antes de compactar"""
+
+import asyncio
+
+import pytest
+
+from app.ingest_queue import IngestQueue
+
+
+def test_error_sin_consumidor_se_propaga():
+    cola = IngestQueue(lambda item: 1 / item)
+    asyncio.run(cola.submit(1))
+    with pytest.raises(ZeroDivisionError):
+        asyncio.run(cola.submit(0))
+    assert cola.procesados == 1
+
+
+def test_error_del_consumidor_cuenta_y_notifica():
+    fallos = []
+    aplicados = []
+    cola = IngestQueue(lambda item: aplicados.append(1 / item), al_fallar=fallos.append)
+
+    async def ingerir():
+        cola.start()
+        for item in (1, 0, 2):
+            await cola.submit(item)
+        await cola.join()
+        await cola.stop()
+
+    asyncio.run(ingerir())
+    assert aplicados == [1.0, 0.5]
+    assert cola.errores == 1 and cola.procesados == 2
+    assert [type(e) for e in fallos] == [ZeroDivisionError]
+    assert cola.stats()["ultimo_error"].startswith("ZeroDivisionError")
+
+
+def test_join_incluye_envios_bloqueados_por_cola_llena():
+    aplicados = []
+    cola = IngestQueue(aplicados.append, max_lote=2, max_items=2)
+
+    async def ingerir():
+        cola.start()
+        envios = [asyncio.create_task(cola.submit(i)) for i in range(10)]
+        await asyncio.sleep(0)
+        await cola.join()
+        # Sin ceder el loop: todo lo enviado ya está aplicado
+        assert aplicados == list(range(10))
+        await asyncio.gather(*envios)
+        await cola.stop()
+
+    asyncio.run(ingerir())
@@ -0,0 +1,100 @@
+"""Difusión en vivo: los eventos "puntos" llevan los puntos almacenados de cada recorrido (SSE y WebSocket)"""
+
+import asyncio
+import json
+import time
+
+import numpy as np
+import pytest
+
+from app import main
+from app.gps_filter import GpsFilter
+from app.ingest import append_points
+from app.live import LiveBroadcaster
+from app.store import TelemetryStore
+
+MONTACARGAS = [{"id": i, "codigo": f"MC-{i:03d}", "modelo": "Sim", "estado": "Activo"} for i in (1, 2)]
+INICIO = int(np.datetime64("2025-11-18T06:00:00", "s").astype(np.int64))
+OUTLIER = 6.3
+
+
+def _lote():
+    """
+    Un recorrido en marcha con un outlier y una parada al final, y tras dos
+    horas sin datos otro recorrido del mismo día, en un solo envío
+    """
+    ts = np.concatenate((INICIO + np.arange(15) * 30, INICIO + 4 * 3600 + np.arange(10) * 30))
+    lat = 6.2687 + np.arange(25) * 1e-4
+    lat[10:15] = lat[9]
+    lat[5] = OUTLIER
+    speed = np.full(25, 5.0, dtype=np.float32)
+    speed[10:15] = 0.0
+    return ts, lat, np.full(25, -75.5697), speed, np.full(25, 90, dtype=np.uint8)
+
+
+@pytest.fixture
+def ingesta(monkeypatch):
+    monkeypatch.setattr(main, "store", TelemetryStore([dict(m) for m in MONTACARGAS]))
+    monkeypatch.setattr(main, "gps_filter", GpsFilter(gap_inactivo_s=1800))
+    monkeypatch.setattr(main, "dedup", None)
+    monkeypatch.setattr(main, "live", LiveBroadcaster())
+
+
+def _comprobar_eventos(eventos):
+    """Cada evento lleva exactamente los puntos almacenados de su recorrido"""
+    assert len(eventos) == 2
+    publicados = 0
+    for evento in eventos:
+        recorrido = main.store.get_recorrido(evento["recorrido"]["id"])
+        puntos = recorrido["puntos_recorrido"]
+        assert evento["mc_id"] == 1 and evento["recorrido"]["hora_fin"] == recorrido["hora_fin"]
+        assert [p["lat"] for p in evento["puntos"]] == puntos.lat.tolist()
+        assert [p["lng"] for p in evento["puntos"]] == puntos.lng.tolist()
+        assert [p["timestamp"] for p in evento["puntos"]] == main.format_timestamps(puntos.ts)
+        assert all(p["lat"] != OUTLIER for p in evento["puntos"])
+        publicados += len(evento["puntos"])
+    recorridos = main.store.recorridos_by_montacarga(1, "2025-11-18", "2025-11-18")
+    assert publicados == sum(len(r["puntos_recorrido"]) for r in recorridos)
+    primero, segundo = eventos
+    # La parada queda con su punto inicial y el final liberado al cortar el recorrido
+    assert len(primero["puntos"]) == 9 + 2 and len(segundo["puntos"]) == 10
+    assert primero["puntos"][-1]["timestamp"].endswith("T06:07:00")
+
+
+def test_sse_publica_los_puntos_almacenados_por_recorrido(ingesta):
+    async def escuchar():
+        flujo = main.live.sse_stream([1])
+        assert await flujo.__anext__() == b": conectado\n\n"
+        main._aplicar_ingesta((append_points, (1, *_lote(), ["active"] * 25)))
+        # Ningún evento para otro montacarga
+        main._aplicar_ingesta((append_points, (2, *_lote(), ["active"] * 25)))
+        # Las zonas y alertas configuradas publican sus propios eventos
+        eventos = []
+        while len(eventos) < 2:
+            linea_evento, linea_datos, _, _ = (await flujo.__anext__()).decode().split("\n")
+            if linea_evento == "event: puntos":
+                eventos.append(json.loads(linea_datos[len("data: "):]))
+        await flujo.aclose()
+        return eventos
+
+    _comprobar_eventos(asyncio.run(escuchar()))
+    assert main.live.suscriptores == 0
+
+
+def test_websocket_publica_los_puntos_almacenados_por_recorrido(cliente, ingesta):
+    ts, lat, lng, speed, battery = _lote()
+    iso = main.format_timestamps(ts)
+    datos = [{"t": t, "lat": la, "lng": ln, "s": s, "b": b}
+             for t, la, ln, s, b in zip(iso, lat.tolist(), lng.tolist(), speed.tolist(), battery.tolist())]
+    with cliente.websocket_connect("/ws/live?mc_id=1") as websocket:
+        limite = time.monotonic() + 5
+        while not main.live.has_subscribers(1) and time.monotonic() < limite:
+            time.sleep(0.01)
+        respuesta = cliente.post("/api/microcontroller/batch", json={"mc_id": 1, "data": datos})
+        assert respuesta.json()["accepted"] == 25
+        eventos = []
+        while len(eventos) < 2:
+            evento = websocket.receive_json()
+            if evento["tipo"] == "puntos":
+                eventos.append(evento)
+    _comprobar_eventos(eventos)
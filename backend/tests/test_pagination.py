@@ -0,0 +1,138 @@
+"""Listados paginados: cursor con filtro de fechas, proyección de campos, since por timestamp y timestamps ISO"""
+
+import numpy as np
+import pytest
+
+from app import main
+from app.columns import PointColumns
+from app.ingest import append_point
+from app.sqlite_store import SQLiteStore
+from app.store import TelemetryStore
+
+MONTACARGAS = [{"id": i, "codigo": f"MC-{i:03d}", "modelo": "Sim", "estado": "Activo"} for i in (1, 2, 3)]
+FECHAS = ["2025-11-18", "2025-11-19", "2025-11-20", "2025-11-21"]
+
+
+def _recorrido(recorrido_id, mc_id, fecha, n=20):
+    inicio = int(np.datetime64(f"{fecha}T06:00:00", "s").astype(np.int64)) + recorrido_id * 60
+    puntos = PointColumns(n)
+    puntos.extend(6.2687 + np.arange(n) * 1e-4, np.full(n, -75.5697), inicio + np.arange(n) * 30,
+                  np.full(n, 5.0), np.full(n, 90))
+    return {"id": recorrido_id, "montacarga_id": mc_id, "fecha": fecha, "hora_inicio": "06:00",
+            "hora_fin": "06:10", "distancia_km": 0.2, "puntos_recorrido": puntos}
+
+
+@pytest.fixture(params=["memoria", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        store = SQLiteStore(str(tmp_path / "t.db"), [dict(m) for m in MONTACARGAS])
+    else:
+        store = TelemetryStore([dict(m) for m in MONTACARGAS])
+    # Fechas intercaladas con los ids: el orden por fecha no es el orden por id
+    rng = np.random.default_rng(11)
+    for recorrido_id in range(1, 61):
+        store.add_recorrido(_recorrido(recorrido_id, int(rng.integers(1, 4)), FECHAS[int(rng.integers(0, 4))]))
+    for recorrido_id in (7, 8, 30):
+        store.delete_recorrido(recorrido_id)
+    yield store
+    if request.param == "sqlite":
+        store.close()
+
+
+@pytest.fixture
+def api(store, monkeypatch):
+    monkeypatch.setattr(main, "store", store)
+    monkeypatch.setattr(main, "trip_archive", None)
+    return store
+
+
+@pytest.mark.parametrize("montacarga_id", [None, 2])
+@pytest.mark.parametrize("desde,hasta", [(None, None), ("2025-11-19", None), (None, "2025-11-18"),
+                                          ("2025-11-19", "2025-11-20"), ("2025-11-20", "2025-11-20"),
+                                          ("2025-11-22", None)])
+def test_paginas_por_cursor_con_filtro_de_fechas(store, montacarga_id, desde, hasta):
+    esperados = sorted(
+        r["id"] for r in store.list_recorridos()
+        if (montacarga_id is None or r["montacarga_id"] == montacarga_id)
+        and (desde is None or r["fecha"] >= desde) and (hasta is None or r["fecha"] <= hasta)
+    )
+    for limit in (1, 4, 100):
+        vistos, cursor = [], None
+        while True:
+            pagina = store.page_recorridos(montacarga_id, cursor, limit, desde, hasta, con_puntos=False)
+            vistos += [r["id"] for r in pagina]
+            if len(pagina) < limit:
+                break
+            cursor = pagina[-1]["id"]
+        assert vistos == esperados
+    # Sin limit, todo lo posterior al cursor
+    assert [r["id"] for r in store.page_recorridos(montacarga_id, 20, None, desde, hasta)] == \
+        [i for i in esperados if i > 20]
+
+
+def test_filtro_de_fechas_sigue_altas_y_bajas():
+    store = TelemetryStore([dict(m) for m in MONTACARGAS])
+    for recorrido_id in range(1, 11):
+        store.add_recorrido(_recorrido(recorrido_id, 1, FECHAS[recorrido_id % 2]))
+    store.add_recorrido(_recorrido(12, 1, FECHAS[0]))
+    store.add_recorrido(_recorrido(11, 1, FECHAS[0]))
+    store.delete_recorrido(4)
+    assert [r["id"] for r in store.page_recorridos(1, 2, 3, FECHAS[0], FECHAS[0])] == [6, 8, 10]
+    assert [r["id"] for r in store.page_recorridos(None, 10, None, hasta=FECHAS[0])] == [11, 12]
+    assert store._fechas == sorted(store._fechas) and len(store._fechas) == 11
+    assert store.page_recorridos(4, desde=FECHAS[0]) == []
+
+
+def test_proyeccion_de_campos(cliente, api):
+    respuesta = cliente.get("/api/recorridos", params={"fields": "id,fecha,total_puntos", "limit": 5,
+                                                      "desde": "2025-11-19"})
+    assert respuesta.status_code == 200
+    cuerpo = respuesta.json()
+    assert all(list(r) == ["id", "fecha", "total_puntos"] for r in cuerpo)
+    assert all(r["total_puntos"] == 20 and r["fecha"] >= "2025-11-19" for r in cuerpo)
+    assert respuesta.headers["X-Next-Cursor"] == str(cuerpo[-1]["id"])
+
+    respuesta = cliente.get("/api/recorridos/montacarga/2", params={"fields": "id,puntos_recorrido", "limit": 2})
+    assert all(list(r) == ["id", "puntos_recorrido"] and len(r["puntos_recorrido"]) == 20 for r in respuesta.json())
+    assert cliente.get("/api/recorridos", params={"fields": "id,velocidad"}).status_code == 400
+
+
+def test_since_por_timestamp_no_se_corre_con_puntos_tardios(cliente, api):
+    # Único recorrido de su día: los puntos nuevos del montacarga 1 van a él
+    recorrido_id = 100
+    api.add_recorrido(_recorrido(recorrido_id, 1, "2025-11-25"))
+    url = "/api/recorridos/montacarga/1"
+    params = {"fields": "id,puntos_recorrido", "cursor": recorrido_id - 1, "limit": 1}
+    primeros = cliente.get(url, params=params).json()[0]["puntos_recorrido"]
+    ultimo = primeros[-1]["timestamp"]
+    ts = api.get_recorrido(recorrido_id)["puntos_recorrido"].ts.copy()
+
+    # Un punto tardío en medio del recorrido y dos nuevos al final
+    append_point(api, 1, int(ts[5]) + 15, 6.27, -75.57)
+    append_point(api, 1, int(ts[-1]) + 30, 6.28, -75.57)
+    append_point(api, 1, int(ts[-1]) + 60, 6.29, -75.57)
+    assert len(api.get_recorrido(recorrido_id)["puntos_recorrido"]) == 23
+    for since in (ultimo, str(int(ts[-1]))):
+        recorrido = cliente.get(url, params={**params, "since": since}).json()[0]
+        assert [p["lat"] for p in recorrido["puntos_recorrido"]] == [6.28, 6.29]
+        assert recorrido["total_puntos"] == 23
+    # Antes del tardío, el tardío y los siguientes
+    recorrido = cliente.get(url, params={**params, "since": primeros[5]["timestamp"]}).json()[0]
+    assert len(recorrido["puntos_recorrido"]) == 23 - 6
+    assert recorrido["puntos_recorrido"][0]["lat"] == 6.27
+    assert cliente.get(url, params={**params, "since": "ayer"}).status_code == 400
+
+
+def test_timestamps_iso_desde_la_api_2(cliente, api):
+    """Los puntos responden el timestamp ISO completo (la versión de la API lo indica)"""
+    assert cliente.get("/health").json()["api_version"] == main.API_VERSION == "2.0.0"
+    recorrido = cliente.get("/api/recorridos", params={"fields": "id,fecha,puntos_recorrido", "limit": 1}).json()[0]
+    primero = recorrido["puntos_recorrido"][0]["timestamp"]
+    assert primero == f"{recorrido['fecha']}T06:{recorrido['id']:02d}:00"
+    # Un recorrido cargado con horas HH:MM responde igual
+    api.add_recorrido({"id": 200, "montacarga_id": 1, "fecha": "2025-11-26", "hora_inicio": "08:00",
+                       "hora_fin": "08:15", "distancia_km": 0.1,
+                       "puntos_recorrido": [{"lat": 6.27, "lng": -75.57, "timestamp": "08:00"},
+                                            {"lat": 6.28, "lng": -75.57, "timestamp": "08:15"}]})
+    puntos = cliente.get("/api/recorridos", params={"fields": "puntos_recorrido", "cursor": 199}).json()[0]
+    assert [p["timestamp"] for p in puntos["puntos_recorrido"]] == ["2025-11-26T08:00:00", "2025-11-26T08:15:00"]
@@ -0,0 +1,199 @@
+"""Log compartido particionado: mismo estado en todos los workers, compactación y arranque desde snapshot"""
+
+import os
+
+import numpy as np
+
+from app.alerts import AlertEngine
+from app.dedup import DedupWindow
+from app.gps_filter import GpsFilter
+from app.shared_log import SharedLog, _generaciones, open_shared
+from app.store import TelemetryStore
+from app.wal import MAGIC, RECORD_DTYPE, replay
+
+MONTACARGAS = [{"id": i, "codigo": f"MC-{i:03d}", "modelo": "Sim", "estado": "Activo"} for i in range(1, 7)]
+PARTICIONES = 3
+REGLAS = [
+    {"id": "exceso_velocidad", "tipo": "velocidad", "max_kmh": 15},
+    {"id": "bateria_baja", "tipo": "bateria", "min": 20},
+    {"id": "sin_datos", "tipo": "sin_datos", "segundos": 300},
+]
+
+
+class Worker:
+    """Un worker: su store, su filtro, su ventana de deduplicación y sus alertas, alimentados por el log compartido"""
+
+    def __init__(self, directorio, lectura=None):
+        self.filtro = GpsFilter()
+        self.dedup = DedupWindow()
+        self.alertas = AlertEngine(REGLAS)
+        self.lectura = lectura
+        self.store, self.log, self.info = open_shared(
+            directorio, TelemetryStore([dict(m) for m in MONTACARGAS]), PARTICIONES, self.filtro, self.dedup,
+            self.alertas
+        )
+
+    def seguir(self):
+        while True:
+            registros = self.log.read_new(self.lectura)
+            replay(self.store, registros, self.filtro, en_orden=True, dedup=self.dedup, alertas=self.alertas)
+            if not len(registros):
+                return
+
+    def enviar(self, mc_id, ts, rng):
+        n = len(ts)
+        self.log.append_many(mc_id, ts, 6.2687 + rng.normal(0, 2e-4, n), -75.5697 + rng.normal(0, 2e-4, n),
+                             rng.uniform(0, 12, n).astype(np.float32), np.full(n, 80, dtype=np.uint8),
+                             ["active"] * n)
+
+
+def _envios(rng, n=80):
+    """Lotes de 1 a 15 puntos por montacarga, con huecos de inactividad y reenvíos"""
+    ultimo = dict.fromkeys(range(1, 7), int(np.datetime64("2025-11-20T06:00:00", "s").astype(np.int64)))
+    envios = []
+    for _ in range(n):
+        mc_id = int(rng.integers(1, 7))
+        if envios and rng.random() < 0.1:
+            envios.append(envios[-1])
+            continue
+        if rng.random() < 0.1:
+            ultimo[mc_id] += 3600
+        largo = int(rng.integers(1, 16))
+        ts = ultimo[mc_id] + np.arange(1, largo + 1, dtype=np.int64) * 30
+        ultimo[mc_id] = int(ts[-1])
+        envios.append((mc_id, ts))
+    return envios
+
+
+def _resumen(store):
+    return {
+        r["id"]: (r["montacarga_id"], r["fecha"], r["hora_inicio"], r["hora_fin"], round(r["distancia_km"], 9),
+                  r["puntos_recorrido"].ts.tolist(), r["puntos_recorrido"].lat.tolist())
+        for r in store.list_recorridos()
+    }
+
+
+def test_workers_convergen_con_lecturas_distintas(tmp_path):
+    directorio = str(tmp_path)
+    rng = np.random.default_rng(1)
+    # Cada worker lee en trozos de distinto tamaño: intercala las particiones de otra forma
+    workers = [Worker(directorio, lectura) for lectura in (None, 7, 50)]
+    for k, (mc_id, ts) in enumerate(_envios(rng)):
+        workers[k % 3].enviar(mc_id, ts, rng)
+        workers[(k * 7) % 3].seguir()
+    for worker in workers:
+        worker.seguir()
+
+    esperado = _resumen(workers[0].store)
+    assert len(esperado) > 6
+    assert all(_resumen(w.store) == esperado for w in workers[1:])
+    # Los ids de cada partición son congruentes con ella
+    assert all(r[0] % PARTICIONES == i % PARTICIONES for i, r in esperado.items())
+    assert sorted(os.listdir(directorio)) == sorted(
+        [f"ingest-{p}-000000.log" for p in range(PARTICIONES)]
+        + [f"ingest-{p}.lock" for p in range(PARTICIONES)] + ["compact.lock"]
+    )
+    for worker in workers:
+        worker.log.close()
+
+
+def test_compactacion_y_arranque_desde_snapshot(tmp_path):
+    directorio = str(tmp_path)
+    rng = np.random.default_rng(2)
+    a, b = Worker(directorio), Worker(directorio, lectura=5)
+    envios = _envios(rng, 150)
+    for k, (mc_id, ts) in enumerate(envios):
+        (a if k % 2 else b).enviar(mc_id, ts, rng)
+        a.seguir()
+        if k in (50, 100) and a.log.try_lock_compaction():
+            assert a.log.compaction_due(100)
+            assert not b.log.try_lock_compaction()
+            a.log.compact(a.store, a.filtro, a.dedup, a.alertas)
+            a.log.unlock_compaction()
+            assert not a.log.compaction_due(100)
+        if k % 10 == 0:
+            b.seguir()
+    a.seguir()
+    b.seguir()
+
+    # Solo quedan las generaciones posteriores al último snapshot
+    assert os.path.exists(os.path.join(directorio, "snapshot.npz"))
+    assert all(_generaciones(directorio, p) == [1, 2] for p in range(PARTICIONES))
+
+    # Un worker nuevo parte del snapshot y re-aplica solo lo posterior
+    c = Worker(directorio)
+    assert 0 < c.info["puntos_reaplicados"] < sum(len(ts) for _, ts in envios)
+    esperado = _resumen(a.store)
+    assert _resumen(b.store) == esperado
+    assert _resumen(c.store) == esperado
+
+    # Los tres siguen igual tras más envíos
+    for mc_id, ts in _envios(np.random.default_rng(3), 30):
+        c.enviar(mc_id, ts + 86400, rng)
+    for worker in (a, b, c):
+        worker.seguir()
+    esperado = _resumen(a.store)
+    assert _resumen(b.store) == esperado
+    assert _resumen(c.store) == esperado
+    for worker in (a, b, c):
+        worker.log.close()
+
+
+def test_escritor_sigue_la_rotacion(tmp_path):
+    directorio = str(tmp_path)
+    escritor = SharedLog(directorio, PARTICIONES)
+    lector = SharedLog(directorio, PARTICIONES)
+    ts = np.arange(3, dtype=np.int64) + 1_763_600_000
+    escritor.append_many(1, ts, np.full(3, 6.2), np.full(3, -75.5), np.zeros(3), np.full(3, 90), ["active"] * 3)
+    # Un envío sin puntos válidos no escribe nada
+    escritor.append_many(2, ts[:0], ts[:0], ts[:0], ts[:0], ts[:0], [])
+    lector.rotate()
+    # El escritor abrió la generación anterior: escribe en la nueva, después del sello
+    escritor.append_many(1, ts + 10, np.full(3, 6.2), np.full(3, -75.5), np.zeros(3), np.full(3, 90),
+                         ["active"] * 3)
+    assert lector.read_new()["ts"].tolist() == ts.tolist() + (ts + 10).tolist()
+    assert lector.positions()["1"] == [1, len(MAGIC) + 3 * RECORD_DTYPE.itemsize]
+    escritor.close()
+    lector.close()
+
+
+def test_worker_nuevo_parte_de_la_misma_ventana_y_alertas(tmp_path):
+    """Un outlier aceptado y descartado por el filtro no está en el store, pero su reenvío sigue siendo duplicado"""
+    directorio = str(tmp_path)
+    a, b = Worker(directorio), Worker(directorio)
+    inicio = int(np.datetime64("2025-11-20T06:00:00", "s").astype(np.int64))
+    ts = inicio + np.arange(12, dtype=np.int64) * 30
+    lat = 6.2687 + np.arange(12) * 1e-4
+    speed = np.full(12, 5.0, dtype=np.float32)
+    bateria = np.full(12, 80, dtype=np.uint8)
+    lat[10], speed[10], bateria[11] = 6.5, 30.0, 15
+    outlier = (1, ts[10:11], lat[10:11], np.full(1, -75.5697), speed[10:11], bateria[10:11], ["active"])
+    a.log.append_many(1, ts[:10], lat[:10], np.full(10, -75.5697), speed[:10], bateria[:10], ["active"] * 10)
+    a.log.append_many(*outlier)
+    b.log.append_many(1, ts[11:], lat[11:], np.full(1, -75.5697), speed[11:], bateria[11:], ["active"])
+    a.seguir()
+    b.seguir()
+    assert 10 not in [int(t - inicio) // 30 for t in a.store.list_recorridos()[0]["puntos_recorrido"].ts]
+    assert a.log.try_lock_compaction()
+    a.log.compact(a.store, a.filtro, a.dedup, a.alertas)
+    a.log.unlock_compaction()
+
+    # Arranca desde el snapshot con la ventana y las alertas de los demás
+    c = Worker(directorio)
+    assert c.info["puntos_reaplicados"] == 0
+    assert c.dedup.export_state() == a.dedup.export_state()
+    activas = [(x["regla_id"], x["mc_id"]) for x in a.alertas.active()]
+    assert activas == [("bateria_baja", 1)]
+    assert [(x["regla_id"], x["mc_id"]) for x in c.alertas.active()] == activas
+    assert c.alertas.stats()["vencimientos_programados"] == 1
+
+    # El reenvío del outlier se descarta en todos (no reactiva el exceso de velocidad)
+    c.log.append_many(*outlier)
+    for worker in (a, b, c):
+        worker.seguir()
+        assert worker.dedup.duplicados == 1
+        assert [(x["regla_id"], x["mc_id"]) for x in worker.alertas.active()] == activas
+        assert worker.dedup.export_state() == a.dedup.export_state()
+    assert _resumen(c.store) == _resumen(a.store) == _resumen(b.store)
+    for worker in (a, b, c):
+        worker.log.close()
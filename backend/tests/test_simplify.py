@@ -0,0 +1,148 @@
+"""Simplificación: RDP por zoom frente a la versión recursiva, polilínea de Google y caché por recorrido"""
+
+import math
+
+import numpy as np
+import pytest
+
+from app import main
+from app.columns import PointColumns
+from app.ingest import append_point, append_points
+from app.simplify import RADIO_TIERRA_M, SimplifyCache, encode_polyline, rdp_indices, tolerancia_zoom
+from app.store import TelemetryStore
+
+INICIO = int(np.datetime64("2025-11-18T06:00:00", "s").astype(np.int64))
+
+
+def _ruta(n=600, semilla=5):
+    rng = np.random.default_rng(semilla)
+    lat = 6.2687 + rng.normal(0, 5e-5, n).cumsum()
+    lng = -75.5697 + rng.normal(0, 5e-5, n).cumsum()
+    return lat, lng
+
+
+def _rdp_recursivo(x, y, i, j, tolerancia, conservados):
+    """Douglas–Peucker clásico: divide en el punto más alejado de la cuerda"""
+    if j - i < 2:
+        return
+    dx, dy = x[j] - x[i], y[j] - y[i]
+    largo = math.hypot(dx, dy)
+    distancias = [abs((x[k] - x[i]) * dy - (y[k] - y[i]) * dx) / largo if largo
+                  else math.hypot(x[k] - x[i], y[k] - y[i]) for k in range(i + 1, j)]
+    maximo = max(distancias)
+    if maximo > tolerancia:
+        k = i + 1 + distancias.index(maximo)
+        conservados.append(k)
+        _rdp_recursivo(x, y, i, k, tolerancia, conservados)
+        _rdp_recursivo(x, y, k, j, tolerancia, conservados)
+
+
+def _polilinea_escalar(lat, lng):
+    """Algoritmo de la documentación de Google, un valor a la vez"""
+    caracteres = []
+    previo = (0, 0)
+    for punto in zip(lat.tolist(), lng.tolist()):
+        actual = tuple(int(round(v * 1e5)) for v in punto)
+        for delta in (actual[0] - previo[0], actual[1] - previo[1]):
+            valor = ~(delta << 1) if delta < 0 else delta << 1
+            while valor >= 0x20:
+                caracteres.append(chr((0x20 | (valor & 0x1F)) + 63))
+                valor >>= 5
+            caracteres.append(chr(valor + 63))
+        previo = actual
+    return "".join(caracteres)
+
+
+def _proyectados(lat, lng):
+    lat0 = math.radians(float(lat.mean()))
+    return (np.radians(lng) * math.cos(lat0) * RADIO_TIERRA_M).tolist(), (np.radians(lat) * RADIO_TIERRA_M).tolist()
+
+
+@pytest.mark.parametrize("zoom", [12, 15, 17, 19, 21])
+def test_rdp_igual_a_la_version_recursiva(zoom):
+    lat, lng = _ruta()
+    tolerancia = tolerancia_zoom(zoom, float(lat.mean()))
+    x, y = _proyectados(lat, lng)
+    conservados = [0, len(lat) - 1]
+    _rdp_recursivo(x, y, 0, len(lat) - 1, tolerancia, conservados)
+    assert rdp_indices(lat, lng, tolerancia).tolist() == sorted(conservados)
+
+
+def test_tolerancia_por_zoom():
+    # Un píxel a zoom 0 en el ecuador; cada nivel la divide por dos y se achica con la latitud
+    assert tolerancia_zoom(0) == pytest.approx(156543.03392)
+    assert tolerancia_zoom(18) == pytest.approx(tolerancia_zoom(17) / 2)
+    assert tolerancia_zoom(10, 60.0) == pytest.approx(tolerancia_zoom(10) / 2)
+    assert tolerancia_zoom(15, pixeles=3) == pytest.approx(3 * tolerancia_zoom(15))
+
+    lat, lng = _ruta()
+    cantidades = [len(rdp_indices(lat, lng, tolerancia_zoom(z, 6.27))) for z in range(10, 23)]
+    assert cantidades == sorted(cantidades) and cantidades[0] < 10 and cantidades[-1] > len(lat) // 2
+    assert rdp_indices(lat, lng, 0).tolist() == list(range(len(lat)))
+    # Puntos repetidos: los tramos de largo cero miden la distancia al punto inicial
+    repetidos = np.array([6.27, 6.2701, 6.27, 6.27])
+    assert rdp_indices(repetidos, np.full(4, -75.57), 5.0).tolist() == [0, 1, 3]
+
+
+def test_polilinea_codificada():
+    # Ejemplo de la documentación del formato de Google
+    lat, lng = np.array([38.5, 40.7, 43.252]), np.array([-120.2, -120.95, -126.453])
+    assert encode_polyline(lat, lng) == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+    assert encode_polyline(np.array([]), np.array([])) == ""
+    assert encode_polyline(np.array([0.0, -0.00001]), np.array([0.0, 0.0])) == "??@?"
+    # Rutas reales y deltas extremos (casi 360°) frente a la codificación valor a valor
+    lat, lng = _ruta()
+    assert encode_polyline(lat, lng) == _polilinea_escalar(lat, lng)
+    extremos = np.array([0.0, -179.99999, 179.99999, 0.00001, 0.0])
+    assert encode_polyline(extremos, extremos[::-1]) == _polilinea_escalar(extremos, extremos[::-1])
+
+
+def test_cache_se_recalcula_al_agregar_o_insertar_puntos():
+    lat, lng = _ruta(200)
+    puntos = PointColumns(200)
+    puntos.extend(lat, lng, INICIO + np.arange(200) * 30, np.full(200, 5.0), np.full(200, 90))
+    cache = SimplifyCache(max_entradas=3)
+    tolerancia = tolerancia_zoom(17, 6.27)
+    primeros = cache.indices(1, puntos, tolerancia)
+    assert cache.indices(1, puntos, tolerancia) is primeros
+    assert cache.stats() == {"entradas": 1, "aciertos": 1, "fallos": 1}
+
+    # Sin invalidar, un recorrido con más puntos se recalcula
+    puntos.append(6.30, -75.60, INICIO + 200 * 30, 5.0, 90)
+    assert cache.indices(1, puntos, tolerancia)[-1] == 200
+    assert cache.stats()["fallos"] == 2
+
+    # LRU con la cuenta por recorrido al día
+    for recorrido_id in (2, 3, 4):
+        cache.indices(recorrido_id, puntos, tolerancia)
+    assert len(cache) == 3 and 1 not in cache._por_recorrido
+    cache.invalidate(2)
+    assert len(cache) == 2 and 2 not in cache._por_recorrido
+
+
+def test_ingesta_invalida_la_ruta_simplificada(monkeypatch):
+    monkeypatch.setattr(main, "store", TelemetryStore([{"id": 1, "codigo": "MC-001", "modelo": "Sim",
+                                                         "estado": "Activo"}]))
+    monkeypatch.setattr(main, "simplify_cache", SimplifyCache())
+    monkeypatch.setattr(main, "gps_filter", None)
+    monkeypatch.setattr(main, "dedup", None)
+    n = 100
+    ts = INICIO + np.arange(n) * 60
+    ts[40] += 30
+    lat = np.full(n, 6.27)
+    lng = -75.57 + np.arange(n) * 1e-4
+    faltante = np.arange(n) != 40
+    main._aplicar_ingesta((append_points, (1, ts[faltante], lat[faltante], lng[faltante],
+                                           np.full(n - 1, 5.0, dtype=np.float32), np.full(n - 1, 90, dtype=np.uint8),
+                                           ["active"] * (n - 1))))
+    recorrido = main.store.get_recorrido_activo(1, "2025-11-18")
+    assert main._indices_simplificados(recorrido, 14).tolist() == [0, n - 2]
+
+    # Un punto atrasado a 110 m de la línea se inserta en medio: el pico y sus vecinos entran en la ruta
+    main._aplicar_ingesta((append_point, (1, int(ts[40]), 6.271, float(lng[40]), 5.0, 90, "active")))
+    assert len(main.simplify_cache) == 0
+    assert main._indices_simplificados(recorrido, 14).tolist() == [0, 39, 40, 41, n - 1]
+    # Y uno al final, con la misma cantidad de entradas en caché
+    main._aplicar_ingesta((append_point, (1, int(ts[-1]) + 60, 6.27, float(lng[-1]) + 1e-4, 5.0, 90, "active")))
+    assert main._indices_simplificados(recorrido, 14).tolist() == [0, 39, 40, 41, n]
+    assert main.simplify_cache.stats()["fallos"] == 3
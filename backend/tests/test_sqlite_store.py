@@ -0,0 +1,172 @@
+"""Backend SQLite: transacción por micro-lote, items atómicos, commits fallidos y un solo proceso escritor"""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from app import main
+from app.dedup import DedupWindow
+from app.gps_filter import GpsFilter
+from app.heatmap import HeatmapGrid
+from app.ingest import append_points
+from app.ingest_queue import IngestQueue
+from app.sqlite_store import SQLiteStore
+
+MONTACARGAS = [{"id": 1, "codigo": "MC-001", "modelo": "Sim", "estado": "Activo"}]
+INICIO = int(np.datetime64("2025-11-20T08:00:00", "s").astype(np.int64))
+
+
+def _envio(k):
+    ts = INICIO + k * 100 + np.arange(10, dtype=np.int64) * 10
+    return (1, ts, np.full(10, 6.2687) + k * 1e-4, np.full(10, -75.5697), np.full(10, 5.0, dtype=np.float32),
+            np.full(10, 90, dtype=np.uint8), ["active"] * 10)
+
+
+def test_un_commit_por_micro_lote(tmp_path):
+    store = SQLiteStore(str(tmp_path / "t.db"), MONTACARGAS)
+    commits = []
+    store._db.set_trace_callback(lambda sql: commits.append(sql) if sql == "COMMIT" else None)
+    cola = IngestQueue(lambda args: append_points(store, *args), contexto_lote=store.write_batch)
+
+    async def ingerir():
+        cola.start()
+        for k in range(20):
+            await cola.submit(_envio(k))
+        await cola.stop()
+
+    asyncio.run(ingerir())
+    assert cola.procesados == 20 and cola.errores == 0
+    assert len(commits) == cola.lotes < 20
+    assert store.count_puntos() == 200
+    store.close()
+
+    # Todo quedó confirmado en la base
+    reabierto = SQLiteStore(str(tmp_path / "t.db"))
+    assert reabierto.count_puntos() == 200
+    assert reabierto.has_recorrido(1) and not reabierto.has_recorrido(2)
+    reabierto.close()
+
+
+def test_un_solo_proceso_por_base(tmp_path):
+    path = str(tmp_path / "t.db")
+    store = SQLiteStore(path, MONTACARGAS)
+    with pytest.raises(RuntimeError, match="un solo worker"):
+        SQLiteStore(path)
+    store.close()
+    SQLiteStore(path).close()
+
+
+def _vetar(store):
+    """
+    Triggers de prueba: un punto con velocidad 40 aborta su inserción (el item falla
+    a mitad de camino) y uno con velocidad 50 hace fallar el commit (clave foránea diferida)
+    """
+    store._db.executescript("""
+        PRAGMA foreign_keys = ON;
+        CREATE TABLE veto (mc_id INTEGER REFERENCES montacargas (id) DEFERRABLE INITIALLY DEFERRED);
+        CREATE TRIGGER falla_item AFTER INSERT ON puntos WHEN NEW.speed = 40 BEGIN SELECT RAISE(ABORT, 'item'); END;
+        CREATE TRIGGER falla_commit AFTER INSERT ON puntos WHEN NEW.speed = 50 BEGIN INSERT INTO veto VALUES (-1); END;
+    """)
+
+
+def _con_velocidad(envio, indice, speed):
+    envio[4][indice] = speed
+    return envio
+
+
+@pytest.fixture
+def ingesta_sqlite(tmp_path, monkeypatch):
+    """Ingesta de la API sobre un SQLiteStore con los triggers de _vetar"""
+    store = SQLiteStore(str(tmp_path / "t.db"), MONTACARGAS)
+    _vetar(store)
+    monkeypatch.setattr(main, "store", store)
+    monkeypatch.setattr(main, "dedup", DedupWindow())
+    monkeypatch.setattr(main, "gps_filter", GpsFilter(velocidad_max_kmh=1e9))
+    monkeypatch.setattr(main, "heatmap", HeatmapGrid(reloj=lambda: INICIO + 86400))
+    monkeypatch.setattr(main, "heatmap_pendientes", {})
+    yield main
+    store.close()
+
+
+def _estado(main):
+    store = main.store
+    recorrido = store.get_recorrido_activo(1, "2025-11-20")
+    return (store.count_puntos(), len(recorrido["puntos_recorrido"]), recorrido["distancia_km"],
+            store.aggregates.stats(), store.get_montacarga(1)["estado"], main.heatmap.puntos,
+            main.gps_filter.export_state())
+
+
+def test_item_que_falla_no_deja_escrituras_parciales(ingesta_sqlite):
+    main = ingesta_sqlite
+    with main._lote_ingesta():
+        main._aplicar_ingesta((append_points, _envio(0)))
+
+    with main._lote_ingesta():
+        main._aplicar_ingesta((append_points, _envio(1)))
+        # Falla a mitad del executemany: la fila del recorrido y algunos puntos ya se escribieron
+        with pytest.raises(Exception, match="item"):
+            main._aplicar_ingesta((append_points, _con_velocidad(_envio(2), 5, 40.0)))
+        main._aplicar_ingesta((append_points, _envio(3)))
+    assert main.store.count_puntos() == 30 == main.store._contar_puntos()
+    assert main.heatmap.puntos == 30
+    ts = main.store.get_recorrido_activo(1, "2025-11-20")["puntos_recorrido"].ts.tolist()
+    assert ts == sorted(np.concatenate([_envio(k)[1] for k in (0, 1, 3)]).tolist())
+    assert main.store.aggregates.check(main.store.list_recorridos(), main.store.list_montacargas()) == {}
+
+    # El reintento del item fallido no se toma por duplicado
+    with main._lote_ingesta():
+        main._aplicar_ingesta((append_points, _envio(2)))
+    assert main.store.count_puntos() == 40 and main.dedup.stats()["duplicados"] == 0
+
+
+def test_commit_fallido_deshace_el_estado_derivado(ingesta_sqlite):
+    main = ingesta_sqlite
+    with main._lote_ingesta():
+        main._aplicar_ingesta((append_points, _envio(0)))
+    antes = _estado(main)
+    ventana = main.dedup.checkpoint(1)
+
+    with pytest.raises(Exception, match="FOREIGN KEY"):
+        with main._lote_ingesta():
+            main._aplicar_ingesta((append_points, _envio(1)))
+            main._aplicar_ingesta((append_points, _con_velocidad(_envio(2), 5, 50.0)))
+            # Un día nuevo crea otro recorrido y cambia el estado del montacarga
+            nuevo = _envio(3)
+            main._aplicar_ingesta((append_points, (1, nuevo[1] + 86400, *nuevo[2:6], ["error"] * 10)))
+    # Recorridos en memoria, agregados, puntos, estado, mapa de calor, filtro y deduplicación como antes del lote
+    assert _estado(main) == antes
+    assert main.dedup.checkpoint(1) == ventana
+    assert main.store.get_recorrido_activo(1, "2025-11-21") is None
+    assert main.store.aggregates.check(main.store.list_recorridos(), main.store.list_montacargas()) == {}
+
+    # El reenvío del lote se acepta completo
+    with main._lote_ingesta():
+        for k in (1, 2):
+            main._aplicar_ingesta((append_points, _envio(k)))
+    assert main.store.count_puntos() == main.store._contar_puntos() == 30
+    assert main.heatmap.puntos == 30
+
+
+def test_mapa_de_calor_carga_los_dias_guardados_al_pedirlos(ingesta_sqlite):
+    main = ingesta_sqlite
+    for k in range(3):
+        main.store.add_recorrido({"id": 10 + k, "montacarga_id": 1, "fecha": f"2025-11-{18 + k}",
+                                  "hora_inicio": "08:00", "hora_fin": "08:02", "distancia_km": 0.1,
+                                  "puntos_recorrido": [{"lat": 6.27, "lng": -75.57,
+                                                        "timestamp": f"2025-11-{18 + k}T08:0{i}:00"}
+                                                       for i in range(3)]})
+    lecturas = []
+    main.store._db.set_trace_callback(lambda sql: lecturas.append(sql) if "FROM puntos WHERE trip_id IN" in sql else None)
+    main.heatmap_pendientes.update({tuple(c): None for c in main.store.dias("2025-11-19")})
+    assert sorted(main.heatmap_pendientes) == [(1, "2025-11-19"), (1, "2025-11-20")]
+
+    # Una consulta carga solo los días de su ventana
+    asyncio.run(main._cargar_heatmap_pendiente(INICIO - 86400, INICIO - 9 * 3600))
+    assert main.heatmap.puntos == 3 and len(lecturas) == 1
+    assert list(main.heatmap_pendientes) == [(1, "2025-11-20")]
+    # Los puntos nuevos de un día pendiente cargan antes lo que ya tenía guardado
+    main._aplicar_ingesta((append_points, _envio(0)))
+    assert main.heatmap.puntos == 3 + 3 + 10 and not main.heatmap_pendientes
+    main._aplicar_ingesta((append_points, _envio(1)))
+    assert main.heatmap.puntos == 26 and len(lecturas) == 2
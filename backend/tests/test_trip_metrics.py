@@ -0,0 +1,113 @@
+"""Métricas de recorrido: incrementales e inserciones tardías frente al recálculo completo"""
+
+import numpy as np
+import pytest
+
+from app import trip_metrics
+from app.columns import PointColumns
+from app.trip_metrics import (
+    compute_trip_metrics,
+    merge_trip_metrics,
+    recompute_trip_metrics,
+    segment_metrics,
+    update_trip_metrics,
+)
+
+INICIO = int(np.datetime64("2025-11-18T06:00:00", "s").astype(np.int64))
+
+
+def _puntos_aleatorios(rng, n):
+    """Caminata con paradas (sin desplazamiento), ts repetidos y saltos largos"""
+    pasos = rng.normal(0, 2e-4, (n, 2)) * (rng.random((n, 1)) < 0.7)
+    lat = 6.2687 + pasos[:, 0].cumsum()
+    lng = -75.5697 + pasos[:, 1].cumsum()
+    ts = INICIO + rng.choice([0, 1, 5, 30, 120], n).cumsum()
+    return lat, lng, ts
+
+
+def _recorrido(lat, lng, ts):
+    puntos = PointColumns(max(len(ts), 1))
+    puntos.extend(lat, lng, ts)
+    return recompute_trip_metrics({"puntos_recorrido": puntos})
+
+
+def _insertar(recorrido, lat, lng, ts):
+    """Mismo contrato que ingest._insertar: append O(1) al final, merge de los segmentos afectados si no"""
+    columnas = recorrido["puntos_recorrido"]
+    if len(ts) == 1 and len(columnas) and ts[0] >= columnas.ts[-1]:
+        columnas.append(lat[0], lng[0], ts[0])
+        update_trip_metrics(recorrido)
+        return
+    desde = max(columnas.bisect(min(ts)) - 1, 0)
+    fin = columnas.bisect(max(ts)) + 1
+    anteriores = segment_metrics(columnas, desde, fin)
+    columnas.merge(lat, lng, ts)
+    merge_trip_metrics(recorrido, desde, fin + len(ts), anteriores)
+
+
+def _comprobar(recorrido):
+    esperadas = compute_trip_metrics(recorrido["puntos_recorrido"])
+    for clave in ("tiempo_minutos", "tiempo_movimiento_s", "tiempo_inactivo_s"):
+        assert recorrido[clave] == esperadas[clave], clave
+    for clave in ("distancia_km", "velocidad_promedio", "velocidad_maxima"):
+        assert recorrido[clave] == pytest.approx(esperadas[clave], rel=1e-9, abs=1e-12), clave
+
+
+@pytest.mark.parametrize("semilla", range(10))
+def test_append_incremental_igual_al_recalculo(semilla):
+    lat, lng, ts = _puntos_aleatorios(np.random.default_rng(semilla), 80)
+    recorrido = _recorrido(lat[:1], lng[:1], ts[:1])
+    for i in range(1, len(ts)):
+        recorrido["puntos_recorrido"].append(lat[i], lng[i], ts[i])
+        update_trip_metrics(recorrido)
+        _comprobar(recorrido)
+
+
+@pytest.mark.parametrize("semilla", range(30))
+def test_insercion_tardia_igual_al_recalculo(semilla):
+    """Parte de los puntos llega tarde, en lotes desordenados que caen en medio, al inicio o al final"""
+    rng = np.random.default_rng(semilla)
+    lat, lng, ts = _puntos_aleatorios(rng, 60)
+    tardios = rng.random(len(ts)) < 0.4
+    tardios[0] = semilla % 3 == 0  # a veces el primer punto también llega tarde
+    base = ~tardios
+    recorrido = _recorrido(lat[base], lng[base], ts[base])
+    _comprobar(recorrido)
+
+    pendientes = rng.permutation(np.flatnonzero(tardios))
+    while len(pendientes):
+        tamano = int(rng.integers(1, 6))
+        lote, pendientes = pendientes[:tamano], pendientes[tamano:]
+        _insertar(recorrido, lat[lote], lng[lote], ts[lote])
+        _comprobar(recorrido)
+    assert recorrido["puntos_recorrido"].ts.tolist() == ts.tolist()
+
+
+def test_velocidad_maxima_en_un_segmento_reemplazado(monkeypatch):
+    # El segmento 2-3 es el más rápido
+    lat = np.array([6.2687, 6.2688, 6.2689, 6.2789, 6.2790])
+    lng = np.full(5, -75.5697)
+    ts = INICIO + np.array([0, 30, 60, 180, 210])
+    recorrido = _recorrido(lat, lng, ts)
+    maxima = recorrido["velocidad_maxima"]
+    assert maxima == pytest.approx(segment_metrics(recorrido["puntos_recorrido"], 2, 4)[2])
+
+    recalculos = []
+    monkeypatch.setattr(trip_metrics, "recompute_trip_metrics",
+                        lambda r: recalculos.append(r) or recompute_trip_metrics(r))
+    # Partido en dos, siempre queda un tramo tan rápido como el original (desigualdad
+    # triangular); baja solo si el punto repite el ts del anterior (dt = 0, velocidad 0)
+    _insertar(recorrido, np.array([6.2785]), np.array([-75.5697]), np.array([INICIO + 60]))
+    assert len(recalculos) == 1
+    assert recorrido["velocidad_maxima"] < maxima
+    _comprobar(recorrido)
+
+    # Si el segmento nuevo es más rápido, la máxima sube sin recalcular
+    _insertar(recorrido, np.array([6.2900]), np.array([-75.5697]), np.array([INICIO + 195]))
+    assert len(recalculos) == 1 and recorrido["velocidad_maxima"] > maxima
+    _comprobar(recorrido)
+
+    # Y si el reemplazado no tenía la máxima, tampoco
+    _insertar(recorrido, np.array([6.26875]), np.array([-75.5697]), np.array([INICIO + 15]))
+    assert len(recalculos) == 1
+    _comprobar(recorrido)
@@ -0,0 +1,232 @@
+"""Log de telemetría: recuperación tras una caída antes y después de compactar"""
+
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.gps_filter import GpsFilter
+from app.ingest import append_points
+from app.store import TelemetryStore
+from app.wal import (
+    MAGIC,
+    RECORD_DTYPE,
+    TelemetryLog,
+    begin_compaction,
+    compact,
+    load_snapshot,
+    log_path,
+    read_log,
+    recover,
+)
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MONTACARGAS = [{"id": i, "codigo": f"MC-{i:03d}", "modelo": "Sim", "estado": "Activo"} for i in (1, 2, 3)]
+
+# Proceso que escribe los envíos en el log, los aplica a su store (con o sin
+# filtro GPS) y muere con SIGKILL (sin cerrar el log) tras compactar en el
+# envío `compactar_en`
+PROCESO = """
+import os, signal, sys
+import numpy as np
+from app.gps_filter import GpsFilter
+from app.ingest import append_points
+from app.store import TelemetryStore
+from app.wal import compact, recover
+
+directorio, envios, compactar_en = sys.argv[1], sys.argv[2], int(sys.argv[3])
+filtro = GpsFilter() if sys.argv[4] == "1" else None
+montacargas = [{"id": i, "codigo": f"MC-{i:03d}", "modelo": "Sim", "estado": "Activo"} for i in (1, 2, 3)]
+store, log, _ = recover(directorio, TelemetryStore(montacargas), filtro, group_size=7)
+with np.load(envios) as datos:
+    for k in range(int(datos["n"])):
+        if k == compactar_en:
+            log = compact(store, log, filtro)
+        args = tuple(datos[f"{k}_{c}"] for c in ("mc", "ts", "lat", "lng", "speed", "battery"))
+        mc_id, resto = int(args[0]), args[1:]
+        status = ["active"] * len(resto[0])
+        log.append_many(mc_id, *resto, status)
+        append_points(store, mc_id, *resto, status, filtro=filtro)
+log.sync()
+os.kill(os.getpid(), signal.SIGKILL)
+"""
+
+
+def _envios(rng, n=60):
+    """
+    Lotes de 1 a 20 puntos de tres montacargas durante dos días: algunos
+    atrasados, con saltos imposibles, detenidos o tras un hueco de inactividad
+    """
+    envios = []
+    ultimo = {1: 0, 2: 0, 3: 0}
+    base = int(np.datetime64("2025-11-19T22:00:00", "s").astype(np.int64))
+    for _ in range(n):
+        mc_id = int(rng.integers(1, 4))
+        largo = int(rng.integers(1, 21))
+        atraso = 600 if rng.random() < 0.1 else 0
+        if not atraso and rng.random() < 0.1:
+            ultimo[mc_id] += 2 * 3600
+        ts = base + ultimo[mc_id] + np.arange(1, largo + 1, dtype=np.int64) * 30 - atraso
+        ultimo[mc_id] += largo * 30 + (0 if atraso else 3)
+        lat = 6.2687 + rng.normal(0, 2e-4, largo)
+        lat[rng.random(largo) < 0.05] += 0.01
+        speed = rng.uniform(0, 12, largo).astype(np.float32)
+        if rng.random() < 0.2:
+            speed[:] = 0
+        envios.append((mc_id, ts, lat, -75.5697 + rng.normal(0, 2e-4, largo), speed,
+                       np.full(largo, 80, dtype=np.uint8)))
+    return envios
+
+
+def _en_vivo(envios, filtro=None):
+    store = TelemetryStore([dict(m) for m in MONTACARGAS])
+    for mc_id, *resto in envios:
+        append_points(store, mc_id, *resto, ["active"] * len(resto[0]), filtro=filtro)
+    return store
+
+
+def _resumen(store):
+    salida = {}
+    for r in store.list_recorridos():
+        puntos = r["puntos_recorrido"]
+        salida[r["id"]] = (
+            r["montacarga_id"], r["fecha"], r["hora_inicio"], r["hora_fin"], round(r["distancia_km"], 9),
+            *(getattr(puntos, c).tolist() for c in ("ts", "lat", "lng", "speed", "battery")),
+        )
+    return salida
+
+
+def _ejecutar_y_matar(directorio, envios, compactar_en, tmp_path, con_filtro=False):
+    path = str(tmp_path / "envios.npz")
+    datos = {"n": len(envios)}
+    for k, envio in enumerate(envios):
+        for nombre, valor in zip(("mc", "ts", "lat", "lng", "speed", "battery"), envio):
+            datos[f"{k}_{nombre}"] = valor
+    np.savez(path, **datos)
+    proceso = subprocess.run([sys.executable, "-c", PROCESO, directorio, path, str(compactar_en),
+                              "1" if con_filtro else "0"],
+                             cwd=BACKEND, capture_output=True, text=True)
+    assert proceso.returncode == -signal.SIGKILL, proceso.stderr
+
+
+@pytest.mark.parametrize("con_filtro", [False, True], ids=["sin_filtro", "con_filtro"])
+@pytest.mark.parametrize("compactar_en", [-1, 25], ids=["antes_de_compactar", "despues_de_compactar"])
+def test_recuperacion_tras_caida(tmp_path, compactar_en, con_filtro):
+    envios = _envios(np.random.default_rng(11))
+    directorio = str(tmp_path / "wal")
+    _ejecutar_y_matar(directorio, envios, compactar_en, tmp_path, con_filtro)
+
+    archivos = sorted(os.listdir(directorio))
+    if compactar_en < 0:
+        assert archivos == ["telemetry-000000.log"]
+    else:
+        assert archivos == ["snapshot.npz", "telemetry-000001.log"]
+
+    # La recuperación filtra la cola del log con el estado del filtro del snapshot
+    filtro = GpsFilter() if con_filtro else None
+    store, log, info = recover(directorio, TelemetryStore([dict(m) for m in MONTACARGAS]), filtro)
+    log.close()
+    filtro_en_vivo = GpsFilter() if con_filtro else None
+    esperado = _en_vivo(envios, filtro_en_vivo)
+    assert _resumen(store) == _resumen(esperado)
+    assert info["puntos_reaplicados"] == sum(len(e[1]) for e in envios[max(compactar_en, 0):])
+    if con_filtro:
+        assert filtro.export_state() == filtro_en_vivo.export_state()
+        assert filtro_en_vivo.descartados > 0 and filtro_en_vivo.suprimidos > 0
+        assert len(esperado.list_recorridos()) > 3
+
+    # Segunda caída sobre el estado recuperado: la recuperación es idempotente
+    _ejecutar_y_matar(directorio, [], -1, tmp_path, con_filtro)
+    store, log, _ = recover(directorio, TelemetryStore([dict(m) for m in MONTACARGAS]),
+                            GpsFilter() if con_filtro else None)
+    log.close()
+    assert _resumen(store) == _resumen(esperado)
+
+
+def test_snapshot_en_un_hilo_mientras_sigue_la_ingesta(tmp_path):
+    """El snapshot guarda el estado al compactar aunque después lleguen puntos (atrasados incluidos)"""
+    envios = _envios(np.random.default_rng(11))
+    directorio = str(tmp_path)
+    store, log, _ = recover(directorio, TelemetryStore([dict(m) for m in MONTACARGAS]))
+
+    def aplicar(log, envio):
+        mc_id, *resto = envio
+        status = ["active"] * len(resto[0])
+        log.append_many(mc_id, *resto, status)
+        append_points(store, mc_id, *resto, status)
+
+    for envio in envios[:30]:
+        aplicar(log, envio)
+    log, escribir = begin_compaction(store, log)
+    al_compactar = _resumen(store)
+    for envio in envios[30:]:
+        aplicar(log, envio)
+    hilo = threading.Thread(target=escribir)
+    hilo.start()
+    hilo.join()
+    log.close()
+
+    assert sorted(os.listdir(directorio)) == ["snapshot.npz", "telemetry-000001.log"]
+    snapshot, meta = load_snapshot(directorio)
+    assert meta["generacion"] == 1 and _resumen(snapshot) == al_compactar
+    # Algún recorrido del snapshot recibió después puntos atrasados en medio
+    assert any(store.has_recorrido(i) and _resumen(store)[i][5][:len(r[5])] != r[5] for i, r in al_compactar.items())
+    recuperado, log, _ = recover(directorio, TelemetryStore([dict(m) for m in MONTACARGAS]))
+    log.close()
+    assert _resumen(recuperado) == _resumen(store) == _resumen(_en_vivo(envios))
+
+
+def test_registro_incompleto_se_trunca(tmp_path):
+    directorio = str(tmp_path)
+    log = TelemetryLog(directorio, 0)
+    ts = np.arange(10, dtype=np.int64) + 1_763_600_000
+    log.append_many(1, ts, np.full(10, 6.2), np.full(10, -75.5), np.zeros(10), np.full(10, 90), ["active"] * 10)
+    log.close()
+    path = log_path(directorio, 0)
+    completo = os.path.getsize(path)
+    assert completo == len(MAGIC) + 10 * RECORD_DTYPE.itemsize
+
+    # Escritura interrumpida: medio registro al final
+    with open(path, "ab") as f:
+        f.write(b"\x01" * (RECORD_DTYPE.itemsize // 2))
+    registros = read_log(path)
+    assert len(registros) == 10
+    assert registros["ts"].tolist() == ts.tolist()
+    assert os.path.getsize(path) == completo
+
+    # Lo que se escriba después queda alineado y se lee completo
+    log = TelemetryLog(directorio, 0)
+    log.append(1, int(ts[-1]) + 1, 6.2, -75.5)
+    log.close()
+    assert read_log(path)["ts"].tolist() == ts.tolist() + [int(ts[-1]) + 1]
+
+
+def test_log_invalido(tmp_path):
+    path = log_path(str(tmp_path), 0)
+    with open(path, "wb") as f:
+        f.write(b"OTRO")
+    with pytest.raises(ValueError):
+        read_log(path)
+
+
+def test_fsync_en_segundo_plano(tmp_path, monkeypatch):
+    log = TelemetryLog(str(tmp_path), 0, group_size=4, intervalo_sync=3600)
+    hilos = []
+    fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda fd: (hilos.append(threading.current_thread().name), fsync(fd)))
+    for i in range(8):
+        log.append(1, 1_763_600_000 + i, 6.2, -75.5)
+    assert "MainThread" not in hilos  # el append no espera al disco
+    limite = time.monotonic() + 5
+    while "wal-sync-0" not in hilos and time.monotonic() < limite:
+        time.sleep(0.01)
+    assert "wal-sync-0" in hilos
+    log.close()
+    assert hilos[-1] == "MainThread"  # el cierre sincroniza en el llamador
+    assert len(read_log(log.path)) == 8
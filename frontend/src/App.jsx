@@ -7,6 +7,33 @@ import GoogleMap from './GoogleMap'
 // Configurar la URL base de la API
 const API_BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000'
 
+// Zoom para el que el backend simplifica las rutas (menos puntos sin cambio visible en el mapa)
+const MAP_SIMPLIFY_ZOOM = 18
+
+// Mezcla los puntos en vivo con los del recorrido en orden de timestamp (ISO, así que
+// el orden de los strings es el cronológico): un punto atrasado queda en su lugar
+// y uno con un timestamp ya presente (reenvío) se ignora
+function mergePuntos(actuales, nuevos) {
+  const ordenados = [...nuevos].sort((a, b) => a.timestamp.localeCompare(b.timestamp))
+  const ultimo = actuales.length ? actuales[actuales.length - 1].timestamp : ''
+  if (!ordenados.length || ordenados[0].timestamp > ultimo) {
+    return [...actuales, ...ordenados]
+  }
+  const mezcla = []
+  let i = 0
+  let j = 0
+  while (i < actuales.length || j < ordenados.length) {
+    if (j >= ordenados.length || (i < actuales.length && actuales[i].timestamp <= ordenados[j].timestamp)) {
+      mezcla.push(actuales[i++])
+    } else if (mezcla.length && mezcla[mezcla.length - 1].timestamp === ordenados[j].timestamp) {
+      j++
+    } else {
+      mezcla.push(ordenados[j++])
+    }
+  }
+  return mezcla
+}
+
 function App() {
   const [montacargas, setMontacargas] = useState([])
   const [recorridos, setRecorridos] = useState([])
@@ -27,6 +54,30 @@ function App() {
     fetchRecorridos()
   }, [])
 
+  // Recibir en vivo solo los puntos nuevos y cambios de estado (sin volver a pedir /api/recorridos)
+  useEffect(() => {
+    const source = new EventSource(`${API_BASE_URL}/api/live`)
+
+    source.addEventListener('puntos', (event) => {
+      const { recorrido, puntos } = JSON.parse(event.data)
+      setRecorridos(prev => {
+        if (!prev.some(rec => rec.id === recorrido.id)) {
+          return [...prev, { ...recorrido, puntos_recorrido: mergePuntos([], puntos) }]
+        }
+        return prev.map(rec => rec.id === recorrido.id
+          ? { ...rec, ...recorrido, puntos_recorrido: mergePuntos(rec.puntos_recorrido, puntos) }
+          : rec)
+      })
+    })
+
+    source.addEventListener('estado', (event) => {
+      const { mc_id, estado } = JSON.parse(event.data)
+      setMontacargas(prev => prev.map(mc => mc.id === mc_id ? { ...mc, estado } : mc))
+    })
+
+    return () => source.close()
+  }, [])
+
   // Recalcular métricas cuando cambie el montacarga seleccionado
   useEffect(() => {
     const recorridosFiltrados = filtrarRecorridosPorMontacarga()
@@ -55,7 +106,9 @@ function App() {
 
   const fetchRecorridos = async () => {
     try {
-      const response = await axios.get(`${API_BASE_URL}/api/recorridos`)
+      const response = await axios.get(`${API_BASE_URL}/api/recorridos`, {
+        params: { simplify: MAP_SIMPLIFY_ZOOM }
+      })
       setRecorridos(response.data)
       calcularDashboardData(response.data)
     } catch (err) {